@@ -0,0 +1,38 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { getDatabase } from '@/lib/mongodb';
+
+// Totais pré-calculados por instituição/ano, mantidos por scripts/dashboard_aggregates.py
+export async function GET(request: NextRequest) {
+  try {
+    const { searchParams } = new URL(request.url);
+    const ano = searchParams.get('ano');
+    const codigo = searchParams.get('codigo');
+
+    const filter: Record<string, unknown> = {};
+    if (ano) {
+      const year = parseInt(ano, 10);
+      if (isNaN(year)) {
+        return NextResponse.json({ error: 'Parâmetro ano inválido' }, { status: 400 });
+      }
+      filter.ano_referencia = year;
+    }
+    if (codigo) {
+      filter.instituicao_codigo = codigo;
+    }
+
+    const db = await getDatabase();
+    const aggregates = await db
+      .collection('dashboard_aggregates')
+      .find(filter)
+      .sort({ instituicao_codigo: 1, ano_referencia: -1 })
+      .toArray();
+
+    return NextResponse.json(aggregates);
+  } catch (error) {
+    console.error('Erro ao buscar totais do dashboard:', error);
+    return NextResponse.json(
+      { error: 'Erro interno do servidor' },
+      { status: 500 }
+    );
+  }
+}
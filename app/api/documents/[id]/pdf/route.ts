@@ -0,0 +1,92 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { getDatabase } from '@/lib/mongodb';
+import { verifyToken } from '@/lib/authService';
+import { GridFSBucket, ObjectId } from 'mongodb';
+import { Readable } from 'stream';
+
+// Mesmo bucket usado por scripts/send_to_mongo.py
+const PDF_BUCKET = 'pdfs';
+
+export async function GET(
+  request: NextRequest,
+  { params }: { params: Promise<{ id: string }> }
+) {
+  try {
+    const token = request.cookies.get('auth-token')?.value;
+    if (!token) {
+      return NextResponse.json(
+        { success: false, message: 'Não autorizado' },
+        { status: 401 }
+      );
+    }
+
+    const user = await verifyToken(token);
+    if (!user) {
+      return NextResponse.json(
+        { success: false, message: 'Token inválido' },
+        { status: 401 }
+      );
+    }
+
+    const { id } = await params;
+    const db = await getDatabase();
+    const documentsCollection = db.collection('projetos');
+
+    const document = await documentsCollection.findOne(
+      { _id: new ObjectId(id) },
+      {
+        projection: {
+          pdf_original_id: 1,
+          pdf_original_tamanho: 1,
+          'metadados_extracao.nome_arquivo_original': 1
+        }
+      }
+    );
+
+    if (!document) {
+      return NextResponse.json(
+        { success: false, message: 'Documento não encontrado' },
+        { status: 404 }
+      );
+    }
+
+    const fileName = document.metadados_extracao?.nome_arquivo_original || `${id}.pdf`;
+    const headers: Record<string, string> = {
+      'Content-Type': 'application/pdf',
+      'Content-Disposition': `inline; filename="${encodeURIComponent(fileName)}"`,
+    };
+
+    if (document.pdf_original_id) {
+      // Repassa os chunks do GridFS sem montar o arquivo inteiro em memória
+      const bucket = new GridFSBucket(db, { bucketName: PDF_BUCKET });
+      const downloadStream = bucket.openDownloadStream(new ObjectId(document.pdf_original_id));
+      if (document.pdf_original_tamanho) {
+        headers['Content-Length'] = String(document.pdf_original_tamanho);
+      }
+      return new Response(Readable.toWeb(downloadStream) as ReadableStream, { headers });
+    }
+
+    // Documentos antigos ainda não migrados (scripts/migrate_pdfs_to_gridfs.py)
+    const legacy = await documentsCollection.findOne(
+      { _id: new ObjectId(id) },
+      { projection: { pdf_original_arquivo: 1 } }
+    );
+    if (legacy?.pdf_original_arquivo) {
+      const buffer = Buffer.from(legacy.pdf_original_arquivo, 'base64');
+      headers['Content-Length'] = String(buffer.length);
+      return new Response(buffer, { headers });
+    }
+
+    return NextResponse.json(
+      { success: false, message: 'Documento não possui PDF original' },
+      { status: 404 }
+    );
+
+  } catch (error) {
+    console.error('Erro ao baixar PDF:', error);
+    return NextResponse.json(
+      { success: false, message: 'Erro interno do servidor' },
+      { status: 500 }
+    );
+  }
+}
@@ -2,8 +2,6 @@ import { NextRequest, NextResponse } from 'next/server';
 import { getDatabase } from '@/lib/mongodb';
 import { verifyToken } from '@/lib/authService';
 import { ObjectId } from 'mongodb';
-import { spawn } from 'child_process';
-import path from 'path';
 
 export async function POST(
   request: NextRequest,
@@ -41,98 +39,36 @@ export async function POST(
       );
     }
 
-    if (document.status !== 'uploaded') {
+    // A extração roda no worker da fila (scripts/job_queue.py); aqui o documento só entra na fila
+    const result = await documentsCollection.updateOne(
+      { _id: new ObjectId(id), status: { $in: ['uploaded', 'error'] } },
+      {
+        $set: {
+          status: 'queued',
+          queuedAt: new Date(),
+          attempts: 0,
+          error: null,
+          errorCode: null
+        },
+        $unset: { lease: '' }
+      }
+    );
+
+    if (result.matchedCount === 0) {
       return NextResponse.json(
         { success: false, message: 'Documento já foi processado ou está em processamento' },
         { status: 400 }
       );
     }
 
-    // Atualizar status para processing
-    await documentsCollection.updateOne(
-      { _id: new ObjectId(id) },
-      { $set: { status: 'processing' } }
-    );
-
-    try {
-      // Processar PDF usando script Python
-      const pythonScript = path.join(process.cwd(), 'scripts', 'process_pdf.py');
-      
-      const result = await new Promise<any>((resolve, reject) => {
-        const pythonProcess = spawn('python3', [
-          pythonScript,
-          document.filePath,
-          document.institutionName,
-          document.year.toString()
-        ]);
-
-        let output = '';
-        let errorOutput = '';
-
-        pythonProcess.stdout.on('data', (data: Buffer) => {
-          output += data.toString();
-        });
-
-        pythonProcess.stderr.on('data', (data: Buffer) => {
-          errorOutput += data.toString();
-        });
-
-        pythonProcess.on('close', (code: number) => {
-          if (code === 0) {
-            try {
-              const result = JSON.parse(output);
-              if (result.success) {
-                resolve(result);
-              } else {
-                reject(new Error('Erro no processamento Python'));
-              }
-            } catch (parseError) {
-              reject(new Error('Erro ao parsear resultado do Python'));
-            }
-          } else {
-            reject(new Error(`Erro no script Python: ${errorOutput}`));
-          }
-        });
-      });
-
-      const extractedData = result.extractedData;
-      const normalizedData = result.normalizedData;
-
-      // Atualizar documento com dados processados
-      await documentsCollection.updateOne(
-        { _id: new ObjectId(id) },
-        { 
-          $set: { 
-            status: 'processed',
-            processedAt: new Date(),
-            extractedData: extractedData,
-            normalizedData: normalizedData
-          } 
-        }
-      );
-
-      return NextResponse.json({
+    return NextResponse.json(
+      {
         success: true,
-        message: 'Documento processado com sucesso',
-        extractedData: extractedData,
-        normalizedData: normalizedData
-      });
-
-    } catch (processingError) {
-      // Em caso de erro no processamento
-      await documentsCollection.updateOne(
-        { _id: new ObjectId(id) },
-        { 
-          $set: { 
-            status: 'error',
-            error: processingError instanceof Error ? processingError.message : 'Erro desconhecido',
-            processedAt: new Date()
-          } 
-        }
-      );
-
-      throw processingError;
-    }
+        message: 'Documento colocado na fila de processamento',
+        status: 'queued'
+      },
+      { status: 202 }
+    );
 
   } catch (error) {
     console.error('Erro no processamento:', error);
@@ -2,6 +2,7 @@ import { NextRequest, NextResponse } from 'next/server';
 import { getDatabase } from '@/lib/mongodb';
 import { verifyToken } from '@/lib/authService';
 import { ObjectId } from 'mongodb';
+import { runPipelineCommand } from '@/lib/pipelineWorker';
 import { unlink } from 'fs/promises';
 import { existsSync } from 'fs';
 import path from 'path';
@@ -31,7 +32,11 @@ export async function GET(
     const db = await getDatabase();
     const documentsCollection = db.collection('projetos');
 
-    const document = await documentsCollection.findOne({ _id: new ObjectId(id) });
+    // O PDF original é servido por /api/documents/[id]/pdf
+    const document = await documentsCollection.findOne(
+      { _id: new ObjectId(id) },
+      { projection: { pdf_original_arquivo: 0 } }
+    );
 
     if (!document) {
       return NextResponse.json(
@@ -74,13 +79,16 @@ export async function DELETE(
     }
 
     const { id } = await params;
-    const db = await getDatabase();
-    const documentsCollection = db.collection('projetos');
 
-    // Buscar o documento antes de deletar
-    const document = await documentsCollection.findOne({ _id: new ObjectId(id) });
-    
-    if (!document) {
+    // A remoção é feita pelo pipeline Python (ver delete_project em
+    // scripts/send_to_mongo.py): documento, coleções derivadas, identidades,
+    // PDF no GridFS, extração guardada e totais do dashboard
+    const removed = await runPipelineCommand<{ removido: boolean; nome_arquivo_original?: string | null }>({
+      command: 'delete_project',
+      project_id: id,
+    });
+
+    if (!removed.removido) {
       return NextResponse.json(
         { success: false, message: 'Documento não encontrado' },
         { status: 404 }
@@ -88,7 +96,7 @@ export async function DELETE(
     }
 
     // Tentar deletar arquivo físico se existir na pasta uploads
-    const fileName = document.metadados_extracao?.nome_arquivo_original;
+    const fileName = removed.nome_arquivo_original;
     if (fileName) {
       const uploadsDir = path.join(process.cwd(), 'uploads');
       const possiblePaths = [
@@ -110,16 +118,6 @@ export async function DELETE(
       }
     }
 
-    // Deletar do MongoDB
-    const deleteResult = await documentsCollection.deleteOne({ _id: new ObjectId(id) });
-
-    if (deleteResult.deletedCount === 0) {
-      return NextResponse.json(
-        { success: false, message: 'Documento não foi deletado' },
-        { status: 500 }
-      );
-    }
-
     return NextResponse.json({
       success: true,
       message: 'Documento deletado com sucesso'
@@ -2,6 +2,7 @@ import { NextRequest, NextResponse } from 'next/server';
 import { getDatabase } from '@/lib/mongodb';
 import { verifyToken } from '@/lib/authService';
 import { ObjectId } from 'mongodb';
+import { runPipelineCommand, PipelineJobError } from '@/lib/pipelineWorker';
 
 export async function POST(
   request: NextRequest,
@@ -70,43 +71,36 @@ export async function POST(
       );
     }
 
-    // Salvar no banco de projetos
-    const projectData = {
-      ...approvedData,
-      metadados_extracao: {
-        ...approvedData.metadados_extracao,
-        documento_origem: document._id,
-        processado_por: user._id,
-        data_processamento: new Date().toISOString()
-      }
-    };
-
-    // Upsert para criar ou atualizar o projeto
-    const result = await projetosCollection.updateOne(
-      { _id: document.projectId || new ObjectId() },
-      { $set: projectData },
-      { upsert: true }
-    );
-
-    const projectId = result.upsertedId ? result.upsertedId : document.projectId;
-
-    // Atualizar status do documento
+    // A gravação em `projetos` é feita pelo pipeline Python (ver save_approved em
+    // scripts/job_queue.py): upsert pela chave natural, hash, revisão, extração
+    // guardada, coleções derivadas e totais do dashboard
     await documentsCollection.updateOne(
       { _id: new ObjectId(id) },
-      { 
-        $set: { 
-          status: 'saved',
-          savedAt: new Date(),
-          normalizedData: approvedData, // Salva a versão final aprovada
-          projectId: projectId
-        } 
-      }
+      { $set: { normalizedData: approvedData } } // Salva a versão final aprovada
     );
 
+    let saved: { project_id: string; operacao: string };
+    try {
+      saved = await runPipelineCommand<{ project_id: string; operacao: string }>({
+        command: 'save_approved',
+        document_id: id,
+        user_id: user._id ? String(user._id) : undefined,
+      });
+    } catch (error) {
+      if (error instanceof PipelineJobError && error.code === 'comando_invalido') {
+        return NextResponse.json(
+          { success: false, message: error.message },
+          { status: 400 }
+        );
+      }
+      throw error;
+    }
+
     return NextResponse.json({
       success: true,
       message: 'Dados salvos com sucesso no banco de projetos',
-      projectId: result.insertedId
+      projectId: saved.project_id,
+      operacao: saved.operacao
     });
 
   } catch (error) {
@@ -2,6 +2,7 @@ import { NextRequest, NextResponse } from 'next/server';
 import { getDatabase } from '@/lib/mongodb';
 import { verifyToken } from '@/lib/authService';
 import { ObjectId } from 'mongodb';
+import { runPipelineCommand } from '@/lib/pipelineWorker';
 import { fullDocumentSchema } from '@/lib/schemas/document';
 import { getInstitutionCode } from '@/lib/dataService';
 import logger, { logAccessControl } from '@/lib/logger';
@@ -99,7 +100,10 @@ export async function POST(request: NextRequest) {
         );
       }
 
-      const document = await documentsCollection.findOne({ _id: new ObjectId(documentId) });
+      const document = await documentsCollection.findOne(
+        { _id: new ObjectId(documentId) },
+        { projection: { pdf_original_arquivo: 0 } }
+      );
 
       if (!document) {
         return NextResponse.json(
@@ -124,10 +128,26 @@ export async function POST(request: NextRequest) {
 
       // Se tem ID, é uma atualização, senão é uma inserção
       if (documentData._id) {
-        const { _id, ...updateData } = documentData;
+        // A referência ao PDF original (GridFS ou base64 legado) não trafega pelo
+        // editor; é preservada a partir do documento armazenado
+        const {
+          _id,
+          pdf_original_id: _pdfId,
+          pdf_original_tamanho: _pdfSize,
+          pdf_original_arquivo: _pdfBase64,
+          ...updateData
+        } = documentData;
+        const stored = await documentsCollection.findOne(
+          { _id: new ObjectId(_id) },
+          { projection: {
+            _id: 0, pdf_original_id: 1, pdf_original_tamanho: 1, pdf_original_arquivo: 1,
+            'identificacao_unidade.codigo': 1, ano_referencia: 1
+          } }
+        );
+        const { identificacao_unidade: storedUnit, ano_referencia: storedYear, ...storedPdf } = stored || {};
         const result = await documentsCollection.replaceOne(
           { _id: new ObjectId(_id) },
-          updateData
+          { ...updateData, ...storedPdf }
         );
 
         if (result.matchedCount === 0) {
@@ -137,6 +157,14 @@ export async function POST(request: NextRequest) {
           );
         }
 
+        // Coleções derivadas, identidades e totais do dashboard, inclusive os
+        // do par unidade/ano anterior se a edição mudou a chave
+        await runPipelineCommand({
+          command: 'sync_projects',
+          project_ids: [String(_id)],
+          previous_keys: [[storedUnit?.codigo ?? '', storedYear]],
+        });
+
         return NextResponse.json({
           success: true,
           message: 'Documento atualizado com sucesso',
@@ -170,6 +198,7 @@ export async function POST(request: NextRequest) {
         }
 
         const result = await documentsCollection.insertOne(documentData);
+        await runPipelineCommand({ command: 'sync_projects', project_ids: [String(result.insertedId)] });
 
         return NextResponse.json({
           success: true,
@@ -1,5 +1,4 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { spawn } from 'child_process';
 import path from 'path';
 import fs from 'fs/promises';
 import { verifyToken } from '@/lib/authService';
@@ -7,6 +6,7 @@ import { documentUploadSchema } from '@/lib/schemas/document';
 import { getInstitutionCode } from '@/lib/dataService';
 import { withRetry, isRetryableError } from '@/lib/retry';
 import logger, { logProcessingMetrics, logAccessControl } from '@/lib/logger';
+import { runPipelineJob, PipelineJobError } from '@/lib/pipelineWorker';
 import sanitize from 'sanitize-filename';
 // Importar file-type (versão 16.5.4 usa CommonJS)
 import fileType from 'file-type';
@@ -160,9 +160,7 @@ export async function POST(request: NextRequest) {
       userId
     });
 
-    const pythonScriptPath = path.join(process.cwd(), 'scripts', 'run_pipeline.py');
-
-    // 7. Processar com retry logic
+    // 7. Processar com retry logic no worker Python persistente
     const stream = new ReadableStream({
       async start(controller) {
         const encoder = new TextEncoder();
@@ -174,95 +172,30 @@ export async function POST(request: NextRequest) {
 
         try {
           await withRetry(
-            () => new Promise<void>((resolve, reject) => {
-              const pythonProcess = spawn('python3', [
-                pythonScriptPath,
-                tempFilePath!,
-                institutionName || '',
-                year || '',
-              ]);
-
-              let hasError = false;
-
-              pythonProcess.stdout.on('data', (data) => {
-                const logLine = data.toString();
-                send({ status: 'processing', log: logLine });
-              });
-
-              pythonProcess.stderr.on('data', (data) => {
-                const logLine = data.toString();
-
-                // Apenas marcar como erro se for realmente um erro (ERROR ou CRITICAL)
-                // Logs INFO/WARNING do Python vão para stderr mas não são erros
-                if (logLine.includes('- ERROR -') || logLine.includes('- CRITICAL -')) {
-                  hasError = true;
-                  send({ status: 'error', log: logLine });
-                  logger.error('Python process error', { error: logLine });
-                } else {
-                  // É apenas um log informativo (INFO/WARNING)
-                  send({ status: 'processing', log: logLine });
-                }
-              });
-
-              pythonProcess.on('close', async (code) => {
-                // Limpar arquivo temporário
-                if (tempFilePath) {
-                  try {
-                    await fs.unlink(tempFilePath);
-                  } catch (err) {
-                    logger.error('Failed to delete temp file', { tempFilePath, error: err });
-                  }
-                }
-
-                if (code === 0 && !hasError) {
-                  send({ status: 'success', message: 'Processo concluído com sucesso!' });
-
-                  logProcessingMetrics({
-                    filename: sanitizedFileName,
-                    fileSize: file.size,
-                    institution: institutionName!,
-                    startTime,
-                    endTime: new Date(),
-                    success: true,
-                    userId
-                  });
-
-                  resolve();
-                } else {
-                  const error = new Error(`Processo falhou com código ${code}`);
-                  send({ status: 'failure', message: error.message });
-
-                  logProcessingMetrics({
-                    filename: sanitizedFileName,
-                    fileSize: file.size,
-                    institution: institutionName!,
-                    startTime,
-                    endTime: new Date(),
-                    success: false,
-                    error: error.message,
-                    userId
-                  });
-
-                  reject(error);
-                }
-                controller.close();
-              });
-
-              pythonProcess.on('error', async (err) => {
-                if (tempFilePath) {
-                  try {
-                    await fs.unlink(tempFilePath);
-                  } catch { }
+            () => runPipelineJob(
+              {
+                pdfPath: tempFilePath!,
+                institutionName: institutionName || '',
+                year: year || '',
+              },
+              (event) => {
+                if (event.event === 'progress') {
+                  send({ status: 'processing', stage: event.stage, log: event.message });
+                } else if (event.event === 'page') {
+                  send({ status: 'processing', event: 'page', stage: event.stage, page: event.page, total: event.total, tables: event.tables });
+                } else if (event.event === 'stage_start' || event.event === 'stage_end') {
+                  send({ status: 'processing', event: event.event, stage: event.stage, counts: event.counts, durationMs: event.duration_ms });
+                } else if (event.event === 'error') {
+                  send({ status: 'error', stage: event.stage, code: event.code, log: event.message });
+                  logger.error('Python pipeline error', { stage: event.stage, code: event.code, error: event.message });
                 }
-                send({ status: 'failure', message: `Falha ao iniciar o processo: ${err.message}` });
-                logger.error('Failed to start Python process', { error: err.message });
-                reject(err);
-                controller.close();
-              });
-            }),
+              }
+            ),
             {
               maxRetries: 3,
               initialDelay: 1000,
+              // Só a queda do worker Python justifica repetir; falhas do próprio PDF (inclusive por tempo) se repetiriam
+              shouldRetry: (error) => !(error instanceof PipelineJobError) || error.code === 'worker_encerrado',
               onRetry: (attempt, error) => {
                 send({
                   status: 'retrying',
@@ -271,11 +204,44 @@ export async function POST(request: NextRequest) {
               }
             }
           );
+
+          send({ status: 'success', message: 'Processo concluído com sucesso!' });
+
+          logProcessingMetrics({
+            filename: sanitizedFileName,
+            fileSize: file.size,
+            institution: institutionName!,
+            startTime,
+            endTime: new Date(),
+            success: true,
+            userId
+          });
         } catch (error) {
+          const message = error instanceof Error ? error.message : String(error);
           send({
             status: 'failure',
-            message: `Falha após 3 tentativas: ${error instanceof Error ? error.message : String(error)}`
+            message: `Falha no processamento: ${message}`
           });
+
+          logProcessingMetrics({
+            filename: sanitizedFileName,
+            fileSize: file.size,
+            institution: institutionName!,
+            startTime,
+            endTime: new Date(),
+            success: false,
+            error: message,
+            userId
+          });
+        } finally {
+          // Limpar arquivo temporário apenas após a última tentativa
+          if (tempFilePath) {
+            try {
+              await fs.unlink(tempFilePath);
+            } catch (err) {
+              logger.error('Failed to delete temp file', { tempFilePath, error: err });
+            }
+          }
           controller.close();
         }
       },
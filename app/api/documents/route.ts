@@ -29,7 +29,7 @@ export async function GET(request: NextRequest) {
     const documents = await documentsCollection
       .find({}, { 
         projection: { 
-          pdf_original_arquivo: 0, // Excluir o PDF em base64
+          pdf_original_arquivo: 0, // Excluir o PDF em base64 (documentos ainda não migrados para o GridFS)
           acoes_projetos: 0, // Excluir projetos para reduzir tamanho
           anexo1_aquisicoes: 0 // Excluir aquisições para reduzir tamanho
         } 
@@ -46,7 +46,7 @@ export async function GET(request: NextRequest) {
       instituicao_nome: doc.instituicao_nome || doc.identificacao_unidade?.nome || 'N/A',
       identificacao_unidade: doc.identificacao_unidade || null,
       versao_documento: doc.versao_documento || null,
-      tem_pdf: !!doc.pdf_original_arquivo
+      tem_pdf: !!doc.pdf_original_id || !!doc.pdf_original_arquivo
     }));
 
     return NextResponse.json({
@@ -82,7 +82,7 @@ export async function POST(request: NextRequest) {
       filePath: filePath,
       institutionName: institutionName,
       year: parseInt(year),
-      status: 'uploaded', // uploaded, processing, processed, error
+      status: 'uploaded', // uploaded, queued, processing, processed, error
       uploadedBy: user._id,
       uploadedAt: new Date(),
       processedAt: null,
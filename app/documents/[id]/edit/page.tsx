@@ -15,7 +15,7 @@ interface Document {
   originalName: string;
   institutionName: string;
   year: number;
-  status: 'uploaded' | 'processing' | 'processed' | 'saved' | 'error';
+  status: 'uploaded' | 'queued' | 'processing' | 'processed' | 'saved' | 'error';
   normalizedData?: any; // Usaremos 'any' por enquanto para flexibilidade
 }
 
@@ -13,7 +13,7 @@ import { Dialog, DialogContent, DialogDescription, DialogFooter, DialogHeader, D
 import { Upload, Loader2, CheckCircle, AlertTriangle, LayoutDashboard, FileCheck, FileClock, FileCog, Database, RotateCcw, Copy, Trash2, FileText, RefreshCw } from "lucide-react"
 import ProtectedRoute from '@/components/ProtectedRoute'
 import { UploadForm } from '@/components/documents/UploadForm'
-import { ProcessingView } from '@/components/documents/ProcessingView'
+import { ProcessingView, applyPipelineEvent, initialPipelineProgress } from '@/components/documents/ProcessingView'
 import { ResultView } from '@/components/documents/ResultView'
 import { useToast } from '@/components/ui/use-toast'
 
@@ -101,6 +101,7 @@ export default function ProcessDocumentPage() {
   const [year, setYear] = useState<string>(new Date().getFullYear().toString())
   const [status, setStatus] = useState<Status>('idle')
   const [logs, setLogs] = useState<string[]>([])
+  const [progress, setProgress] = useState(initialPipelineProgress)
 
   // Estados adicionais para gerenciamento de documentos
   const [documents, setDocuments] = useState<ProcessedDocument[]>([])
@@ -120,6 +121,7 @@ export default function ProcessDocumentPage() {
     setInstitutionName('');
     setYear(new Date().getFullYear().toString());
     setLogs([]);
+    setProgress(initialPipelineProgress);
   };
 
   const handleSubmit = async (uploadedFile: File, institution: string, uploadYear: string) => {
@@ -128,6 +130,7 @@ export default function ProcessDocumentPage() {
     setYear(uploadYear);
     setStatus('processing');
     setLogs(['Iniciando conexão com o servidor...']);
+    setProgress(initialPipelineProgress);
 
     const formData = new FormData();
     formData.append('file', uploadedFile);
@@ -153,6 +156,7 @@ export default function ProcessDocumentPage() {
           try {
             const data = JSON.parse(jsonString);
             if (data.log) setLogs(prev => [...prev, data.log]);
+            if (data.event) setProgress(prev => applyPipelineEvent(prev, data));
             if (data.status === 'success') {
               setStatus('success');
               toast({
@@ -304,7 +308,7 @@ export default function ProcessDocumentPage() {
   const renderContent = () => {
     switch (status) {
       case 'processing':
-        return <ProcessingView logs={logs} status={status} />;
+        return <ProcessingView logs={logs} status={status} progress={progress} />;
       case 'success':
         return <ResultView type="success" logs={logs} onReset={resetForm} />;
       case 'error':
@@ -20,6 +20,8 @@ import {
     InstitutionalData,
     getAvailableInstitutions,
     loadInstitutionData,
+    loadDashboardAggregates,
+    aggregateToProjectStats,
     calculateProjectStats,
     Institution
 } from "@/lib/dataService"
@@ -53,6 +55,8 @@ export default function AggregatedDashboard() {
         criticalAlertsCount: 0
     })
     const [institutionsStats, setInstitutionsStats] = useState<{ name: string, id: string, stats: any }[]>([])
+    // Códigos das unidades que o usuário pode ver (filtra os totais pré-calculados)
+    const [institutionCodes, setInstitutionCodes] = useState<string[]>([])
 
     useEffect(() => {
         const loadAllData = async () => {
@@ -71,6 +75,7 @@ export default function AggregatedDashboard() {
                 }
 
                 const uniqueInstitutions = Array.from(new Map(validInstitutions.map(inst => [inst.id, inst])).values())
+                setInstitutionCodes(uniqueInstitutions.map(inst => inst.id))
 
                 const promises = uniqueInstitutions.map(inst => loadInstitutionData(inst.id))
                 const results = await Promise.all(promises)
@@ -98,45 +103,58 @@ export default function AggregatedDashboard() {
 
     // Recalculate stats when year or data changes
     useEffect(() => {
-        if (allInstitutionsData.length === 0) return
-
-        const filteredData = allInstitutionsData.filter(d => d.ano_referencia.toString() === selectedYear)
-
-        let totalProjects = 0
-        let totalBudget = 0
-        let totalWorkload = 0
-        let projectsWithoutCost = 0
-        let projectsWithBudget = 0
+        if (institutionCodes.length === 0) return
+        let cancelled = false
+
+        const applyStats = (aggregates: Awaited<ReturnType<typeof loadDashboardAggregates>>) => {
+            if (cancelled) return
+            const allowed = new Set(institutionCodes)
+            const statsByCode = new Map<string, { name: string, id: string, stats: any }>()
+
+            // Totais pré-calculados pelo pipeline, atualizados a cada gravação em `projetos`
+            for (const aggregate of aggregates) {
+                if (!allowed.has(aggregate.instituicao_codigo)) continue
+                statsByCode.set(aggregate.instituicao_codigo, {
+                    name: aggregate.instituicao_nome,
+                    id: aggregate.instituicao_codigo,
+                    stats: aggregateToProjectStats(aggregate)
+                })
+            }
 
-        const instStats = filteredData.map(data => {
-            const stats = calculateProjectStats(data.acoes_projetos, data)
+            // Unidades ainda sem total pré-calculado são calculadas a partir dos projetos
+            for (const data of allInstitutionsData) {
+                const code = data.identificacao_unidade.codigo
+                if (data.ano_referencia.toString() !== selectedYear || statsByCode.has(code)) continue
+                statsByCode.set(code, {
+                    name: data.identificacao_unidade.nome,
+                    id: code,
+                    stats: calculateProjectStats(data.acoes_projetos, data)
+                })
+            }
 
-            totalProjects += stats.totalProjects
-            totalBudget += stats.totalBudget
-            totalWorkload += stats.totalWorkload
-            projectsWithoutCost += stats.projectsWithoutCost
-            projectsWithBudget += stats.projectsWithBudget
+            const instStats = Array.from(statsByCode.values())
+            const sum = (field: string) => instStats.reduce((total, inst) => total + inst.stats[field], 0)
+            const totalProjects = sum('totalProjects')
+            const totalWorkload = sum('totalWorkload')
+            const projectsWithoutCost = sum('projectsWithoutCost')
+
+            setAggregatedStats({
+                totalProjects,
+                totalBudget: sum('totalBudget'),
+                totalWorkload,
+                averageWorkloadPerProject: totalProjects > 0 ? (totalWorkload / totalProjects).toFixed(1) : "0",
+                projectsWithoutCost,
+                projectsWithBudget: sum('projectsWithBudget'),
+                institutionCount: instStats.length,
+                criticalAlertsCount: projectsWithoutCost // Using projects without cost as a proxy for critical alerts
+            })
+
+            setInstitutionsStats(instStats)
+        }
 
-            return {
-                name: data.identificacao_unidade.nome,
-                id: data.identificacao_unidade.codigo, // Assuming code is unique enough or use _id
-                stats
-            }
-        })
-
-        setAggregatedStats({
-            totalProjects,
-            totalBudget,
-            totalWorkload,
-            averageWorkloadPerProject: totalProjects > 0 ? (totalWorkload / totalProjects).toFixed(1) : "0",
-            projectsWithoutCost,
-            projectsWithBudget,
-            institutionCount: filteredData.length,
-            criticalAlertsCount: projectsWithoutCost // Using projects without cost as a proxy for critical alerts
-        })
-
-        setInstitutionsStats(instStats)
-    }, [allInstitutionsData, selectedYear])
+        loadDashboardAggregates(selectedYear).then(applyStats)
+        return () => { cancelled = true }
+    }, [institutionCodes, allInstitutionsData, selectedYear])
 
     const chartData = useMemo(() => {
         return institutionsStats.map(inst => ({
@@ -9,62 +9,84 @@ type Status = 'idle' | 'processing' | 'success' | 'error'
 interface ProcessingViewProps {
     logs: string[]
     status: Status
+    progress: PipelineProgress
+}
+
+// Estado montado a partir dos eventos estruturados do pipeline (ver scripts/progress_events.py)
+export interface PipelineProgress {
+    stage: string | null
+    completed: boolean
+    pagesProcessed: number
+    totalPages: number
+    tablesFound: number
+    projectsExtracted: number
+    acquisitionsFound: number
+}
+
+export const initialPipelineProgress: PipelineProgress = {
+    stage: null,
+    completed: false,
+    pagesProcessed: 0,
+    totalPages: 0,
+    tablesFound: 0,
+    projectsExtracted: 0,
+    acquisitionsFound: 0,
+}
+
+interface PipelineStreamEvent {
+    event?: string
+    stage?: string
+    page?: number
+    total?: number
+    tables?: number
+    counts?: Record<string, unknown>
+}
+
+const countOf = (counts: Record<string, unknown> | undefined, key: string) =>
+    typeof counts?.[key] === 'number' ? (counts[key] as number) : undefined
+
+// Aplica um evento recebido da rota /api/documents/process-pdf ao estado de progresso
+export function applyPipelineEvent(progress: PipelineProgress, data: PipelineStreamEvent): PipelineProgress {
+    switch (data.event) {
+        case 'stage_start':
+            return { ...progress, stage: data.stage ?? progress.stage }
+        case 'page':
+            return {
+                ...progress,
+                pagesProcessed: data.page ?? progress.pagesProcessed,
+                totalPages: data.total ?? progress.totalPages,
+                tablesFound: progress.tablesFound + (data.tables ?? 0),
+            }
+        case 'stage_end':
+            return {
+                ...progress,
+                completed: data.stage === 'envio',
+                pagesProcessed: countOf(data.counts, 'paginas') ?? progress.pagesProcessed,
+                totalPages: countOf(data.counts, 'paginas') ?? progress.totalPages,
+                tablesFound: countOf(data.counts, 'tabelas') ?? progress.tablesFound,
+                projectsExtracted: countOf(data.counts, 'projetos') ?? progress.projectsExtracted,
+                acquisitionsFound: countOf(data.counts, 'aquisicoes') ?? progress.acquisitionsFound,
+            }
+        default:
+            return progress
+    }
 }
 
 const pipelineSteps = [
-    { name: 'Extraindo Dados', keyword: 'Iniciando a extração' },
-    { name: 'Normalizando Dados', keyword: 'Iniciando a normalização' },
-    { name: 'Salvando no Banco', keyword: 'Inserindo dados no banco' },
-    { name: 'Concluído', keyword: 'Dados inseridos com sucesso' },
+    { name: 'Extraindo Dados', stages: ['extracao', 'extracao_normalizacao'] },
+    { name: 'Normalizando Dados', stages: ['normalizacao'] },
+    { name: 'Salvando no Banco', stages: ['envio'] },
+    { name: 'Concluído', stages: [] as string[] },
 ]
 
-export function ProcessingView({ logs, status }: ProcessingViewProps) {
-    // Extrair estatísticas dos logs
-    const stats = useMemo(() => {
-        const logText = logs.join('\n')
-
-        // Páginas processadas
-        const pageMatches = logText.match(/Processando página (\d+) de (\d+)/g)
-        const lastPageMatch = pageMatches?.[pageMatches.length - 1]
-        const pageNumbers = lastPageMatch?.match(/\d+/g)
-        const pagesProcessed = pageNumbers ? parseInt(pageNumbers[0]) : 0
-        const totalPages = pageNumbers ? parseInt(pageNumbers[1]) : 0
-
-        // Tabelas encontradas
-        const tableMatches = logText.match(/(\d+) tabelas encontradas/g)
-        const tablesFound = tableMatches?.reduce((sum, match) => {
-            const num = match.match(/\d+/)
-            return sum + (num ? parseInt(num[0]) : 0)
-        }, 0) || 0
-
-        // Projetos extraídos
-        const projectMatch = logText.match(/(\d+) projetos/)
-        const projectsExtracted = projectMatch ? parseInt(projectMatch[1]) : 0
-
-        // Aquisições
-        const acquisitionMatch = logText.match(/(\d+) aquisições/)
-        const acquisitionsFound = acquisitionMatch ? parseInt(acquisitionMatch[1]) : 0
-
-        return {
-            pagesProcessed,
-            totalPages,
-            tablesFound,
-            projectsExtracted,
-            acquisitionsFound
-        }
-    }, [logs])
-
+export function ProcessingView({ logs, status, progress: stats }: ProcessingViewProps) {
     // Determinar etapa atual
     const currentStep = useMemo(() => {
         if (status !== 'processing') return -1
-        const logText = logs.join('\n')
-        for (let i = pipelineSteps.length - 1; i >= 0; i--) {
-            if (logText.includes(pipelineSteps[i].keyword)) {
-                return i
-            }
-        }
-        return 0
-    }, [logs, status])
+        if (stats.completed) return pipelineSteps.length - 1
+        const index = pipelineSteps.findIndex(step => stats.stage !== null && step.stages.includes(stats.stage))
+        return index === -1 ? 0 : index
+    }, [stats, status])
 
     const progress = stats.totalPages > 0
         ? (stats.pagesProcessed / stats.totalPages) * 100
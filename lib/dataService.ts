@@ -81,6 +81,54 @@ export async function loadInstitutionData(institutionId: string): Promise<Instit
   }
 }
 
+// Totais pré-calculados por instituição/ano (coleção dashboard_aggregates)
+export interface DashboardAggregate {
+  _id: string;
+  instituicao_codigo: string;
+  instituicao_nome: string;
+  ano_referencia: number;
+  total_projetos: number;
+  custo_estimado_total: number;
+  projetos_com_orcamento: number;
+  projetos_sem_custo: number;
+  carga_horaria_semanal_total: number;
+  media_carga_por_projeto: number;
+  membros_equipe: number;
+  projetos_por_origem: Array<{ origem_prioridade: string; projetos: number }>;
+  carga_horaria_por_tipo: Array<{ tipo_hora: string; horas: number }>;
+  total_aquisicoes: number;
+  valor_aquisicoes_total: number;
+  atualizado_em: string;
+}
+
+// Função para carregar os totais pré-calculados de um ano (vazio se a coleção ainda não foi gerada)
+export async function loadDashboardAggregates(year: string): Promise<DashboardAggregate[]> {
+  try {
+    const response = await fetch(`/api/dashboard/aggregates?ano=${encodeURIComponent(year)}`);
+    if (!response.ok) {
+      throw new Error(`Failed to load dashboard aggregates for ${year}`);
+    }
+    return await response.json();
+  } catch (error) {
+    console.error(`Error loading dashboard aggregates for ${year}:`, error);
+    return [];
+  }
+}
+
+// Converte um total pré-calculado para o formato de calculateProjectStats
+export function aggregateToProjectStats(aggregate: DashboardAggregate) {
+  return {
+    totalProjects: aggregate.total_projetos,
+    totalBudget: aggregate.custo_estimado_total,
+    totalWorkload: aggregate.carga_horaria_semanal_total,
+    projectsWithoutCost: aggregate.projetos_sem_custo,
+    projectsWithBudget: aggregate.projetos_com_orcamento,
+    averageWorkloadPerProject: aggregate.total_projetos > 0
+      ? (aggregate.carga_horaria_semanal_total / aggregate.total_projetos).toFixed(1)
+      : '0'
+  };
+}
+
 // Função para obter lista de anos disponíveis para uma instituição
 export function getAvailableYears(data: InstitutionalData): number[] {
   // Por enquanto retornamos apenas o ano de referência
@@ -0,0 +1,90 @@
+// @vitest-environment node
+import { describe, it, expect, vi, beforeEach, afterEach } from 'vitest';
+import { EventEmitter } from 'events';
+import { PassThrough } from 'stream';
+
+const { mockSpawn } = vi.hoisted(() => ({ mockSpawn: vi.fn() }));
+
+vi.mock('child_process', () => ({
+    __esModule: true,
+    spawn: mockSpawn,
+    default: { spawn: mockSpawn }
+}));
+
+vi.mock('./logger', () => ({
+    default: { info: vi.fn(), warn: vi.fn(), error: vi.fn(), debug: vi.fn() }
+}));
+
+// Processo Python falso: guarda as linhas recebidas no stdin e responde pelo stdout
+function fakeChild() {
+    const child = Object.assign(new EventEmitter(), {
+        stdin: new PassThrough(),
+        stdout: new PassThrough(),
+        stderr: new PassThrough(),
+        pid: 1000 + mockSpawn.mock.calls.length,
+        exitCode: null as number | null,
+        killed: false,
+        received: [] as Record<string, unknown>[],
+        kill: vi.fn(),
+    });
+    child.stdin.on('data', (chunk: Buffer) => {
+        for (const line of chunk.toString().split('\n').filter(Boolean)) {
+            child.received.push(JSON.parse(line));
+        }
+    });
+    child.kill.mockImplementation((signal: string) => {
+        child.killed = true;
+        setImmediate(() => child.emit('exit', null, signal));
+        return true;
+    });
+    return child;
+}
+
+const tick = () => new Promise((resolve) => setImmediate(resolve));
+
+describe('Pipeline worker', () => {
+    beforeEach(() => {
+        vi.resetModules();
+        mockSpawn.mockReset();
+        mockSpawn.mockImplementation(() => fakeChild());
+        (global as { _pipelineWorkers?: unknown })._pipelineWorkers = undefined;
+    });
+
+    afterEach(() => {
+        vi.unstubAllEnvs();
+    });
+
+    it('should run commands in their own process while a PDF job is running', async () => {
+        const { runPipelineJob, runPipelineCommand } = await import('./pipelineWorker');
+
+        runPipelineJob({ pdfPath: '/tmp/a.pdf', institutionName: 'Fatec', year: '2025' }).catch(() => {});
+        const saved = runPipelineCommand({ command: 'delete_project', project_id: 'abc' });
+        await tick();
+
+        expect(mockSpawn).toHaveBeenCalledTimes(2);
+        const [jobs, commands] = mockSpawn.mock.results.map((result) => result.value);
+        expect(jobs.received).toHaveLength(1);
+        expect(commands.received).toEqual([expect.objectContaining({ command: 'delete_project' })]);
+
+        const id = commands.received[0].id;
+        commands.stdout.write(JSON.stringify({ id, event: 'done', result: { removido: true } }) + '\n');
+        await expect(saved).resolves.toEqual({ removido: true });
+    });
+
+    it('should restart the worker when a call times out', async () => {
+        vi.stubEnv('PGA_PIPELINE_COMMAND_TIMEOUT_S', '0.05');
+        const { runPipelineCommand, PipelineJobError } = await import('./pipelineWorker');
+
+        const call = runPipelineCommand({ command: 'sync_projects', project_ids: ['abc'] });
+        await expect(call).rejects.toBeInstanceOf(PipelineJobError);
+        await expect(call).rejects.toMatchObject({ code: 'tempo_esgotado' });
+
+        const stuck = mockSpawn.mock.results[0].value;
+        expect(stuck.kill).toHaveBeenCalledWith('SIGKILL');
+
+        runPipelineCommand({ command: 'sync_projects', project_ids: ['abc'] }).catch(() => {});
+        await tick();
+        expect(mockSpawn).toHaveBeenCalledTimes(2);
+        expect(mockSpawn.mock.results[1].value.received).toHaveLength(1);
+    });
+});
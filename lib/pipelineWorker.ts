@@ -0,0 +1,239 @@
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process';
+import path from 'path';
+import readline from 'readline';
+import logger from './logger';
+
+export interface PipelineJob {
+    pdfPath: string;
+    institutionName: string;
+    year: string;
+}
+
+export interface PipelineResult {
+    inserted_id: string;
+    paginas: number;
+    projetos: number;
+    aquisicoes: number;
+    operacao?: 'inserido' | 'atualizado' | 'inalterado';
+}
+
+// Eventos estruturados de progresso: ver scripts/progress_events.py
+export interface PipelineEvent {
+    id?: string;
+    event: 'ready' | 'progress' | 'stage_start' | 'stage_end' | 'page' | 'done' | 'error' | 'pong';
+    stage?: string;
+    message?: string;
+    code?: string;
+    status?: 'ok' | 'erro';
+    page?: number;
+    total?: number;
+    tables?: number;
+    duration_ms?: number;
+    counts?: Record<string, unknown>;
+    result?: PipelineResult;
+}
+
+/**
+ * Falha de um job do pipeline, com a etapa e o código do evento de erro
+ * (ex.: `extracao_falhou`, ou `worker_encerrado` quando o processo Python caiu).
+ */
+export class PipelineJobError extends Error {
+    constructor(message: string, public stage?: string, public code?: string) {
+        super(message);
+        this.name = 'PipelineJobError';
+    }
+}
+
+type JobListener = (event: PipelineEvent) => void;
+
+/**
+ * Cada canal tem o seu processo Python: `jobs` processa os PDFs da rota de
+ * upload, um de cada vez, e `commands` atende as gravações das rotas da
+ * interface web, que assim não esperam atrás de uma extração.
+ */
+type WorkerChannel = 'jobs' | 'commands';
+
+interface WorkerState {
+    channel: WorkerChannel;
+    process: ChildProcessWithoutNullStreams;
+    listeners: Map<string, JobListener>;
+    // Momento do último evento recebido do worker (de qualquer chamada)
+    lastActivity: number;
+}
+
+const WORKER_SCRIPT = path.join(process.cwd(), 'scripts', 'pipeline_worker.py');
+
+function secondsFromEnv(name: string, fallback: number): number {
+    const value = Number(process.env[name]);
+    return Number.isFinite(value) && value > 0 ? value * 1000 : fallback * 1000;
+}
+
+// Tempo máximo sem nenhum evento do worker enquanto uma chamada espera: uma extração
+// emite um evento por página, então só um processo travado chega a esse limite
+const JOB_TIMEOUT_MS = secondsFromEnv('PGA_PIPELINE_JOB_TIMEOUT_S', 600);
+const COMMAND_TIMEOUT_MS = secondsFromEnv('PGA_PIPELINE_COMMAND_TIMEOUT_S', 60);
+
+// Em desenvolvimento o módulo é recarregado pelo HMR; os workers ficam no escopo global
+// para não deixar processos Python órfãos a cada recarga (mesma ideia de lib/mongodb.ts).
+const globalWithWorker = global as typeof globalThis & {
+    _pipelineWorkers?: Partial<Record<WorkerChannel, WorkerState | null>>;
+};
+const workers = (globalWithWorker._pipelineWorkers ??= {});
+
+let jobCounter = 0;
+
+function startWorker(channel: WorkerChannel): WorkerState {
+    const child = spawn('python3', [WORKER_SCRIPT]);
+    const state: WorkerState = { channel, process: child, listeners: new Map(), lastActivity: Date.now() };
+
+    readline.createInterface({ input: child.stdout }).on('line', (line) => {
+        let event: PipelineEvent;
+        try {
+            event = JSON.parse(line);
+        } catch {
+            logger.warn('Invalid line from pipeline worker', { channel, line });
+            return;
+        }
+        state.lastActivity = Date.now();
+
+        if (event.event === 'ready') {
+            logger.info('Pipeline worker ready', { channel, pid: child.pid });
+            return;
+        }
+        if (event.id) {
+            state.listeners.get(event.id)?.(event);
+        }
+    });
+
+    // Logs do Python (INFO/WARNING/ERROR) vão para o stderr; o resultado vem pelos eventos
+    readline.createInterface({ input: child.stderr }).on('line', (line) => {
+        logger.debug('Pipeline worker log', { channel, line });
+    });
+
+    const fail = (message: string) => {
+        if (workers[channel] === state) {
+            workers[channel] = null;
+        }
+        for (const [id, listener] of state.listeners) {
+            listener({ id, event: 'error', stage: 'worker', code: 'worker_encerrado', message });
+        }
+        state.listeners.clear();
+    };
+
+    child.on('exit', (code, signal) => {
+        logger.warn('Pipeline worker exited', { channel, code, signal });
+        fail(`Worker do pipeline encerrado (código ${code ?? signal})`);
+    });
+    child.on('error', (err) => {
+        logger.error('Failed to start pipeline worker', { channel, error: err.message });
+        fail(`Falha ao iniciar o worker do pipeline: ${err.message}`);
+    });
+
+    return state;
+}
+
+function getWorker(channel: WorkerChannel): WorkerState {
+    const current = workers[channel];
+    if (current && current.process.exitCode === null && !current.process.killed) {
+        return current;
+    }
+    const state = startWorker(channel);
+    workers[channel] = state;
+    return state;
+}
+
+/**
+ * Envia uma linha ao worker do canal e chama `onEvent` com os eventos da
+ * chamada até `done` ou `error`. Se o worker passar `timeoutMs` sem emitir
+ * nenhum evento, a chamada é rejeitada com o código `tempo_esgotado` e o
+ * processo é encerrado: as outras chamadas pendentes nele recebem
+ * `worker_encerrado` e a próxima chamada inicia um worker novo.
+ */
+function callWorker<T>(
+    channel: WorkerChannel,
+    message: Record<string, unknown>,
+    timeoutMs: number,
+    onEvent: (event: PipelineEvent) => void,
+    failureMessage: (event: PipelineEvent) => string
+): Promise<T> {
+    const worker = getWorker(channel);
+    const id = `${Date.now()}-${++jobCounter}`;
+
+    return new Promise<T>((resolve, reject) => {
+        let timer: ReturnType<typeof setTimeout>;
+
+        const settle = () => {
+            clearTimeout(timer);
+            worker.listeners.delete(id);
+        };
+
+        const check = () => {
+            const idle = Date.now() - worker.lastActivity;
+            if (idle < timeoutMs) {
+                timer = setTimeout(check, timeoutMs - idle);
+                return;
+            }
+            settle();
+            logger.error('Pipeline worker timed out', { channel, pid: worker.process.pid, id, timeoutMs });
+            reject(new PipelineJobError(
+                `O worker do pipeline ficou ${Math.round(timeoutMs / 1000)} s sem responder`,
+                'worker',
+                'tempo_esgotado'
+            ));
+            worker.process.kill('SIGKILL');
+        };
+        timer = setTimeout(check, timeoutMs);
+
+        worker.listeners.set(id, (event) => {
+            onEvent(event);
+            if (event.event === 'done') {
+                settle();
+                resolve(event.result as unknown as T);
+            } else if (event.event === 'error') {
+                settle();
+                reject(new PipelineJobError(event.message || failureMessage(event), event.stage, event.code));
+            }
+        });
+
+        worker.process.stdin.write(JSON.stringify({ id, ...message }) + '\n');
+    });
+}
+
+/**
+ * Envia um PDF para o worker Python persistente e repassa os eventos de progresso.
+ * Resolve com o resumo do processamento ou rejeita com a mensagem de erro do pipeline
+ * (código `tempo_esgotado` se o worker parar de responder).
+ */
+export function runPipelineJob(
+    job: PipelineJob,
+    onEvent?: (event: PipelineEvent) => void
+): Promise<PipelineResult> {
+    return callWorker<PipelineResult>(
+        'jobs',
+        { pdf_path: job.pdfPath, institution_name: job.institutionName, year: job.year },
+        JOB_TIMEOUT_MS,
+        (event) => onEvent?.(event),
+        (event) => `Falha na etapa ${event.stage}`
+    );
+}
+
+/**
+ * Comandos de gravação executados pelo worker Python (ver COMMANDS em
+ * scripts/pipeline_worker.py), para que as rotas que alteram `projetos`
+ * mantenham as coleções derivadas e os totais do dashboard pelo mesmo código
+ * do pipeline.
+ */
+export type PipelineCommand =
+    | { command: 'save_approved'; document_id: string; user_id?: string }
+    | { command: 'sync_projects'; project_ids: string[]; previous_keys?: [string, number][] }
+    | { command: 'delete_project'; project_id: string };
+
+/**
+ * Envia um comando ao worker Python dos comandos, separado do que processa os
+ * PDFs. Resolve com o `result` do evento `done` ou rejeita com um
+ * PipelineJobError (código `comando_invalido` para dados inválidos,
+ * `tempo_esgotado` se o worker parar de responder).
+ */
+export function runPipelineCommand<T = Record<string, unknown>>(command: PipelineCommand): Promise<T> {
+    return callWorker<T>('commands', command, COMMAND_TIMEOUT_MS, () => {}, () => `Falha no comando ${command.command}`);
+}
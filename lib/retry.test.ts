@@ -39,5 +39,13 @@ describe('Retry Logic', () => {
 
         expect(mockFn).toHaveBeenCalledTimes(2) // Total attempts (initial + 1 retry if maxRetries=2 means 2 attempts)
     })
-})
 
+    it('should not retry when shouldRetry rejects the error', async () => {
+        const mockFn = vi.fn().mockRejectedValue(new Error('pdf invalido'))
+
+        await expect(withRetry(mockFn, { maxRetries: 3, initialDelay: 10, shouldRetry: () => false }))
+            .rejects.toThrow('pdf invalido')
+
+        expect(mockFn).toHaveBeenCalledTimes(1)
+    })
+})
@@ -6,6 +6,8 @@ export interface RetryOptions {
     maxDelay?: number;
     backoffMultiplier?: number;
     onRetry?: (attempt: number, error: Error) => void;
+    // Erros para os quais a nova tentativa não adianta (ex.: falha determinística do PDF) retornam false
+    shouldRetry?: (error: Error) => boolean;
 }
 
 /**
@@ -20,7 +22,8 @@ export async function withRetry<T>(
         initialDelay = 1000,
         maxDelay = 10000,
         backoffMultiplier = 2,
-        onRetry
+        onRetry,
+        shouldRetry
     } = options;
 
     let lastError: Error;
@@ -31,6 +34,14 @@ export async function withRetry<T>(
         } catch (error) {
             lastError = error as Error;
 
+            if (shouldRetry && !shouldRetry(lastError)) {
+                logger.warn('Error is not retryable', {
+                    attempt,
+                    error: lastError.message
+                });
+                throw lastError;
+            }
+
             if (attempt === maxRetries) {
                 logger.error('Max retries reached', {
                     attempts: maxRetries,
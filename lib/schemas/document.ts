@@ -79,7 +79,9 @@ export const fullDocumentSchema = z.object({
     metadados_extracao: z.object({
         nome_arquivo_original: z.string(),
         data_extracao: z.string(),
-        metodo_extracao: z.string().optional()
+        metodo_extracao: z.string().optional(),
+        paginas_sem_tabelas_por_tempo: z.array(z.number()).optional(),
+        extracao_parcial: z.boolean().optional()
     }),
     situacoes_problema_gerais: z.array(z.string()),
     acoes_projetos: z.array(acaoProjetoSchema),
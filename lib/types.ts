@@ -11,6 +11,9 @@ export interface CollectionData {
   metadados_extracao: {
     nome_arquivo_original: string;
     data_extracao: string;
+    // Páginas cuja detecção de tabelas passou do tempo; com elas, a extração é parcial
+    paginas_sem_tabelas_por_tempo?: number[];
+    extracao_parcial?: boolean;
   };
   situacoes_problema_gerais: string[];
   acoes_projetos: AcaoProjeto[];
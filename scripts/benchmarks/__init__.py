@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks do pipeline de processamento de PDF (extração, normalização e envio)."""
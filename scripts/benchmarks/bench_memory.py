@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de memória do pipeline: extração em lista vs. streaming.
+
+A partir de um PDF de exemplo, monta PDFs temporários com quantidades
+crescentes de páginas (repetindo as páginas do original com o pypdfium2, que
+já vem com o pdfplumber) e mede o pico de RSS de extração + normalização em
+cada modo. Cada medição roda em um subprocesso novo, para que o pico de uma
+execução não contamine a seguinte.
+
+- lista: `extract_pdf_data` (sem cache, serial) seguido de `normalize_data`
+- streaming: `stream_extract_and_normalize` (páginas descartadas uma a uma)
+
+Uso:
+    python3 scripts/benchmarks/bench_memory.py <caminho_pdf> [--pages 50 200 800]
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Adiciona a pasta scripts/ ao path do Python para importar os módulos do pipeline
+sys.path.insert(0, SCRIPTS_DIR)
+
+from process_pdf import extract_pdf_data, stream_extract_and_normalize
+from normalization import normalize_data
+
+MODES = ("lista", "streaming")
+
+
+def peak_rss_mb():
+    """Pico de RSS do processo atual em MB (ru_maxrss é em KB no Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def build_pdf(source_path, total_pages, output_path):
+    """Grava em `output_path` um PDF com `total_pages` páginas repetindo as do original."""
+    import pypdfium2 as pdfium
+
+    source = pdfium.PdfDocument(source_path)
+    output = pdfium.PdfDocument.new()
+    source_pages = len(source)
+    while len(output) < total_pages:
+        count = min(source_pages, total_pages - len(output))
+        output.import_pages(source, list(range(count)))
+    output.save(output_path)
+    output.close()
+    source.close()
+
+
+def measure(mode, pdf_path):
+    """Executado no subprocesso: roda um modo e devolve pico de RSS e tempo."""
+    base = peak_rss_mb()
+    start = time.perf_counter()
+    stats = {}
+    if mode == "lista":
+        extracted_data = extract_pdf_data(pdf_path, workers=1, cache=None, stats=stats)
+        normalized_data = normalize_data(extracted_data, pdf_path, "Benchmark", 2025)
+    else:
+        normalized_data = stream_extract_and_normalize(pdf_path, "Benchmark", 2025, stats=stats)
+    elapsed = time.perf_counter() - start
+    return {
+        "modo": mode,
+        "paginas": stats.get("paginas", 0),
+        "projetos": len(normalized_data["acoes_projetos"]) if normalized_data else None,
+        "tempo_s": round(elapsed, 3),
+        "rss_base_mb": round(base, 1),
+        "rss_pico_mb": round(peak_rss_mb(), 1),
+        "rss_pipeline_mb": round(peak_rss_mb() - base, 1),
+    }
+
+
+def run_benchmark(pdf_path, page_counts, modes=MODES):
+    """Mede cada modo para cada quantidade de páginas e retorna o relatório."""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for total_pages in page_counts:
+            sample = os.path.join(tmp_dir, f"amostra_{total_pages}.pdf")
+            build_pdf(pdf_path, total_pages, sample)
+            for mode in modes:
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--child", mode, sample],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                results.append(json.loads(output))
+
+    return {"arquivo": os.path.basename(pdf_path), "resultados": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de memória: extração em lista vs. streaming.")
+    parser.add_argument("pdf_path", help="PDF usado como base para os arquivos do benchmark.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[50, 200, 800],
+                        help="Quantidades de páginas testadas (padrão: 50 200 800).")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES), help="Modos medidos.")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Os logs por página distorcem a medição
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.pdf_path)))
+        return
+
+    print(json.dumps(run_benchmark(args.pdf_path, args.pages, args.modes), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
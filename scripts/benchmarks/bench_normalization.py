@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark da normalização indexada em um documento sintético grande.
+
+Compara a extração de projetos por índice (`normalization.extract_project_data`)
+com a implementação anterior, que varria cada tabela uma vez por campo
+(`legacy_extract_project_data`, mantida aqui como referência), e confere que
+os resultados são idênticos.
+
+Uso:
+    python3 scripts/benchmarks/bench_normalization.py [--projects 1000] [--repeat 5]
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+# Adiciona a pasta scripts/ ao path do Python para importar os módulos do pipeline
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from normalization import (
+    extract_project_data, normalize_data, get_value_from_table, get_multiline_value,
+    parse_currency, parse_workload,
+)
+from benchmarks.synthetic_data import make_extracted_document
+
+
+def legacy_extract_project_data(pages):
+    """Implementação anterior: várias passadas por tabela (uma por campo)."""
+    projetos = []
+    for page in pages:
+        for table in page.get('tabelas', []):
+            if table and table[0] and "AÇÃO/PROJETO (Tema)" in str(table[0]):
+                try:
+                    title_cell = " ".join(filter(None, table[0]))
+                    codigo_match = re.search(r'(\d+)', title_cell)
+                    codigo_acao = codigo_match.group(1) if codigo_match else ""
+                    titulo = re.sub(r'^AÇÃO/PROJETO \(Tema\)\s*' + re.escape(codigo_acao), '', title_cell, 1).strip()
+
+                    equipe = []
+                    is_capturing_team = False
+                    for row in table:
+                        if not row or not row[0]: continue
+                        label = row[0].strip()
+                        if label.startswith("Responsável:"):
+                            is_capturing_team = True
+                        if is_capturing_team:
+                            if label.startswith(("Responsável:", "Colaborador(a):")):
+                                nome = row[1].replace("<nome>", "").strip() if len(row) > 1 and row[1] else ""
+                                carga_horaria = parse_workload(row[6]) if len(row) > 6 else 0
+                                tipo_hora = row[8] if len(row) > 8 else ""
+                                if nome and nome.lower() != 'nn':
+                                    equipe.append({
+                                        "funcao": "Responsável" if label.startswith("Responsável") else "Colaborador",
+                                        "nome": nome,
+                                        "carga_horaria_semanal": carga_horaria,
+                                        "tipo_hora": tipo_hora.strip()
+                                    })
+                        if label.startswith("Período de execução:"):
+                            is_capturing_team = False
+
+                    periodo_execucao = {}
+                    for row in table:
+                        if row and row[0] and "Período de execução:" in row[0]:
+                            datas = re.findall(r'\d{2}/\d{2}/\d{4}', " ".join(filter(None, row)))
+                            if len(datas) >= 2:
+                                periodo_execucao = {"data_inicial": datas[0], "data_final": datas[1]}
+                            break
+
+                    projetos.append({
+                        "codigo_acao": codigo_acao,
+                        "titulo": titulo,
+                        "origem_prioridade": get_value_from_table(table, "Origem (prioridade):"),
+                        "o_que_sera_feito": get_multiline_value(table, "O que será feito:", "Por que será feito:"),
+                        "por_que_sera_feito": get_multiline_value(table, "Por que será feito:", "Responsável:"),
+                        "custo_estimado": parse_currency(get_value_from_table(table, "Custo R$ (se houver):")),
+                        "fonte_recursos": get_value_from_table(table, "Fonte(s) dos recursos:"),
+                        "periodo_execucao": periodo_execucao,
+                        "equipe": equipe,
+                        "etapas_processo": [],
+                    })
+                except Exception as e:
+                    logging.warning(f"Falha ao extrair um projeto da tabela: {e}")
+                    continue
+    return projetos
+
+
+def _best_time(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run_benchmark(n_projects, repeat, team_size=6, text_lines=6):
+    pages = make_extracted_document(n_projects=n_projects, acquisitions=n_projects,
+                                    team_size=team_size, text_lines=text_lines)
+    legacy_time, legacy = _best_time(lambda: legacy_extract_project_data(pages), repeat)
+    indexed_time, indexed = _best_time(lambda: extract_project_data(pages), repeat)
+    normalize_time, normalized = _best_time(lambda: normalize_data(pages, "sintetico.pdf", "Fatec Sorocaba", 2025), repeat)
+    return {
+        "projetos": n_projects,
+        "linhas_por_tabela": len(pages[1]["tabelas"][0]),
+        "paginas": len(pages),
+        "projetos_legado_s": round(legacy_time, 4),
+        "projetos_indexado_s": round(indexed_time, 4),
+        "aceleracao": round(legacy_time / indexed_time, 2) if indexed_time else None,
+        "normalize_data_s": round(normalize_time, 4),
+        "resultados_identicos": legacy == indexed and len(normalized["acoes_projetos"]) == n_projects,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark da normalização indexada.")
+    parser.add_argument("--projects", type=int, default=1000, help="Quantidade de projetos no documento sintético.")
+    parser.add_argument("--team-size", type=int, default=6, help="Membros de equipe por projeto.")
+    parser.add_argument("--text-lines", type=int, default=6, help="Linhas extras em cada texto multilinha.")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetições (usa o melhor tempo).")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+    report = run_benchmark(args.projects, args.repeat, args.team_size, args.text_lines)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if not report["resultados_identicos"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
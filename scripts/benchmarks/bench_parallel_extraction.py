@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark da extração paralela de páginas (`extract_pdf_data(workers=N)`).
+
+Mede páginas/segundo para 1..N processos e confere que o resultado de cada
+execução é idêntico, byte a byte, ao da extração serial.
+
+Uso:
+    python3 scripts/benchmarks/bench_parallel_extraction.py <caminho_pdf> [--max-workers 8] [--repeat 3]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+# Adiciona a pasta scripts/ ao path do Python para importar os módulos do pipeline
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from process_pdf import extract_pdf_data
+
+
+def run_benchmark(pdf_path, max_workers, repeat):
+    """Executa a extração para cada quantidade de processos e retorna o relatório."""
+    reference = json.dumps(extract_pdf_data(pdf_path, workers=1), ensure_ascii=False)
+    total_pages = len(json.loads(reference))
+
+    results = []
+    for workers in range(1, max_workers + 1):
+        timings = []
+        identical = True
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = extract_pdf_data(pdf_path, workers=workers)
+            timings.append(time.perf_counter() - start)
+            identical = identical and json.dumps(data, ensure_ascii=False) == reference
+        best = min(timings)
+        results.append({
+            "workers": workers,
+            "melhor_tempo_s": round(best, 4),
+            "paginas_por_segundo": round(total_pages / best, 2) if best else None,
+            "identico_ao_serial": identical,
+        })
+
+    return {"arquivo": os.path.basename(pdf_path), "paginas": total_pages, "resultados": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da extração paralela de páginas.")
+    parser.add_argument("pdf_path", help="PDF usado no benchmark.")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1,
+                        help="Maior quantidade de processos testada (padrão: número de CPUs).")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetições por configuração (usa o melhor tempo).")
+    args = parser.parse_args()
+
+    # Os logs por página distorcem a medição
+    logging.getLogger().setLevel(logging.WARNING)
+
+    report = run_benchmark(args.pdf_path, args.max_workers, args.repeat)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if not all(r["identico_ao_serial"] for r in report["resultados"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark do pipeline completo em PGAs sintéticos de tamanho crescente.
+
+Para cada quantidade de projetos, gera um PDF no formato de um PGA (ver
+synthetic_pdf.py: tabelas AÇÃO/PROJETO (Tema), equipe e Anexo 1, sem acesso à
+rede) e mede separadamente, em um subprocesso novo:
+
+- extracao: `extract_pdf_data` (serial, sem cache)
+- normalizacao: `normalize_data`
+- escrita: `upsert_documents` em um MongoDB local, no banco descartável
+  `pga_benchmark` (apagado antes de cada repetição); sem MongoDB acessível,
+  ou com `--memory`, mede só o trabalho do lado do cliente (hash do PDF,
+  `update_fields`, linhas das coleções derivadas, totais do dashboard e
+  codificação BSON), sem rede nem servidor
+
+O relatório JSON traz, por tamanho, o melhor tempo de cada etapa, vazão
+(páginas/s, projetos/s, MB/s), pico de RSS e se a normalização encontrou
+todos os projetos e aquisições; em `escala`, os pontos (projetos, tempo) de
+cada etapa e o expoente do ajuste log-log (≈1 é linear). Com `--baseline`,
+compara com um relatório anterior e termina com código 1 se alguma etapa
+ficou mais lenta que a tolerância.
+
+Uso:
+    python3 scripts/benchmarks/bench_pipeline.py [--projects 10 50 200] [--team-size 4]
+        [--acquisitions-per-project 2] [--repeat 3] [--memory] [--output relatorio.json]
+        [--baseline relatorio_anterior.json --tolerance 0.25]
+    python3 scripts/benchmarks/bench_pipeline.py --generate ./pdfs --projects 50 500
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Adiciona a pasta scripts/ ao path do Python para importar os módulos do pipeline
+sys.path.insert(0, SCRIPTS_DIR)
+
+import bson
+from pymongo import MongoClient
+
+from process_pdf import extract_pdf_data
+from normalization import normalize_data
+from send_to_mongo import update_fields, upsert_documents
+from extraction_cache import file_sha256
+from child_collections import flatten_document
+from dashboard_aggregates import compute_aggregate
+from benchmarks.synthetic_pdf import write_pga_pdf
+
+STAGES = ("extracao", "normalizacao", "escrita")
+BENCH_DATABASE = "pga_benchmark"
+INSTITUTION = "Fatec Sorocaba"
+YEAR = 2025
+# Diferenças menores que isto são ruído de medição, não regressão
+MIN_REGRESSION_S = 0.005
+
+
+def peak_rss_mb():
+    """Pico de RSS do processo atual em MB (ru_maxrss é em KB no Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def mongo_available(mongo_uri):
+    """Indica se há um MongoDB respondendo em `mongo_uri` (espera no máximo 2 s)."""
+    if not mongo_uri:
+        return False
+    client = MongoClient(mongo_uri, serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command("ping")
+        return True
+    except Exception:
+        return False
+    finally:
+        client.close()
+
+
+def encode_write(normalized_data, pdf_path):
+    """
+    Trabalho do lado do cliente de um upsert, sem servidor: o que
+    `upsert_documents` calcula e codifica em BSON. Retorna os bytes gerados.
+    """
+    normalized_data["hash_conteudo"] = file_sha256(pdf_path)
+    fields, on_insert = update_fields(normalized_data)
+    total = len(bson.encode({"$set": fields, "$setOnInsert": on_insert}))
+    for rows in flatten_document("benchmark", normalized_data).values():
+        total += sum(len(bson.encode(row)) for row in rows)
+    return total + len(bson.encode(compute_aggregate(normalized_data)))
+
+
+def measure(pdf_path, repeat, mongo_uri):
+    """Executado no subprocesso: roda as três etapas `repeat` vezes e devolve o melhor tempo de cada uma."""
+    base = peak_rss_mb()
+    client = MongoClient(mongo_uri) if mongo_uri else None
+    timings = {stage: [] for stage in STAGES}
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            extracted_data = extract_pdf_data(pdf_path, workers=1, cache=None)
+            timings["extracao"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            normalized_data = normalize_data(extracted_data, pdf_path, INSTITUTION, YEAR)
+            timings["normalizacao"].append(time.perf_counter() - start)
+
+            if client is not None:
+                client.drop_database(BENCH_DATABASE)
+                start = time.perf_counter()
+                upsert_documents(client[BENCH_DATABASE].projetos, [(normalized_data, pdf_path)])
+                timings["escrita"].append(time.perf_counter() - start)
+            else:
+                start = time.perf_counter()
+                bytes_bson = encode_write(normalized_data, pdf_path)
+                timings["escrita"].append(time.perf_counter() - start)
+    finally:
+        if client is not None:
+            client.drop_database(BENCH_DATABASE)
+            client.close()
+
+    result = {
+        "paginas": len(extracted_data),
+        "projetos_normalizados": len(normalized_data["acoes_projetos"]),
+        "aquisicoes_normalizadas": len(normalized_data["anexo1_aquisicoes"]),
+        "tempos_s": {stage: round(min(values), 4) for stage, values in timings.items()},
+        "rss_base_mb": round(base, 1),
+        "rss_pico_mb": round(peak_rss_mb(), 1),
+    }
+    if client is None:
+        result["bytes_bson"] = bytes_bson
+    return result
+
+
+def scaling(results):
+    """Pontos (projetos, tempo) por etapa e o expoente do ajuste log-log por mínimos quadrados."""
+    curves = {}
+    for stage in STAGES + ("total",):
+        points = [(r["projetos"], r["tempos_s"][stage]) for r in results]
+        valid = [(math.log(x), math.log(y)) for x, y in points if x > 0 and y > 0]
+        exponent = None
+        if len(valid) >= 2:
+            mean_x = sum(x for x, _ in valid) / len(valid)
+            mean_y = sum(y for _, y in valid) / len(valid)
+            var_x = sum((x - mean_x) ** 2 for x, _ in valid)
+            if var_x:
+                exponent = round(sum((x - mean_x) * (y - mean_y) for x, y in valid) / var_x, 3)
+        curves[stage] = {"pontos": points, "expoente": exponent}
+    return curves
+
+
+def compare_with_baseline(report, baseline, tolerance):
+    """Etapas mais lentas que o relatório anterior (mesmo número de projetos) além da tolerância."""
+    previous = {r["projetos"]: r for r in baseline.get("resultados", [])}
+    regressions = []
+    for result in report["resultados"]:
+        old = previous.get(result["projetos"])
+        if not old:
+            continue
+        for stage in STAGES + ("total",):
+            before, after = old["tempos_s"].get(stage), result["tempos_s"][stage]
+            if before and after > before * (1 + tolerance) and after - before > MIN_REGRESSION_S:
+                regressions.append({"projetos": result["projetos"], "etapa": stage,
+                                    "antes_s": before, "depois_s": after,
+                                    "variacao": round(after / before - 1, 3)})
+    return regressions
+
+
+def document_params(n_projects, team_size, acquisitions_per_project):
+    return {"n_projects": n_projects, "team_size": team_size,
+            "acquisitions": n_projects * acquisitions_per_project}
+
+
+def run_benchmark(project_counts, team_size, acquisitions_per_project, repeat, mongo_uri):
+    """Gera e mede um PGA sintético para cada quantidade de projetos e retorna o relatório."""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_projects in project_counts:
+            params = document_params(n_projects, team_size, acquisitions_per_project)
+            pdf_path = os.path.join(tmp_dir, f"pga_{n_projects}.pdf")
+            write_pga_pdf(pdf_path, **params)
+            child = [sys.executable, os.path.abspath(__file__), "--child", pdf_path, "--repeat", str(repeat)]
+            child += ["--mongo-uri", mongo_uri] if mongo_uri else ["--memory"]
+            measured = json.loads(subprocess.run(child, check=True, capture_output=True, text=True).stdout)
+
+            size = os.path.getsize(pdf_path)
+            total = round(sum(measured["tempos_s"].values()), 4)
+            measured["tempos_s"]["total"] = total
+            results.append({
+                "projetos": n_projects,
+                "membros_equipe": n_projects * team_size,
+                "aquisicoes": params["acquisitions"],
+                "tamanho_pdf_bytes": size,
+                **measured,
+                "vazao": {
+                    "paginas_por_s": round(measured["paginas"] / total, 2) if total else None,
+                    "projetos_por_s": round(n_projects / total, 2) if total else None,
+                    "mb_por_s": round(size / 1024 / 1024 / total, 3) if total else None,
+                },
+                "confere": (measured["projetos_normalizados"] == n_projects
+                            and measured["aquisicoes_normalizadas"] == params["acquisitions"]),
+            })
+            logging.warning(f"{n_projects} projetos: {measured['paginas']} páginas em {total:.2f}s.")
+
+    return {
+        "gerado_em": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "destino_escrita": "mongodb" if mongo_uri else "memoria",
+        "parametros": {"team_size": team_size, "acquisitions_per_project": acquisitions_per_project,
+                       "repeat": repeat},
+        "resultados": results,
+        "escala": scaling(results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline em PGAs sintéticos de tamanho crescente.")
+    parser.add_argument("--projects", type=int, nargs="+", default=[10, 50, 200],
+                        help="Quantidades de tabelas AÇÃO/PROJETO testadas (padrão: 10 50 200).")
+    parser.add_argument("--team-size", type=int, default=4, help="Membros de equipe por projeto (padrão: 4).")
+    parser.add_argument("--acquisitions-per-project", type=int, default=2,
+                        help="Linhas do Anexo 1 por projeto (padrão: 2).")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetições por tamanho (usa o melhor tempo).")
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGODB_URI"),
+                        help="MongoDB usado na etapa de escrita (padrão: MONGODB_URI).")
+    parser.add_argument("--memory", action="store_true",
+                        help="Mede a escrita sem MongoDB (só o trabalho do lado do cliente).")
+    parser.add_argument("--output", help="Arquivo do relatório JSON (padrão: stdout).")
+    parser.add_argument("--baseline", help="Relatório anterior para detectar regressões.")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Aumento de tempo tolerado em relação ao --baseline (padrão: 0.25 = 25%%).")
+    parser.add_argument("--generate", metavar="PASTA", help="Só gera os PDFs sintéticos na pasta e termina.")
+    parser.add_argument("--child", metavar="PDF", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Os logs por página e por etapa distorcem a medição
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.repeat, None if args.memory else args.mongo_uri)))
+        return
+
+    if args.generate:
+        os.makedirs(args.generate, exist_ok=True)
+        for n_projects in args.projects:
+            pdf_path = os.path.join(args.generate, f"pga_sintetico_{n_projects}.pdf")
+            pages = write_pga_pdf(pdf_path, **document_params(n_projects, args.team_size,
+                                                              args.acquisitions_per_project))
+            print(f"{pdf_path}: {len(pages)} páginas, {os.path.getsize(pdf_path)} bytes")
+        return
+
+    mongo_uri = None
+    if not args.memory:
+        if mongo_available(args.mongo_uri):
+            mongo_uri = args.mongo_uri
+        else:
+            logging.warning("MongoDB indisponível; a escrita será medida em memória (sem servidor).")
+
+    report = run_benchmark(args.projects, args.team_size, args.acquisitions_per_project,
+                           max(1, args.repeat), mongo_uri)
+    failed = not all(r["confere"] for r in report["resultados"])
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["regressoes"] = compare_with_baseline(report, json.load(f), args.tolerance)
+        failed = failed or bool(report["regressoes"])
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
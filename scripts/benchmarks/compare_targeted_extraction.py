@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compara a extração completa com a extração direcionada (`targeted=True`).
+
+Para cada PDF, extrai nos dois modos, normaliza e confere que o resultado
+normalizado é idêntico (ignorando a data da extração). Informa o tempo de
+cada modo e quantas páginas tiveram a detecção de tabelas ignorada.
+
+Uso:
+    python3 scripts/benchmarks/compare_targeted_extraction.py <pdf> [<pdf> ...]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+# Adiciona a pasta scripts/ ao path do Python para importar os módulos do pipeline
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from process_pdf import extract_pdf_data
+from normalization import normalize_data
+
+
+def _normalized_json(pages, pdf_path):
+    normalized = normalize_data(pages, pdf_path, "Comparação", 2000)
+    normalized["metadados_extracao"].pop("data_extracao", None)
+    return json.dumps(normalized, ensure_ascii=False, sort_keys=True)
+
+
+def compare(pdf_path):
+    """Extrai o PDF nos dois modos e retorna o relatório da comparação."""
+    start = time.perf_counter()
+    full = extract_pdf_data(pdf_path, targeted=False)
+    full_time = time.perf_counter() - start
+
+    stats = {}
+    start = time.perf_counter()
+    targeted = extract_pdf_data(pdf_path, targeted=True, stats=stats)
+    targeted_time = time.perf_counter() - start
+
+    return {
+        "arquivo": os.path.basename(pdf_path),
+        "paginas": stats["paginas"],
+        "paginas_tabelas_ignoradas": stats["paginas_tabelas_ignoradas"],
+        "tempo_completo_s": round(full_time, 4),
+        "tempo_direcionado_s": round(targeted_time, 4),
+        "normalizado_identico": _normalized_json(full, pdf_path) == _normalized_json(targeted, pdf_path),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara a extração completa com a direcionada.")
+    parser.add_argument("pdf_paths", nargs="+", help="PDFs do corpus a comparar.")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+
+    reports = [compare(path) for path in args.pdf_paths]
+    print(json.dumps(reports, ensure_ascii=False, indent=2))
+    if not all(r["normalizado_identico"] for r in reports):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Gerador de dados extraídos sintéticos no formato de `extract_pdf_data`.
+
+As tabelas imitam o layout que o pdfplumber devolve para um PGA: tabela de
+identificação e de análise do cenário na primeira página, uma tabela
+`AÇÃO/PROJETO (Tema)` de 9 colunas por projeto e as páginas do Anexo 1.
+Tudo é determinístico a partir dos parâmetros, sem acesso à rede.
+"""
+
+NUM_COLUMNS = 9
+FIRST_NAMES = ["Ana", "Bruno", "Carla", "Diego", "Elaine", "Fábio", "Gisele", "Hélio", "Íris", "João"]
+LAST_NAMES = ["Silva", "Souza", "Oliveira", "Pereira", "Gonçalves", "Araújo", "Conceição", "Lima"]
+
+
+def _row(*cells):
+    """Completa a linha com None até o número de colunas da tabela de projeto."""
+    cells = list(cells)
+    return cells + [None] * (NUM_COLUMNS - len(cells))
+
+
+def person_name(n):
+    return f"{FIRST_NAMES[n % len(FIRST_NAMES)]} {LAST_NAMES[(n // len(FIRST_NAMES)) % len(LAST_NAMES)]}"
+
+
+def make_project_table(n, team_size=3, text_lines=2):
+    """Tabela de um projeto com título, textos multilinha, equipe, período, custo e fonte."""
+    codigo = f"{n + 1:02d}"
+    table = [
+        _row(f"AÇÃO/PROJETO (Tema) {codigo} Projeto sintético número {n + 1}"),
+        _row("Origem (prioridade):", f"Prioridade {n % 5 + 1}"),
+        _row("O que será feito:", f"Ação {n + 1}: implantação da melhoria planejada."),
+    ]
+    table += [_row("", f"Detalhamento {k + 1} do que será feito no projeto {n + 1}.") for k in range(text_lines)]
+    table.append(_row("Por que será feito:", f"Justificativa do projeto {n + 1}."))
+    table += [_row("", f"Motivação adicional {k + 1}.") for k in range(text_lines)]
+    for k in range(team_size):
+        label = "Responsável:" if k == 0 else "Colaborador(a):"
+        table.append(_row(label, f"<nome> {person_name(n + k)}", None, None, None, None,
+                          f"{(n + k) % 10 + 2:02d}", None, "HAE" if k % 2 else "hora/aula"))
+    table.append(_row("Período de execução:", f"01/02/2025 a {n % 28 + 1:02d}/11/2025"))
+    table.append(_row("Custo R$ (se houver):", f"R$ {n + 1}.{n % 1000:03d},{n % 100:02d}"))
+    table.append(_row("Fonte(s) dos recursos:", "Orçamento da unidade"))
+    return table
+
+
+def make_acquisition_table(start_item, rows, n_projects):
+    table = [["Item", "Projeto", "Denominação", "Quantidade", "Preço total estimado"]]
+    for k in range(rows):
+        item = start_item + k
+        table.append([str(item), f"{item % max(n_projects, 1) + 1:02d}", f"Equipamento {item}",
+                      str(item % 7 + 1), f"R$ {item * 10},00"])
+    return table
+
+
+def make_extracted_document(n_projects=10, projects_per_page=2, team_size=3, acquisitions=20,
+                            acquisitions_per_page=25, institution="Fatec Sorocaba", text_lines=2):
+    """Lista de páginas no formato de `extract_pdf_data` com o tamanho pedido."""
+    first_page = {
+        "numero_pagina": 1,
+        "texto": f"PLANO DE GESTÃO ANUAL\n{institution}\nIDENTIFICAÇÃO DA UNIDADE",
+        "tabelas": [
+            [["IDENTIFICAÇÃO DA UNIDADE", None], ["Unidade", f"123 {institution}"], ["Diretor(a)", "Diretora Sintética"]],
+            [["ANÁLISE DO CENÁRIO", None], ["", "Cenário sintético para benchmark."],
+             ["APONTAMENTO DE SITUAÇÕES-PROBLEMA", None]],
+            [["APONTAMENTO DE SITUAÇÕES-PROBLEMA", None], ["cat. 1", "cat. infraestrutura"]],
+        ],
+    }
+    pages = [first_page]
+    for start in range(0, n_projects, projects_per_page):
+        tables = [make_project_table(n, team_size, text_lines) for n in range(start, min(start + projects_per_page, n_projects))]
+        pages.append({"numero_pagina": len(pages) + 1, "texto": "AÇÃO/PROJETO (Tema)", "tabelas": tables})
+    for start in range(0, acquisitions, acquisitions_per_page):
+        rows = min(acquisitions_per_page, acquisitions - start)
+        pages.append({
+            "numero_pagina": len(pages) + 1,
+            "texto": "Anexo 1 – Lista de aquisições",
+            "tabelas": [make_acquisition_table(start + 1, rows, n_projects)],
+        })
+    return pages
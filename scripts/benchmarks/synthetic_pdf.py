@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Gerador de PDFs sintéticos no formato de um PGA, para os benchmarks.
+
+As páginas e tabelas vêm de `synthetic_data.make_extracted_document` e são
+desenhadas em um PDF de verdade: o texto da página no topo e cada tabela como
+uma grade de linhas, que é o que a detecção de tabelas do pdfplumber procura.
+Células None no fim de uma linha viram uma célula mesclada com a última
+preenchida (sem as linhas verticais entre elas), como nos PGAs reais; as do
+meio da linha (equipe) viram células vazias, para que todas as bordas de
+coluna existam. `normalize_data` dá o mesmo resultado para o PDF extraído e
+para as páginas de `synthetic_data`.
+
+O PDF é escrito diretamente (Helvetica com WinAnsiEncoding, sem dependências
+nem acesso à rede), e a altura de cada página cresce com o conteúdo.
+"""
+
+from benchmarks.synthetic_data import make_extracted_document
+
+PAGE_WIDTH = 842
+MARGIN = 36
+FONT_SIZE = 6
+ROW_HEIGHT = 10
+TABLE_GAP = 18
+TEXT_LEADING = 9
+# Largura da primeira coluna (rótulos); as demais dividem o restante
+LABEL_WIDTH = 120
+
+
+def _pdf_string(text):
+    """Texto como string literal do PDF em WinAnsiEncoding (cp1252)."""
+    raw = text.encode("cp1252", errors="replace")
+    return b"(" + raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def _column_edges(num_columns):
+    """Posições x das bordas das colunas de uma tabela com `num_columns` colunas."""
+    if num_columns == 1:
+        return [MARGIN, PAGE_WIDTH - MARGIN]
+    width = (PAGE_WIDTH - 2 * MARGIN - LABEL_WIDTH) / (num_columns - 1)
+    return [MARGIN] + [MARGIN + LABEL_WIDTH + width * k for k in range(num_columns)]
+
+
+def _row_spans(row):
+    """Agrupa as células da linha em (coluna inicial, coluna final exclusiva, texto)."""
+    filled = [index for index, cell in enumerate(row) if cell is not None]
+    last = filled[-1] if filled else 0
+    spans = [(index, index + 1, row[index] or "") for index in range(last)]
+    spans.append((last, len(row), row[last] or ""))
+    return spans
+
+
+def _text_op(x, y, text):
+    return b"BT /F1 %d Tf %.2f %.2f Td " % (FONT_SIZE, x, y) + _pdf_string(text) + b" Tj ET\n"
+
+
+def _table_ops(table, top):
+    """Operadores que desenham a tabela a partir de `top` (y do topo); retorna (bytes, altura)."""
+    num_columns = max(len(row) for row in table)
+    edges = _column_edges(num_columns)
+    left, right = edges[0], edges[-1]
+    ops = [b"0.5 w\n"]
+    y = top
+    ops.append(b"%.2f %.2f m %.2f %.2f l S\n" % (left, y, right, y))
+    for row in table:
+        row = list(row) + [None] * (num_columns - len(row))
+        bottom = y - ROW_HEIGHT
+        ops.append(b"%.2f %.2f m %.2f %.2f l S\n" % (left, bottom, right, bottom))
+        for start, _, text in _row_spans(row):
+            ops.append(b"%.2f %.2f m %.2f %.2f l S\n" % (edges[start], y, edges[start], bottom))
+            if text:
+                ops.append(_text_op(edges[start] + 2, bottom + 2.5, text))
+        ops.append(b"%.2f %.2f m %.2f %.2f l S\n" % (right, y, right, bottom))
+        y = bottom
+    return b"".join(ops), top - y
+
+
+def _page_content(page):
+    """Content stream e altura de uma página extraída sintética."""
+    lines = (page.get("texto") or "").split("\n")
+    height = 2 * MARGIN + len(lines) * TEXT_LEADING
+    height += sum(len(table) * ROW_HEIGHT + TABLE_GAP for table in page.get("tabelas", []))
+
+    ops = []
+    y = height - MARGIN
+    for line in lines:
+        y -= TEXT_LEADING
+        ops.append(_text_op(MARGIN, y, line))
+    y -= TABLE_GAP / 2
+    for table in page.get("tabelas", []):
+        table_ops, table_height = _table_ops(table, y)
+        ops.append(table_ops)
+        y -= table_height + TABLE_GAP
+    return b"".join(ops), height
+
+
+def write_pdf(pages, output_path):
+    """Grava as páginas (formato de `extract_pdf_data`) como um PDF com texto e tabelas desenhadas."""
+    # Objetos 1 (catálogo), 2 (árvore de páginas) e 3 (fonte); depois conteúdo + página para cada página
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for page in pages:
+        content, height = _page_content(page)
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R >> >> "
+            b"/Contents %d 0 R >>" % (PAGE_WIDTH, int(height) + 1, len(objects))
+        )
+        kids.append(len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids)
+    )
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(output_path, "wb") as f:
+        f.write(output)
+    return len(output)
+
+
+def write_pga_pdf(output_path, n_projects=10, team_size=3, acquisitions=20, projects_per_page=2,
+                  acquisitions_per_page=25, institution="Fatec Sorocaba", text_lines=2):
+    """
+    Gera um PGA sintético com `n_projects` tabelas AÇÃO/PROJETO (Tema) de
+    `team_size` membros cada e `acquisitions` linhas no Anexo 1. Retorna a
+    lista de páginas desenhada, referência para conferir a normalização.
+    """
+    pages = make_extracted_document(n_projects=n_projects, projects_per_page=projects_per_page,
+                                    team_size=team_size, acquisitions=acquisitions,
+                                    acquisitions_per_page=acquisitions_per_page, institution=institution,
+                                    text_lines=text_lines)
+    write_pdf(pages, output_path)
+    return pages
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Coleções derivadas de `projetos` para as consultas do dashboard.
+
+Cada documento de `projetos` guarda os projetos em `acoes_projetos[]` (com a
+equipe aninhada em `equipe[]`) e as compras em `anexo1_aquisicoes[]`. Para que
+as visões por projeto e por membro de equipe sejam consultas indexadas, o
+writer do pipeline também grava uma linha por item nas coleções:
+
+- `acoes`: um documento por ação/projeto (sem a equipe)
+- `equipe_membros`: um documento por membro de equipe de cada ação
+- `aquisicoes`: um documento por item do Anexo 1
+- `busca`: os textos de cada projeto e do documento, com os termos analisados
+  para a busca textual (ver search_index.py)
+- `assinaturas_projetos`: a assinatura MinHash e as bandas LSH de cada
+  projeto, para encontrar projetos recorrentes (ver recurring_projects.py)
+
+As linhas de `equipe_membros` também têm o `nome_normalizado`, e a
+sincronização atualiza as identidades afetadas da coleção `pessoas` (ver
+team_identities.py).
+
+Todas as linhas carregam `projeto_id` (o `_id` do documento de origem),
+`instituicao_codigo`, `instituicao_nome` e `ano_referencia`, com índices
+compostos instituição/ano/código. A sincronização de um documento apaga as
+linhas antigas dele e insere as novas.
+
+Uso:
+    python3 scripts/child_collections.py rebuild [--batch-size 100]
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+from pymongo import ASCENDING
+
+# Adiciona o diretório do script ao path do Python para importar módulos locais
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from recurring_projects import SIGNATURES, signature_rows
+from search_index import SEARCH_COLLECTION, ensure_text_index, index_rows
+from team_identities import PESSOAS, normalize_name, rebuild as rebuild_identities, refresh_identities
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+ACOES = 'acoes'
+EQUIPE_MEMBROS = 'equipe_membros'
+AQUISICOES = 'aquisicoes'
+BUSCA = SEARCH_COLLECTION
+ASSINATURAS = SIGNATURES
+CHILD_COLLECTIONS = (ACOES, EQUIPE_MEMBROS, AQUISICOES, BUSCA, ASSINATURAS)
+
+# Índices compostos por coleção: (nome, campos)
+CHILD_INDEXES = {
+    ACOES: [
+        ('instituicao_ano_codigo', ['instituicao_codigo', 'ano_referencia', 'codigo_acao']),
+        ('projeto_id', ['projeto_id']),
+    ],
+    EQUIPE_MEMBROS: [
+        ('instituicao_ano_codigo', ['instituicao_codigo', 'ano_referencia', 'codigo_acao']),
+        ('projeto_id', ['projeto_id']),
+    ],
+    AQUISICOES: [
+        ('instituicao_ano_codigo', ['instituicao_codigo', 'ano_referencia', 'projeto_referencia']),
+        ('projeto_id', ['projeto_id']),
+    ],
+    BUSCA: [
+        ('instituicao_ano', ['instituicao_codigo', 'ano_referencia']),
+        ('projeto_id', ['projeto_id']),
+    ],
+    ASSINATURAS: [
+        ('projeto_id_codigo', ['projeto_id', 'codigo_acao']),
+        ('bandas', ['bandas']),
+    ],
+}
+
+# Campos do documento de origem lidos pela sincronização e pelo rebuild
+SOURCE_PROJECTION = {
+    'ano_referencia': 1,
+    'instituicao_nome': 1,
+    'identificacao_unidade.codigo': 1,
+    'identificacao_unidade.nome': 1,
+    'analise_cenario': 1,
+    'situacoes_problema_gerais': 1,
+    'acoes_projetos': 1,
+    'anexo1_aquisicoes': 1,
+}
+
+# Bancos cujos índices já foram garantidos neste processo
+_indexed_databases = set()
+
+
+def ensure_child_indexes(db):
+    """Cria os índices das coleções derivadas, uma vez por processo e banco."""
+    if db.name in _indexed_databases:
+        return
+    for collection_name, indexes in CHILD_INDEXES.items():
+        for name, fields in indexes:
+            db[collection_name].create_index([(field, ASCENDING) for field in fields], name=name)
+    ensure_text_index(db[BUSCA])
+    _indexed_databases.add(db.name)
+
+
+def flatten_document(projeto_id, document):
+    """
+    Gera as linhas das coleções derivadas de um documento de `projetos`.
+    Retorna um dict {nome da coleção: lista de documentos}.
+    """
+    unidade = document.get('identificacao_unidade') or {}
+    parent = {
+        'projeto_id': projeto_id,
+        'instituicao_codigo': unidade.get('codigo', ''),
+        'instituicao_nome': unidade.get('nome') or document.get('instituicao_nome', ''),
+        'ano_referencia': document.get('ano_referencia'),
+    }
+
+    acoes = []
+    membros = []
+    for posicao, acao in enumerate(document.get('acoes_projetos') or []):
+        equipe = acao.get('equipe') or []
+        linha = dict(parent)
+        linha.update({key: value for key, value in acao.items() if key != 'equipe'})
+        linha['posicao'] = posicao
+        linha['membros_equipe'] = len(equipe)
+        # Documentos editados à mão podem ter a carga horária como texto
+        linha['carga_horaria_semanal_total'] = sum(
+            membro.get('carga_horaria_semanal') for membro in equipe
+            if isinstance(membro.get('carga_horaria_semanal'), (int, float))
+        )
+        acoes.append(linha)
+
+        for membro_posicao, membro in enumerate(equipe):
+            linha_membro = dict(parent, codigo_acao=acao.get('codigo_acao', ''), titulo_acao=acao.get('titulo', ''))
+            linha_membro.update(membro)
+            linha_membro['posicao'] = membro_posicao
+            linha_membro['nome_normalizado'] = normalize_name(membro.get('nome'))
+            membros.append(linha_membro)
+
+    aquisicoes = []
+    for posicao, aquisicao in enumerate(document.get('anexo1_aquisicoes') or []):
+        linha = dict(parent)
+        linha.update(aquisicao)
+        linha['posicao'] = posicao
+        aquisicoes.append(linha)
+    return {ACOES: acoes, EQUIPE_MEMBROS: membros, AQUISICOES: aquisicoes, BUSCA: index_rows(parent, document),
+            ASSINATURAS: signature_rows(parent, document)}
+
+
+def sync_documents(db, documents, identities=True):
+    """
+    Substitui as linhas derivadas dos documentos informados, como tuplas
+    (projeto_id, documento). São dois round-trips por coleção para o lote
+    inteiro: um delete_many pelos `projeto_id` e um insert_many. Com
+    `identities`, as identidades de `pessoas` dos nomes que saíram ou entraram
+    são recalculadas.
+    """
+    if not documents:
+        return {name: 0 for name in CHILD_COLLECTIONS}
+    ensure_child_indexes(db)
+    rows = {name: [] for name in CHILD_COLLECTIONS}
+    for projeto_id, document in documents:
+        for name, linhas in flatten_document(projeto_id, document).items():
+            rows[name].extend(linhas)
+
+    ids = [projeto_id for projeto_id, _ in documents]
+    names = set()
+    if identities:
+        names.update(db[EQUIPE_MEMBROS].distinct('nome_normalizado', {'projeto_id': {'$in': ids}}))
+        names.update(linha['nome_normalizado'] for linha in rows[EQUIPE_MEMBROS])
+    for name in CHILD_COLLECTIONS:
+        db[name].delete_many({'projeto_id': {'$in': ids}})
+        if rows[name]:
+            db[name].insert_many(rows[name], ordered=False)
+    if names:
+        refresh_identities(db[EQUIPE_MEMBROS], db[PESSOAS], names)
+    return {name: len(linhas) for name, linhas in rows.items()}
+
+
+def delete_documents(db, projeto_ids):
+    """Remove as linhas derivadas dos documentos informados e atualiza as identidades dos seus membros."""
+    names = db[EQUIPE_MEMBROS].distinct('nome_normalizado', {'projeto_id': {'$in': list(projeto_ids)}})
+    for name in CHILD_COLLECTIONS:
+        db[name].delete_many({'projeto_id': {'$in': list(projeto_ids)}})
+    refresh_identities(db[EQUIPE_MEMBROS], db[PESSOAS], names)
+
+
+def rebuild(db, batch_size=100):
+    """
+    Reconstrói as coleções derivadas a partir de todos os documentos de
+    `projetos`, lidos em lotes com projeção, e remove as linhas de documentos
+    que não existem mais; no fim, refaz a coleção `pessoas`. Retorna o total
+    de linhas por coleção.
+    """
+    ensure_child_indexes(db)
+    totals = {name: 0 for name in CHILD_COLLECTIONS}
+    seen_ids = []
+    batch = []
+
+    def flush():
+        for name, count in sync_documents(db, batch, identities=False).items():
+            totals[name] += count
+        batch.clear()
+
+    for document in db.projetos.find({}, SOURCE_PROJECTION, batch_size=batch_size):
+        seen_ids.append(document['_id'])
+        batch.append((document['_id'], document))
+        if len(batch) >= batch_size:
+            flush()
+            logging.info(f'{len(seen_ids)} documentos sincronizados...')
+    flush()
+
+    for name in CHILD_COLLECTIONS:
+        removed = db[name].delete_many({'projeto_id': {'$nin': seen_ids}}).deleted_count
+        if removed:
+            logging.info(f"{removed} linhas órfãs removidas de '{name}'.")
+    rebuild_identities(db)
+    logging.info(f'Rebuild concluído: {len(seen_ids)} documentos de origem, {totals}.')
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mantém as coleções acoes, equipe_membros, aquisicoes, busca, assinaturas_projetos e pessoas.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    rebuild_parser = subparsers.add_parser('rebuild', help='Reconstrói as coleções a partir de projetos.')
+    rebuild_parser.add_argument('--batch-size', type=int, default=100, help='Documentos de projetos por lote.')
+    args = parser.parse_args()
+
+    # Importado aqui porque send_to_mongo também importa este módulo
+    from send_to_mongo import get_mongo_client
+
+    client = get_mongo_client()
+    try:
+        rebuild(client.get_database(), batch_size=max(1, args.batch_size))
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Totais do dashboard pré-calculados por instituição e ano (`dashboard_aggregates`).
+
+Para cada par (código da unidade, `ano_referencia`) é mantido um documento
+pequeno com os totais exibidos nos cards e gráficos: número de projetos, custo
+estimado, projetos com e sem orçamento, carga horária semanal (total e por tipo
+de hora), projetos por `origem_prioridade` e aquisições do Anexo 1. Como o
+dashboard, os totais usam o documento de `projetos` mais recente do par.
+
+Os writers (`send_to_mongo.py`, `manual_document_editor.save_document` e
+`fix_missing_names.py`) chamam `refresh` só para os pares afetados pela
+gravação; `rebuild` recalcula tudo em uma passada por `projetos`.
+
+Uso:
+    python3 scripts/dashboard_aggregates.py rebuild
+    python3 scripts/dashboard_aggregates.py show <codigo_unidade> <ano>
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING, ReplaceOne
+
+# Adiciona o diretório do script ao path do Python para importar módulos locais
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+AGGREGATES = 'dashboard_aggregates'
+
+# Campos de `projetos` usados no cálculo
+SOURCE_PROJECTION = {
+    'ano_referencia': 1,
+    'instituicao_nome': 1,
+    'identificacao_unidade.codigo': 1,
+    'identificacao_unidade.nome': 1,
+    'metadados_extracao.data_extracao': 1,
+    'acoes_projetos.custo_estimado': 1,
+    'acoes_projetos.fonte_recursos': 1,
+    'acoes_projetos.origem_prioridade': 1,
+    'acoes_projetos.equipe.carga_horaria_semanal': 1,
+    'acoes_projetos.equipe.tipo_hora': 1,
+    'anexo1_aquisicoes.preco_total_estimado': 1,
+}
+
+# Bancos cujo índice já foi garantido neste processo
+_indexed_databases = set()
+
+
+def ensure_aggregate_index(db):
+    """Cria o índice único instituição/ano da coleção, uma vez por processo e banco."""
+    if db.name in _indexed_databases:
+        return
+    db[AGGREGATES].create_index(
+        [('instituicao_codigo', ASCENDING), ('ano_referencia', ASCENDING)],
+        name='instituicao_ano', unique=True,
+    )
+    _indexed_databases.add(db.name)
+
+
+def aggregate_key(document):
+    """Par (código da unidade, ano) de um documento de `projetos`."""
+    return ((document.get('identificacao_unidade') or {}).get('codigo', ''), document.get('ano_referencia'))
+
+
+def parse_workload_value(value):
+    """Mesma regra de `parseWorkloadValue` (lib/dataService.ts) para números e textos."""
+    if isinstance(value, bool):
+        return 0
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        cleaned = re.sub(r'[^0-9.,]', '', value.strip().lower()).replace(',', '.', 1)
+        try:
+            return float(cleaned)
+        except ValueError:
+            return 0
+    return 0
+
+
+def _number(value):
+    """Valor numérico de um campo monetário; documentos editados à mão podem ter texto."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return None
+
+
+def compute_aggregate(document):
+    """Calcula o documento de totais a partir de um documento de `projetos`."""
+    codigo, ano = aggregate_key(document)
+    projetos = document.get('acoes_projetos') or []
+    aquisicoes = document.get('anexo1_aquisicoes') or []
+
+    custo_total = 0
+    com_orcamento = 0
+    sem_custo = 0
+    carga_total = 0
+    membros = 0
+    por_origem = {}
+    por_tipo_hora = {}
+    for projeto in projetos:
+        custo = _number(projeto.get('custo_estimado'))
+        custo_total += custo or 0
+        if custo is not None and custo > 0:
+            com_orcamento += 1
+        if not custo or 'não haverá custos' in (projeto.get('fonte_recursos') or '').lower():
+            sem_custo += 1
+
+        origem = projeto.get('origem_prioridade') or 'N/A'
+        por_origem[origem] = por_origem.get(origem, 0) + 1
+
+        for membro in projeto.get('equipe') or []:
+            horas = parse_workload_value(membro.get('carga_horaria_semanal'))
+            carga_total += horas
+            membros += 1
+            tipo = (membro.get('tipo_hora') or '').strip() or 'N/A'
+            por_tipo_hora[tipo] = por_tipo_hora.get(tipo, 0) + horas
+
+    unidade = document.get('identificacao_unidade') or {}
+    return {
+        '_id': f'{codigo}|{ano}',
+        'instituicao_codigo': codigo,
+        'instituicao_nome': unidade.get('nome') or document.get('instituicao_nome', ''),
+        'ano_referencia': ano,
+        'projeto_id': document.get('_id'),
+        'total_projetos': len(projetos),
+        'custo_estimado_total': custo_total,
+        'projetos_com_orcamento': com_orcamento,
+        'projetos_sem_custo': sem_custo,
+        'carga_horaria_semanal_total': carga_total,
+        'media_carga_por_projeto': round(carga_total / len(projetos), 1) if projetos else 0,
+        'membros_equipe': membros,
+        # Listas em vez de objetos: os valores viram chaves e podem conter "." ou "$"
+        'projetos_por_origem': [
+            {'origem_prioridade': origem, 'projetos': total}
+            for origem, total in sorted(por_origem.items(), key=lambda item: (-item[1], item[0]))
+        ],
+        'carga_horaria_por_tipo': [
+            {'tipo_hora': tipo, 'horas': horas}
+            for tipo, horas in sorted(por_tipo_hora.items(), key=lambda item: (-item[1], item[0]))
+        ],
+        'total_aquisicoes': len(aquisicoes),
+        'valor_aquisicoes_total': sum(_number(item.get('preco_total_estimado')) or 0 for item in aquisicoes),
+        'atualizado_em': datetime.now().isoformat(),
+    }
+
+
+def refresh(db, keys):
+    """
+    Recalcula os totais dos pares (código, ano) informados a partir do documento
+    mais recente de cada par; remove o total de pares sem documentos.
+    """
+    keys = {key for key in keys if key[1] is not None}
+    if not keys:
+        return
+    ensure_aggregate_index(db)
+    for codigo, ano in keys:
+        latest = db.projetos.find_one(
+            {'identificacao_unidade.codigo': codigo, 'ano_referencia': ano},
+            SOURCE_PROJECTION,
+            sort=[('metadados_extracao.data_extracao', DESCENDING)],
+        )
+        if latest is None:
+            db[AGGREGATES].delete_one({'_id': f'{codigo}|{ano}'})
+            logging.info(f"Totais do dashboard removidos para '{codigo}' ({ano}): nenhum documento restante.")
+            continue
+        db[AGGREGATES].replace_one({'_id': f'{codigo}|{ano}'}, compute_aggregate(latest), upsert=True)
+
+
+def rebuild(db, batch_size=500):
+    """Recalcula todos os totais em uma passada por `projetos` e remove os pares que não existem mais."""
+    ensure_aggregate_index(db)
+    latest = {}
+    for document in db.projetos.find({}, SOURCE_PROJECTION, batch_size=batch_size):
+        key = aggregate_key(document)
+        if key[1] is None:
+            continue
+        data = str((document.get('metadados_extracao') or {}).get('data_extracao') or '')
+        current = latest.get(key)
+        if current is None or data > current[0]:
+            latest[key] = (data, document)
+
+    operations = [
+        ReplaceOne({'_id': f'{codigo}|{ano}'}, compute_aggregate(document), upsert=True)
+        for (codigo, ano), (_, document) in latest.items()
+    ]
+    for start in range(0, len(operations), batch_size):
+        db[AGGREGATES].bulk_write(operations[start:start + batch_size], ordered=False)
+    removed = db[AGGREGATES].delete_many(
+        {'_id': {'$nin': [f'{codigo}|{ano}' for codigo, ano in latest]}}
+    ).deleted_count
+    logging.info(f'Rebuild concluído: {len(operations)} pares instituição/ano, {removed} removidos.')
+    return len(operations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mantém a coleção dashboard_aggregates.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('rebuild', help='Recalcula todos os totais a partir de projetos.')
+    show_parser = subparsers.add_parser('show', help='Mostra os totais de uma instituição em um ano.')
+    show_parser.add_argument('codigo', help='Código da unidade (identificacao_unidade.codigo).')
+    show_parser.add_argument('ano', type=int, help='Ano de referência.')
+    args = parser.parse_args()
+
+    # Importado aqui porque send_to_mongo também importa este módulo
+    from send_to_mongo import get_mongo_client
+
+    client = get_mongo_client()
+    try:
+        db = client.get_database()
+        if args.command == 'rebuild':
+            rebuild(db)
+        else:
+            doc = db[AGGREGATES].find_one({'_id': f'{args.codigo}|{args.ano}'})
+            if not doc:
+                logging.error(f"Nenhum total encontrado para '{args.codigo}' ({args.ano}).")
+                sys.exit(1)
+            print(json.dumps(doc, ensure_ascii=False, indent=2, default=str))
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache em disco da extração de PDFs (`dados_extraidos`), endereçado pelo conteúdo.
+
+A chave é o SHA-256 dos bytes do PDF combinado com a versão do pdfplumber e as
+configurações de extração, então um reenvio do mesmo arquivo (retentativas,
+correções, envios duplicados) pula o pdfplumber e vai direto para a normalização.
+O cache tem tamanho máximo com remoção LRU (pela data de último acesso de cada
+entrada) e contadores de acertos/falhas persistidos em `stats.json`.
+
+Na subpasta `paginas` fica o cache por página (`PageCache`), endereçado pela
+impressão digital de cada página (ver `process_pdf.page_fingerprint`): uma
+versão revisada de um PGA, com outro SHA-256, reaproveita a extração das
+páginas que não mudaram e só as páginas alteradas passam pelo pdfplumber. Ele
+tem o mesmo limite de tamanho, contado à parte.
+
+Configuração por variáveis de ambiente:
+    PGA_EXTRACTION_CACHE=0            desativa o cache no pipeline
+    PGA_EXTRACTION_CACHE_DIR=<pasta>  padrão: <raiz do projeto>/.cache/extraction
+    PGA_EXTRACTION_CACHE_MAX_MB=512   tamanho máximo em disco
+
+Uso:
+    python3 scripts/extraction_cache.py stats
+    python3 scripts/extraction_cache.py clear
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+
+import pdfplumber
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_DIR = os.path.join(ROOT, '.cache', 'extraction')
+ENTRY_SUFFIX = '.json.gz'
+STATS_FILE = 'stats.json'
+PAGES_DIR = 'paginas'
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Calcula o SHA-256 de um arquivo lendo em blocos."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """Cache LRU limitado por tamanho, com uma entrada gzip JSON por PDF extraído."""
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or os.getenv('PGA_EXTRACTION_CACHE_DIR') or DEFAULT_CACHE_DIR
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv('PGA_EXTRACTION_CACHE_MAX_MB', '512')) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(pdf_path, settings=None, pdf_sha256=None):
+        """Chave do cache: hash do PDF + versão do pdfplumber + configurações de extração."""
+        material = {
+            'pdf_sha256': pdf_sha256 or file_sha256(pdf_path),
+            'pdfplumber': pdfplumber.__version__,
+            'settings': settings or {},
+        }
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ENTRY_SUFFIX)
+
+    def _read_entry(self, key):
+        path = self._entry_path(key)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                value = json.load(f)
+            # Atualiza a data de acesso usada pela política LRU
+            os.utime(path, None)
+            return value
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Entrada de cache corrompida ({key[:12]}...), descartando: {e}")
+            self._remove(path)
+            return None
+
+    def _write_entry(self, key, value):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as f:
+                f.write(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+            os.replace(tmp_path, self._entry_path(key))
+        except Exception:
+            self._remove(tmp_path)
+            raise
+
+    def get(self, key):
+        """Retorna a lista de páginas armazenada para a chave, ou None em caso de falha."""
+        pages = self._read_entry(key)
+        if pages is None:
+            self.misses += 1
+            self._record('misses')
+        else:
+            self.hits += 1
+            self._record('hits')
+        return pages
+
+    def put(self, key, pages):
+        """Grava a extração de forma atômica e aplica o limite de tamanho."""
+        self._write_entry(key, pages)
+        self.evict()
+
+    def page_cache(self):
+        """Cache por página guardado na subpasta `paginas` deste cache."""
+        return PageCache(os.path.join(self.cache_dir, PAGES_DIR), self.max_bytes)
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(ENTRY_SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self):
+        """Remove as entradas menos usadas recentemente até caber em `max_bytes`."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            evicted += 1
+        if evicted:
+            logging.info(f"Cache de extração: {evicted} entradas removidas (LRU).")
+            self._record('evictions', evicted)
+        return evicted
+
+    def clear(self):
+        for _, _, path in self._entries():
+            self._remove(path)
+        self._remove(os.path.join(self.cache_dir, STATS_FILE))
+
+    def _read_stats(self):
+        try:
+            with open(os.path.join(self.cache_dir, STATS_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _record(self, counter, amount=1):
+        # Contadores acumulados entre execuções; melhor esforço, sem trava entre processos
+        stats = self._read_stats()
+        stats[counter] = stats.get(counter, 0) + amount
+        try:
+            with open(os.path.join(self.cache_dir, STATS_FILE), 'w', encoding='utf-8') as f:
+                json.dump(stats, f)
+        except OSError as e:
+            logging.warning(f"Não foi possível atualizar as estatísticas do cache: {e}")
+
+    def stats(self):
+        """Contadores da sessão e acumulados, número de entradas e tamanho ocupado."""
+        entries = self._entries()
+        totals = self._read_stats()
+        return {
+            'dir': self.cache_dir,
+            'entradas': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+            'sessao': {'hits': self.hits, 'misses': self.misses},
+            'total': {
+                'hits': totals.get('hits', 0),
+                'misses': totals.get('misses', 0),
+                'evictions': totals.get('evictions', 0),
+            },
+        }
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class PageCache(ExtractionCache):
+    """
+    Cache de páginas extraídas, uma entrada por impressão digital de página.
+    As consultas só são contadas em memória; `flush` grava as páginas novas, os
+    contadores e aplica o limite de tamanho de uma vez por documento.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        if cache_dir is None:
+            cache_dir = os.path.join(os.getenv('PGA_EXTRACTION_CACHE_DIR') or DEFAULT_CACHE_DIR, PAGES_DIR)
+        super().__init__(cache_dir, max_bytes)
+        self._pending = []
+        self._counted = (0, 0)
+
+    def get(self, key):
+        page = self._read_entry(key)
+        if page is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return page
+
+    def put(self, key, page):
+        self._pending.append((key, page))
+
+    def flush(self):
+        """Grava as páginas pendentes; retorna quantas foram gravadas."""
+        written = 0
+        for key, page in self._pending:
+            try:
+                self._write_entry(key, page)
+                written += 1
+            except OSError as e:
+                logging.warning(f"Não foi possível gravar a página no cache: {e}")
+                break
+        self._pending = []
+        hits, misses = self.hits - self._counted[0], self.misses - self._counted[1]
+        if hits:
+            self._record('hits', hits)
+        if misses:
+            self._record('misses', misses)
+        self._counted = (self.hits, self.misses)
+        if written:
+            self.evict()
+        return written
+
+
+def get_default_cache():
+    """Cache usado pelo pipeline, ou None se desativado por PGA_EXTRACTION_CACHE=0."""
+    if os.getenv('PGA_EXTRACTION_CACHE', '1').lower() in ('0', 'false', 'no'):
+        return None
+    try:
+        return ExtractionCache()
+    except OSError as e:
+        logging.warning(f"Cache de extração indisponível: {e}")
+        return None
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ('stats', 'clear'):
+        print("Uso: python extraction_cache.py stats|clear")
+        sys.exit(1)
+
+    cache = ExtractionCache()
+    pages = cache.page_cache()
+    if sys.argv[1] == 'clear':
+        cache.clear()
+        pages.clear()
+        print(f"Cache de extração limpo: {cache.cache_dir}")
+    else:
+        print(json.dumps(dict(cache.stats(), paginas=pages.stats()), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,20 +4,32 @@
 Script de manutenção: atualiza documentos na coleção `projetos` onde
 `identificacao_unidade.nome` está ausente ou vazio, usando `instituicao_nome`.
 
+É a migração `fix_missing_names` do executor em `migrations.py`: lê só os
+campos necessários em lotes, grava cada lote com um bulk_write, pode ser
+retomada de onde parou e ressincroniza as coleções derivadas e os totais do
+dashboard dos documentos alterados.
+
 Roda dentro do ambiente (container ou host) e usa MONGODB_URI do arquivo
 `.env.local` no diretório raiz do projeto. Se não encontrar, tenta uma URI
 padrão para `mongodb://mongodb:27017/db_pga`.
 
 Uso:
-    python3 scripts/fix_missing_names.py
+    python3 scripts/fix_missing_names.py [--dry-run] [--batch-size 500] [--partitions 4] [--restart]
 
 """
 
+import argparse
 import os
+import sys
 import logging
 from pymongo import MongoClient
 from dotenv import load_dotenv
 
+# Adiciona o diretório do script ao path do Python para importar módulos locais
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from migrations import Migration, add_run_arguments, run_from_args
+
 # Carregar .env.local do diretório raiz do projeto
 ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 ENV_PATH = os.path.join(ROOT, '.env.local')
@@ -37,12 +49,15 @@ def normalize_code(text: str) -> str:
     return s
 
 
-def main():
-    logging.info(f'Conectando ao MongoDB: {MONGODB_URI}')
-    client = MongoClient(MONGODB_URI)
-    db = client.get_database()
-    coll = db.projetos
+class FixMissingNames(Migration):
+    """
+    Preenche `identificacao_unidade` a partir de `instituicao_nome`. O update é
+    montado no cliente porque o `$toLower` do MongoDB só trata ASCII e não
+    reproduz `normalize_code`.
+    """
 
+    name = 'fix_missing_names'
+    description = 'Preenche identificacao_unidade (código e nome) a partir de instituicao_nome.'
     # Critérios: identificacao_unidade nao existente, ou nome vazio/nulo
     query = {
         '$or': [
@@ -51,35 +66,36 @@ def main():
             {'identificacao_unidade.nome': {'$exists': False}}
         ]
     }
+    projection = {'instituicao_nome': 1}
+    # O código e o nome da unidade são copiados para as coleções derivadas e para os totais
+    updates_derived = True
 
-    docs = list(coll.find(query))
-    logging.info(f'Encontrados {len(docs)} documentos com nome de unidade ausente/ vazio.')
-
-    updated = 0
-    for doc in docs:
+    def plan(self, doc):
         instituicao_nome = doc.get('instituicao_nome') or ''
         if not instituicao_nome:
-            logging.warning(f'Documento {doc.get("_id")} sem `instituicao_nome`, pulando.')
-            continue
-
-        new_codigo = normalize_code(instituicao_nome)
-        new_nome = instituicao_nome
+            logging.warning(f'Documento {_id_repr(doc)} sem `instituicao_nome`, pulando.')
+            return None
 
         new_ident = {
-            'codigo': new_codigo,
-            'nome': new_nome,
+            'codigo': normalize_code(instituicao_nome),
+            'nome': instituicao_nome,
             'diretor': ''
         }
+        logging.debug(f'Documento {_id_repr(doc)} -> nome="{new_ident["nome"]}" codigo="{new_ident["codigo"]}"')
+        return {'$set': {'identificacao_unidade': new_ident}}
+
 
-        result = coll.update_one({'_id': doc['_id']}, {'$set': {'identificacao_unidade': new_ident}})
-        if result.modified_count > 0:
-            updated += 1
-            logging.info(f'Atualizado documento {_id_repr(doc)} -> nome="{new_nome}" codigo="{new_codigo}"')
-        else:
-            logging.info(f'Nenhuma alteração para documento {_id_repr(doc)}')
+def main():
+    parser = argparse.ArgumentParser(description=FixMissingNames.description)
+    add_run_arguments(parser)
+    args = parser.parse_args()
 
-    logging.info(f'Atualização finalizada. Documentos atualizados: {updated}')
-    client.close()
+    logging.info(f'Conectando ao MongoDB: {MONGODB_URI}')
+    client = MongoClient(MONGODB_URI)
+    try:
+        run_from_args(client.get_database(), FixMissingNames(), args)
+    finally:
+        client.close()
 
 
 def _id_repr(d):
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fila durável de processamento de PDFs sobre a coleção `documents`.
+
+A rota `POST /api/documents/[id]/process` só marca o documento como `queued`;
+a extração e a normalização rodam neste worker, que pode ter várias instâncias
+(containers ou máquinas) apontando para o mesmo banco. O ciclo de um documento:
+
+    uploaded -> queued -> processing -> processed
+                                     -> error
+
+- Cada worker reserva um job de forma atômica com `find_one_and_update`
+  (`queued` mais antigo primeiro), gravando em `lease` o próprio id e o prazo
+  da reserva, e incrementa `attempts`.
+- Enquanto o job roda, o worker renova o prazo (heartbeat) de todos os seus
+  jobs em um único update a cada terço do prazo.
+- Um job `processing` com prazo vencido (worker que caiu), ou sem reserva
+  (deixado pela rota síncrona antiga), volta a ser reservado por qualquer worker; depois de `--max-attempts` tentativas ele
+  passa para `error`.
+- O resultado só é gravado se o worker ainda for o dono da reserva.
+
+Como na rota antiga, o resultado (`normalizedData`) fica no documento para
+revisão; a extração compactada já vai para `extracoes` (ver
+raw_extractions.py). Ao aprovar, a rota de salvar chama `save_approved` pelo
+worker persistente (ver pipeline_worker.py), que grava em `projetos` pelo
+mesmo upsert do pipeline, com as coleções derivadas e os totais do dashboard. Cada worker roda até
+`--concurrency` extrações ao mesmo tempo, em processos separados; SIGTERM e
+SIGINT param de reservar jobs e esperam os que estão em andamento. Cada job
+finalizado é registrado nas métricas do pipeline e em `processing_runs` (ver
+pipeline_metrics.py), com origem `fila`.
+
+Configuração por variáveis de ambiente (os argumentos têm precedência):
+    PGA_QUEUE_CONCURRENCY=<n>     extrações simultâneas por worker (padrão: número de CPUs)
+    PGA_QUEUE_LEASE_S=120         prazo da reserva, em segundos
+    PGA_QUEUE_POLL_S=2            intervalo entre consultas com a fila vazia
+    PGA_QUEUE_MAX_ATTEMPTS=3      tentativas antes de desistir de um job
+
+Uso:
+    python3 scripts/job_queue.py run [--concurrency 4] [--lease 120] [--poll 2] [--max-attempts 3]
+    python3 scripts/job_queue.py enqueue <document_id>
+    python3 scripts/job_queue.py status
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+
+# Adiciona o diretório do script ao path do Python para importar módulos locais
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import process_pdf
+from extraction_cache import file_sha256
+from pipeline_metrics import RunRecorder, add_round_trips, count_round_trips, metrics_from_env
+from progress_events import ProgressEvents
+from raw_extractions import PageEncoder, storage_enabled as raw_storage_enabled, store_extractions
+from send_to_mongo import delete_project, get_mongo_client, upsert_document
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DOCUMENTS = 'documents'
+
+UPLOADED = 'uploaded'
+QUEUED = 'queued'
+PROCESSING = 'processing'
+PROCESSED = 'processed'
+SAVED = 'saved'
+ERROR = 'error'
+
+DEFAULT_LEASE_S = 120
+DEFAULT_POLL_S = 2
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Collections cujos índices da fila já foram garantidos neste processo
+_indexed_collections = set()
+
+
+def _env_number(name, default, cast=float):
+    try:
+        return cast(os.getenv(name) or default)
+    except ValueError:
+        logging.warning(f"Valor inválido em {name}; usando {default}.")
+        return default
+
+
+def _now():
+    # O driver devolve datas sem fuso (UTC); as comparações são feitas no mesmo formato
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def ensure_queue_indexes(collection):
+    """Índices da reserva de jobs, uma vez por processo e collection."""
+    if collection.full_name in _indexed_collections:
+        return
+    collection.create_index([('status', ASCENDING), ('queuedAt', ASCENDING)], name='fila')
+    collection.create_index([('status', ASCENDING), ('lease.expiresAt', ASCENDING)], name='fila_reservas')
+    _indexed_collections.add(collection.full_name)
+
+
+def enqueue(collection, document_id):
+    """Coloca na fila um documento enviado ou com erro. Retorna False se ele não estava em um desses estados."""
+    result = collection.update_one(
+        {'_id': document_id, 'status': {'$in': [UPLOADED, ERROR]}},
+        {'$set': {'status': QUEUED, 'queuedAt': _now(), 'attempts': 0, 'error': None, 'errorCode': None},
+         '$unset': {'lease': ''}},
+    )
+    return result.matched_count == 1
+
+
+def _abandoned(now):
+    """
+    Filtros dos jobs `processing` sem dono: reserva vencida, ou sem reserva
+    nenhuma (deixados pela rota síncrona antiga, que não gravava `lease`).
+    """
+    return [
+        {'status': PROCESSING, 'lease.expiresAt': {'$lt': now}},
+        {'status': PROCESSING, 'lease': {'$exists': False}},
+    ]
+
+
+def claim_job(collection, worker_id, lease_s, max_attempts, now=None):
+    """
+    Reserva o job mais antigo da fila, ou um `processing` sem dono (ver
+    `_abandoned`), em uma única operação atômica. Retorna o documento ou None.
+    """
+    now = now or _now()
+    return collection.find_one_and_update(
+        {
+            '$or': [
+                {'status': QUEUED},
+                *_abandoned(now),
+            ],
+            'attempts': {'$not': {'$gte': max_attempts}},
+        },
+        {
+            '$set': {
+                'status': PROCESSING,
+                'startedAt': now,
+                'lease': {'worker': worker_id, 'expiresAt': now + timedelta(seconds=lease_s), 'heartbeatAt': now},
+            },
+            '$inc': {'attempts': 1},
+        },
+        projection={'filePath': 1, 'institutionName': 1, 'year': 1, 'attempts': 1, 'lease': 1},
+        sort=[('queuedAt', ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def fail_exhausted(collection, max_attempts, now=None):
+    """Marca como erro os jobs sem dono que já esgotaram as tentativas."""
+    now = now or _now()
+    result = collection.update_many(
+        {'$or': _abandoned(now), 'attempts': {'$gte': max_attempts}},
+        {'$set': {'status': ERROR, 'error': f'Processamento interrompido {max_attempts} vez(es); tentativas esgotadas.',
+                  'errorCode': 'tentativas_esgotadas', 'processedAt': now},
+         '$unset': {'lease': ''}},
+    )
+    if result.modified_count:
+        logging.warning(f"{result.modified_count} job(s) sem mais tentativas marcados como erro.")
+    return result.modified_count
+
+
+def heartbeat(collection, job_ids, worker_id, lease_s, now=None):
+    """
+    Renova a reserva dos jobs do worker em um único update. Retorna os ids
+    cuja reserva foi perdida (vencida e tomada por outro worker).
+    """
+    if not job_ids:
+        return set()
+    now = now or _now()
+    owned = {'_id': {'$in': list(job_ids)}, 'status': PROCESSING, 'lease.worker': worker_id}
+    result = collection.update_many(owned, {'$set': {'lease.expiresAt': now + timedelta(seconds=lease_s),
+                                                     'lease.heartbeatAt': now}})
+    if result.matched_count == len(job_ids):
+        return set()
+    still_owned = {doc['_id'] for doc in collection.find(owned, {'_id': 1})}
+    return set(job_ids) - still_owned
+
+
+def finish_job(collection, job_id, worker_id, fields):
+    """Grava o fim de um job se o worker ainda é o dono da reserva. Retorna False caso contrário."""
+    result = collection.update_one(
+        {'_id': job_id, 'status': PROCESSING, 'lease.worker': worker_id},
+        {'$set': dict(fields, processedAt=_now()), '$unset': {'lease': ''}},
+    )
+    return result.matched_count == 1
+
+
+def _init_pool_process():
+    # O Ctrl+C chega a todo o grupo de processos; quem decide parar é o processo principal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def run_job(pdf_path, institution_name, year):
+    """
+    Executado no pool: extrai e normaliza um PDF, devolvendo os dados ou o
+    erro, com o registro da execução para as métricas em `metricas` e a
+    extração compactada em `extracao` (hash_conteudo, bytes, páginas).
+    """
+    start = time.perf_counter()
+    recorder = RunRecorder(arquivo=os.path.basename(pdf_path), instituicao=institution_name, ano=year,
+                           origem='fila')
+    raw = PageEncoder() if raw_storage_enabled() else None
+    try:
+        stats = {}
+        with recorder.counting():
+            _, normalized_data = process_pdf.extract_and_normalize(pdf_path, institution_name, year, stats=stats,
+                                                                   events=recorder.attach(ProgressEvents()), raw=raw)
+        outcome = {'normalized': normalized_data, 'paginas': stats['paginas'],
+                   'duracao_s': round(time.perf_counter() - start, 3)}
+        if raw is not None:
+            outcome['extracao'] = (file_sha256(pdf_path), raw.finish(), raw.paginas)
+    except process_pdf.PipelineError as e:
+        outcome = {'erro': str(e), 'etapa': e.etapa, 'codigo': e.codigo}
+    except Exception as e:
+        outcome = {'erro': str(e), 'etapa': 'desconhecida', 'codigo': 'erro_inesperado'}
+    outcome['metricas'] = recorder.finish()
+    return outcome
+
+
+class QueueWorker:
+    """Worker da fila: reserva jobs, roda até `concurrency` ao mesmo tempo e renova as reservas."""
+
+    def __init__(self, collection, concurrency=None, lease_s=None, poll_s=None, max_attempts=None, worker_id=None,
+                 metrics=None):
+        self.collection = collection
+        self.metrics = metrics
+        self.concurrency = max(1, concurrency or _env_number('PGA_QUEUE_CONCURRENCY', os.cpu_count() or 1, int))
+        self.lease_s = lease_s or _env_number('PGA_QUEUE_LEASE_S', DEFAULT_LEASE_S)
+        self.poll_s = poll_s or _env_number('PGA_QUEUE_POLL_S', DEFAULT_POLL_S)
+        self.max_attempts = max_attempts or _env_number('PGA_QUEUE_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS, int)
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        self.stop_event = threading.Event()
+
+    def stop(self, *_):
+        if not self.stop_event.is_set():
+            logging.info("Parando: nenhum job novo será reservado; aguardando os que estão em andamento...")
+        self.stop_event.set()
+
+    def run(self):
+        ensure_queue_indexes(self.collection)
+        logging.info(f"Worker '{self.worker_id}' da fila iniciado (concorrência {self.concurrency}, "
+                     f"reserva de {self.lease_s:.0f}s).")
+        heartbeat_interval = self.lease_s / 3
+        in_flight = {}
+        last_heartbeat = time.monotonic()
+        executor = self._new_executor()
+        try:
+            while True:
+                if not self.stop_event.is_set():
+                    fail_exhausted(self.collection, self.max_attempts)
+                    while len(in_flight) < self.concurrency:
+                        job = claim_job(self.collection, self.worker_id, self.lease_s, self.max_attempts)
+                        if job is None:
+                            break
+                        self._log_claim(job)
+                        future = executor.submit(run_job, job['filePath'], job['institutionName'], job['year'])
+                        in_flight[future] = job
+
+                if not in_flight:
+                    if self.stop_event.is_set():
+                        break
+                    self.stop_event.wait(self.poll_s)
+                    continue
+
+                done, _ = wait(in_flight, timeout=min(self.poll_s, heartbeat_interval), return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._finish(in_flight.pop(future), future)
+                if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                    # Um processo do pool morreu e o pool inteiro fica inutilizável: os demais jobs também falharam
+                    for future in list(in_flight):
+                        self._finish(in_flight.pop(future), future)
+                    executor.shutdown(wait=False)
+                    executor = self._new_executor()
+
+                if in_flight and time.monotonic() - last_heartbeat >= heartbeat_interval:
+                    lost = heartbeat(self.collection, [job['_id'] for job in in_flight.values()],
+                                     self.worker_id, self.lease_s)
+                    for job_id in lost:
+                        logging.warning(f"Reserva do job {job_id} perdida; o resultado será descartado.")
+                    last_heartbeat = time.monotonic()
+        finally:
+            executor.shutdown(wait=True)
+        logging.info(f"Worker '{self.worker_id}' encerrado.")
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(max_workers=self.concurrency, initializer=_init_pool_process)
+
+    def _log_claim(self, job):
+        if job.get('attempts', 1) > 1:
+            logging.warning(f"Job {job['_id']} retomado (tentativa {job['attempts']} de {self.max_attempts}).")
+        else:
+            logging.info(f"Job {job['_id']} reservado: '{job['filePath']}'.")
+
+    def _finish(self, job, future):
+        try:
+            outcome = future.result()
+        except Exception as e:
+            # O processo do pool morreu (ex.: falta de memória): o job volta para a fila se ainda houver tentativas
+            logging.error(f"Job {job['_id']} interrompido: {e}")
+            retry = job.get('attempts', 1) < self.max_attempts
+            fields = {'status': QUEUED if retry else ERROR, 'error': str(e), 'errorCode': 'worker_interrompido'}
+            finish_job(self.collection, job['_id'], self.worker_id, fields)
+            return
+
+        if 'erro' in outcome:
+            logging.error(f"Job {job['_id']} falhou na etapa '{outcome['etapa']}': {outcome['erro']}")
+            fields = {'status': ERROR, 'error': outcome['erro'], 'errorCode': outcome['codigo'],
+                      'errorStage': outcome['etapa']}
+        else:
+            normalized = outcome['normalized']
+            fields = {'status': PROCESSED, 'normalizedData': normalized, 'error': None, 'errorCode': None,
+                      'errorStage': None,
+                      'result': {'paginas': outcome['paginas'],
+                                 'projetos': len(normalized.get('acoes_projetos', [])),
+                                 'aquisicoes': len(normalized.get('anexo1_aquisicoes', [])),
+                                 'duracao_s': outcome['duracao_s']}}
+        # As gravações do job são feitas aqui, e não no processo do pool: entram no registro dele
+        with count_round_trips() as round_trips:
+            if outcome.get('extracao'):
+                try:
+                    store_extractions(self.collection.database, [outcome['extracao']])
+                except Exception as e:
+                    logging.warning(f"Não foi possível guardar a extração do job {job['_id']}: {e}")
+            owned = finish_job(self.collection, job['_id'], self.worker_id, fields)
+        if owned:
+            logging.info(f"Job {job['_id']} finalizado ({fields['status']}).")
+        else:
+            logging.warning(f"Job {job['_id']} finalizado, mas a reserva foi tomada por outro worker; resultado descartado.")
+        if self.metrics is not None and outcome.get('metricas'):
+            self.metrics.record_run(add_round_trips(outcome['metricas'], round_trips.total), self.collection.database)
+
+
+def save_approved(db, document_id, user_id=None):
+    """
+    Grava em `projetos` os dados aprovados (`normalizedData`) de um documento
+    processado pela fila, com o upsert pela chave natural do pipeline (ver
+    send_to_mongo.py): hash, revisão, PDF no GridFS, coleções derivadas e
+    totais do dashboard. Se o documento já tinha sido salvo em outro projeto
+    (a aprovação mudou a unidade ou o ano), o projeto anterior é removido.
+    Retorna (id do projeto, operação); lança ValueError se o documento não
+    existe ou não está processado.
+    """
+    documents = db[DOCUMENTS]
+    document = documents.find_one({'_id': document_id},
+                                  {'status': 1, 'normalizedData': 1, 'filePath': 1, 'projectId': 1})
+    if document is None:
+        raise ValueError(f"Documento {document_id} não encontrado.")
+    if document.get('status') not in (PROCESSED, SAVED) or not document.get('normalizedData'):
+        raise ValueError(f"Documento {document_id} deve estar processado para ser salvo.")
+
+    normalized = dict(document['normalizedData'])
+    normalized['metadados_extracao'] = dict(normalized.get('metadados_extracao') or {},
+                                            documento_origem=document_id, processado_por=user_id,
+                                            data_processamento=datetime.now().isoformat())
+    project_id, operacao = upsert_document(db.projetos, normalized, document['filePath'])
+    previous = document.get('projectId')
+    if previous is not None and previous != project_id:
+        delete_project(db, previous)
+    documents.update_one({'_id': document_id},
+                         {'$set': {'status': SAVED, 'savedAt': _now(), 'projectId': project_id}})
+    return project_id, operacao
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fila de processamento de PDFs sobre a coleção documents.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='Executa o worker até receber SIGTERM/SIGINT.')
+    run_parser.add_argument('--concurrency', type=int, default=None,
+                            help='Extrações simultâneas (padrão: PGA_QUEUE_CONCURRENCY ou número de CPUs).')
+    run_parser.add_argument('--lease', type=float, default=None,
+                            help=f'Prazo da reserva em segundos (padrão: PGA_QUEUE_LEASE_S ou {DEFAULT_LEASE_S}).')
+    run_parser.add_argument('--poll', type=float, default=None,
+                            help=f'Intervalo entre consultas com a fila vazia (padrão: PGA_QUEUE_POLL_S ou {DEFAULT_POLL_S}).')
+    run_parser.add_argument('--max-attempts', type=int, default=None,
+                            help=f'Tentativas por job (padrão: PGA_QUEUE_MAX_ATTEMPTS ou {DEFAULT_MAX_ATTEMPTS}).')
+    enqueue_parser = subparsers.add_parser('enqueue', help='Coloca um documento enviado na fila.')
+    enqueue_parser.add_argument('document_id', help='ID do documento na coleção documents.')
+    subparsers.add_parser('status', help='Quantidade de documentos por status e reservas ativas.')
+    args = parser.parse_args()
+
+    process_pdf.configure_log_level()
+    client = get_mongo_client()
+    try:
+        collection = client.get_database()[DOCUMENTS]
+        if args.command == 'run':
+            worker = QueueWorker(collection, args.concurrency, args.lease, args.poll, args.max_attempts,
+                                 metrics=metrics_from_env())
+            signal.signal(signal.SIGTERM, worker.stop)
+            signal.signal(signal.SIGINT, worker.stop)
+            worker.run()
+        elif args.command == 'enqueue':
+            if not enqueue(collection, ObjectId(args.document_id)):
+                logging.error(f"Documento {args.document_id} não encontrado ou já está na fila/processado.")
+                sys.exit(1)
+            logging.info(f"Documento {args.document_id} colocado na fila.")
+        else:
+            counts = {doc['_id']: doc['total'] for doc in collection.aggregate([
+                {'$group': {'_id': '$status', 'total': {'$sum': 1}}},
+            ])}
+            reservas = list(collection.find({'status': PROCESSING}, {'lease': 1, 'attempts': 1, 'filePath': 1}))
+            print(json.dumps({'status': counts, 'reservas': reservas}, ensure_ascii=False, indent=2, default=str))
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
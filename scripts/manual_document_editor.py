@@ -7,21 +7,34 @@ no formato esperado pelo sistema PGA Dashboard Database.
 Permite:
 1. Editar documentos já processados salvos no MongoDB
 2. Inserir novos documentos manualmente seguindo a mesma estrutura
+
+O `edit` exporta o documento sem o PDF e os campos de controle (hashes e
+referências ao GridFS), em JSON estendido relaxado do MongoDB (`bson.json_util`):
+ObjectIds e datas vão como `{"$oid": ...}` e `{"$date": ...}` e voltam com o
+tipo original no `save`. O `save` de um documento existente grava só a
+diferença para a versão armazenada (`$set`/`$unset` por caminho) e usa o campo
+`revisao` exportado como controle de concorrência otimista: se o documento foi
+alterado por outra pessoa ou pelo pipeline depois da exportação, nada é
+gravado. Cada gravação deixa em `historico_edicoes` só os campos alterados e
+os valores anteriores (`history` lista as edições de um documento).
 """
 
-import json
 import sys
 import os
 import logging
-from pymongo import MongoClient
+from bson import ObjectId, json_util
+from pymongo import MongoClient, ASCENDING
 from pymongo.errors import ConnectionFailure
 from dotenv import load_dotenv
 from datetime import datetime
-import base64
 
 # Adiciona o diretório do script ao path do Python para importar módulos locais
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+from child_collections import sync_documents as sync_child_collections
+from dashboard_aggregates import aggregate_key, refresh as refresh_aggregates
+from send_to_mongo import REVISION_FIELD
+
 # Carregar as variáveis de ambiente do arquivo .env
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 env_path = os.path.join(root_dir, '.env.local')
@@ -29,6 +42,19 @@ load_dotenv(env_path)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Coleção com um registro por edição salva
+HISTORY = 'historico_edicoes'
+# Campos que não são exportados para edição e que o save nunca altera
+PROTECTED_FIELDS = ('_id', REVISION_FIELD, 'pdf_original_arquivo', 'pdf_original_id', 'pdf_original_tamanho',
+                    'hash_conteudo', 'hash_dados')
+
+# Conexão compartilhada por todos os comandos do processo
+_client = None
+
+
+class EditConflictError(Exception):
+    """O documento mudou no banco depois de ser exportado para edição."""
+
 # Estrutura base para um novo documento
 BASE_DOCUMENT_STRUCTURE = {
     "ano_referencia": 2025,
@@ -84,92 +110,207 @@ BASE_DOCUMENT_STRUCTURE = {
 }
 
 def get_mongodb_connection():
-    """Estabelece conexão com o MongoDB."""
+    """Retorna o MongoClient compartilhado e a collection `projetos`, conectando no primeiro uso."""
+    global _client
+    if _client is not None:
+        return _client, _client.get_database().projetos
+
     mongodb_uri = os.getenv('MONGODB_URI')
     if not mongodb_uri:
         logging.error("A variável de ambiente MONGODB_URI não foi encontrada.")
         sys.exit(1)
     
     try:
-        client = MongoClient(mongodb_uri)
-        db = client.get_database()
+        _client = MongoClient(mongodb_uri)
+        db = _client.get_database()
         collection = db.projetos
         logging.info(f"Conectado ao banco '{db.name}', collection '{collection.name}'")
-        return client, collection
+        return _client, collection
     except ConnectionFailure as e:
         logging.error(f"Não foi possível conectar ao MongoDB: {e}")
         sys.exit(1)
 
+def close_mongodb_connection():
+    """Fecha a conexão compartilhada, se aberta."""
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
 def list_documents():
     """Lista todos os documentos disponíveis no MongoDB."""
     client, collection = get_mongodb_connection()
+    documents = list(collection.find({}, {
+        "identificacao_unidade.nome": 1,
+        "ano_referencia": 1,
+        "metadados_extracao.data_extracao": 1
+    }))
     
-    try:
-        documents = list(collection.find({}, {
-            "identificacao_unidade.nome": 1,
-            "ano_referencia": 1,
-            "metadados_extracao.data_extracao": 1
-        }))
-        
-        if not documents:
-            logging.info("Nenhum documento encontrado.")
-            return
-        
-        print("\nDocumentos disponíveis:")
-        print("-" * 80)
-        for i, doc in enumerate(documents):
-            nome = doc.get('identificacao_unidade', {}).get('nome', 'N/A')
-            ano = doc.get('ano_referencia', 'N/A')
-            data = doc.get('metadados_extracao', {}).get('data_extracao', 'N/A')
-            print(f"{i+1}. {nome} ({ano}) - {data}")
-        
-        return documents
-    finally:
-        client.close()
+    if not documents:
+        logging.info("Nenhum documento encontrado.")
+        return
+    
+    print("\nDocumentos disponíveis:")
+    print("-" * 80)
+    for i, doc in enumerate(documents):
+        nome = doc.get('identificacao_unidade', {}).get('nome', 'N/A')
+        ano = doc.get('ano_referencia', 'N/A')
+        data = doc.get('metadados_extracao', {}).get('data_extracao', 'N/A')
+        print(f"{i+1}. {doc['_id']} {nome} ({ano}) - {data}")
+    
+    return documents
 
 def get_document_by_id(doc_id):
-    """Obtém um documento específico pelo ID."""
+    """Obtém um documento específico pelo ID, sem o PDF antigo em base64."""
     client, collection = get_mongodb_connection()
-    
-    try:
-        from bson import ObjectId
-        document = collection.find_one({"_id": ObjectId(doc_id)})
-        return document
-    finally:
-        client.close()
+    return collection.find_one({"_id": ObjectId(doc_id)}, {"pdf_original_arquivo": 0})
+
+def export_document(document):
+    """Documento pronto para edição em JSON: sem os campos protegidos, com `_id` e `revisao`."""
+    exported = {"_id": document["_id"], REVISION_FIELD: document.get(REVISION_FIELD, 0)}
+    exported.update({key: value for key, value in document.items() if key not in PROTECTED_FIELDS})
+    return exported
+
+def _plain_keys(value):
+    """Se as chaves do dict podem ser usadas em caminhos com ponto do MongoDB."""
+    return all(isinstance(key, str) and key and '.' not in key and not key.startswith('$') for key in value)
+
+def diff_documents(stored, edited, prefix=''):
+    """
+    Diferença mínima entre o documento armazenado e o editado. Retorna
+    (set, unset, anterior): os caminhos com ponto a gravar, os a remover e o
+    valor anterior de cada caminho alterado. Dicts são comparados campo a campo
+    e listas de mesmo tamanho item a item; o resto é substituído inteiro.
+    """
+    sets, unsets, anterior = {}, {}, {}
+    for key, value in edited.items():
+        path = prefix + key
+        if key not in stored:
+            sets[path] = value
+            anterior[path] = None
+            continue
+        old = stored[key]
+        if old == value:
+            continue
+        if isinstance(old, dict) and isinstance(value, dict) and _plain_keys(old) and _plain_keys(value):
+            _merge_diff((sets, unsets, anterior), diff_documents(old, value, path + '.'))
+        elif isinstance(old, list) and isinstance(value, list) and len(old) == len(value):
+            for index, (old_item, item) in enumerate(zip(old, value)):
+                item_path = f'{path}.{index}'
+                if old_item == item:
+                    continue
+                if isinstance(old_item, dict) and isinstance(item, dict) and _plain_keys(old_item) and _plain_keys(item):
+                    _merge_diff((sets, unsets, anterior), diff_documents(old_item, item, item_path + '.'))
+                else:
+                    sets[item_path] = item
+                    anterior[item_path] = old_item
+        else:
+            sets[path] = value
+            anterior[path] = old
+    for key, old in stored.items():
+        if key not in edited:
+            unsets[prefix + key] = ''
+            anterior[prefix + key] = old
+    return sets, unsets, anterior
+
+def _merge_diff(target, diff):
+    for total, partial in zip(target, diff):
+        total.update(partial)
+
+def _history_record(doc_id, revisao, operacao, sets=None, unsets=None, anterior=None):
+    """Registro compacto de uma edição: só os caminhos alterados, com o valor novo e o anterior."""
+    alteracoes = [{"campo": path, "valor": value, "anterior": anterior[path]} for path, value in (sets or {}).items()]
+    alteracoes += [{"campo": path, "removido": True, "anterior": anterior[path]} for path in (unsets or {})]
+    return {
+        "documento_id": doc_id,
+        REVISION_FIELD: revisao,
+        "operacao": operacao,
+        "origem": "manual_document_editor",
+        "data": datetime.now().isoformat(),
+        "alteracoes": alteracoes,
+    }
 
 def save_document(document):
-    """Salva um documento no MongoDB."""
+    """
+    Salva um documento no MongoDB. Um documento com `_id` é atualizado só nos
+    campos que mudaram em relação à versão armazenada; lança
+    EditConflictError se a `revisao` exportada não é mais a atual.
+    """
     client, collection = get_mongodb_connection()
-    
-    try:
-        # Se o documento já tem _id, faz update, senão insere
-        if "_id" in document:
-            from bson import ObjectId
-            doc_id = document["_id"]
-            del document["_id"]  # Remove _id para evitar erro no update
-            result = collection.replace_one({"_id": ObjectId(doc_id)}, document)
-            logging.info(f"Documento atualizado com sucesso! ID: {doc_id}")
-        else:
-            result = collection.insert_one(document)
-            logging.info(f"Documento inserido com sucesso! ID: {result.inserted_id}")
-    finally:
-        client.close()
+    db = collection.database
+    db[HISTORY].create_index([("documento_id", ASCENDING), (REVISION_FIELD, ASCENDING)], name="documento_revisao")
+
+    if "_id" not in document:
+        document = {key: value for key, value in document.items() if key not in PROTECTED_FIELDS}
+        document[REVISION_FIELD] = 1
+        doc_id = collection.insert_one(document).inserted_id
+        db[HISTORY].insert_one(_history_record(doc_id, 1, "insercao"))
+        logging.info(f"Documento inserido com sucesso! ID: {doc_id}")
+        sync_child_collections(db, [(doc_id, document)])
+        refresh_aggregates(db, {aggregate_key(document)})
+        return doc_id
+
+    doc_id = ObjectId(document["_id"])
+    stored = collection.find_one({"_id": doc_id}, {"pdf_original_arquivo": 0})
+    if stored is None:
+        raise EditConflictError(f"Documento {doc_id} não existe mais.")
+    expected = document.get(REVISION_FIELD)
+    current = stored.get(REVISION_FIELD, 0)
+    if expected is None:
+        logging.warning("O arquivo não tem o campo 'revisao' (exportação antiga); edições concorrentes não serão detectadas.")
+        expected = current
+    if expected != current:
+        raise EditConflictError(
+            f"O documento {doc_id} foi alterado depois da exportação (revisão {expected}, atual {current}). "
+            f"Exporte-o de novo com 'edit' e refaça a edição."
+        )
+
+    edited = {key: value for key, value in document.items() if key not in PROTECTED_FIELDS}
+    sets, unsets, anterior = diff_documents(
+        {key: value for key, value in stored.items() if key not in PROTECTED_FIELDS}, edited
+    )
+    if not sets and not unsets:
+        logging.info(f"Nenhuma alteração em relação ao documento armazenado ({doc_id}).")
+        return doc_id
+
+    update = {"$inc": {REVISION_FIELD: 1}}
+    if sets:
+        update["$set"] = sets
+    if unsets:
+        update["$unset"] = unsets
+    # Documentos gravados antes do campo `revisao` não o têm: {"$in": [0, None]} também casa com o campo ausente
+    revision_filter = expected if expected else {"$in": [0, None]}
+    result = collection.update_one({"_id": doc_id, REVISION_FIELD: revision_filter}, update)
+    if result.matched_count == 0:
+        raise EditConflictError(f"O documento {doc_id} foi alterado durante a gravação; exporte-o de novo com 'edit'.")
+    db[HISTORY].insert_one(_history_record(doc_id, expected + 1, "edicao", sets, unsets, anterior))
+    logging.info(f"Documento atualizado com sucesso! ID: {doc_id} ({len(sets)} campo(s) alterado(s), "
+                 f"{len(unsets)} removido(s), revisão {expected + 1})")
+
+    sync_child_collections(db, [(doc_id, edited)])
+    # A edição pode ter mudado a instituição ou o ano: recalcula o par antigo e o novo
+    refresh_aggregates(db, {aggregate_key(edited), aggregate_key(stored)})
+    return doc_id
+
+def get_history(doc_id):
+    """Registros de edição de um documento, do mais antigo para o mais recente."""
+    client, collection = get_mongodb_connection()
+    return list(collection.database[HISTORY].find({"documento_id": ObjectId(doc_id)}, {"_id": 0}).sort(REVISION_FIELD, ASCENDING))
 
 def load_json_file(file_path):
-    """Carrega um arquivo JSON."""
+    """Carrega um arquivo JSON (JSON estendido do MongoDB: `$oid`, `$date`...)."""
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+            return json_util.loads(f.read(), json_options=json_util.RELAXED_JSON_OPTIONS)
     except Exception as e:
         logging.error(f"Erro ao carregar arquivo JSON: {e}")
         sys.exit(1)
 
 def save_json_file(data, file_path):
-    """Salva dados em um arquivo JSON."""
+    """Salva dados em um arquivo JSON, em JSON estendido relaxado do MongoDB."""
     try:
         with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.write(json_util.dumps(data, json_options=json_util.RELAXED_JSON_OPTIONS, ensure_ascii=False, indent=2))
         logging.info(f"Arquivo salvo com sucesso: {file_path}")
     except Exception as e:
         logging.error(f"Erro ao salvar arquivo JSON: {e}")
@@ -189,10 +330,19 @@ def main():
         print("  python manual_document_editor.py edit <document_id>")
         print("  python manual_document_editor.py new")
         print("  python manual_document_editor.py save <json_file>")
+        print("  python manual_document_editor.py history <document_id>")
         sys.exit(1)
     
-    command = sys.argv[1]
-    
+    try:
+        run_command(sys.argv[1])
+    except EditConflictError as e:
+        logging.error(str(e))
+        sys.exit(1)
+    finally:
+        close_mongodb_connection()
+
+def run_command(command):
+    """Executa um comando da linha de comando."""
     if command == "list":
         list_documents()
     
@@ -210,7 +360,7 @@ def main():
         
         # Salva o documento em um arquivo temporário para edição
         temp_file = f"temp_edit_{doc_id}.json"
-        save_json_file(document, temp_file)
+        save_json_file(export_document(document), temp_file)
         print(f"Documento salvo em {temp_file} para edição.")
         print("Edite o arquivo e depois use o comando 'save' para salvar as alterações.")
     
@@ -231,6 +381,14 @@ def main():
         save_document(document)
         print(f"Documento salvo com sucesso no MongoDB a partir de {file_path}")
     
+    elif command == "history":
+        if len(sys.argv) < 3:
+            logging.error("ID do documento não fornecido.")
+            sys.exit(1)
+        
+        for record in get_history(sys.argv[2]):
+            print(json_util.dumps(record, json_options=json_util.RELAXED_JSON_OPTIONS, ensure_ascii=False))
+    
     else:
         logging.error(f"Comando desconhecido: {command}")
         sys.exit(1)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script de manutenção: move os PDFs originais armazenados em base64 no campo
+`pdf_original_arquivo` da coleção `projetos` para o GridFS (bucket `pdfs`).
+
+Para cada documento, o base64 é decodificado, enviado ao GridFS e substituído
+pela referência `pdf_original_id`; o campo `pdf_original_arquivo` é removido.
+Os documentos são lidos um a um, com projeção, para não manter vários PDFs em
+memória ao mesmo tempo. Pode ser executado novamente sem duplicar arquivos:
+só documentos que ainda têm `pdf_original_arquivo` são processados.
+
+Uso:
+    python3 scripts/migrate_pdfs_to_gridfs.py [--dry-run] [--limit N]
+"""
+
+import argparse
+import base64
+import binascii
+import io
+import logging
+import os
+import sys
+
+from gridfs import GridFSBucket
+
+# Adiciona o diretório do script ao path do Python para importar módulos locais
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from send_to_mongo import get_mongo_client, PDF_BUCKET
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def migrate(db, dry_run=False, limit=0):
+    """Migra os PDFs em base64 para o GridFS. Retorna (migrados, falhas)."""
+    coll = db.projetos
+    bucket = GridFSBucket(db, bucket_name=PDF_BUCKET)
+    query = {'pdf_original_arquivo': {'$exists': True, '$type': 'string'}}
+
+    total = coll.count_documents(query)
+    logging.info(f'Encontrados {total} documentos com PDF em base64.')
+    if dry_run:
+        return 0, 0
+
+    migrated = 0
+    failed = 0
+    # batch_size pequeno: cada documento pode carregar vários MB de base64
+    cursor = coll.find(
+        query,
+        {'pdf_original_arquivo': 1, 'metadados_extracao.nome_arquivo_original': 1},
+        batch_size=1,
+        limit=limit,
+    )
+    for doc in cursor:
+        doc_id = doc['_id']
+        filename = (doc.get('metadados_extracao') or {}).get('nome_arquivo_original') or f'{doc_id}.pdf'
+        try:
+            pdf_bytes = base64.b64decode(doc['pdf_original_arquivo'], validate=True)
+        except (binascii.Error, ValueError) as e:
+            logging.warning(f'Documento {doc_id}: base64 inválido, pulando ({e}).')
+            failed += 1
+            continue
+        # Libera a string base64 antes do upload
+        del doc['pdf_original_arquivo']
+
+        file_id = bucket.upload_from_stream(
+            filename,
+            io.BytesIO(pdf_bytes),
+            metadata={'contentType': 'application/pdf', 'projeto_id': doc_id},
+        )
+        result = coll.update_one(
+            {'_id': doc_id, 'pdf_original_arquivo': {'$exists': True}},
+            {
+                '$set': {'pdf_original_id': file_id, 'pdf_original_tamanho': len(pdf_bytes)},
+                '$unset': {'pdf_original_arquivo': ''},
+            },
+        )
+        if result.modified_count:
+            migrated += 1
+            logging.info(f'Documento {doc_id} migrado -> GridFS {file_id} ({len(pdf_bytes)} bytes).')
+        else:
+            # Outro processo migrou o documento no meio do caminho
+            bucket.delete(file_id)
+            logging.info(f'Documento {doc_id} já havia sido migrado, arquivo duplicado removido.')
+
+    return migrated, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move os PDFs em base64 da coleção projetos para o GridFS.')
+    parser.add_argument('--dry-run', action='store_true', help='Apenas conta os documentos a migrar.')
+    parser.add_argument('--limit', type=int, default=0, help='Migra no máximo N documentos (0 = todos).')
+    args = parser.parse_args()
+
+    client = get_mongo_client()
+    try:
+        migrated, failed = migrate(client.get_database(), dry_run=args.dry_run, limit=args.limit)
+    finally:
+        client.close()
+
+    logging.info(f'Migração finalizada. Documentos migrados: {migrated}. Falhas: {failed}.')
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Executor de migrações de manutenção da coleção `projetos`.
+
+Uma migração (subclasse de `Migration`) define o filtro dos documentos, os
+campos que precisa ler e a alteração de cada documento: `plan(doc)` devolve o
+update (aplicado com bulk_write) ou, quando a alteração pode ser feita no
+servidor, `pipeline()` devolve um update com pipeline de agregação aplicado
+com um update_many por lote.
+
+O executor:
+
+- lê os documentos em lotes por um cursor com projeção e ordenado por `_id`
+  (nunca o documento inteiro, que pode ter PDFs antigos em base64);
+- grava um ponto de retomada (último `_id` processado) na coleção
+  `migracoes` após cada lote, para continuar de onde parou (uma execução
+  concluída não é retomada: a próxima começa do início);
+- com `--partitions N`, divide o intervalo de `_id` em N faixas ($bucketAuto)
+  processadas em paralelo, cada uma com seu ponto de retomada;
+- com `--dry-run`, só conta e mostra exemplos das alterações, sem gravar;
+- ressincroniza as coleções derivadas e os totais do dashboard dos documentos
+  alterados, quando a migração mexe em campos usados por eles.
+
+Uso:
+    python3 scripts/migrations.py list
+    python3 scripts/migrations.py run <nome> [--dry-run] [--batch-size 500] [--partitions 4] [--restart] [--limit N]
+    python3 scripts/migrations.py status <nome>
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+# Adiciona o diretório do script ao path do Python para importar módulos locais
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from child_collections import sync_documents as sync_child_collections, SOURCE_PROJECTION as CHILD_PROJECTION
+from dashboard_aggregates import aggregate_key, refresh as refresh_aggregates
+from send_to_mongo import get_mongo_client, REVISION_FIELD
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+CHECKPOINTS = 'migracoes'
+DEFAULT_BATCH_SIZE = 500
+# Quantos updates de exemplo o dry-run mostra por partição
+DRY_RUN_SAMPLES = 5
+# Campos sempre lidos: chave dos totais do dashboard antes da alteração
+KEY_PROJECTION = {'identificacao_unidade.codigo': 1, 'ano_referencia': 1}
+
+
+class Migration:
+    """
+    Base das migrações. Subclasses definem `name`, `description`, `query`,
+    `projection` e `plan` ou `pipeline`. `updates_derived` indica que a
+    alteração mexe em campos copiados para as coleções derivadas ou para os
+    totais do dashboard.
+    """
+
+    name = ''
+    description = ''
+    query = {}
+    projection = {}
+    updates_derived = False
+
+    def plan(self, doc):
+        """Update de um documento (ex.: {'$set': {...}}) ou None se não há o que mudar."""
+        raise NotImplementedError
+
+    def pipeline(self):
+        """Update com pipeline de agregação aplicado no servidor, ou None se a migração usa `plan`."""
+        return None
+
+
+def load_migrations():
+    """Migrações disponíveis, por nome."""
+    # Importado aqui porque as migrações importam este módulo
+    from fix_missing_names import FixMissingNames
+
+    return {migration.name: migration for migration in (FixMissingNames(),)}
+
+
+def partition_bounds(coll, query, partitions):
+    """
+    Divide os `_id` dos documentos do filtro em até `partitions` faixas
+    [início, fim) de tamanho parecido; None indica faixa aberta.
+    """
+    if partitions <= 1:
+        return [(None, None)]
+    buckets = list(coll.aggregate([
+        {'$match': query},
+        {'$bucketAuto': {'groupBy': '$_id', 'buckets': partitions}},
+    ]))
+    if not buckets:
+        return [(None, None)]
+    starts = [bucket['_id']['min'] for bucket in buckets]
+    return [(None if k == 0 else start, starts[k + 1] if k + 1 < len(starts) else None)
+            for k, start in enumerate(starts)]
+
+
+def _range_filter(query, start, end, after):
+    """Filtro da migração restrito à faixa [start, end) e aos `_id` maiores que `after`."""
+    id_filter = {}
+    lower = after if after is not None else start
+    if lower is not None:
+        id_filter['$gt' if after is not None else '$gte'] = lower
+    if end is not None:
+        id_filter['$lt'] = end
+    if not id_filter:
+        return dict(query)
+    return {'$and': [query, {'_id': id_filter}]} if query else {'_id': id_filter}
+
+
+class MigrationRunner:
+    """Executa uma migração em `db.projetos` com lotes, retomada e partições."""
+
+    def __init__(self, db, migration, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, limit=0):
+        self.db = db
+        self.coll = db.projetos
+        self.migration = migration
+        self.batch_size = max(1, batch_size)
+        self.dry_run = dry_run
+        self.limit = limit
+        self._lock = threading.Lock()
+        self.totals = {'lidos': 0, 'alterados': 0, 'ignorados': 0}
+
+    def checkpoint_id(self, partition):
+        return f'{self.migration.name}:{partition}'
+
+    def run(self, partitions=1, restart=False):
+        """Executa (ou retoma) a migração e retorna os totais de documentos lidos, alterados e ignorados."""
+        name = self.migration.name
+        checkpoints = self.db[CHECKPOINTS]
+        if restart and not self.dry_run:
+            checkpoints.delete_many({'migracao': name})
+
+        saved = list(checkpoints.find({'migracao': name}).sort('particao', 1)) if not self.dry_run else []
+        if saved and all(cp.get('concluida') for cp in saved):
+            # Só retoma execuções interrompidas; uma concluída não cobre os documentos criados depois dela
+            logging.info(f"A última execução de '{name}' foi concluída; iniciando uma nova.")
+            checkpoints.delete_many({'migracao': name})
+            saved = []
+        if saved:
+            ranges = [(cp['particao'], cp['inicio'], cp['fim'], cp.get('ultimo_id'), cp.get('concluida'))
+                      for cp in saved]
+            logging.info(f"Retomando '{name}' em {len(ranges)} partição(ões) a partir dos pontos salvos.")
+        else:
+            bounds = partition_bounds(self.coll, self.migration.query, partitions)
+            ranges = [(k, start, end, None, False) for k, (start, end) in enumerate(bounds)]
+            if not self.dry_run:
+                for k, start, end, _, _ in ranges:
+                    checkpoints.replace_one({'_id': self.checkpoint_id(k)}, {
+                        'migracao': name, 'particao': k, 'inicio': start, 'fim': end,
+                        'ultimo_id': None, 'lidos': 0, 'alterados': 0, 'concluida': False,
+                        'iniciada_em': datetime.now().isoformat(),
+                    }, upsert=True)
+
+        pending = [r for r in ranges if not r[4]]
+        logging.info(f"Migração '{name}': {len(pending)} partição(ões) pendente(s)"
+                     f"{' (dry-run)' if self.dry_run else ''}.")
+        if len(pending) == 1:
+            self._run_partition(*pending[0][:4])
+        elif pending:
+            with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+                for future in [executor.submit(self._run_partition, *r[:4]) for r in pending]:
+                    future.result()
+        return self.totals
+
+    def _run_partition(self, partition, start, end, after):
+        projection = dict(self.migration.projection)
+        projection.update(KEY_PROJECTION)
+        cursor = self.coll.find(
+            _range_filter(self.migration.query, start, end, after),
+            projection,
+            sort=[('_id', 1)],
+            batch_size=self.batch_size,
+            limit=self.limit,
+        )
+        batch = []
+        samples = []
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= self.batch_size:
+                self._apply(partition, batch, samples)
+                batch = []
+        if batch:
+            self._apply(partition, batch, samples)
+        if not self.dry_run:
+            self.db[CHECKPOINTS].update_one(
+                {'_id': self.checkpoint_id(partition)},
+                {'$set': {'concluida': True, 'concluida_em': datetime.now().isoformat()}},
+            )
+        for doc_id, update in samples:
+            logging.info(f'[dry-run] {doc_id}: {json.dumps(update, ensure_ascii=False, default=str)}')
+
+    def _apply(self, partition, batch, samples):
+        """Aplica a migração a um lote: um round-trip de escrita e, se preciso, a ressincronização."""
+        pipeline = self.migration.pipeline()
+        ids = [doc['_id'] for doc in batch]
+        if pipeline is not None:
+            changed_ids = ids
+            if self.dry_run:
+                samples.extend((doc_id, pipeline) for doc_id in ids[:DRY_RUN_SAMPLES - len(samples)])
+                modified = len(ids)
+            else:
+                filtro = {'$and': [self.migration.query, {'_id': {'$in': ids}}]} if self.migration.query else {'_id': {'$in': ids}}
+                pipeline = list(pipeline) + [
+                    {'$set': {REVISION_FIELD: {'$add': [{'$ifNull': [f'${REVISION_FIELD}', 0]}, 1]}}},
+                ]
+                modified = self.coll.update_many(filtro, pipeline).modified_count
+        else:
+            operations = []
+            changed_ids = []
+            for doc in batch:
+                update = self.migration.plan(doc)
+                if update is None:
+                    continue
+                changed_ids.append(doc['_id'])
+                if self.dry_run:
+                    if len(samples) < DRY_RUN_SAMPLES:
+                        samples.append((doc['_id'], update))
+                    continue
+                # O filtro da migração de novo: não sobrescreve um documento corrigido no meio do caminho
+                filtro = {'$and': [self.migration.query, {'_id': doc['_id']}]} if self.migration.query else {'_id': doc['_id']}
+                # A revisão avisa o editor manual de que o documento mudou
+                update = dict(update)
+                update['$inc'] = dict(update.get('$inc', {}), **{REVISION_FIELD: 1})
+                operations.append(UpdateOne(filtro, update))
+            modified = len(changed_ids)
+            if operations:
+                modified = self.coll.bulk_write(operations, ordered=False).modified_count
+
+        if not self.dry_run and self.migration.updates_derived and changed_ids:
+            self._resync_derived(batch, changed_ids)
+
+        with self._lock:
+            self.totals['lidos'] += len(batch)
+            self.totals['alterados'] += modified
+            self.totals['ignorados'] += len(batch) - len(changed_ids)
+        if not self.dry_run:
+            self.db[CHECKPOINTS].update_one(
+                {'_id': self.checkpoint_id(partition)},
+                {'$set': {'ultimo_id': ids[-1], 'atualizado_em': datetime.now().isoformat()},
+                 '$inc': {'lidos': len(batch), 'alterados': modified}},
+            )
+        logging.info(f"Partição {partition}: lote de {len(batch)} documento(s), {modified} alterado(s)"
+                     f"{' (dry-run)' if self.dry_run else ''}; último _id {ids[-1]}.")
+
+    def _resync_derived(self, batch, changed_ids):
+        """Atualiza coleções derivadas e totais do dashboard dos documentos alterados (chaves antigas e novas)."""
+        changed = set(changed_ids)
+        keys = {aggregate_key(doc) for doc in batch if doc['_id'] in changed}
+        documents = [(doc['_id'], doc) for doc in self.coll.find({'_id': {'$in': changed_ids}}, CHILD_PROJECTION)]
+        sync_child_collections(self.db, documents)
+        keys.update(aggregate_key(doc) for _, doc in documents)
+        refresh_aggregates(self.db, keys)
+
+
+def run_migration(db, migration, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, partitions=1, restart=False,
+                  limit=0):
+    """Atalho para `MigrationRunner(...).run(...)`."""
+    runner = MigrationRunner(db, migration, batch_size=batch_size, dry_run=dry_run, limit=limit)
+    return runner.run(partitions=partitions, restart=restart)
+
+
+def add_run_arguments(parser):
+    """Opções do executor, compartilhadas com os scripts de cada migração."""
+    parser.add_argument('--dry-run', action='store_true', help='Só conta e mostra exemplos das alterações.')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f'Documentos por lote (padrão: {DEFAULT_BATCH_SIZE}).')
+    parser.add_argument('--partitions', type=int, default=1,
+                        help='Faixas de _id processadas em paralelo (padrão: 1).')
+    parser.add_argument('--restart', action='store_true', help='Ignora os pontos de retomada salvos.')
+    parser.add_argument('--limit', type=int, default=0, help='No máximo N documentos por partição (0 = todos).')
+
+
+def run_from_args(db, migration, args):
+    """Executa a migração com as opções de `add_run_arguments` e registra o resultado."""
+    totals = run_migration(db, migration, batch_size=args.batch_size, dry_run=args.dry_run,
+                           partitions=max(1, args.partitions), restart=args.restart, limit=max(0, args.limit))
+    logging.info(f"Migração '{migration.name}' finalizada{' (dry-run)' if args.dry_run else ''}: "
+                 f"{totals['lidos']} lidos, {totals['alterados']} alterados, {totals['ignorados']} ignorados.")
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Executa migrações de manutenção da coleção projetos.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help='Lista as migrações disponíveis.')
+    run_parser = subparsers.add_parser('run', help='Executa (ou retoma) uma migração.')
+    run_parser.add_argument('name', help='Nome da migração.')
+    add_run_arguments(run_parser)
+    status_parser = subparsers.add_parser('status', help='Mostra os pontos de retomada de uma migração.')
+    status_parser.add_argument('name', help='Nome da migração.')
+    args = parser.parse_args()
+
+    migrations = load_migrations()
+    if args.command == 'list':
+        for name, migration in migrations.items():
+            print(f'{name}: {migration.description}')
+        return
+    if args.name not in migrations:
+        logging.error(f"Migração desconhecida: '{args.name}'. Disponíveis: {', '.join(migrations)}.")
+        sys.exit(1)
+
+    client = get_mongo_client()
+    try:
+        db = client.get_database()
+        if args.command == 'status':
+            for checkpoint in db[CHECKPOINTS].find({'migracao': args.name}).sort('particao', 1):
+                print(json.dumps(checkpoint, ensure_ascii=False, default=str))
+        else:
+            run_from_args(db, migrations[args.name], args)
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,35 @@
 import re
 import logging
+from itertools import islice
 from datetime import datetime
 import os
 
+# --- Marcadores de Seção ---
+# Cabeçalhos e textos que a normalização procura. A extração direcionada
+# (`process_pdf.extract_pdf_data(targeted=True)`) usa os mesmos marcadores para
+# decidir em quais páginas vale a pena rodar a detecção de tabelas.
+
+IDENTIFICACAO_HEADER = "IDENTIFICAÇÃO DA UNIDADE"
+ANALISE_CENARIO_HEADER = "ANÁLISE DO CENÁRIO"
+SITUACOES_PROBLEMA_HEADER = "APONTAMENTO DE SITUAÇÕES-PROBLEMA"
+PROJECT_TABLE_HEADER = "AÇÃO/PROJETO (Tema)"
+ANEXO1_MARKER = "Anexo 1 – Lista de aquisições"
+
+def page_needs_tables(page_text, numero_pagina):
+    """
+    Indica se as tabelas de uma página podem ser usadas pela normalização.
+
+    A primeira página é sempre necessária (identificação, cenário e
+    situações-problema); nas demais só interessam as tabelas de projetos e as
+    páginas do Anexo 1. O teste de projeto usa apenas "AÇÃO/PROJETO" porque o
+    sufixo "(Tema)" pode quebrar de linha no texto da página.
+    """
+    if numero_pagina == 1:
+        return True
+    if not page_text:
+        return False
+    return PROJECT_TABLE_HEADER.split(" ")[0] in page_text or ANEXO1_MARKER in page_text
+
 # --- Funções Auxiliares de Extração e Limpeza ---
 
 def parse_currency(value_str: str) -> float | None:
@@ -51,13 +78,18 @@ def get_value_from_table(table, label):
                     return cell.strip()
     return ""
 
-def get_multiline_value(table, start_label, stop_label):
-    """Extrai um valor de múltiplas linhas entre um rótulo inicial e final."""
+def get_multiline_value(table, start_label, stop_label, start=0):
+    """
+    Extrai um valor de múltiplas linhas entre um rótulo inicial e final.
+
+    `start` permite começar a varredura em uma linha já conhecida (ver
+    `ProjectTableIndex`); as linhas anteriores ao rótulo inicial não contribuem.
+    """
     if not table:
         return ""
     capturing = False
     text_lines = []
-    for row in table:
+    for row in islice(table, start, None):
         # Se a primeira célula estiver vazia, só continuamos se já estivermos capturando
         if not row:
             continue
@@ -106,109 +138,242 @@ def extract_institution_from_text(pages):
     logging.warning("Nenhuma instituição conhecida foi detectada no texto do PDF.")
     return None
 
+# --- Indexação das Tabelas ---
+# As tabelas são classificadas pelo cabeçalho em uma única passada pelas
+# páginas, e cada tabela de projeto é percorrida uma única vez para montar o
+# índice rótulo → linhas. Os extratores de seção leem desse índice em vez de
+# varrer o documento (e cada tabela) novamente para cada campo.
+
+FIRST_PAGE_HEADERS = (IDENTIFICACAO_HEADER, ANALISE_CENARIO_HEADER, SITUACOES_PROBLEMA_HEADER)
+PROJECT_VALUE_LABELS = ("Origem (prioridade):", "Custo R$ (se houver):", "Fonte(s) dos recursos:", "Período de execução:")
+PROJECT_MULTILINE_LABELS = ("O que será feito:", "Por que será feito:")
+TEAM_LABELS = ("Responsável:", "Colaborador(a):")
+PROJECT_TITLE_PREFIX = re.compile(r'^AÇÃO/PROJETO \(Tema\)\s*')
+DATE_PATTERN = re.compile(r'\d{2}/\d{2}/\d{4}')
+
+def classify_page_tables(page, is_first_page, first_page_tables, project_tables, acquisition_tables):
+    """
+    Classifica as tabelas de uma página pelo cabeçalho, acrescentando-as às
+    coleções informadas: tabelas da primeira página (por cabeçalho, a primeira
+    encontrada), tabelas de projeto e tabelas de aquisição do Anexo 1.
+    """
+    is_anexo1 = bool(page.get('texto')) and ANEXO1_MARKER in page['texto']
+    for table in page.get('tabelas', []):
+        if not (table and table[0]):
+            continue
+        header_row = table[0]
+        if is_first_page:
+            for header in FIRST_PAGE_HEADERS:
+                if header not in first_page_tables and header in str(header_row[0]):
+                    first_page_tables[header] = table
+        if PROJECT_TABLE_HEADER in str(header_row):
+            project_tables.append(table)
+        if is_anexo1 and "Item" in header_row[0] and "Projeto" in str(header_row[1]):
+            acquisition_tables.append(table)
+
+def classify_tables(pages):
+    """Percorre as páginas uma única vez e separa as tabelas por seção."""
+    first_page_tables = {}
+    project_tables = []
+    acquisition_tables = []
+    for i, page in enumerate(pages):
+        classify_page_tables(page, i == 0, first_page_tables, project_tables, acquisition_tables)
+    return {
+        "primeira_pagina": first_page_tables,
+        "projetos": project_tables,
+        "aquisicoes": acquisition_tables,
+    }
+
+class ProjectTableIndex:
+    """
+    Índice de uma tabela `AÇÃO/PROJETO (Tema)` montado em uma única passada:
+    linhas que contêm cada rótulo de valor, primeira linha que começa com cada
+    rótulo de texto multilinha e linhas de equipe dentro do bloco Responsável →
+    Período de execução.
+    """
+
+    __slots__ = ("table", "value_rows", "start_rows", "team_rows")
+
+    def __init__(self, table):
+        self.table = table
+        self.value_rows = {label: [] for label in PROJECT_VALUE_LABELS}
+        self.start_rows = {}
+        self.team_rows = []
+        is_capturing_team = False
+        for i, row in enumerate(table):
+            if not row or not row[0]:
+                continue
+            first_cell = row[0]
+            for label in PROJECT_VALUE_LABELS:
+                if label in first_cell:
+                    self.value_rows[label].append(i)
+
+            label = first_cell.strip()
+            for start_label in PROJECT_MULTILINE_LABELS:
+                if start_label not in self.start_rows and label.startswith(start_label):
+                    self.start_rows[start_label] = i
+
+            if label.startswith("Responsável:"):
+                is_capturing_team = True
+            if is_capturing_team and label.startswith(TEAM_LABELS):
+                self.team_rows.append(i)
+            if label.startswith("Período de execução:"):
+                is_capturing_team = False
+
+    def value(self, label):
+        """Equivalente a `get_value_from_table(table, label)` usando o índice."""
+        for i in self.value_rows[label]:
+            for cell in self.table[i][1:]:
+                if cell:
+                    return cell.strip()
+        return ""
+
+    def multiline(self, start_label, stop_label):
+        """Equivalente a `get_multiline_value(table, start_label, stop_label)` usando o índice."""
+        start = self.start_rows.get(start_label)
+        if start is None:
+            return ""
+        return get_multiline_value(self.table, start_label, stop_label, start=start)
+
+    def periodo_execucao(self):
+        rows = self.value_rows["Período de execução:"]
+        if rows:
+            row = self.table[rows[0]]
+            datas = DATE_PATTERN.findall(" ".join(filter(None, row)))
+            if len(datas) >= 2:
+                return {"data_inicial": datas[0], "data_final": datas[1]}
+        return {}
+
+    def equipe(self):
+        equipe = []
+        for i in self.team_rows:
+            row = self.table[i]
+            label = row[0].strip()
+            nome = row[1].replace("<nome>", "").strip() if len(row) > 1 and row[1] else ""
+            carga_horaria = parse_workload(row[6]) if len(row) > 6 else 0
+            tipo_hora = row[8] if len(row) > 8 else ""
+
+            if nome and nome.lower() != 'nn':
+                equipe.append({
+                    "funcao": "Responsável" if label.startswith("Responsável") else "Colaborador",
+                    "nome": nome,
+                    "carga_horaria_semanal": carga_horaria,
+                    "tipo_hora": tipo_hora.strip()
+                })
+        return equipe
+
 # --- Funções de Extração de Seções ---
 
-def extract_project_data(pages):
-    """Extrai todos os dados de projetos das tabelas encontradas."""
+def extract_project(table):
+    """Extrai os dados de um projeto a partir da sua tabela `AÇÃO/PROJETO (Tema)`."""
+    # Extração do Título e Código
+    title_cell = " ".join(filter(None, table[0]))
+    codigo_match = re.search(r'(\d+)', title_cell)
+    codigo_acao = codigo_match.group(1) if codigo_match else ""
+    # Remove o prefixo "AÇÃO/PROJETO (Tema) <código>" com um padrão pré-compilado
+    # (montar um regex por código esgotava o cache do módulo `re` em documentos grandes)
+    titulo = title_cell
+    prefix = PROJECT_TITLE_PREFIX.match(title_cell)
+    if prefix and title_cell.startswith(codigo_acao, prefix.end()):
+        titulo = title_cell[prefix.end() + len(codigo_acao):]
+    titulo = titulo.strip()
+
+    index = ProjectTableIndex(table)
+    return {
+        "codigo_acao": codigo_acao,
+        "titulo": titulo,
+        "origem_prioridade": index.value("Origem (prioridade):"),
+        "o_que_sera_feito": index.multiline("O que será feito:", "Por que será feito:"),
+        "por_que_sera_feito": index.multiline("Por que será feito:", "Responsável:"),
+        "custo_estimado": parse_currency(index.value("Custo R$ (se houver):")),
+        "fonte_recursos": index.value("Fonte(s) dos recursos:"),
+        "periodo_execucao": index.periodo_execucao(),
+        "equipe": index.equipe(),
+        "etapas_processo": [], # Lógica de etapas pode ser adicionada aqui se necessário
+    }
+
+def extract_projects_from_tables(project_tables):
+    """Extrai os projetos das tabelas já classificadas, ignorando as que falharem."""
     projetos = []
-    for page in pages:
-        for table in page.get('tabelas', []):
-            if table and table[0] and "AÇÃO/PROJETO (Tema)" in str(table[0]):
-                try:
-                    # Extração do Título e Código
-                    title_cell = " ".join(filter(None, table[0]))
-                    codigo_match = re.search(r'(\d+)', title_cell)
-                    codigo_acao = codigo_match.group(1) if codigo_match else ""
-                    titulo = re.sub(r'^AÇÃO/PROJETO \(Tema\)\s*' + re.escape(codigo_acao), '', title_cell, 1).strip()
-
-                    # Extração da Equipe
-                    equipe = []
-                    is_capturing_team = False
-                    for row in table:
-                        if not row or not row[0]: continue
-                        
-                        label = row[0].strip()
-                        if label.startswith("Responsável:"):
-                            is_capturing_team = True
-                        
-                        if is_capturing_team:
-                            if label.startswith(("Responsável:", "Colaborador(a):")):
-                                nome = row[1].replace("<nome>", "").strip() if len(row) > 1 and row[1] else ""
-                                carga_horaria = parse_workload(row[6]) if len(row) > 6 else 0
-                                tipo_hora = row[8] if len(row) > 8 else ""
-                                
-                                if nome and nome.lower() != 'nn':
-                                    equipe.append({
-                                        "funcao": "Responsável" if label.startswith("Responsável") else "Colaborador",
-                                        "nome": nome,
-                                        "carga_horaria_semanal": carga_horaria,
-                                        "tipo_hora": tipo_hora.strip()
-                                    })
-                        
-                        if label.startswith("Período de execução:"):
-                            is_capturing_team = False
-
-                    # Extração do Período
-                    periodo_execucao = {}
-                    for row in table:
-                        if row and row[0] and "Período de execução:" in row[0]:
-                            datas = re.findall(r'\d{2}/\d{2}/\d{4}', " ".join(filter(None, row)))
-                            if len(datas) >= 2:
-                                periodo_execucao = {"data_inicial": datas[0], "data_final": datas[1]}
-                            break
-
-                    projeto = {
-                        "codigo_acao": codigo_acao,
-                        "titulo": titulo,
-                        "origem_prioridade": get_value_from_table(table, "Origem (prioridade):"),
-                        "o_que_sera_feito": get_multiline_value(table, "O que será feito:", "Por que será feito:"),
-                        "por_que_sera_feito": get_multiline_value(table, "Por que será feito:", "Responsável:"),
-                        "custo_estimado": parse_currency(get_value_from_table(table, "Custo R$ (se houver):")),
-                        "fonte_recursos": get_value_from_table(table, "Fonte(s) dos recursos:"),
-                        "periodo_execucao": periodo_execucao,
-                        "equipe": equipe,
-                        "etapas_processo": [], # Lógica de etapas pode ser adicionada aqui se necessário
-                    }
-                    projetos.append(projeto)
-                except Exception as e:
-                    logging.warning(f"Falha ao extrair um projeto da tabela: {e}", exc_info=True)
-                    continue
+    for table in project_tables:
+        try:
+            projetos.append(extract_project(table))
+        except Exception as e:
+            logging.warning(f"Falha ao extrair um projeto da tabela: {e}", exc_info=True)
+            continue
     return projetos
 
-def extract_acquisitions(pages):
-    """Extrai a lista de aquisições do Anexo 1."""
+def extract_project_data(pages):
+    """Extrai todos os dados de projetos das tabelas encontradas."""
+    return extract_projects_from_tables(classify_tables(pages)["projetos"])
+
+def extract_acquisitions_from_tables(acquisition_tables):
+    """Extrai as linhas de aquisição das tabelas do Anexo 1 já classificadas."""
     aquisicoes = []
-    for page in pages:
-        if page.get('texto') and "Anexo 1 – Lista de aquisições" in page['texto']:
-            for table in page.get('tabelas', []):
-                if table and table[0] and "Item" in table[0][0] and "Projeto" in str(table[0][1]):
-                    # Pula cabeçalhos que podem ter múltiplas linhas
-                    data_rows = [row for row in table if row and row[0] and row[0].isdigit()]
-                    for row in data_rows:
-                        try:
-                            aquisicoes.append({
-                                "item": int(row[0]),
-                                "projeto_referencia": str(row[1]).strip().replace('\n', ' '),
-                                "denominacao": str(row[2]).strip(),
-                                "quantidade": int(row[3]) if row[3] and row[3].isdigit() else 0,
-                                "preco_total_estimado": parse_currency(row[4])
-                            })
-                        except (IndexError, TypeError, ValueError) as e:
-                            logging.warning(f"Falha ao processar linha de aquisição: {row}. Erro: {e}")
-                            continue
+    for table in acquisition_tables:
+        # Pula cabeçalhos que podem ter múltiplas linhas
+        data_rows = [row for row in table if row and row[0] and row[0].isdigit()]
+        for row in data_rows:
+            try:
+                aquisicoes.append({
+                    "item": int(row[0]),
+                    "projeto_referencia": str(row[1]).strip().replace('\n', ' '),
+                    "denominacao": str(row[2]).strip(),
+                    "quantidade": int(row[3]) if row[3] and row[3].isdigit() else 0,
+                    "preco_total_estimado": parse_currency(row[4])
+                })
+            except (IndexError, TypeError, ValueError) as e:
+                logging.warning(f"Falha ao processar linha de aquisição: {row}. Erro: {e}")
+                continue
     return aquisicoes
 
-# --- Função Principal de Normalização ---
+def extract_acquisitions(pages):
+    """Extrai a lista de aquisições do Anexo 1."""
+    return extract_acquisitions_from_tables(classify_tables(pages)["aquisicoes"])
 
-def normalize_data(extracted_data, file_path, institution_name_from_user, year):
-    """Normaliza os dados extraídos para o formato final do JSON."""
-    try:
-        logging.info("Iniciando normalização...")
-        
+# --- Normalização Incremental ---
+
+class IncrementalNormalizer:
+    """
+    Normalização página a página, usada pelo pipeline em streaming.
+
+    `feed(page)` classifica as tabelas da página e extrai na hora os projetos e
+    as aquisições; a página pode ser descartada em seguida. Do documento bruto
+    ficam apenas o texto das 3 primeiras páginas (detecção da instituição) e as
+    tabelas de seção da primeira página. `finish` monta o JSON final, idêntico
+    ao de `normalize_data` para as mesmas páginas. As páginas cuja detecção de
+    tabelas foi interrompida por tempo (`tabelas_tempo_esgotado`) ficam
+    listadas em `metadados_extracao.paginas_sem_tabelas_por_tempo`, e
+    `metadados_extracao.extracao_parcial` diz se houve alguma: sem projetos e
+    com `extracao_parcial` falso, o documento estava mesmo vazio.
+    """
+
+    def __init__(self):
+        self.paginas = 0
+        self.first_pages = []
+        self.first_page_tables = {}
+        self.acoes_projetos = []
+        self.anexo1_aquisicoes = []
+        self.paginas_sem_tabelas = []
+
+    def feed(self, page):
+        project_tables = []
+        acquisition_tables = []
+        classify_page_tables(page, self.paginas == 0, self.first_page_tables, project_tables, acquisition_tables)
+        if self.paginas < 3:
+            self.first_pages.append({"texto": page.get("texto")})
+        self.paginas += 1
+        if page.get("tabelas_tempo_esgotado"):
+            self.paginas_sem_tabelas.append(page.get("numero_pagina", self.paginas))
+        self.acoes_projetos.extend(extract_projects_from_tables(project_tables))
+        self.anexo1_aquisicoes.extend(extract_acquisitions_from_tables(acquisition_tables))
+
+    def finish(self, file_path, institution_name_from_user, year):
+        """Monta os dados normalizados; lança ValueError se nenhuma página foi recebida."""
         # Lógica de Prioridade Invertida: Prioriza a entrada do usuário.
         # 1. Usa o nome fornecido pelo usuário como primário.
         # 2. Se o usuário não forneceu um nome, tenta detectar no PDF como fallback.
-        detected_institution = extract_institution_from_text(extracted_data)
+        detected_institution = extract_institution_from_text(self.first_pages)
         
         final_institution_name = institution_name_from_user or detected_institution
         
@@ -222,10 +387,13 @@ def normalize_data(extracted_data, file_path, institution_name_from_user, year):
                 f"Priorizando o nome fornecido pelo usuário, conforme solicitado."
             )
 
-        first_page = extracted_data[0]
-        
+        if not self.paginas:
+            raise ValueError("Nenhuma página extraída.")
+
+        first_page_tables = self.first_page_tables
+
         # Extração da Identificação da Unidade
-        identificacao_table = find_table_by_header(first_page, "IDENTIFICAÇÃO DA UNIDADE")
+        identificacao_table = first_page_tables.get(IDENTIFICACAO_HEADER, [])
         identificacao_unidade = {}
         if identificacao_table:
             unidade_raw = get_value_from_table(identificacao_table, "Unidade")
@@ -245,9 +413,9 @@ def normalize_data(extracted_data, file_path, institution_name_from_user, year):
             identificacao_unidade = {"codigo": fallback_code, "nome": final_institution_name, "diretor": ""}
 
         # Extração das outras seções
-        analise_cenario = get_multiline_value(find_table_by_header(first_page, "ANÁLISE DO CENÁRIO"), "ANÁLISE DO CENÁRIO", "APONTAMENTO DE SITUAÇÕES-PROBLEMA")
+        analise_cenario = get_multiline_value(first_page_tables.get(ANALISE_CENARIO_HEADER, []), ANALISE_CENARIO_HEADER, SITUACOES_PROBLEMA_HEADER)
         
-        situacoes_problema_table = find_table_by_header(first_page, "APONTAMENTO DE SITUAÇÕES-PROBLEMA")
+        situacoes_problema_table = first_page_tables.get(SITUACOES_PROBLEMA_HEADER, [])
         situacoes_problema_gerais = []
         if situacoes_problema_table:
             for row in situacoes_problema_table[1:]:
@@ -255,8 +423,8 @@ def normalize_data(extracted_data, file_path, institution_name_from_user, year):
                     if cell and "cat" in cell:
                         situacoes_problema_gerais.append(cell.strip().replace('\n', ' '))
 
-        acoes_projetos = extract_project_data(extracted_data)
-        anexo1_aquisicoes = extract_acquisitions(extracted_data)
+        acoes_projetos = self.acoes_projetos
+        anexo1_aquisicoes = self.anexo1_aquisicoes
 
         normalized_data = {
             "ano_referencia": int(year),
@@ -266,15 +434,29 @@ def normalize_data(extracted_data, file_path, institution_name_from_user, year):
             "analise_cenario": analise_cenario,
             "metadados_extracao": {
                 "nome_arquivo_original": os.path.basename(file_path),
-                "data_extracao": datetime.now().isoformat()
+                "data_extracao": datetime.now().isoformat(),
+                "extracao_parcial": bool(self.paginas_sem_tabelas),
             },
-            "situacoes_problema_gerais": list(set(situacoes_problema_gerais)), # Remove duplicatas
+            "situacoes_problema_gerais": list(dict.fromkeys(situacoes_problema_gerais)), # Remove duplicatas mantendo a ordem
             "acoes_projetos": acoes_projetos,
             "anexo1_aquisicoes": anexo1_aquisicoes
         }
+        if self.paginas_sem_tabelas:
+            normalized_data["metadados_extracao"]["paginas_sem_tabelas_por_tempo"] = self.paginas_sem_tabelas
         
         logging.info(f"Normalização concluída para '{final_institution_name}'. {len(acoes_projetos)} projetos e {len(anexo1_aquisicoes)} aquisições encontradas.")
         return normalized_data
+
+# --- Função Principal de Normalização ---
+
+def normalize_data(extracted_data, file_path, institution_name_from_user, year):
+    """Normaliza os dados extraídos para o formato final do JSON."""
+    try:
+        logging.info("Iniciando normalização...")
+        normalizer = IncrementalNormalizer()
+        for page in extracted_data or []:
+            normalizer.feed(page)
+        return normalizer.finish(file_path, institution_name_from_user, year)
         
     except Exception as e:
         logging.error(f"Erro catastrófico ao normalizar dados: {e}", exc_info=True)
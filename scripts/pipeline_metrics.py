@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Métricas do pipeline: contadores, histogramas e a coleção `processing_runs`.
+
+O `logProcessingMetrics` do Node só registra o início e o fim de cada upload.
+Aqui cada execução do pipeline vira um registro com a duração de cada etapa
+(`extracao`, `normalizacao`, `extracao_normalizacao`, `envio`), páginas por
+segundo, tabelas por página, bytes lidos e escritos, o resultado do cache de
+extração, as páginas reaproveitadas e as idas e voltas ao MongoDB.
+
+- `RunRecorder` monta o registro a partir dos eventos de progresso (ver
+  progress_events.py): os `stage_end` trazem as durações e as contagens e os
+  `page` as tabelas de cada página, então as etapas não precisam de outra
+  instrumentação; os comandos enviados ao MongoDB são contados por execução,
+  pelo listener dos clientes, só no thread que está dentro de `counting()`;
+- `PipelineMetrics` acumula os registros em contadores e histogramas no
+  formato texto do Prometheus, gravados em um arquivo (PGA_METRICS_FILE, para
+  o textfile collector do node_exporter) e/ou servidos em
+  http://localhost:<PGA_METRICS_PORT>/metrics pelos workers de longa duração;
+- cada registro também é acrescentado à coleção `processing_runs` (índice por
+  `ts`), de onde o comando `report` calcula p50/p95/p99 por etapa em uma
+  janela de tempo.
+
+Uso:
+    python3 scripts/pipeline_metrics.py report [--since 24h] [--origem fila] [--json]
+"""
+
+import argparse
+import contextvars
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pymongo import ASCENDING, monitoring
+
+# Adiciona o diretório do script ao path do Python para importar módulos locais
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+PROCESSING_RUNS = 'processing_runs'
+METRICS_FILE_ENV = 'PGA_METRICS_FILE'
+METRICS_PORT_ENV = 'PGA_METRICS_PORT'
+
+# Limites superiores dos baldes dos histogramas (o +Inf é implícito)
+DURATION_BUCKETS_S = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+PAGES_PER_SECOND_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200)
+TABLES_PER_PAGE_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 20)
+PERCENTILES = (50, 95, 99)
+EXTRACTION_STAGES = ('extracao', 'extracao_normalizacao')
+
+_WINDOW_UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+
+
+# Contadores ativos no contexto atual (cada thread tem o seu): um comando conta em todos eles
+_ACTIVE_COUNTERS = contextvars.ContextVar('pga_round_trip_counters', default=())
+
+
+class RoundTripCounter(monitoring.CommandListener):
+    """
+    Listener dos clientes criados por get_mongo_client: cada comando enviado
+    ao MongoDB conta nos contadores ativos no thread que o enviou (ver
+    `count_round_trips`).
+    """
+
+    def started(self, event):
+        for counter in _ACTIVE_COUNTERS.get():
+            counter.total += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# Registrado nos clientes de get_mongo_client (ver send_to_mongo.py)
+ROUND_TRIPS = RoundTripCounter()
+
+
+class RoundTrips:
+    """Comandos enviados ao MongoDB enquanto ativo em `count_round_trips`."""
+
+    def __init__(self):
+        self.total = 0
+
+
+@contextmanager
+def count_round_trips(counter=None):
+    """
+    Conta em `counter` (padrão: um RoundTrips novo, devolvido pelo `with`) os
+    comandos que o thread atual envia ao MongoDB dentro do bloco. Execuções em
+    outros threads ou processos não entram na conta.
+    """
+    counter = counter if counter is not None else RoundTrips()
+    token = _ACTIVE_COUNTERS.set(_ACTIVE_COUNTERS.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _ACTIVE_COUNTERS.reset(token)
+
+
+class RunRecorder:
+    """
+    Monta o registro de uma execução do pipeline a partir dos eventos de
+    progresso. `context` (arquivo, instituição, ano, origem) é copiado no
+    registro. Os comandos enviados ao MongoDB dentro de `counting()` entram
+    em `mongo_round_trips`; quando a gravação é feita em outro processo (fila
+    e lote), quem grava soma os seus com `add_round_trips`.
+    """
+
+    def __init__(self, **context):
+        self.context = context
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self.round_trips = RoundTrips()
+        self.etapas = {}
+        self.counts = {}
+        self.tabelas_por_pagina = Counter()
+
+    def write(self, event):
+        """Destino de eventos (ver `ProgressEvents.also`)."""
+        if event.get('event') == 'page' and event.get('tables') is not None:
+            self.tabelas_por_pagina[event['tables']] += 1
+        elif event.get('event') == 'stage_end':
+            etapa = {'duracao_ms': event.get('duration_ms'), 'status': event.get('status')}
+            if event.get('code'):
+                etapa['codigo'] = event['code']
+            self.etapas[event['stage']] = etapa
+            self.counts.update(event.get('counts') or {})
+
+    def attach(self, events):
+        """Emissor com o mesmo destino e contexto de `events` que também alimenta este registro."""
+        return events.also(self.write)
+
+    def counting(self):
+        """Bloco cujos comandos ao MongoDB (no thread atual) contam para esta execução."""
+        return count_round_trips(self.round_trips)
+
+    def finish(self):
+        """O registro da execução, pronto para `PipelineMetrics.record_run`."""
+        erro = next((etapa for etapa in self.etapas.values() if etapa['status'] == 'erro'), None)
+        paginas = self.counts.get('paginas')
+        extracao = next((self.etapas[name] for name in EXTRACTION_STAGES if name in self.etapas), None)
+        paginas_por_s = None
+        # Com o cache de extração a "extração" é só a leitura do cache e a vazão não diz nada
+        if paginas and extracao and extracao['duracao_ms'] and self.counts.get('cache') != 'hit':
+            paginas_por_s = round(paginas / (extracao['duracao_ms'] / 1000), 2)
+        tabelas = self.counts.get('tabelas')
+        if tabelas is None and self.tabelas_por_pagina:
+            tabelas = sum(n * count for n, count in self.tabelas_por_pagina.items())
+        reaproveitadas = self.counts.get('paginas_reaproveitadas')
+        record = dict(self.context)
+        record.update({
+            'ts': self.started_at,
+            'duracao_ms': round((time.perf_counter() - self._start) * 1000, 1),
+            'status': 'erro' if erro else 'ok',
+            'codigo': erro.get('codigo') if erro else None,
+            'etapas': self.etapas,
+            'paginas': paginas,
+            'paginas_por_s': paginas_por_s,
+            'tabelas': tabelas,
+            # Chaves de documento no MongoDB precisam ser strings
+            'tabelas_por_pagina': {str(n): count for n, count in sorted(self.tabelas_por_pagina.items())},
+            'cache': self.counts.get('cache'),
+            'paginas_reaproveitadas': len(reaproveitadas) if isinstance(reaproveitadas, list) else 0,
+            'bytes_lidos': self.counts.get('bytes_lidos'),
+            'bytes_escritos': self.counts.get('bytes_escritos'),
+            'mongo_round_trips': self.round_trips.total,
+        })
+        return record
+
+
+def add_round_trips(record, round_trips):
+    """Soma a um registro já montado os comandos ao MongoDB de uma gravação feita em outro processo."""
+    record['mongo_round_trips'] = (record.get('mongo_round_trips') or 0) + round_trips
+    return record
+
+
+class _Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+
+    def render(self, name, labels=''):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+        suffix = f'{{{labels}}}' if labels else ''
+        lines.append(f'{name}_sum{suffix} {self.total:g}')
+        lines.append(f'{name}_count{suffix} {cumulative}')
+        return lines
+
+
+class PipelineMetrics:
+    """
+    Contadores e histogramas das execuções registradas neste processo, no
+    formato texto do Prometheus. `textfile`, se informado, é regravado a cada
+    execução registrada.
+    """
+
+    def __init__(self, textfile=None):
+        self.textfile = textfile
+        self._lock = threading.Lock()
+        self.runs = Counter()
+        self.totals = Counter()
+        self.cache = Counter()
+        self.stage_durations = defaultdict(lambda: _Histogram(DURATION_BUCKETS_S))
+        self.pages_per_second = _Histogram(PAGES_PER_SECOND_BUCKETS)
+        self.tables_per_page = _Histogram(TABLES_PER_PAGE_BUCKETS)
+
+    def observe_run(self, record):
+        with self._lock:
+            self.runs[record['status']] += 1
+            for stage, etapa in record['etapas'].items():
+                if etapa.get('duracao_ms') is not None:
+                    self.stage_durations[stage].observe(etapa['duracao_ms'] / 1000)
+            if record.get('paginas_por_s') is not None:
+                self.pages_per_second.observe(record['paginas_por_s'])
+            for tabelas, paginas in record.get('tabelas_por_pagina', {}).items():
+                for _ in range(paginas):
+                    self.tables_per_page.observe(int(tabelas))
+            if record.get('cache'):
+                self.cache[record['cache']] += 1
+            for field in ('paginas', 'tabelas', 'paginas_reaproveitadas', 'bytes_lidos', 'bytes_escritos',
+                          'mongo_round_trips'):
+                self.totals[field] += record.get(field) or 0
+
+    def render(self):
+        """As métricas no formato texto de exposição do Prometheus."""
+        with self._lock:
+            lines = ['# HELP pga_runs_total Execuções do pipeline por status.', '# TYPE pga_runs_total counter']
+            lines += [f'pga_runs_total{{status="{status}"}} {count}' for status, count in sorted(self.runs.items())]
+            lines += ['# HELP pga_stage_duration_seconds Duração de cada etapa do pipeline.',
+                      '# TYPE pga_stage_duration_seconds histogram']
+            for stage, histogram in sorted(self.stage_durations.items()):
+                lines += histogram.render('pga_stage_duration_seconds', f'stage="{stage}"')
+            lines += ['# HELP pga_pages_per_second Vazão da extração por documento (sem as leituras do cache).',
+                      '# TYPE pga_pages_per_second histogram']
+            lines += self.pages_per_second.render('pga_pages_per_second')
+            lines += ['# HELP pga_tables_per_page Tabelas encontradas por página.',
+                      '# TYPE pga_tables_per_page histogram']
+            lines += self.tables_per_page.render('pga_tables_per_page')
+            lines += ['# HELP pga_extraction_cache_total Consultas ao cache de extração por resultado.',
+                      '# TYPE pga_extraction_cache_total counter']
+            lines += [f'pga_extraction_cache_total{{result="{result}"}} {count}'
+                      for result, count in sorted(self.cache.items())]
+            for field, name, help_text in (
+                    ('paginas', 'pga_pages_total', 'Páginas extraídas.'),
+                    ('tabelas', 'pga_tables_total', 'Tabelas extraídas.'),
+                    ('paginas_reaproveitadas', 'pga_pages_reused_total', 'Páginas reaproveitadas do cache de páginas.'),
+                    ('bytes_lidos', 'pga_bytes_read_total', 'Bytes de PDF lidos.'),
+                    ('bytes_escritos', 'pga_bytes_written_total', 'Bytes gravados no MongoDB (documento e extração).'),
+                    ('mongo_round_trips', 'pga_mongo_round_trips_total', 'Comandos enviados ao MongoDB.')):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter', f'{name} {self.totals[field]}']
+            return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path=None):
+        """Grava as métricas em `path` (padrão: o `textfile`) de forma atômica."""
+        path = path or self.textfile
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def record_run(self, record, db=None):
+        """
+        Acumula o registro, regrava o arquivo de métricas e o acrescenta a
+        `processing_runs` se `db` foi informado; falhas só geram um aviso.
+        """
+        self.observe_run(record)
+        if self.textfile:
+            try:
+                self.write_textfile()
+            except OSError as e:
+                logging.warning(f"Não foi possível gravar as métricas em '{self.textfile}': {e}")
+        if db is not None:
+            try:
+                store_run(db, record)
+            except Exception as e:
+                logging.warning(f"Não foi possível gravar a execução em '{PROCESSING_RUNS}': {e}")
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serve as métricas em http://host:port/metrics em uma thread de fundo e devolve o servidor."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        logging.info(f"Métricas do pipeline em http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+
+_process_metrics = None
+
+
+def metrics_from_env():
+    """
+    As métricas deste processo, criadas na primeira chamada: com o arquivo de
+    PGA_METRICS_FILE e, se PGA_METRICS_PORT estiver definida, servidas por HTTP.
+    """
+    global _process_metrics
+    if _process_metrics is None:
+        _process_metrics = PipelineMetrics(textfile=os.getenv(METRICS_FILE_ENV) or None)
+        port = os.getenv(METRICS_PORT_ENV)
+        if port:
+            try:
+                _process_metrics.serve(int(port), host=os.getenv('PGA_METRICS_HOST', '127.0.0.1'))
+            except (ValueError, OSError) as e:
+                logging.warning(f"Não foi possível servir as métricas na porta {port}: {e}")
+    return _process_metrics
+
+
+# Coleções cujos índices já foram garantidos neste processo
+_indexed_collections = set()
+
+
+def store_run(db, record):
+    """Acrescenta o registro de uma execução a `processing_runs`."""
+    collection = db[PROCESSING_RUNS]
+    if collection.full_name not in _indexed_collections:
+        collection.create_index([('ts', ASCENDING)], name='ts')
+        _indexed_collections.add(collection.full_name)
+    collection.insert_one(dict(record))
+
+
+def percentile(sorted_values, p):
+    """Percentil `p` pelo método do posto mais próximo, sobre valores já ordenados."""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def summarize_runs(records):
+    """p50/p95/p99 da duração de cada etapa e do total (ms) e da vazão da extração (páginas/s)."""
+    series = defaultdict(list)
+    status = Counter()
+    for record in records:
+        status[record.get('status')] += 1
+        if record.get('duracao_ms') is not None:
+            series['total'].append(record['duracao_ms'])
+        for stage, etapa in (record.get('etapas') or {}).items():
+            if etapa.get('duracao_ms') is not None:
+                series[stage].append(etapa['duracao_ms'])
+        if record.get('paginas_por_s') is not None:
+            series['paginas_por_s'].append(record['paginas_por_s'])
+    summary = {}
+    for name, values in sorted(series.items()):
+        values.sort()
+        summary[name] = {'n': len(values), **{f'p{p}': percentile(values, p) for p in PERCENTILES}}
+    return {'execucoes': sum(status.values()), 'por_status': dict(status), 'series': summary}
+
+
+def parse_window(text):
+    """'30m', '24h' ou '7d' -> timedelta."""
+    unit = _WINDOW_UNITS.get(text[-1:].lower())
+    try:
+        amount = float(text[:-1])
+    except ValueError:
+        amount = None
+    if unit is None or amount is None or amount <= 0:
+        raise argparse.ArgumentTypeError(f"janela inválida '{text}' (use por exemplo 30m, 24h ou 7d)")
+    return timedelta(**{unit: amount})
+
+
+def report(db, window, origem=None):
+    """Resumo das execuções de `processing_runs` na janela de tempo informada."""
+    query = {'ts': {'$gte': datetime.now(timezone.utc) - window}}
+    if origem:
+        query['origem'] = origem
+    return summarize_runs(db[PROCESSING_RUNS].find(
+        query, {'_id': 0, 'status': 1, 'duracao_ms': 1, 'etapas': 1, 'paginas_por_s': 1}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Métricas das execuções do pipeline.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    report_parser = subparsers.add_parser('report', help='p50/p95/p99 por etapa em uma janela de tempo.')
+    report_parser.add_argument('--since', type=parse_window, default=timedelta(hours=24),
+                               help='Janela de tempo (ex.: 30m, 24h, 7d; padrão: 24h).')
+    report_parser.add_argument('--origem', choices=('cli', 'worker', 'fila', 'lote'), help='Só as execuções dessa origem.')
+    report_parser.add_argument('--json', action='store_true', help='Escreve o resumo em JSON.')
+    args = parser.parse_args()
+
+    # Importado aqui porque send_to_mongo importa este módulo
+    from send_to_mongo import get_mongo_client
+
+    client = get_mongo_client()
+    try:
+        summary = report(client.get_database(), args.since, origem=args.origem)
+    finally:
+        client.close()
+
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return
+    print(f"{summary['execucoes']} execuções ({', '.join(f'{s}: {n}' for s, n in summary['por_status'].items())})")
+    print(f"{'série':<24}{'n':>6}" + ''.join(f"{f'p{p}':>12}" for p in PERCENTILES))
+    for name, values in summary['series'].items():
+        unit = '' if name == 'paginas_por_s' else ' ms'
+        print(f'{name:<24}{values["n"]:>6}' + ''.join(f'{values[f"p{p}"]:>9g}{unit:<3}' for p in PERCENTILES))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Worker persistente do pipeline de processamento de PDF.
+
+Importa pdfplumber, a normalização e o cliente do MongoDB uma única vez e
+atende jobs por um protocolo de linhas JSON:
+
+- Entrada (stdin), um job por linha:
+    {"id": "abc", "pdf_path": "/app/uploads/x.pdf", "institution_name": "Fatec Votorantim", "year": 2025}
+  (campos opcionais: "workers" ativa a extração paralela das páginas,
+  "targeted" a extração direcionada de tabelas e "streaming" o processamento
+  página a página com memória limitada)
+- Saída (stdout), um evento por linha:
+    {"event": "ready"}
+    {"id": "abc", "event": "progress", "stage": "extracao", "message": "..."}
+    {"id": "abc", "event": "stage_start", "stage": "extracao", "ts": ...}
+    {"id": "abc", "event": "page", "stage": "extracao", "page": 3, "total": 40, "tables": 2, "ts": ...}
+    {"id": "abc", "event": "stage_end", "stage": "extracao", "status": "ok", "duration_ms": 812.4, "counts": {...}, "ts": ...}
+    {"id": "abc", "event": "done", "result": {...}}
+    {"id": "abc", "event": "error", "stage": "normalizacao", "code": "normalizacao_falhou", "message": "..."}
+
+Os eventos `stage_start`, `page` e `stage_end` são os de progress_events.py.
+
+As rotas da interface web que gravam em `projetos` também passam por aqui,
+para que as coleções derivadas, as identidades, a extração guardada e os totais
+do dashboard sejam mantidos pelo mesmo código do pipeline. Esses comandos
+respondem com `done` (com `result`) ou `error`:
+    {"id": "abc", "command": "save_approved", "document_id": "...", "user_id": "..."}
+    {"id": "abc", "command": "sync_projects", "project_ids": ["..."], "previous_keys": [["123", 2025]]}
+    {"id": "abc", "command": "delete_project", "project_id": "..."}
+A aplicação (lib/pipelineWorker.ts) inicia um processo para os PDFs e outro
+para esses comandos, e encerra o processo que fica sem responder além do
+tempo máximo da chamada.
+Os logs continuam indo para stderr (nível em PGA_LOG_LEVEL; DEBUG inclui os
+logs por página). O worker termina quando o stdin é fechado
+ou ao receber {"command": "shutdown"}.
+
+Uso:
+    python3 scripts/pipeline_worker.py
+"""
+
+import sys
+import os
+import json
+import logging
+
+# Adiciona o diretório do script ao path do Python para importar módulos locais
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from job_queue import save_approved
+from process_pdf import process_document, PipelineError, configure_log_level
+from progress_events import ProgressEvents
+from pipeline_metrics import metrics_from_env
+from send_to_mongo import delete_project, get_mongo_client, sync_projects
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# O stdout é reservado para o protocolo; qualquer print acidental vai para o stderr.
+_protocol_out = sys.stdout
+sys.stdout = sys.stderr
+
+
+def send_event(event):
+    """Escreve um evento do protocolo como uma linha JSON no stdout original."""
+    _protocol_out.write(json.dumps(event, ensure_ascii=False) + "\n")
+    _protocol_out.flush()
+
+
+def handle_job(job, collection, metrics=None):
+    """Processa um job e emite os eventos de progresso, sucesso ou erro correspondentes."""
+    job_id = job.get("id")
+    missing = [key for key in ("pdf_path", "institution_name", "year") if job.get(key) in (None, "")]
+    if missing:
+        send_event({"id": job_id, "event": "error", "stage": "entrada", "code": "campos_ausentes",
+                    "message": f"Campos obrigatórios ausentes: {', '.join(missing)}"})
+        return
+
+    def on_progress(etapa, mensagem):
+        send_event({"id": job_id, "event": "progress", "stage": etapa, "message": mensagem})
+
+    try:
+        result = process_document(job["pdf_path"], job["institution_name"], job["year"],
+                                  collection, on_progress=on_progress, workers=job.get("workers"),
+                                  targeted=job.get("targeted"), streaming=job.get("streaming"),
+                                  events=ProgressEvents(send_event, id=job_id), metrics=metrics, origem="worker")
+        send_event({"id": job_id, "event": "done", "result": result})
+    except PipelineError as e:
+        logging.error(f"Job {job_id} falhou na etapa '{e.etapa}': {e}")
+        send_event({"id": job_id, "event": "error", "stage": e.etapa, "code": e.codigo, "message": str(e)})
+    except Exception as e:
+        logging.error(f"Erro inesperado no job {job_id}: {e}", exc_info=True)
+        send_event({"id": job_id, "event": "error", "stage": "desconhecida", "code": "erro_inesperado",
+                    "message": str(e)})
+
+
+def _object_id(value):
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return value
+
+
+def _save_approved(job, db):
+    project_id, operacao = save_approved(db, _object_id(job["document_id"]), _object_id(job.get("user_id")))
+    return {"project_id": str(project_id), "operacao": operacao}
+
+
+def _sync_projects(job, db):
+    total = sync_projects(db, [_object_id(value) for value in job.get("project_ids") or []],
+                          previous_keys=[tuple(key) for key in job.get("previous_keys") or []])
+    return {"sincronizados": total}
+
+
+def _delete_project(job, db):
+    document = delete_project(db, _object_id(job["project_id"]))
+    if document is None:
+        return {"removido": False}
+    return {"removido": True,
+            "nome_arquivo_original": (document.get("metadados_extracao") or {}).get("nome_arquivo_original")}
+
+
+# Comandos de gravação das rotas da interface web: nome -> função(job, db) que devolve o `result`
+COMMANDS = {
+    "save_approved": _save_approved,
+    "sync_projects": _sync_projects,
+    "delete_project": _delete_project,
+}
+
+
+def handle_command(job, db):
+    """Executa um comando de gravação e emite `done` com o resultado ou `error`."""
+    job_id = job.get("id")
+    command = job["command"]
+    try:
+        send_event({"id": job_id, "event": "done", "result": COMMANDS[command](job, db)})
+    except (ValueError, KeyError) as e:
+        send_event({"id": job_id, "event": "error", "stage": command, "code": "comando_invalido", "message": str(e)})
+    except Exception as e:
+        logging.error(f"Erro inesperado no comando '{command}' ({job_id}): {e}", exc_info=True)
+        send_event({"id": job_id, "event": "error", "stage": command, "code": "erro_inesperado", "message": str(e)})
+
+
+def main():
+    configure_log_level()
+    client = get_mongo_client()
+    collection = client.get_database().projetos
+    metrics = metrics_from_env()
+    logging.info("Worker do pipeline pronto para receber jobs.")
+    send_event({"event": "ready", "pid": os.getpid()})
+
+    try:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError:
+                send_event({"event": "error", "stage": "entrada", "code": "json_invalido",
+                            "message": "Linha recebida não é um JSON válido."})
+                continue
+
+            if job.get("command") == "shutdown":
+                break
+            if job.get("command") == "ping":
+                send_event({"id": job.get("id"), "event": "pong"})
+                continue
+
+            if job.get("command") in COMMANDS:
+                handle_command(job, collection.database)
+                continue
+
+            handle_job(job, collection, metrics)
+    finally:
+        client.close()
+        logging.info("Worker do pipeline encerrado.")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,126 +7,958 @@ Usa o ambiente virtual configurado
 """
 
 import pdfplumber
-import json
+from pdfplumber.page import Page
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdftypes import PDFObjRef, PDFStream, resolve1
+from pdfminer.psparser import PSLiteral
 import sys
 import os
-import subprocess
-from pathlib import Path
-from datetime import datetime
+import gc
+import hashlib
+import itertools
+import json
 import logging
+import resource
+import signal
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor
+
+from bson import encode as bson_encode
 
 # Adiciona o diretório do script ao path do Python para importar módulos locais
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from normalization import normalize_data
+from normalization import normalize_data, page_needs_tables, IncrementalNormalizer
+from send_to_mongo import get_mongo_client, upsert_document
+from extraction_cache import get_default_cache
+from raw_extractions import PageEncoder, storage_enabled as raw_storage_enabled, store_extractions
+from progress_events import ProgressEvents, events_from_env
+from pipeline_metrics import RunRecorder, metrics_from_env
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def extract_pdf_data(pdf_path):
+def configure_log_level(level=None):
+    """
+    Aplica o nível de log do processo (padrão: PGA_LOG_LEVEL ou INFO). Os logs
+    por página são DEBUG: no nível INFO não custam nada além da chamada.
+    """
+    level = (level or os.getenv('PGA_LOG_LEVEL') or 'INFO').upper()
+    logging.getLogger().setLevel(getattr(logging, level, logging.INFO))
+
+def extraction_settings(targeted=False):
+    """Configurações que alteram o resultado da extração; fazem parte da chave do cache."""
+    return {"table_settings": None, "targeted": bool(targeted)}
+
+def extract_page(page, numero_pagina, total_paginas, targeted=False, budget=None):
+    """
+    Extrai texto e tabelas de uma única página do pdfplumber.
+
+    Com `targeted`, a detecção de tabelas (a parte cara) só roda nas páginas
+    cujo texto contém um marcador de seção usado pela normalização; nas demais
+    `tabelas` fica vazia e a chave `tabelas_ignoradas` é marcada.
+
+    `budget` (um PageTimeBudget) limita o tempo da detecção de tabelas: se a
+    página passar do tempo, ou o do documento já tiver acabado, a página fica
+    só com o texto e a chave `tabelas_tempo_esgotado` é marcada.
+    """
+    logging.debug("Processando página %d de %d...", numero_pagina, total_paginas)
+    text = page.extract_text()
+    # %.100s: o recorte do texto só é feito se a mensagem for realmente emitida
+    logging.debug("Texto extraído da página %d: %.100s...", numero_pagina, text)
+    dados_pagina = {
+        "numero_pagina": numero_pagina,
+        "texto": text,
+        "tabelas": []
+    }
+    if targeted and not page_needs_tables(text, numero_pagina):
+        logging.debug("Página %d sem marcadores de seção; detecção de tabelas ignorada.", numero_pagina)
+        dados_pagina["tabelas_ignoradas"] = True
+        return dados_pagina
+    if budget is not None and not budget.tables_allowed(numero_pagina):
+        dados_pagina["tabelas_tempo_esgotado"] = True
+        return dados_pagina
+    try:
+        with budget.limit() if budget is not None else nullcontext():
+            tables = page.extract_tables()
+    except PageTimeout:
+        logging.warning(f"Detecção de tabelas da página {numero_pagina} passou do tempo disponível; "
+                        f"página mantida só com o texto.")
+        dados_pagina["tabelas_tempo_esgotado"] = True
+        return dados_pagina
+    logging.debug("Tabelas extraídas da página %d: %d tabelas encontradas.", numero_pagina, len(tables))
+    dados_pagina["tabelas"] = tables
+    return dados_pagina
+
+def current_rss_mb():
+    """RSS atual do processo em MB (/proc/self/statm); fora do Linux, o pico do processo."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def rss_limit_from_env(rss_limit_mb=None):
+    """Resolve o teto de RSS da extração; o padrão vem de PGA_EXTRACTION_RSS_LIMIT_MB (sem teto)."""
+    if rss_limit_mb is None:
+        value = os.getenv('PGA_EXTRACTION_RSS_LIMIT_MB', '').strip()
+        rss_limit_mb = float(value) if value else None
+    return rss_limit_mb or None
+
+
+class PageMemoryGuard:
+    """
+    Acompanha o RSS do processo a cada página e, ao passar de `rss_limit_mb`,
+    ativa o modo enxuto para as páginas seguintes: detecção de tabelas só nas
+    páginas com marcadores de seção (como em `targeted`), cache de fontes do
+    pdfminer esvaziado e coleta de lixo a cada página. O resultado normalizado
+    não muda; a extração fica mais lenta.
+    """
+
+    def __init__(self, rss_limit_mb=None):
+        self.rss_limit_mb = rss_limit_mb
+        self.lean = False
+        self.lean_from_page = None
+        self.page_rss_mb = []
+
+    def record(self, numero_pagina):
+        """Registra o RSS com a página ainda aberta (o pico dela) e decide se ativa o modo enxuto."""
+        rss = current_rss_mb()
+        self.page_rss_mb.append(round(rss, 1))
+        if self.rss_limit_mb and not self.lean and rss > self.rss_limit_mb:
+            self.lean = True
+            self.lean_from_page = numero_pagina + 1
+            logging.warning(
+                f"RSS de {rss:.0f} MB na página {numero_pagina} passou do limite de {self.rss_limit_mb:.0f} MB; "
+                f"modo enxuto ativado a partir da página {self.lean_from_page}."
+            )
+
+    def release(self, pdf):
+        """No modo enxuto, libera o que o pdfminer ainda guarda entre páginas."""
+        if self.lean:
+            # Atributo interno do pdfminer; as fontes são lidas de novo quando uma página precisar
+            pdf.rsrcmgr._cached_fonts.clear()
+            gc.collect()
+
+    def stats(self):
+        return {
+            "memoria_paginas_mb": self.page_rss_mb,
+            "rss_pico_mb": max(self.page_rss_mb) if self.page_rss_mb else None,
+            "modo_enxuto_desde_pagina": self.lean_from_page,
+        }
+
+
+class PageTimeout(Exception):
+    """A detecção de tabelas de uma página passou do tempo disponível."""
+
+
+DEFAULT_PAGE_BUDGET_S = 30
+DEFAULT_DOCUMENT_BUDGET_S = 300
+# Páginas a partir deste tempo entram no relatório de páginas lentas (as mais lentas primeiro)
+SLOW_PAGE_S = 2.0
+SLOW_PAGES_REPORTED = 10
+
+
+def time_budget_from_env(page_budget_s=None, document_budget_s=None):
+    """
+    Resolve os tempos máximos da detecção de tabelas, em segundos: por página
+    (PGA_EXTRACTION_PAGE_BUDGET_S, padrão 30) e por documento
+    (PGA_EXTRACTION_DOCUMENT_BUDGET_S, padrão 300). 0 desativa o limite.
+    """
+    if page_budget_s is None:
+        page_budget_s = float(os.getenv('PGA_EXTRACTION_PAGE_BUDGET_S') or DEFAULT_PAGE_BUDGET_S)
+    if document_budget_s is None:
+        document_budget_s = float(os.getenv('PGA_EXTRACTION_DOCUMENT_BUDGET_S') or DEFAULT_DOCUMENT_BUDGET_S)
+    return page_budget_s or None, document_budget_s or None
+
+
+class PageTimeBudget:
+    """
+    Limita o tempo da detecção de tabelas (`extract_tables`, que pode levar
+    minutos em uma página com milhares de linhas vetoriais). Cada página tem até
+    `page_budget_s`; depois de `deadline` (padrão: agora + `document_budget_s`)
+    as páginas restantes ficam só com o texto. A interrupção usa SIGALRM, então
+    só vale no thread principal de um processo Unix (o caso do worker do
+    pipeline, da fila e dos pools de extração); fora dele o limite por página
+    não é aplicado, o que é avisado no log e em `tempo_limite_aplicado`, e o
+    prazo do documento só é conferido entre uma página e outra. `stats()` traz
+    as páginas que ficaram sem tabelas e as mais lentas.
+    """
+
+    def __init__(self, page_budget_s=None, document_budget_s=None, deadline=None):
+        self.page_budget_s = page_budget_s
+        self.deadline = deadline or (time.time() + document_budget_s if document_budget_s else None)
+        self.enforced = True
+        self.timed_out_pages = []
+        self.slow_pages = []
+        self.exhausted_from_page = None
+
+    def tables_allowed(self, numero_pagina):
+        """False quando o tempo do documento acabou; avisa uma vez, na primeira página afetada."""
+        if self.exhausted_from_page is None and self.deadline and time.time() >= self.deadline:
+            self.exhausted_from_page = numero_pagina
+            logging.warning(f"Tempo de extração do documento esgotado; páginas a partir da {numero_pagina} "
+                            f"ficam só com o texto.")
+        return self.exhausted_from_page is None
+
+    @contextmanager
+    def limit(self):
+        """Interrompe o bloco com PageTimeout ao fim do tempo da página (ou do que resta do documento)."""
+        limits = [self.page_budget_s] if self.page_budget_s else []
+        if self.deadline:
+            limits.append(max(self.deadline - time.time(), 0.001))
+        if not limits:
+            yield
+            return
+        if not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+            if self.enforced:
+                self.enforced = False
+                logging.warning(f"Tempo máximo da detecção de tabelas não pode ser aplicado fora do thread "
+                                f"principal ({threading.current_thread().name}); a página pode levar mais "
+                                f"que {min(limits):.0f} s.")
+            yield
+            return
+
+        def expire(signum, frame):
+            raise PageTimeout()
+
+        previous = signal.signal(signal.SIGALRM, expire)
+        signal.setitimer(signal.ITIMER_REAL, min(limits))
+        try:
+            yield
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+    def record(self, dados_pagina, duracao_s):
+        """Registra o tempo total de uma página extraída."""
+        numero_pagina = dados_pagina["numero_pagina"]
+        if dados_pagina.get("tabelas_tempo_esgotado"):
+            self.timed_out_pages.append(numero_pagina)
+        if duracao_s >= SLOW_PAGE_S:
+            self.slow_pages.append({"pagina": numero_pagina, "duracao_s": round(duracao_s, 3)})
+            self.slow_pages.sort(key=lambda pagina: -pagina["duracao_s"])
+            del self.slow_pages[SLOW_PAGES_REPORTED:]
+
+    def stats(self):
+        return {
+            "paginas_tempo_esgotado": list(self.timed_out_pages),
+            "paginas_lentas": list(self.slow_pages),
+            "tempo_documento_esgotado_na_pagina": self.exhausted_from_page,
+            "tempo_limite_aplicado": self.enforced,
+        }
+
+
+def _merge_time_stats(total, fatia):
+    """Junta as estatísticas de tempo de uma fatia da extração paralela às anteriores."""
+    total["paginas_tempo_esgotado"] = sorted(total["paginas_tempo_esgotado"] + fatia["paginas_tempo_esgotado"])
+    lentas = sorted(total["paginas_lentas"] + fatia["paginas_lentas"], key=lambda pagina: -pagina["duracao_s"])
+    total["paginas_lentas"] = lentas[:SLOW_PAGES_REPORTED]
+    esgotado = [p for p in (total["tempo_documento_esgotado_na_pagina"], fatia["tempo_documento_esgotado_na_pagina"])
+                if p is not None]
+    total["tempo_documento_esgotado_na_pagina"] = min(esgotado) if esgotado else None
+    total["tempo_limite_aplicado"] = total["tempo_limite_aplicado"] and fatia["tempo_limite_aplicado"]
+
+
+# Chaves que apontam de volta para a árvore de páginas (ou para a página) e não descrevem o conteúdo
+_FINGERPRINT_SKIPPED_KEYS = {'Parent', 'P'}
+
+
+def _feed_pdf_object(digest, obj, memo, seen):
+    """Alimenta `digest` com um objeto do pdfminer, resolvendo referências; `memo` guarda o hash de cada objeto indireto."""
+    if isinstance(obj, PDFObjRef):
+        cached = memo.get(obj.objid)
+        if cached is None:
+            if obj.objid in seen:
+                # Referência circular: o objeto já está sendo descrito mais acima
+                digest.update(b'C' + str(obj.objid).encode())
+                return
+            seen.add(obj.objid)
+            sub = hashlib.sha256()
+            _feed_pdf_object(sub, obj.resolve(), memo, seen)
+            cached = memo[obj.objid] = sub.digest()
+        digest.update(b'R' + cached)
+    elif isinstance(obj, PDFStream):
+        digest.update(b'S')
+        _feed_pdf_object(digest, obj.attrs, memo, seen)
+        try:
+            data = obj.get_data()
+        except Exception:
+            data = obj.get_rawdata()
+        digest.update(len(data or b'').to_bytes(8, 'big') + (data or b''))
+    elif isinstance(obj, dict):
+        digest.update(b'D')
+        for key in sorted(obj, key=str):
+            if key in _FINGERPRINT_SKIPPED_KEYS:
+                continue
+            digest.update(str(key).encode() + b'=')
+            _feed_pdf_object(digest, obj[key], memo, seen)
+        digest.update(b'E')
+    elif isinstance(obj, (list, tuple)):
+        digest.update(b'L')
+        for item in obj:
+            _feed_pdf_object(digest, item, memo, seen)
+        digest.update(b'E')
+    elif isinstance(obj, PSLiteral):
+        digest.update(b'N' + str(obj.name).encode())
+    elif isinstance(obj, bytes):
+        digest.update(b'B' + len(obj).to_bytes(8, 'big') + obj)
+    else:
+        digest.update(b'V' + repr(obj).encode())
+
+
+def page_fingerprint(page_obj, settings, numero_pagina, memo=None):
+    """
+    Impressão digital de uma página: SHA-256 dos content streams decodificados,
+    dos recursos (fontes, imagens, XObjects, resolvidos recursivamente), das
+    caixas e da rotação, com a versão do pdfplumber e as configurações de
+    extração. A mesma página em outra versão do PDF tem a mesma impressão
+    digital, e a extração dela pode ser reaproveitada. Como a primeira página
+    tem tratamento próprio na extração direcionada, ela entra na chave.
+    `memo` (um dict por documento) evita repetir o hash dos objetos
+    compartilhados entre páginas, como as fontes.
+    """
+    memo = {} if memo is None else memo
+    digest = hashlib.sha256()
+    digest.update(json.dumps({'pdfplumber': pdfplumber.__version__, 'settings': settings,
+                              'primeira_pagina': numero_pagina == 1}, sort_keys=True).encode())
+    for name, value in (('mediabox', page_obj.mediabox), ('cropbox', page_obj.cropbox),
+                        ('rotate', page_obj.rotate), ('resources', page_obj.resources),
+                        ('contents', page_obj.contents)):
+        digest.update(name.encode())
+        _feed_pdf_object(digest, value, memo, set())
+    return digest.hexdigest()
+
+
+class PageReuse:
+    """
+    Reaproveitamento de páginas já extraídas durante a extração de um documento,
+    com um PageCache (ver extraction_cache.py). `lookup` devolve a página
+    guardada com a mesma impressão digital (ou None e a chave para `remember`);
+    só são guardadas as páginas extraídas com a configuração pedida (sem modo
+    enxuto nem interrupção por tempo). `flush` grava as páginas novas.
+    """
+
+    def __init__(self, page_cache, targeted=False):
+        self.page_cache = page_cache
+        self.settings = extraction_settings(targeted)
+        self.targeted = bool(targeted)
+        self.memo = {}
+        self.reused = []
+
+    def lookup(self, page_obj, numero_pagina):
+        key = page_fingerprint(page_obj, self.settings, numero_pagina, self.memo)
+        cached = self.page_cache.get(key)
+        if cached is None:
+            return key, None
+        self.reused.append(numero_pagina)
+        logging.debug("Página %d reaproveitada do cache de páginas.", numero_pagina)
+        return key, dict(cached, numero_pagina=numero_pagina)
+
+    def remember(self, key, dados_pagina):
+        if dados_pagina.get("tabelas_tempo_esgotado"):
+            return
+        if dados_pagina.get("tabelas_ignoradas") and not self.targeted:
+            # Tabelas puladas pelo modo enxuto, não pela configuração pedida
+            return
+        self.page_cache.put(key, {name: value for name, value in dados_pagina.items() if name != "numero_pagina"})
+
+    def flush(self):
+        try:
+            self.page_cache.flush()
+        except OSError as e:
+            logging.warning(f"Não foi possível gravar o cache de páginas: {e}")
+
+    def stats(self):
+        return {"paginas_reaproveitadas": list(self.reused)}
+
+
+def _extract_or_reuse(page, numero_pagina, total_paginas, targeted, budget, reuse):
+    """Extrai uma página, ou a devolve do cache de páginas se `reuse` (um PageReuse) tiver a mesma página."""
+    start = time.perf_counter()
+    key = None
+    if reuse is not None:
+        key, dados_pagina = reuse.lookup(page.page_obj, numero_pagina)
+        if dados_pagina is not None:
+            return dados_pagina
+    dados_pagina = extract_page(page, numero_pagina, total_paginas, targeted, budget)
+    budget.record(dados_pagina, time.perf_counter() - start)
+    if key is not None:
+        reuse.remember(key, dados_pagina)
+    return dados_pagina
+
+
+def _page_count(pdf):
+    """Total de páginas pelo /Count da árvore de páginas, sem instanciar as páginas."""
+    try:
+        return int(resolve1(pdf.doc.catalog["Pages"])["Count"])
+    except Exception:
+        return len(pdf.pages)
+
+def _open_pages(pdf, start=0, end=None):
+    """
+    Páginas do pdfplumber de `start` a `end` (exclusivo), criadas uma a uma a
+    partir da árvore de páginas do pdfminer, como em `pdf.pages` mas sem
+    instanciar nem guardar as outras. As anteriores a `start` só têm a altura
+    somada ao `doctop`, para que as coordenadas fiquem iguais às de
+    `pdf.pages`; o chamador fecha cada página depois de usá-la.
+    """
+    doctop = 0
+    for i, page_obj in enumerate(itertools.islice(PDFPage.create_pages(pdf.doc), end)):
+        page = Page(pdf, page_obj, page_number=i + 1, initial_doctop=doctop)
+        doctop += page.height
+        if i >= start:
+            yield i, page
+
+def iter_pdf_pages(pdf_path, targeted=False, stats=None, on_page=None, memory=None, budget=None, reuse=None):
+    """
+    Gerador que abre o PDF e devolve as páginas extraídas uma a uma, na ordem.
+
+    Diferente de `pdf.pages`, que instancia (e mantém) todas as páginas, cada
+    página do pdfplumber é criada só quando chega a sua vez e fechada logo após
+    a extração, e o cache de objetos do pdfminer (onde ficam os content streams
+    já decodificados) é esvaziado a cada página. Assim a memória ocupada não
+    cresce com o número de páginas, desde que o chamador também não acumule os
+    dicts devolvidos. `stats`, se informado, recebe `paginas` e
+    `paginas_tabelas_ignoradas` conforme a leitura avança, e
+    `on_page(dados_pagina, total_paginas)` é chamado a cada página extraída.
+
+    `memory` (um PageMemoryGuard; padrão: um novo, com o teto de
+    PGA_EXTRACTION_RSS_LIMIT_MB) mede o RSS de cada página e ativa o modo
+    enxuto se o teto for ultrapassado; as medições também vão para `stats`.
+    `budget` (um PageTimeBudget; padrão: um novo, com os tempos de
+    `time_budget_from_env`) limita o tempo da detecção de tabelas e também
+    tem as suas estatísticas em `stats`. Com `reuse` (um PageReuse), as
+    páginas já extraídas antes, neste ou em outro PDF, vêm do cache de páginas
+    sem passar pelo pdfplumber; o chamador grava as novas com `reuse.flush()`.
+    """
+    if memory is None:
+        memory = PageMemoryGuard(rss_limit_from_env())
+    if budget is None:
+        budget = PageTimeBudget(*time_budget_from_env())
+    if stats is not None:
+        stats.update({"paginas": 0, "paginas_tabelas_ignoradas": 0})
+        stats.update(memory.stats())
+        stats.update(budget.stats())
+    with pdfplumber.open(pdf_path) as pdf:
+        total_pages = _page_count(pdf)
+        logging.info(f"PDF aberto com sucesso. Total de páginas: {total_pages}")
+        for i, page in _open_pages(pdf):
+            try:
+                dados_pagina = _extract_or_reuse(page, i + 1, total_pages, targeted or memory.lean, budget, reuse)
+                memory.record(i + 1)
+            finally:
+                page.close()
+                # Atributo interno do pdfminer; fontes continuam no cache do PDFResourceManager
+                pdf.doc._cached_objs.clear()
+                memory.release(pdf)
+            if stats is not None:
+                stats["paginas"] += 1
+                if dados_pagina.get("tabelas_ignoradas"):
+                    stats["paginas_tabelas_ignoradas"] += 1
+                stats["rss_pico_mb"] = max(stats["rss_pico_mb"] or 0, memory.page_rss_mb[-1])
+                stats["modo_enxuto_desde_pagina"] = memory.lean_from_page
+                stats.update(budget.stats())
+                if reuse is not None:
+                    stats.update(reuse.stats())
+            if on_page:
+                on_page(dados_pagina, total_pages)
+            yield dados_pagina
+
+def _extract_page_range(pdf_path, start, end, targeted=False, rss_limit_mb=None, page_budget_s=None, deadline=None,
+                        page_cache=None):
+    """
+    Executado em um processo do pool: abre o PDF por conta própria e extrai
+    as páginas do intervalo [start, end), na ordem. Cada processo tem o seu
+    PageMemoryGuard e o seu PageTimeBudget, com o prazo do documento comum a
+    todas as fatias, e consulta e grava o `page_cache` por conta própria;
+    retorna (páginas, estatísticas de memória, de tempo e de reaproveitamento).
+    Como em `iter_pdf_pages`, só as páginas do intervalo são instanciadas, uma
+    de cada vez, e cada uma é fechada logo após a extração.
+    """
+    memory = PageMemoryGuard(rss_limit_mb)
+    budget = PageTimeBudget(page_budget_s, deadline=deadline)
+    reuse = PageReuse(page_cache, targeted) if page_cache is not None else None
+    with pdfplumber.open(pdf_path) as pdf:
+        total = _page_count(pdf)
+        dados_extraidos = []
+        for i, page in _open_pages(pdf, start, end):
+            try:
+                dados_extraidos.append(_extract_or_reuse(page, i + 1, total, targeted or memory.lean, budget, reuse))
+                memory.record(i + 1)
+            finally:
+                page.close()
+                # Atributo interno do pdfminer; fontes continuam no cache do PDFResourceManager
+                pdf.doc._cached_objs.clear()
+                memory.release(pdf)
+    stats = dict(memory.stats(), **budget.stats())
+    if reuse is not None:
+        reuse.flush()
+        stats.update(reuse.stats())
+    return dados_extraidos, stats
+
+def split_page_ranges(total_pages, workers):
+    """Divide as páginas em até `workers` fatias contíguas de tamanho equilibrado."""
+    workers = max(1, min(workers, total_pages))
+    base, extra = divmod(total_pages, workers)
+    ranges = []
+    start = 0
+    for i in range(workers):
+        end = start + base + (1 if i < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+def _extract_parallel(pdf_path, total_pages, workers, targeted=False, on_page=None, rss_limit_mb=None,
+                      budget=None, page_cache=None):
+    """
+    Distribui fatias contíguas de páginas entre processos e junta o resultado na
+    ordem das páginas; `on_page` é chamado para as páginas de cada fatia concluída.
+    `budget` dá o tempo por página e o prazo do documento usados por todas as
+    fatias, e `page_cache` o cache de páginas consultado por elas. Retorna
+    (páginas, estatísticas de memória, de tempo e de reaproveitamento de todas as fatias).
+    """
+    ranges = split_page_ranges(total_pages, workers)
+    logging.info(f"Extração paralela com {len(ranges)} processos: {ranges}")
+    if budget is None:
+        budget = PageTimeBudget(*time_budget_from_env())
+    with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+        futures = [executor.submit(_extract_page_range, pdf_path, start, end, targeted, rss_limit_mb,
+                                   budget.page_budget_s, budget.deadline, page_cache)
+                   for start, end in ranges]
+        dados_extraidos = []
+        memoria = {"memoria_paginas_mb": [], "rss_pico_mb": None, "modo_enxuto_desde_pagina": None}
+        memoria.update(PageTimeBudget().stats(), paginas_reaproveitadas=[])
+        for future in futures:
+            fatia, memoria_fatia = future.result()
+            dados_extraidos.extend(fatia)
+            memoria["memoria_paginas_mb"].extend(memoria_fatia["memoria_paginas_mb"])
+            if memoria["modo_enxuto_desde_pagina"] is None:
+                memoria["modo_enxuto_desde_pagina"] = memoria_fatia["modo_enxuto_desde_pagina"]
+            _merge_time_stats(memoria, memoria_fatia)
+            memoria["paginas_reaproveitadas"].extend(memoria_fatia.get("paginas_reaproveitadas", []))
+            if on_page:
+                for dados_pagina in fatia:
+                    on_page(dados_pagina, total_pages)
+    if memoria["memoria_paginas_mb"]:
+        memoria["rss_pico_mb"] = max(memoria["memoria_paginas_mb"])
+    return dados_extraidos, memoria
+
+def extract_pdf_data(pdf_path, workers=None, cache=None, targeted=None, stats=None, on_page=None,
+                     rss_limit_mb=None, page_budget_s=None, document_budget_s=None):
     """
     Extrai dados de um PDF usando pdfplumber
+
+    `workers` > 1 ativa a extração paralela: as páginas são divididas em fatias
+    contíguas, cada processo abre o PDF e extrai a sua fatia, e o resultado é
+    idêntico ao da extração serial. O padrão vem de PGA_EXTRACTION_WORKERS (1).
+
+    `cache` (um ExtractionCache) evita reprocessar um PDF já extraído: em um
+    acerto a lista de páginas vem do disco sem abrir o pdfplumber. Sem acerto,
+    o cache de páginas do mesmo cache (ver `PageReuse`) reaproveita as páginas
+    iguais às de PDFs já extraídos, como as páginas não alteradas de uma nova
+    versão do PGA; só as demais passam pelo pdfplumber, e `stats` recebe a
+    lista `paginas_reaproveitadas`.
+
+    `targeted` ativa a extração direcionada (ver `extract_page`); o padrão vem
+    de PGA_EXTRACTION_TARGETED (desativada). O resultado normalizado é o mesmo.
+
+    Se `stats` (um dict) for informado, recebe as contagens da execução:
+    `paginas`, `paginas_tabelas_ignoradas` e `cache` ("hit", "miss" ou None).
+    `on_page(dados_pagina, total_paginas)` é chamado para cada página extraída
+    (não em um acerto do cache).
+
+    Cada página é liberada logo depois de extraída. `rss_limit_mb` (padrão:
+    PGA_EXTRACTION_RSS_LIMIT_MB, sem teto) ativa o modo enxuto de
+    `PageMemoryGuard` quando o RSS passa do teto; com extração paralela o teto
+    vale para cada processo. `stats` também recebe `memoria_paginas_mb` (RSS
+    de cada página, em ordem), `rss_pico_mb` e `modo_enxuto_desde_pagina`. Uma
+    extração que entrou no modo enxuto não é gravada no cache.
+
+    `page_budget_s` e `document_budget_s` (padrão: `time_budget_from_env`)
+    limitam o tempo da detecção de tabelas por página e no documento inteiro
+    (ver PageTimeBudget); as páginas que passaram do tempo ficam só com o texto,
+    marcadas com `tabelas_tempo_esgotado`. `stats` recebe
+    `paginas_tempo_esgotado`, `paginas_lentas` e
+    `tempo_documento_esgotado_na_pagina`, e uma extração com páginas sem
+    tabelas por tempo também não é gravada no cache.
     """
-    dados_extraidos = []
+    if workers is None:
+        workers = int(os.getenv('PGA_EXTRACTION_WORKERS', '1'))
+    if targeted is None:
+        targeted = os.getenv('PGA_EXTRACTION_TARGETED', '0').lower() in ('1', 'true', 'yes')
+    rss_limit_mb = rss_limit_from_env(rss_limit_mb)
+    budget = PageTimeBudget(*time_budget_from_env(page_budget_s, document_budget_s))
+    if stats is None:
+        stats = {}
+    stats.update({"paginas": 0, "paginas_tabelas_ignoradas": 0, "cache": None})
+    stats.update(PageMemoryGuard().stats())
+    stats.update(budget.stats())
+    stats["paginas_reaproveitadas"] = []
     logging.info(f"Iniciando a extração do arquivo: {pdf_path}")
     
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            logging.info(f"PDF aberto com sucesso. Total de páginas: {len(pdf.pages)}")
-            for i, page in enumerate(pdf.pages):
-                logging.info(f"Processando página {i + 1} de {len(pdf.pages)}...")
-                text = page.extract_text()
-                logging.info(f"Texto extraído da página {i + 1}: {text[:100]}...")
-                tables = page.extract_tables()
-                logging.info(f"Tabelas extraídas da página {i + 1}: {len(tables)} tabelas encontradas.")
-                dados_pagina = {
-                    "numero_pagina": i + 1,
-                    "texto": text,
-                    "tabelas": tables
-                }
-                dados_extraidos.append(dados_pagina)
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.make_key(pdf_path, extraction_settings(targeted))
+            dados_extraidos = cache.get(cache_key)
+            if dados_extraidos is not None:
+                logging.info(f"Extração encontrada no cache ({len(dados_extraidos)} páginas); pdfplumber não será usado.")
+                _fill_stats(stats, dados_extraidos, "hit")
+                return dados_extraidos
+
+        page_cache = None
+        if cache is not None:
+            try:
+                page_cache = cache.page_cache()
+            except OSError as e:
+                logging.warning(f"Cache de páginas indisponível: {e}")
+
+        if workers > 1:
+            with pdfplumber.open(pdf_path) as pdf:
+                total_pages = len(pdf.pages)
+            logging.info(f"PDF aberto com sucesso. Total de páginas: {total_pages}")
+        if workers > 1 and total_pages >= 2:
+            dados_extraidos, memoria = _extract_parallel(pdf_path, total_pages, workers, targeted, on_page,
+                                                         rss_limit_mb, budget, page_cache)
+        else:
+            memory = PageMemoryGuard(rss_limit_mb)
+            reuse = PageReuse(page_cache, targeted) if page_cache is not None else None
+            dados_extraidos = list(iter_pdf_pages(pdf_path, targeted, on_page=on_page, memory=memory, budget=budget,
+                                                  reuse=reuse))
+            memoria = dict(memory.stats(), **budget.stats())
+            if reuse is not None:
+                reuse.flush()
+                memoria.update(reuse.stats())
+            total_pages = len(dados_extraidos)
+        _fill_stats(stats, dados_extraidos, "miss" if cache_key else None)
+        stats.update(memoria)
+        if targeted:
+            logging.info(
+                f"Extração direcionada: detecção de tabelas ignorada em "
+                f"{stats['paginas_tabelas_ignoradas']} de {total_pages} páginas."
+            )
+        if memoria.get("paginas_reaproveitadas"):
+            logging.info(f"{len(memoria['paginas_reaproveitadas'])} de {total_pages} páginas reaproveitadas do "
+                         f"cache de páginas; {total_pages - len(memoria['paginas_reaproveitadas'])} extraídas.")
+        if memoria["paginas_tempo_esgotado"]:
+            logging.warning(f"Detecção de tabelas interrompida por tempo em {len(memoria['paginas_tempo_esgotado'])} "
+                            f"página(s): {memoria['paginas_tempo_esgotado']}.")
         logging.info("Extração finalizada.")
+
+        if memoria["modo_enxuto_desde_pagina"] is not None or memoria["paginas_tempo_esgotado"]:
+            # As páginas do modo enxuto ou sem tabelas por tempo não têm as tabelas que a configuração pedida teria
+            cache_key = None
+        if cache_key is not None:
+            try:
+                cache.put(cache_key, dados_extraidos)
+            except OSError as e:
+                logging.warning(f"Não foi possível gravar a extração no cache: {e}")
         return dados_extraidos
     except Exception as e:
         logging.error(f"Erro ao processar PDF: {e}")
         return None
 
+def _fill_stats(stats, dados_extraidos, cache_status):
+    stats["paginas"] = len(dados_extraidos)
+    stats["paginas_tabelas_ignoradas"] = sum(1 for p in dados_extraidos if p.get("tabelas_ignoradas"))
+    stats["cache"] = cache_status
+
+class PipelineError(Exception):
+    """
+    Falha em uma etapa do pipeline (extração, normalização ou envio ao MongoDB).
+    `codigo` identifica o erro nos eventos de progresso (padrão: "<etapa>_falhou").
+    """
+
+    def __init__(self, etapa, mensagem, codigo=None):
+        super().__init__(mensagem)
+        self.etapa = etapa
+        self.codigo = codigo or f"{etapa}_falhou"
+
+
+def _progress_reporter(on_progress):
+    def progress(etapa, mensagem):
+        logging.info(mensagem)
+        if on_progress:
+            on_progress(etapa, mensagem)
+    return progress
+
+
+def streaming_enabled(streaming=None):
+    """Resolve a opção `streaming`; o padrão vem de PGA_PIPELINE_STREAMING (desativado)."""
+    if streaming is None:
+        return os.getenv('PGA_PIPELINE_STREAMING', '0').lower() in ('1', 'true', 'yes')
+    return bool(streaming)
+
+
+def stream_extract_and_normalize(pdf_path, institution_name, year, targeted=None, stats=None, on_page=None,
+                                 rss_limit_mb=None, page_budget_s=None, document_budget_s=None):
+    """
+    Extrai e normaliza o PDF página a página, sem manter a lista de páginas.
+
+    Cada página sai de `iter_pdf_pages`, alimenta o `IncrementalNormalizer` e é
+    descartada, então o pico de memória fica praticamente constante qualquer
+    que seja o número de páginas. O cache de extração e a extração paralela não
+    são usados (ambos precisam do documento inteiro). Retorna os dados
+    normalizados, ou None em caso de falha, como `normalize_data`. `on_page`,
+    `rss_limit_mb` e os tempos máximos de tabelas (ver `extract_pdf_data`)
+    valem para `iter_pdf_pages`.
+    """
+    if targeted is None:
+        targeted = os.getenv('PGA_EXTRACTION_TARGETED', '0').lower() in ('1', 'true', 'yes')
+    if stats is None:
+        stats = {}
+    logging.info(f"Iniciando a extração e normalização em streaming do arquivo: {pdf_path}")
+    normalizer = IncrementalNormalizer()
+    try:
+        memory = PageMemoryGuard(rss_limit_from_env(rss_limit_mb))
+        budget = PageTimeBudget(*time_budget_from_env(page_budget_s, document_budget_s))
+        for page in iter_pdf_pages(pdf_path, targeted, stats, on_page, memory, budget):
+            normalizer.feed(page)
+    except Exception as e:
+        logging.error(f"Erro ao processar PDF: {e}")
+        return None
+    stats["cache"] = None
+    try:
+        return normalizer.finish(pdf_path, institution_name, year)
+    except Exception as e:
+        logging.error(f"Erro catastrófico ao normalizar dados: {e}", exc_info=True)
+        return None
+
+
+def _stage_counts(stats):
+    """Contagens da extração para o evento de fim de etapa (sem a lista de RSS por página)."""
+    return {key: value for key, value in stats.items() if key != "memoria_paginas_mb"}
+
+
+def _page_reporter(events, etapa):
+    """Callback `on_page` que emite um evento `page` por página, ou None se os eventos estão desativados."""
+    if not events.enabled:
+        return None
+
+    def on_page(dados_pagina, total_paginas):
+        events.page(etapa, dados_pagina["numero_pagina"], total_paginas, len(dados_pagina["tabelas"]))
+
+    return on_page
+
+
+def _chain_page_callbacks(*callbacks):
+    """Callback `on_page` que chama cada um dos informados (os None são ignorados)."""
+    callbacks = [callback for callback in callbacks if callback is not None]
+    if len(callbacks) <= 1:
+        return callbacks[0] if callbacks else None
+
+    def on_page(dados_pagina, total_paginas):
+        for callback in callbacks:
+            callback(dados_pagina, total_paginas)
+
+    return on_page
+
+
+def extract_and_normalize(pdf_path, institution_name, year, on_progress=None, workers=None, targeted=None,
+                          streaming=None, stats=None, events=None, raw=None):
+    """
+    Executa as etapas de extração e normalização (sem acesso ao MongoDB).
+
+    `workers` e `targeted` são repassados para `extract_pdf_data`; o cache de
+    extração padrão (ver extraction_cache.py) é usado quando ativo.
+
+    Com `streaming` (padrão: PGA_PIPELINE_STREAMING) as páginas são
+    normalizadas conforme são extraídas e descartadas em seguida (ver
+    `stream_extract_and_normalize`); nesse modo `dados_extraidos` é None.
+    `stats`, se informado, recebe as contagens da extração (`paginas` etc.).
+    `events` (um ProgressEvents, ver progress_events.py) recebe os eventos de
+    etapa e de página. `raw` (um PageEncoder, ver raw_extractions.py) recebe as
+    páginas extraídas para serem guardadas de forma compacta, também no modo
+    streaming.
+
+    Retorna a tupla (dados_extraidos, dados_normalizados); lança PipelineError em caso de falha.
+    """
+    progress = _progress_reporter(on_progress)
+    if stats is None:
+        stats = {}
+    if events is None:
+        events = ProgressEvents()
+
+    if streaming_enabled(streaming):
+        with events.stage("extracao_normalizacao") as counts:
+            if not os.path.exists(pdf_path):
+                raise PipelineError("extracao", f"Arquivo não encontrado: {pdf_path}", "arquivo_nao_encontrado")
+            counts["bytes_lidos"] = os.path.getsize(pdf_path)
+            progress("extracao", "Iniciando a extração e normalização do PDF página a página...")
+            normalized_data = stream_extract_and_normalize(
+                pdf_path, institution_name, year, targeted=targeted, stats=stats,
+                on_page=_chain_page_callbacks(_page_reporter(events, "extracao_normalizacao"),
+                                              raw.add_page if raw is not None else None)
+            )
+            counts.update(_stage_counts(stats))
+            if not stats.get("paginas"):
+                raise PipelineError("extracao", "Falha na extração dos dados do PDF.")
+            if not normalized_data:
+                raise PipelineError("normalizacao", "Falha na normalização dos dados.")
+            counts.update(projetos=len(normalized_data.get("acoes_projetos", [])),
+                          aquisicoes=len(normalized_data.get("anexo1_aquisicoes", [])))
+            progress("normalizacao", f"Extração e normalização concluídas ({stats['paginas']} páginas).")
+        return None, normalized_data
+
+    with events.stage("extracao") as counts:
+        if not os.path.exists(pdf_path):
+            raise PipelineError("extracao", f"Arquivo não encontrado: {pdf_path}", "arquivo_nao_encontrado")
+        counts["bytes_lidos"] = os.path.getsize(pdf_path)
+        progress("extracao", "Iniciando a extração de dados do PDF...")
+        extracted_data = extract_pdf_data(pdf_path, workers=workers, cache=get_default_cache(),
+                                          targeted=targeted, stats=stats, on_page=_page_reporter(events, "extracao"))
+        counts.update(_stage_counts(stats))
+        if not extracted_data:
+            raise PipelineError("extracao", "Falha na extração dos dados do PDF.")
+        counts["tabelas"] = sum(len(pagina["tabelas"]) for pagina in extracted_data)
+        if raw is not None:
+            for pagina in extracted_data:
+                raw.add(pagina)
+        mensagem = f"Extração de dados do PDF concluída ({len(extracted_data)} páginas"
+        if stats["paginas_tabelas_ignoradas"]:
+            mensagem += f", detecção de tabelas ignorada em {stats['paginas_tabelas_ignoradas']}"
+        if stats["paginas_reaproveitadas"]:
+            mensagem += f", {len(stats['paginas_reaproveitadas'])} reaproveitadas de extrações anteriores"
+        if stats["paginas_tempo_esgotado"]:
+            mensagem += f", sem tabelas por tempo em {len(stats['paginas_tempo_esgotado'])}"
+        progress("extracao", mensagem + ").")
+
+    with events.stage("normalizacao") as counts:
+        progress("normalizacao", "Iniciando a normalização dos dados...")
+        normalized_data = normalize_data(extracted_data, pdf_path, institution_name, year)
+        if not normalized_data:
+            raise PipelineError("normalizacao", "Falha na normalização dos dados.")
+        counts.update(projetos=len(normalized_data.get("acoes_projetos", [])),
+                      aquisicoes=len(normalized_data.get("anexo1_aquisicoes", [])))
+        progress("normalizacao", "Normalização dos dados concluída.")
+
+    return extracted_data, normalized_data
+
+
+def summarize(normalized_data, inserted_id, paginas, operacao=None):
+    """Resumo de um documento processado, usado nos eventos e no relatório do modo em lote."""
+    resumo = {
+        "inserted_id": str(inserted_id),
+        "paginas": paginas,
+        "projetos": len(normalized_data.get("acoes_projetos", [])),
+        "aquisicoes": len(normalized_data.get("anexo1_aquisicoes", [])),
+    }
+    if operacao:
+        resumo["operacao"] = operacao
+    return resumo
+
+
+def write_document(collection, normalized_data, pdf_path, on_progress=None, events=None, raw=None):
+    """
+    Grava os dados normalizados no MongoDB com upsert pela chave natural (ver
+    send_to_mongo.py) e retorna (id do documento, operação), onde a operação é
+    "inserido", "atualizado" ou "inalterado"; lança PipelineError em caso de falha.
+    As páginas de `raw` (PageEncoder) vão para a coleção `extracoes`; uma falha
+    nessa gravação só gera um aviso. O evento de fim da etapa traz os bytes
+    gravados (documento em BSON e extração compactada).
+    """
+    progress = _progress_reporter(on_progress)
+    if events is None:
+        events = ProgressEvents()
+    with events.stage("envio") as counts:
+        progress("envio", "Enviando os dados para o MongoDB...")
+        try:
+            document_id, operacao = upsert_document(collection, normalized_data, pdf_path)
+        except Exception as e:
+            raise PipelineError("envio", f"Erro ao enviar os dados para o MongoDB: {e}") from e
+        counts["operacao"] = operacao
+        dados = raw.finish() if raw is not None else b""
+        if raw is not None:
+            save_raw_extractions(collection.database, [(normalized_data.get("hash_conteudo"), dados, raw.paginas)])
+        if events.enabled:
+            # Serializar o documento de novo custa alguns milissegundos: só quando alguém ouve os eventos
+            counts["bytes_escritos"] = len(bson_encode(normalized_data)) + len(dados)
+        progress("envio", f"Dados enviados para o MongoDB (documento {operacao}).")
+    return document_id, operacao
+
+
+def save_raw_extractions(db, items):
+    """Guarda as extrações compactadas (ver `store_extractions`); erros só geram um aviso."""
+    try:
+        store_extractions(db, items)
+    except Exception as e:
+        logging.warning(f"Não foi possível guardar a extração bruta: {e}")
+
+
+def process_document(pdf_path, institution_name, year, collection, on_progress=None, workers=None, targeted=None,
+                     streaming=None, events=None, metrics=None, origem="cli"):
+    """
+    Executa extração, normalização e envio ao MongoDB no processo atual.
+
+    `collection` é a collection `projetos` de um MongoClient já aberto, para que
+    chamadores de longa duração (ver pipeline_worker.py) reutilizem a conexão.
+    `on_progress(etapa, mensagem)` é chamado no início e no fim de cada etapa.
+    `workers`, `targeted` e `streaming` são repassados para `extract_and_normalize`
+    e `events` (ProgressEvents) recebe os eventos estruturados de todas as etapas.
+    As páginas extraídas são guardadas em `extracoes` (ver raw_extractions.py)
+    para permitir a renormalização sem o PDF, a menos que PGA_RAW_EXTRACTIONS=0.
+    Com `metrics` (PipelineMetrics, ver pipeline_metrics.py), a execução, com
+    sucesso ou não, é registrada nas métricas e em `processing_runs` com a
+    `origem` informada.
+    Retorna um resumo com o ID do documento, a operação e as contagens; lança PipelineError em caso de falha.
+    """
+    stats = {}
+    raw = PageEncoder() if raw_storage_enabled() else None
+    recorder = None
+    if metrics is not None:
+        recorder = RunRecorder(arquivo=os.path.basename(pdf_path), instituicao=institution_name, ano=year,
+                               origem=origem)
+        events = recorder.attach(events if events is not None else ProgressEvents())
+    try:
+        with recorder.counting() if recorder is not None else nullcontext():
+            _, normalized_data = extract_and_normalize(
+                pdf_path, institution_name, year, on_progress=on_progress, workers=workers, targeted=targeted,
+                streaming=streaming, stats=stats, events=events, raw=raw
+            )
+            document_id, operacao = write_document(collection, normalized_data, pdf_path, on_progress=on_progress,
+                                                   events=events, raw=raw)
+    finally:
+        if recorder is not None:
+            metrics.record_run(recorder.finish(), collection.database)
+    return summarize(normalized_data, document_id, stats["paginas"], operacao)
+
+
+def run(pdf_path, institution_name, year, workers=None, targeted=None, streaming=None, events=None):
+    """Processa um único PDF abrindo (e fechando) sua própria conexão com o MongoDB."""
+    client = get_mongo_client()
+    try:
+        return process_document(pdf_path, institution_name, year, client.get_database().projetos,
+                                workers=workers, targeted=targeted, streaming=streaming, events=events,
+                                metrics=metrics_from_env())
+    finally:
+        client.close()
+
+
 def main():
     """
     Função principal para processar PDF e enviar para o MongoDB.
+    Os eventos de progresso vão para o descritor PGA_PROGRESS_FD, se definido.
     """
     if len(sys.argv) != 4:
         logging.error("Uso: python process_pdf.py <caminho_pdf> <nome_instituicao> <ano>")
         sys.exit(1)
-    
+
     pdf_path = sys.argv[1]
     institution_name = sys.argv[2]
     year = sys.argv[3]
-    
-    if not os.path.exists(pdf_path):
-        logging.error(f"Arquivo não encontrado: {pdf_path}")
-        sys.exit(1)
-
-    logging.info("Iniciando a extração de dados do PDF...")
-    extracted_data = extract_pdf_data(pdf_path)
-    if not extracted_data:
-        logging.error("Falha na extração dos dados do PDF.")
-        sys.exit(1)
-    logging.info("Extração de dados do PDF concluída.")
-
-    logging.info("Iniciando a normalização dos dados...")
-    normalized_data = normalize_data(extracted_data, pdf_path, institution_name, year)
-    if not normalized_data:
-        logging.error("Falha na normalização dos dados.")
-        sys.exit(1)
-    logging.info("Normalização dos dados concluída.")
+    configure_log_level()
 
-    result = {
-        "success": True,
-        "extractedData": extracted_data,
-        "normalizedData": normalized_data
-    }
-    
-    # Caminho para o script send_to_mongo.py
-    send_to_mongo_script_path = os.path.join(os.path.dirname(__file__), 'send_to_mongo.py')
-
-    logging.info(f"Executando {send_to_mongo_script_path} para enviar os dados...")
     try:
-        # Serializa o resultado para uma string JSON
-        json_output_string = json.dumps(result, ensure_ascii=False)
-
-        # Executa o script send_to_mongo.py, passando o caminho do PDF como argumento
-        # e o JSON via stdin
-        process = subprocess.run(
-            [sys.executable, send_to_mongo_script_path, pdf_path],
-            input=json_output_string,
-            text=True,
-            capture_output=True,
-            check=True
-        )
-        
-        
-        # Log da saída do script filho para depuração
-        logging.info("Saída do send_to_mongo.py:")
-        logging.info(process.stdout)
-        if process.stderr:
-            # stderr do Python pode conter logs INFO, não apenas erros
-            # Apenas logar como erro se realmente contiver ERROR ou CRITICAL
-            if '- ERROR -' in process.stderr or '- CRITICAL -' in process.stderr:
-                logging.error("Erro do send_to_mongo.py:")
-                logging.error(process.stderr)
-            else:
-                logging.info("Logs do send_to_mongo.py:")
-                logging.info(process.stderr)
-        
+        run(pdf_path, institution_name, year, events=events_from_env())
         logging.info("Processo concluído com sucesso.")
-
-    except subprocess.CalledProcessError as e:
-        logging.error(f"O script send_to_mongo.py falhou com código de saída {e.returncode}")
-        logging.error(f"Stdout: {e.stdout}")
-        logging.error(f"Stderr: {e.stderr}")
+    except PipelineError as e:
+        logging.error(str(e))
         sys.exit(1)
     except Exception as e:
-        logging.error(f"Erro ao executar o subprocesso: {e}")
+        logging.error(f"Erro inesperado no pipeline: {e}")
         sys.exit(1)
 
 if __name__ == "__main__":
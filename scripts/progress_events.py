@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Eventos de progresso do pipeline em JSON por linha (NDJSON).
+
+Em vez de procurar mensagens nos logs, quem chama o pipeline recebe eventos
+estruturados, escritos assim que acontecem:
+
+    {"event": "stage_start", "stage": "extracao", "ts": 1760000000.123}
+    {"event": "page", "stage": "extracao", "page": 3, "total": 40, "tables": 2, "ts": ...}
+    {"event": "stage_end", "stage": "extracao", "status": "ok", "duration_ms": 812.4,
+     "counts": {"paginas": 40, "paginas_tabelas_ignoradas": 0, "cache": null}, "ts": ...}
+    {"event": "stage_end", "stage": "normalizacao", "status": "erro", "code": "normalizacao_falhou",
+     "message": "...", "duration_ms": 10.2, "counts": {}, "ts": ...}
+
+As etapas são `extracao`, `normalizacao`, `extracao_normalizacao` (modo
+streaming, em que as duas acontecem juntas) e `envio`. Os códigos de erro vêm
+de `PipelineError.codigo` (ver process_pdf.py).
+
+Os CLIs escrevem os eventos no descritor de arquivo indicado em
+PGA_PROGRESS_FD (ou `--progress-fd` no run_pipeline.py), separado do stdout e
+do stderr dos logs; o pipeline_worker.py os repassa pelo próprio protocolo.
+Sem destino configurado os eventos são descartados.
+"""
+
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+PROGRESS_FD_ENV = 'PGA_PROGRESS_FD'
+
+
+class ProgressEvents:
+    """
+    Emissor de eventos de progresso. `write` recebe cada evento como dict; sem
+    `write` nada é montado nem escrito. `context` é copiado em todos os eventos
+    (por exemplo o id do job ou o arquivo do lote).
+    """
+
+    def __init__(self, write=None, **context):
+        self._write = write
+        self.context = context
+
+    @property
+    def enabled(self):
+        return self._write is not None
+
+    def emit(self, event, **fields):
+        if self._write is None:
+            return
+        payload = {"event": event}
+        payload.update(self.context)
+        payload.update(fields)
+        payload["ts"] = round(time.time(), 3)
+        self._write(payload)
+
+    def forward(self, event):
+        """Repassa um evento já montado (por exemplo, vindo de outro processo), acrescentando o contexto."""
+        if self._write is None:
+            return
+        payload = dict(event)
+        payload.update(self.context)
+        self._write(payload)
+
+    def also(self, write):
+        """Emissor com o mesmo contexto que escreve cada evento no destino atual e também em `write`."""
+        if self._write is None:
+            return ProgressEvents(write, **self.context)
+        current = self._write
+
+        def both(event):
+            current(event)
+            write(event)
+
+        return ProgressEvents(both, **self.context)
+
+    def page(self, stage, numero, total, tabelas=None):
+        """Página `numero` de `total` concluída na etapa; `tabelas` é a quantidade encontrada nela."""
+        if self._write is None:
+            return
+        fields = {"stage": stage, "page": numero, "total": total}
+        if tabelas is not None:
+            fields["tables"] = tabelas
+        self.emit("page", **fields)
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Envolve uma etapa: emite `stage_start` e, na saída, `stage_end` com a
+        duração e as contagens que o bloco gravou no dict devolvido. Se o bloco
+        lançar uma exceção, o `stage_end` sai com status "erro", o código e a
+        mensagem, e a exceção continua subindo.
+        """
+        counts = {}
+        self.emit("stage_start", stage=name)
+        start = time.perf_counter()
+        try:
+            yield counts
+        except Exception as e:
+            self.emit("stage_end", stage=name, status="erro", code=getattr(e, "codigo", "erro_inesperado"),
+                      message=str(e), duration_ms=_elapsed_ms(start), counts=counts)
+            raise
+        self.emit("stage_end", stage=name, status="ok", duration_ms=_elapsed_ms(start), counts=counts)
+
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def fd_writer(fd):
+    """Função de escrita que grava cada evento como uma linha JSON no descritor `fd`."""
+    stream = os.fdopen(fd, 'w', encoding='utf-8', buffering=1, closefd=False)
+
+    def write(event):
+        # buffering=1: cada linha vai para o descritor assim que é escrita
+        stream.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+
+    return write
+
+
+def events_from_env(fd=None, **context):
+    """
+    Emissor que escreve no descritor `fd` ou, sem ele, no indicado em
+    PGA_PROGRESS_FD; sem nenhum dos dois devolve um emissor que descarta tudo.
+    """
+    if fd is None:
+        fd = os.getenv(PROGRESS_FD_ENV)
+    if fd in (None, ''):
+        return ProgressEvents(**context)
+    try:
+        return ProgressEvents(fd_writer(int(fd)), **context)
+    except (ValueError, OSError) as e:
+        logging.warning(f"Descritor de eventos de progresso inválido ({fd}): {e}")
+        return ProgressEvents(**context)
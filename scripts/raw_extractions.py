@@ -0,0 +1,584 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Extrações brutas dos PDFs guardadas no MongoDB (`extracoes`) e renormalização.
+
+O pipeline grava, junto com cada documento de `projetos`, a saída página a
+página do pdfplumber (`dados_extraidos`) em formato compacto, em um documento
+de `extracoes` cujo `_id` é o `hash_conteudo` do PDF. Quando as regras de
+`normalization.py` mudam, `renormalize` reaplica `normalize_data` sobre essas
+extrações em vários processos, compara o resultado com o documento atual de
+`projetos` e grava só os campos que mudaram, sem abrir nenhum PDF.
+
+Documentos alterados à mão depois da gravação (o `hash_dados` não confere com
+o conteúdo) são preservados; `--force` os sobrescreve. Documentos sem
+`hash_conteudo` ou sem extração guardada são ignorados.
+
+Formato compacto (`pga-col.v2`, ver PageEncoder): as células de cada tabela
+são gravadas coluna por coluna, com os tamanhos à parte do texto; as páginas
+são agrupadas em blocos de ~16 KB, cada um um fluxo zlib próprio que usa o
+primeiro bloco como dicionário preset, com um índice dos blocos e das páginas
+no cabeçalho. Fica de 3% a 6% menor que o `json.gz` do documento inteiro, e
+`LazyExtraction` lê uma página ou uma tabela descompactando só o bloco dela
+(e o primeiro). Não há dicionário explícito de strings: índices para uma
+tabela de strings por documento deixavam o resultado maior que o `json.gz`,
+porque o deflate já reaproveita os rótulos repetidos dentro da janela.
+As extrações antigas (`json.gz`, um array JSON em gzip) continuam legíveis
+por `decode_pages`.
+
+Configuração por variável de ambiente:
+    PGA_RAW_EXTRACTIONS=0   não grava as extrações no pipeline
+
+Uso:
+    python3 scripts/raw_extractions.py stats
+    python3 scripts/raw_extractions.py renormalize [--workers 4] [--batch-size 100] [--dry-run] [--force]
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pdfplumber
+from bson import Binary
+from pymongo import ReplaceOne, UpdateOne
+
+# Adiciona o diretório do script ao path do Python para importar módulos locais
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from normalization import normalize_data
+from child_collections import sync_documents as sync_child_collections
+from dashboard_aggregates import aggregate_key, refresh as refresh_aggregates
+from send_to_mongo import fields_hash, get_mongo_client, update_fields, REVISION_FIELD
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+EXTRACTIONS = 'extracoes'
+FORMAT = 'pga-col.v2'
+LEGACY_FORMAT = 'json.gz'
+MAGIC = b'PGX3'
+# Bytes de páginas codificadas por bloco zlib: o bastante para o deflate achar as repetições entre páginas
+GROUP_BYTES = 16 * 1024
+# Janela do deflate: só os últimos 32 KB do dicionário preset são usados
+_ZDICT_BYTES = 32 * 1024
+# Bits de `flags` de cada página
+_IGNORED, _TIMED_OUT, _NO_TEXT = 1, 2, 4
+_PAGE_FLAGS = (('tabelas_ignoradas', _IGNORED), ('tabelas_tempo_esgotado', _TIMED_OUT))
+_PAGE_KEYS = {'numero_pagina', 'texto', 'tabelas', 'tabelas_ignoradas', 'tabelas_tempo_esgotado'}
+# Formas de uma tabela: todas as linhas com o mesmo número de células, linhas de tamanhos variados, JSON
+_RECTANGULAR, _RAGGED, _JSON_TABLE = 0, 1, 2
+# Bit somado à forma quando o tamanho de todas as células cabe em um byte
+_SHORT_CELLS = 4
+# Margem abaixo do limite de 16 MB de um documento BSON
+MAX_STORED_BYTES = 15 * 1024 * 1024
+DEFAULT_BATCH_SIZE = 100
+# Campos de `projetos` (caminhos de update_fields) produzidos pela normalização e pelo pipeline; os
+# demais, como a proveniência gravada por job_queue.save_approved, não são comparados nem removidos
+NORMALIZED_FIELDS = frozenset({
+    'ano_referencia', 'versao_documento', 'instituicao_nome', 'identificacao_unidade', 'analise_cenario',
+    'situacoes_problema_gerais', 'acoes_projetos', 'anexo1_aquisicoes', 'hash_conteudo',
+    'metadados_extracao.nome_arquivo_original', 'metadados_extracao.paginas_sem_tabelas_por_tempo',
+    'metadados_extracao.extracao_parcial',
+})
+# Campos de `projetos` que não participam da comparação (PDF antigo em base64)
+RENORMALIZE_PROJECTION = {'pdf_original_arquivo': 0}
+
+
+def storage_enabled():
+    """Se o pipeline grava as extrações (PGA_RAW_EXTRACTIONS, padrão ativado)."""
+    return os.getenv('PGA_RAW_EXTRACTIONS', '1').lower() not in ('0', 'false', 'no')
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _write_bytes(out, value):
+    _write_varint(out, len(value))
+    out += value
+
+
+def _read_bytes(data, pos):
+    size, pos = _read_varint(data, pos)
+    return bytes(data[pos:pos + size]), pos + size
+
+
+def _encode_table(table):
+    out = bytearray()
+    if not all(isinstance(row, list) and all(cell is None or isinstance(cell, str) for cell in row)
+               for row in table):
+        out.append(_JSON_TABLE)
+        out += json.dumps(table, ensure_ascii=False).encode('utf-8')
+        return out
+    widths = [len(row) for row in table]
+    columns = max(widths, default=0)
+    rectangular = all(width == columns for width in widths)
+    # Por coluna: rótulos repetidos e colunas de None ficam em sequência, o que o deflate comprime bem
+    cells = [row[column] for column in range(columns) for row in table if column < len(row)]
+    # Tamanho de cada célula em caracteres mais 1 (0 é None): um byte por célula quando todos cabem
+    sizes = [0 if cell is None else len(cell) + 1 for cell in cells]
+    short = all(size < 256 for size in sizes)
+    out.append((_RECTANGULAR if rectangular else _RAGGED) | (_SHORT_CELLS if short else 0))
+    _write_varint(out, len(table))
+    _write_varint(out, columns)
+    if not rectangular:
+        for width in widths:
+            _write_varint(out, width)
+    if short:
+        out += bytes(sizes)
+    else:
+        for size in sizes:
+            _write_varint(out, size)
+    out += ''.join(cell for cell in cells if cell).encode('utf-8')
+    return out
+
+
+def _decode_table(data, start, end):
+    kind = data[start]
+    if kind == _JSON_TABLE:
+        return json.loads(bytes(data[start + 1:end]).decode('utf-8'))
+    rows, pos = _read_varint(data, start + 1)
+    columns, pos = _read_varint(data, pos)
+    if kind & _RAGGED:
+        widths = []
+        for _ in range(rows):
+            width, pos = _read_varint(data, pos)
+            widths.append(width)
+    else:
+        widths = [columns] * rows
+    count = sum(widths)
+    if kind & _SHORT_CELLS:
+        sizes = data[pos:pos + count]
+        pos += count
+    else:
+        sizes = []
+        for _ in range(count):
+            size, pos = _read_varint(data, pos)
+            sizes.append(size)
+    text = bytes(data[pos:end]).decode('utf-8')
+    cells = []
+    offset = 0
+    for size in sizes:
+        if size:
+            cells.append(text[offset:offset + size - 1])
+            offset += size - 1
+        else:
+            cells.append(None)
+    if not kind & _RAGGED:
+        return [cells[row::rows] for row in range(rows)] if rows else []
+    table = [[None] * width for width in widths]
+    index = 0
+    for column in range(columns):
+        for row in table:
+            if column < len(row):
+                row[column] = cells[index]
+                index += 1
+    return table
+
+
+class PageEncoder:
+    """
+    Codifica as páginas extraídas no formato compacto conforme chegam. As
+    tabelas vão por coluna: primeiro o tamanho de cada célula, depois o texto
+    de todas elas em sequência (tabelas com células que não são texto vão em
+    JSON). As páginas codificadas são agrupadas em blocos de pelo menos
+    GROUP_BYTES, e cada bloco é compactado assim que fica cheio, com o
+    primeiro bloco como dicionário preset dos demais (as páginas de um PGA
+    repetem os mesmos rótulos e cabeçalhos). Só os blocos comprimidos e o bloco em formação
+    ficam em memória, então serve também para o modo streaming, em que as
+    páginas são descartadas depois de normalizadas.
+    """
+
+    def __init__(self):
+        self._pending = bytearray()
+        self._pending_sizes = []
+        # (bloco comprimido, tamanho codificado de cada página do bloco)
+        self._blocks = []
+        self._zdict = None
+        self.paginas = 0
+
+    def add(self, page):
+        out = bytearray()
+        texto = page.get('texto')
+        flags = _NO_TEXT if texto is None else 0
+        for name, bit in _PAGE_FLAGS:
+            if page.get(name):
+                flags |= bit
+        _write_varint(out, page.get('numero_pagina') or 0)
+        _write_varint(out, flags)
+        _write_bytes(out, (texto or '').encode('utf-8'))
+        extras = {name: value for name, value in page.items() if name not in _PAGE_KEYS}
+        _write_bytes(out, json.dumps(extras, ensure_ascii=False).encode('utf-8') if extras else b'')
+        tables = [_encode_table(table) for table in page.get('tabelas') or []]
+        _write_varint(out, len(tables))
+        for table in tables:
+            _write_varint(out, len(table))
+        for table in tables:
+            out += table
+        self._pending += out
+        self._pending_sizes.append(len(out))
+        self.paginas += 1
+        if len(self._pending) >= GROUP_BYTES:
+            self._flush()
+
+    def add_page(self, dados_pagina, total_paginas=None):
+        """Mesma assinatura dos callbacks `on_page` do pipeline."""
+        self.add(dados_pagina)
+
+    def _flush(self):
+        if not self._pending_sizes:
+            return
+        raw = bytes(self._pending)
+        if self._zdict is None:
+            self._zdict = raw[-_ZDICT_BYTES:]
+            compressor = zlib.compressobj(9)
+        else:
+            compressor = zlib.compressobj(9, zdict=self._zdict)
+        self._blocks.append((compressor.compress(raw) + compressor.flush(), self._pending_sizes))
+        self._pending = bytearray()
+        self._pending_sizes = []
+
+    def finish(self):
+        """Bytes do documento codificado; o encoder não pode mais ser usado."""
+        self._flush()
+        out = bytearray(MAGIC)
+        _write_varint(out, len(self._blocks))
+        for block, sizes in self._blocks:
+            _write_varint(out, len(block))
+            _write_varint(out, len(sizes))
+            for size in sizes:
+                _write_varint(out, size)
+        for block, _ in self._blocks:
+            out += block
+        self._blocks = []
+        return bytes(out)
+
+
+class LazyExtraction:
+    """
+    Leitura sob demanda de uma extração no formato compacto: só o cabeçalho é
+    lido na criação; `page(i)` descompacta apenas o bloco da página (e, uma
+    vez, o primeiro bloco, que é o dicionário preset dos demais) e
+    `table(i, j)` decodifica apenas a tabela pedida.
+    """
+
+    def __init__(self, data):
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError('Extração não está no formato compacto.')
+        self._data = memoryview(data)
+        count, pos = _read_varint(self._data, len(MAGIC))
+        sizes = []
+        # Por página: (bloco, início, fim) dentro do bloco descompactado
+        self._pages = []
+        for block in range(count):
+            size, pos = _read_varint(self._data, pos)
+            pages, pos = _read_varint(self._data, pos)
+            sizes.append(size)
+            offset = 0
+            for _ in range(pages):
+                page_size, pos = _read_varint(self._data, pos)
+                self._pages.append((block, offset, offset + page_size))
+                offset += page_size
+        self._offsets = []
+        for size in sizes:
+            self._offsets.append((pos, pos + size))
+            pos += size
+        self._first = None
+        self._last = (None, None)
+
+    def __len__(self):
+        return len(self._pages)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.page(index)
+
+    def _block(self, index):
+        if index == 0 and self._first is not None:
+            return self._first
+        if self._last[0] == index:
+            return self._last[1]
+        start, end = self._offsets[index]
+        if index == 0:
+            self._first = memoryview(zlib.decompress(self._data[start:end]))
+            return self._first
+        decompressor = zlib.decompressobj(zdict=self._block(0)[-_ZDICT_BYTES:])
+        data = memoryview(decompressor.decompress(self._data[start:end]) + decompressor.flush())
+        self._last = (index, data)
+        return data
+
+    def _page_record(self, index):
+        block, start, end = self._pages[index]
+        data = self._block(block)[start:end]
+        numero, pos = _read_varint(data, 0)
+        flags, pos = _read_varint(data, pos)
+        texto, pos = _read_bytes(data, pos)
+        extras, pos = _read_bytes(data, pos)
+        count, pos = _read_varint(data, pos)
+        sizes = []
+        for _ in range(count):
+            size, pos = _read_varint(data, pos)
+            sizes.append(size)
+        tables = []
+        for size in sizes:
+            tables.append((pos, pos + size))
+            pos += size
+        return data, numero, flags, texto, extras, tables
+
+    def page(self, index):
+        """Página na posição `index` (a partir de 0), no mesmo formato da extração."""
+        data, numero, flags, texto, extras, tables = self._page_record(index)
+        page = {
+            'numero_pagina': numero,
+            'texto': None if flags & _NO_TEXT else texto.decode('utf-8'),
+            'tabelas': [_decode_table(data, start, end) for start, end in tables],
+        }
+        for name, bit in _PAGE_FLAGS:
+            if flags & bit:
+                page[name] = True
+        if extras:
+            page.update(json.loads(extras.decode('utf-8')))
+        return page
+
+    def table(self, page_index, table_index):
+        """Só a tabela `table_index` da página `page_index`, sem decodificar as outras."""
+        data, _, _, _, _, tables = self._page_record(page_index)
+        start, end = tables[table_index]
+        return _decode_table(data, start, end)
+
+
+def encode_pages(pages):
+    encoder = PageEncoder()
+    for page in pages:
+        encoder.add(page)
+    return encoder.finish()
+
+
+def decode_pages(data):
+    """Páginas de uma extração guardada, no formato compacto ou no antigo (`json.gz`)."""
+    if data[:len(MAGIC)] == MAGIC:
+        return list(LazyExtraction(data))
+    return json.loads(gzip.decompress(data).decode('utf-8'))
+
+
+def store_extractions(db, items):
+    """
+    Grava as extrações compactadas, como tuplas (hash_conteudo, bytes, paginas),
+    em um único bulk_write. Extrações grandes demais para um documento são
+    ignoradas com um aviso.
+    """
+    operations = []
+    agora = datetime.now().isoformat()
+    for hash_conteudo, dados, paginas in items:
+        if not hash_conteudo or dados is None:
+            continue
+        if len(dados) > MAX_STORED_BYTES:
+            logging.warning(f"Extração de {hash_conteudo[:12]}... com {len(dados)} bytes não foi guardada (limite de {MAX_STORED_BYTES}).")
+            continue
+        operations.append(ReplaceOne({'_id': hash_conteudo}, {
+            'formato': FORMAT,
+            'dados': Binary(dados),
+            'paginas': paginas,
+            'tamanho': len(dados),
+            'pdfplumber': pdfplumber.__version__,
+            'atualizado_em': agora,
+        }, upsert=True))
+    if operations:
+        db[EXTRACTIONS].bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def _lookup(document, dotted):
+    value = document
+    for part in dotted.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def plan_update(stored, normalized, force=False):
+    """
+    Compara os dados renormalizados com o documento atual e retorna a tupla
+    (status, update). `status` é "inalterado", "editado" (o documento foi
+    alterado à mão e `force` não foi pedido) ou "alterado", com o `$set` só dos
+    campos que mudaram (e `$unset` dos campos da normalização que deixaram de
+    existir). Só os campos de NORMALIZED_FIELDS são comparados.
+    """
+    fields, _ = update_fields(dict(normalized, hash_conteudo=stored.get('hash_conteudo')))
+    fields.pop('hash_dados')
+    current, _ = update_fields(stored)
+    # Campos que a normalização não produz (a proveniência gravada na aprovação pela fila, por exemplo) ficam como estão
+    fields.update({name: value for name, value in current.items()
+                   if name != 'hash_dados' and name not in fields and name not in NORMALIZED_FIELDS})
+    fields['hash_dados'] = fields_hash(fields)
+    if fields['hash_dados'] == stored.get('hash_dados'):
+        return 'inalterado', None
+
+    if current['hash_dados'] != stored.get('hash_dados') and not force:
+        return 'editado', None
+
+    changes = {name: value for name, value in fields.items() if _lookup(stored, name) != value}
+    removed = {name: '' for name in current if name not in fields}
+    update = {'$set': changes, '$inc': {REVISION_FIELD: 1}}
+    if removed:
+        update['$unset'] = removed
+    return 'alterado', update
+
+
+def _init_worker():
+    # Os logs por documento de normalize_data ficariam repetidos para cada documento
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def _renormalize_one(task):
+    """Executado no pool: renormaliza um documento a partir da extração guardada."""
+    stored, dados, force = task
+    pages = decode_pages(dados)
+    normalized = normalize_data(
+        pages,
+        (stored.get('metadados_extracao') or {}).get('nome_arquivo_original') or '',
+        stored.get('instituicao_nome'),
+        stored.get('ano_referencia'),
+    )
+    if not normalized:
+        return stored['_id'], 'erro', None, None
+    status, update = plan_update(stored, normalized, force)
+    return stored['_id'], status, update, normalized if update else None
+
+
+def renormalize(db, workers=None, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, force=False):
+    """
+    Renormaliza todos os documentos com extração guardada e grava só as
+    diferenças, um bulk_write por lote. Retorna as contagens por status.
+    """
+    counts = {'inalterado': 0, 'alterado': 0, 'editado': 0, 'sem_extracao': 0, 'erro': 0}
+    workers = workers or os.cpu_count() or 1
+    cursor = db.projetos.find({'hash_conteudo': {'$exists': True}}, RENORMALIZE_PROJECTION,
+                              sort=[('_id', 1)], batch_size=batch_size)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        batch = []
+        for stored in cursor:
+            batch.append(stored)
+            if len(batch) >= batch_size:
+                _renormalize_batch(db, executor, workers, batch, counts, dry_run, force)
+                batch = []
+        if batch:
+            _renormalize_batch(db, executor, workers, batch, counts, dry_run, force)
+    logging.info(f"Renormalização finalizada{' (dry-run)' if dry_run else ''}: "
+                 + ', '.join(f'{total} {status}' for status, total in counts.items()) + '.')
+    return counts
+
+
+def _applied(db, changed, counts):
+    """
+    Só as gravações que alteraram o documento: as outras perderam para uma
+    gravação feita no meio do caminho (o hash_dados do filtro não conferiu) e
+    contam como documento editado.
+    """
+    current = {doc['_id']: doc.get('hash_dados') for doc in
+               db.projetos.find({'_id': {'$in': [doc_id for doc_id, _, _ in changed]}}, {'hash_dados': 1})}
+    applied = []
+    for item in changed:
+        if current.get(item[0]) == item[2]:
+            applied.append(item)
+        else:
+            logging.warning(f"Documento {item[0]} foi gravado durante a renormalização; mantido.")
+    skipped = len(changed) - len(applied)
+    counts['alterado'] -= skipped
+    counts['editado'] += skipped
+    return applied
+
+
+def _renormalize_batch(db, executor, workers, batch, counts, dry_run, force):
+    hashes = list({stored['hash_conteudo'] for stored in batch})
+    extracoes = {doc['_id']: doc['dados'] for doc in db[EXTRACTIONS].find({'_id': {'$in': hashes}}, {'dados': 1})}
+    tasks = []
+    for stored in batch:
+        dados = extracoes.get(stored['hash_conteudo'])
+        if dados is None:
+            counts['sem_extracao'] += 1
+            continue
+        tasks.append((stored, bytes(dados), force))
+
+    previous = {stored['_id']: stored for stored in batch}
+    operations = []
+    changed = []
+    chunksize = max(1, len(tasks) // (workers * 4))
+    for doc_id, status, update, normalized in executor.map(_renormalize_one, tasks, chunksize=chunksize):
+        counts[status] += 1
+        if status == 'editado':
+            logging.warning(f"Documento {doc_id} foi alterado à mão; mantido (use --force para sobrescrever).")
+        if update is None:
+            continue
+        if dry_run:
+            logging.info(f"[dry-run] {doc_id}: {', '.join(sorted(update['$set']))} mudariam.")
+            continue
+        # O hash_dados lido no filtro: não sobrescreve um documento gravado no meio do caminho
+        operations.append(UpdateOne({'_id': doc_id, 'hash_dados': previous[doc_id].get('hash_dados')}, update))
+        changed.append((doc_id, normalized, update['$set']['hash_dados']))
+
+    if operations:
+        result = db.projetos.bulk_write(operations, ordered=False)
+        if result.modified_count < len(operations):
+            changed = _applied(db, changed, counts)
+        changed = [(doc_id, normalized) for doc_id, normalized, _ in changed]
+        sync_child_collections(db, changed)
+        keys = {aggregate_key(previous[doc_id]) for doc_id, _ in changed}
+        keys.update(aggregate_key(normalized) for _, normalized in changed)
+        refresh_aggregates(db, keys)
+    logging.info(f"Lote de {len(batch)} documento(s) renormalizado, {len(changed)} gravado(s).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extrações guardadas e renormalização da coleção projetos.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help='Quantidade e tamanho das extrações guardadas.')
+    renormalize_parser = subparsers.add_parser('renormalize', help='Reaplica a normalização às extrações guardadas.')
+    renormalize_parser.add_argument('--workers', type=int, default=None,
+                                    help='Processos de normalização (padrão: número de CPUs).')
+    renormalize_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                                    help=f'Documentos por lote (padrão: {DEFAULT_BATCH_SIZE}).')
+    renormalize_parser.add_argument('--dry-run', action='store_true', help='Só mostra o que mudaria.')
+    renormalize_parser.add_argument('--force', action='store_true',
+                                    help='Sobrescreve também documentos alterados à mão.')
+    args = parser.parse_args()
+
+    client = get_mongo_client()
+    try:
+        db = client.get_database()
+        if args.command == 'stats':
+            totals = next(db[EXTRACTIONS].aggregate([
+                {'$group': {'_id': None, 'extracoes': {'$sum': 1}, 'paginas': {'$sum': '$paginas'},
+                            'bytes': {'$sum': '$tamanho'}}},
+            ]), {'extracoes': 0, 'paginas': 0, 'bytes': 0})
+            totals.pop('_id', None)
+            print(json.dumps(totals, ensure_ascii=False, indent=2))
+        else:
+            renormalize(db, workers=args.workers, batch_size=max(1, args.batch_size), dry_run=args.dry_run,
+                        force=args.force)
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Projetos recorrentes entre anos e unidades (coleções `assinaturas_projetos`
+e `projetos_recorrentes`).
+
+O mesmo projeto volta de um ano para o outro (e aparece em outras unidades)
+com o título e o `o_que_sera_feito` levemente reescritos, então a comparação
+exata não encontra a recorrência, e comparar todos os projetos com todos cresce
+com o quadrado do acervo. Cada projeto ganha uma assinatura MinHash dos pares
+de termos consecutivos (`shingles`, com os termos analisados de
+search_index.py) e as chaves LSH da assinatura (`bandas`): dois projetos com
+similaridade de Jaccard acima de ~0,5 dividem ao menos uma banda com alta
+probabilidade, e os que dividem pouca coisa quase nunca.
+
+- `assinaturas_projetos` é mais uma coleção derivada de `projetos` (ver
+  child_collections.py), com uma linha por ação/projeto e índice por banda, e
+  é atualizada a cada ingestão;
+- `candidates` devolve os projetos parecidos com um projeto, em uma consulta
+  indexada pelas bandas, ordenados pela similaridade estimada;
+- `link_recurring` agrupa os projetos recorrentes de todo o acervo a partir
+  dos baldes das bandas, sem comparar todos os pares, e grava os grupos em
+  `projetos_recorrentes`.
+
+Uso:
+    python3 scripts/recurring_projects.py candidates <projeto_id> <codigo_acao> [--limit 10]
+    python3 scripts/recurring_projects.py link [--threshold 0.6]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import sys
+from collections import defaultdict
+from itertools import combinations
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING
+
+# Adiciona o diretório do script ao path do Python para importar módulos locais
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from search_index import analyze
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+SIGNATURES = 'assinaturas_projetos'
+RECURRING = 'projetos_recorrentes'
+
+# Campos do projeto que entram na assinatura
+SIGNATURE_FIELDS = ('titulo', 'o_que_sera_feito')
+SHINGLE_SIZE = 2
+
+# 16 bandas de 4 linhas: limiar da curva do LSH em (1/16)^(1/4) ~ 0,5
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+DEFAULT_THRESHOLD = 0.6
+# Baldes maiores que isso (textos padrão pouco reescritos por muitas unidades) são comparados por amostra
+MAX_BUCKET = 200
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+# Permutações fixas: as assinaturas gravadas continuam comparáveis entre execuções
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+SIGNATURE_PROJECTION = {
+    'projeto_id': 1, 'instituicao_codigo': 1, 'instituicao_nome': 1, 'ano_referencia': 1, 'posicao': 1,
+    'codigo_acao': 1, 'titulo': 1, 'assinatura': 1,
+}
+
+
+def shingles(acao):
+    """Pares de termos consecutivos de cada campo (o termo sozinho quando o campo só tem um)."""
+    result = set()
+    for name in SIGNATURE_FIELDS:
+        value = acao.get(name)
+        terms = analyze(value if isinstance(value, str) else '')
+        if len(terms) < SHINGLE_SIZE:
+            result.update(terms)
+        for i in range(len(terms) - SHINGLE_SIZE + 1):
+            result.add(' '.join(terms[i:i + SHINGLE_SIZE]))
+    return result
+
+
+def _shingle_hash(shingle):
+    return int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big') % _PRIME
+
+
+def minhash(shingle_set):
+    """Assinatura MinHash (NUM_PERM inteiros menores que 2^61) de um conjunto não vazio de shingles."""
+    hashes = [_shingle_hash(shingle) for shingle in shingle_set]
+    return [min((a * x + b) % _PRIME for x in hashes) for a, b in _PERMUTATIONS]
+
+
+def band_keys(signature):
+    """Chaves LSH: o número da banda e um hash curto das suas linhas da assinatura."""
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(repr(rows).encode('ascii'), digest_size=6).hexdigest()
+        keys.append(f'{band:02d}{digest}')
+    return keys
+
+
+def similarity(a, b):
+    """Similaridade de Jaccard estimada pela fração de posições iguais das assinaturas."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def signature_rows(parent, document):
+    """
+    Linhas de `assinaturas_projetos` de um documento de `projetos`, uma por
+    ação/projeto com texto. `parent` traz os campos comuns, como nas outras
+    coleções derivadas.
+    """
+    rows = []
+    for posicao, acao in enumerate(document.get('acoes_projetos') or []):
+        shingle_set = shingles(acao)
+        if not shingle_set:
+            continue
+        signature = minhash(shingle_set)
+        rows.append(dict(parent, posicao=posicao, codigo_acao=acao.get('codigo_acao', ''),
+                         titulo=acao.get('titulo', ''), assinatura=signature, bandas=band_keys(signature)))
+    return rows
+
+
+def candidates(collection, row, threshold=DEFAULT_THRESHOLD, limit=10):
+    """
+    Projetos de outros documentos parecidos com a linha de assinatura `row`:
+    os que dividem ao menos uma banda, com similaridade estimada acima do
+    limiar, do mais parecido para o menos.
+    """
+    found = []
+    query = {'bandas': {'$in': row['bandas']}, 'projeto_id': {'$ne': row['projeto_id']}}
+    for other in collection.find(query, SIGNATURE_PROJECTION):
+        score = similarity(row['assinatura'], other['assinatura'])
+        if score >= threshold:
+            other.pop('assinatura')
+            other['similaridade'] = score
+            found.append(other)
+    found.sort(key=lambda other: (-other['similaridade'], other.get('ano_referencia') or 0))
+    return found[:limit]
+
+
+def project_candidates(db, projeto_id, codigo_acao, threshold=DEFAULT_THRESHOLD, limit=10):
+    """Candidatos de um projeto pelo `_id` do documento e pelo código da ação, ou None se não existir."""
+    row = db[SIGNATURES].find_one({'projeto_id': projeto_id, 'codigo_acao': codigo_acao},
+                                  dict(SIGNATURE_PROJECTION, bandas=1))
+    if row is None:
+        return None
+    return candidates(db[SIGNATURES], row, threshold=threshold, limit=limit)
+
+
+def link_rows(rows, threshold=DEFAULT_THRESHOLD, max_bucket=MAX_BUCKET, stats=None):
+    """
+    Agrupa as linhas de assinatura (com `bandas`) em projetos recorrentes.
+    Linhas com a mesma assinatura (textos padrão repetidos por várias
+    unidades) são unidas direto e entram nos baldes uma vez só. Só os pares
+    que dividem um balde são comparados, e só entre documentos diferentes: as
+    ações de um mesmo PGA são projetos distintos da mesma unidade e ano, ainda
+    que com o texto parecido (modelos preenchidos quase iguais), e não uma
+    recorrência; elas só acabam no mesmo grupo por meio de projetos de outros
+    documentos. Em baldes que ainda passam de `max_bucket`, cada linha é
+    comparada só com uma amostra de `max_bucket` linhas do balde, escolhida
+    pela ordem de (`projeto_id`, `posicao`): o resultado não depende da ordem
+    em que as linhas chegam. Retorna uma lista de grupos (listas de índices de
+    `rows`) com pelo menos dois projetos.
+    """
+    parent = list(range(len(rows)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Ordem canônica das linhas: representantes e amostras iguais em toda execução
+    order = sorted(range(len(rows)), key=lambda i: (str(rows[i]['projeto_id']), rows[i].get('posicao') or 0))
+    identical = defaultdict(list)
+    for i in order:
+        identical[tuple(rows[i]['assinatura'])].append(i)
+    # Documentos de cada assinatura, pela primeira linha que a tem
+    documents = {}
+    for members in identical.values():
+        documents[members[0]] = {rows[i]['projeto_id'] for i in members}
+        if len(documents[members[0]]) > 1:
+            for i in members[1:]:
+                parent[find(i)] = find(members[0])
+
+    buckets = defaultdict(list)
+    for i in documents:
+        for key in rows[i]['bandas']:
+            buckets[key].append(i)
+
+    compared = set()
+    sampled = 0
+    for members in buckets.values():
+        if len(members) > max_bucket:
+            sampled += 1
+            pivots = members[::math.ceil(len(members) / max_bucket)]
+            pairs = ((i, j) for i in pivots for j in members if i != j)
+        else:
+            pairs = combinations(members, 2)
+        for i, j in pairs:
+            pair = (min(i, j), max(i, j))
+            # Duas linhas do mesmo documento (e só dele) não são comparadas; ver a docstring
+            if pair in compared or (documents[i] == documents[j] and len(documents[i]) == 1):
+                continue
+            compared.add(pair)
+            if similarity(rows[i]['assinatura'], rows[j]['assinatura']) >= threshold:
+                parent[find(i)] = find(j)
+
+    if stats is not None:
+        stats['assinaturas_distintas'] = len(documents)
+        stats['pares_comparados'] = len(compared)
+        stats['baldes_amostrados'] = sampled
+
+    groups = defaultdict(list)
+    for i in range(len(rows)):
+        groups[find(i)].append(i)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def _group_document(rows, members):
+    membros = sorted((rows[i] for i in members),
+                     key=lambda row: (row.get('ano_referencia') or 0, row.get('instituicao_codigo') or '',
+                                      row.get('codigo_acao') or ''))
+    return {
+        '_id': f"{membros[0]['projeto_id']}:{membros[0]['posicao']}",
+        'titulo': membros[-1].get('titulo', ''),
+        'membros': [{field: row.get(field) for field in (
+            'projeto_id', 'posicao', 'codigo_acao', 'titulo', 'instituicao_codigo', 'instituicao_nome',
+            'ano_referencia')} for row in membros],
+        'anos': sorted({row['ano_referencia'] for row in membros if row.get('ano_referencia') is not None}),
+        'unidades': sorted({row.get('instituicao_codigo') or '' for row in membros}),
+    }
+
+
+def link_recurring(db, threshold=DEFAULT_THRESHOLD):
+    """
+    Refaz `projetos_recorrentes` a partir de todas as linhas de
+    `assinaturas_projetos`. Retorna as estatísticas da execução.
+    """
+    rows = list(db[SIGNATURES].find({}, dict(SIGNATURE_PROJECTION, bandas=1)))
+    stats = {'projetos': len(rows)}
+    groups = [_group_document(rows, members) for members in link_rows(rows, threshold=threshold, stats=stats)]
+    recurring = db[RECURRING]
+    recurring.create_index([('membros.projeto_id', ASCENDING)], name='membros_projeto_id')
+    recurring.delete_many({})
+    if groups:
+        recurring.insert_many(groups, ordered=False)
+    stats['grupos'] = len(groups)
+    stats['projetos_recorrentes'] = sum(len(group['membros']) for group in groups)
+    logging.info(f"{stats['grupos']} grupos de projetos recorrentes ({stats['projetos_recorrentes']} de "
+                 f"{stats['projetos']} projetos); {stats['pares_comparados']} pares comparados, "
+                 f"{stats['baldes_amostrados']} baldes grandes comparados por amostra.")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Projetos recorrentes entre anos e unidades.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    candidates_parser = subparsers.add_parser('candidates', help='Projetos parecidos com um projeto.')
+    candidates_parser.add_argument('projeto_id', help='_id do documento em projetos.')
+    candidates_parser.add_argument('codigo_acao', help='Código da ação/projeto no documento.')
+    candidates_parser.add_argument('--limit', type=int, default=10)
+    link_parser = subparsers.add_parser('link', help='Agrupa os projetos recorrentes de todo o acervo.')
+    for sub in (candidates_parser, link_parser):
+        sub.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                         help='Similaridade estimada mínima (0 a 1).')
+    args = parser.parse_args()
+
+    # Importado aqui porque send_to_mongo importa child_collections, que importa este módulo
+    from send_to_mongo import get_mongo_client
+
+    client = get_mongo_client()
+    try:
+        db = client.get_database()
+        if args.command == 'link':
+            link_recurring(db, threshold=args.threshold)
+            return
+        try:
+            projeto_id = ObjectId(args.projeto_id)
+        except InvalidId:
+            projeto_id = args.projeto_id
+        found = project_candidates(db, projeto_id, args.codigo_acao, threshold=args.threshold, limit=args.limit)
+        if found is None:
+            logging.error(f"Projeto '{args.codigo_acao}' do documento {args.projeto_id} não encontrado.")
+            sys.exit(1)
+        print(json.dumps(found, ensure_ascii=False, indent=2, default=str))
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,75 +2,403 @@
 # -*- coding: utf-8 -*-
 """
 Script orquestrador para executar o pipeline de processamento de PDF.
+
+Modo simples (um documento):
+    python3 scripts/run_pipeline.py <pdf_path> <institution_name> <year>
+
+Modo em lote (backfill):
+    python3 scripts/run_pipeline.py --batch ./pgas/ --institution "Fatec Sorocaba" --year 2024
+    python3 scripts/run_pipeline.py --batch "./pgas/**/*.pdf" --institution "Fatec Sorocaba" --year 2024
+    python3 scripts/run_pipeline.py --batch manifest.csv --concurrency 4 --summary resultado.jsonl
+
+O manifesto (CSV com cabeçalho ou JSONL) tem os campos `pdf_path`,
+`institution_name` e `year`; caminhos relativos são resolvidos a partir da
+pasta do manifesto. No modo em lote a extração e a normalização rodam em um
+pool limitado de processos e o envio ao MongoDB usa um único MongoClient,
+com upserts idempotentes agrupados em lotes (`--write-batch`): rodar o mesmo
+lote de novo não duplica documentos.
+
+Com `--progress-fd N` (ou PGA_PROGRESS_FD) os eventos de progresso em JSON por
+linha (ver progress_events.py) são escritos no descritor N; no modo em lote os
+eventos de cada arquivo levam o campo `arquivo` e chegam quando a extração dele
+termina. `--verbose` ativa os logs por página.
 """
 
 import argparse
-import subprocess
+import csv
+import glob
+import json
 import sys
 import os
 import logging
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+# Adiciona o diretório do script ao path do Python para importar módulos locais
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import process_pdf
+from pipeline_metrics import RoundTrips, RunRecorder, add_round_trips, count_round_trips, metrics_from_env
+from progress_events import ProgressEvents, events_from_env
+from raw_extractions import PageEncoder, storage_enabled as raw_storage_enabled
+from send_to_mongo import get_mongo_client, upsert_documents, UPSERT_BATCH_SIZE
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+
+def load_batch_jobs(source, institution_name=None, year=None):
+    """
+    Monta a lista de jobs (pdf_path, institution_name, year) a partir de uma
+    pasta, de um padrão glob ou de um manifesto CSV/JSONL.
+    """
+    lower = source.lower()
+    if os.path.isfile(source) and (lower.endswith('.csv') or lower.endswith('.jsonl')):
+        base_dir = os.path.dirname(os.path.abspath(source))
+        with open(source, 'r', encoding='utf-8') as f:
+            if lower.endswith('.csv'):
+                rows = list(csv.DictReader(f))
+            else:
+                rows = [json.loads(line) for line in f if line.strip()]
+
+        jobs = []
+        for n, row in enumerate(rows, start=1):
+            pdf_path = (row.get('pdf_path') or '').strip()
+            job_institution = (row.get('institution_name') or institution_name or '').strip()
+            job_year = row.get('year') or year
+            if not pdf_path or not job_institution or not job_year:
+                raise ValueError(f"Linha {n} do manifesto sem pdf_path, institution_name ou year: {row}")
+            if not os.path.isabs(pdf_path):
+                pdf_path = os.path.join(base_dir, pdf_path)
+            jobs.append((pdf_path, job_institution, int(job_year)))
+        return jobs
+
+    if os.path.isdir(source):
+        paths = sorted(
+            os.path.join(source, name) for name in os.listdir(source) if name.lower().endswith('.pdf')
+        )
+    else:
+        paths = sorted(p for p in glob.glob(source, recursive=True) if os.path.isfile(p))
+
+    if institution_name is None or year is None:
+        raise ValueError("Para pastas e padrões glob, informe --institution e --year (ou use um manifesto).")
+    return [(path, institution_name, int(year)) for path in paths]
+
+
+def _extract_batch_item(pdf_path, institution_name, year, targeted=None, streaming=None, collect_events=False):
+    """
+    Executado no pool: extrai e normaliza um PDF, devolvendo os dados ou o erro,
+    com o registro da execução para as métricas em `metricas`. Com
+    `collect_events` os eventos de progresso do arquivo voltam em `eventos`.
+    """
+    start = time.perf_counter()
+    eventos = []
+    recorder = RunRecorder(arquivo=os.path.basename(pdf_path), instituicao=institution_name, ano=year,
+                           origem='lote')
+    events = recorder.attach(ProgressEvents(eventos.append) if collect_events else ProgressEvents())
+    raw = PageEncoder() if raw_storage_enabled() else None
+    try:
+        stats = {}
+        with recorder.counting():
+            _, normalized_data = process_pdf.extract_and_normalize(
+                pdf_path, institution_name, year, targeted=targeted, streaming=streaming, stats=stats,
+                events=events, raw=raw
+            )
+        # A extração volta compactada: só os bytes do gzip atravessam o pool
+        outcome = {"normalized": normalized_data, "paginas": stats["paginas"],
+                   "extracao": raw.finish() if raw is not None else None}
+    except process_pdf.PipelineError as e:
+        outcome = {"erro": str(e), "etapa": e.etapa, "codigo": e.codigo}
+    except Exception as e:
+        outcome = {"erro": str(e), "etapa": "desconhecida", "codigo": "erro_inesperado"}
+    outcome.update(duracao_extracao_s=time.perf_counter() - start, eventos=eventos, metricas=recorder.finish())
+    return outcome
+
+
+def run_batch(jobs, concurrency, summary_file, targeted=None, streaming=None, write_batch=UPSERT_BATCH_SIZE,
+              events=None, metrics=None):
+    """
+    Processa os jobs com no máximo `concurrency` processos de extração e grava
+    uma linha JSON de resumo por arquivo. Os documentos extraídos são enviados
+    ao MongoDB em upserts de até `write_batch` documentos por round-trip.
+    `events` (ProgressEvents) recebe os eventos de cada arquivo e os de envio.
+    Com `metrics` (PipelineMetrics), cada arquivo é registrado com a origem
+    `lote`; o envio, feito em grupo, entra no registro de cada arquivo com a
+    duração do grupo e a sua parte dos comandos enviados ao MongoDB.
+    Se um processo de extração morre, os arquivos que estavam em andamento são
+    reprocessados um por vez, para que só o culpado fique com erro. Retorna a
+    quantidade de falhas.
+    """
+    if events is None:
+        events = ProgressEvents()
+    client = get_mongo_client()
+    collection = client.get_database().projetos
+    failures = 0
+    done = 0
+    pending = []
+    batch_start = time.perf_counter()
+
+    def emit(summary, submitted_at):
+        nonlocal failures, done
+        done += 1
+        summary["duracao_total_s"] = round(time.perf_counter() - submitted_at, 3)
+        if summary["status"] != "ok":
+            failures += 1
+            logging.error(f"[{done}/{len(jobs)}] Falha em '{summary['arquivo']}': {summary['erro']}")
+        else:
+            logging.info(f"[{done}/{len(jobs)}] '{summary['arquivo']}': {summary['projetos']} projetos, "
+                         f"{summary['aquisicoes']} aquisições ({summary['operacao']}).")
+        summary_file.write(json.dumps(summary, ensure_ascii=False) + "\n")
+        summary_file.flush()
+
+    def record_run(record):
+        if metrics is not None:
+            metrics.record_run(record, collection.database)
+
+    def flush():
+        if not pending:
+            return
+        write_start = time.perf_counter()
+        round_trips = RoundTrips()
+        try:
+            with count_round_trips(round_trips), events.stage("envio") as counts:
+                result = upsert_documents(collection, [(item["normalized"], item["summary"]["arquivo"]) for item in pending])
+                counts.update(documentos=len(pending), inseridos=result["inseridos"],
+                              atualizados=result["atualizados"], inalterados=result["inalterados"])
+                process_pdf.save_raw_extractions(collection.database, [
+                    (item["normalized"].get("hash_conteudo"), item["extracao"], item["paginas"]) for item in pending
+                ])
+            resultados = result["resultados"]
+            erro = None
+        except Exception as e:
+            erro = f"Erro ao enviar os dados para o MongoDB: {e}"
+        duracao_envio = round(time.perf_counter() - write_start, 3)
+        # Os comandos do grupo são divididos entre os arquivos, para que a soma nas métricas feche
+        share, extra = divmod(round_trips.total, len(pending))
+        for n, item in enumerate(pending):
+            summary = item["summary"]
+            if erro:
+                summary.update({"status": "erro", "etapa": "envio", "codigo": "envio_falhou", "erro": erro})
+            else:
+                document_id, operacao = resultados[n]
+                summary.update({"status": "ok", "duracao_envio_s": duracao_envio})
+                summary.update(process_pdf.summarize(item["normalized"], document_id, item["paginas"], operacao))
+            record = item["metricas"]
+            if record is not None:
+                envio = {"duracao_ms": round(duracao_envio * 1000, 1), "status": "erro" if erro else "ok"}
+                if erro:
+                    envio["codigo"] = "envio_falhou"
+                    record.update(status="erro", codigo="envio_falhou")
+                record["etapas"]["envio"] = envio
+                record_run(add_round_trips(record, share + (1 if n < extra else 0)))
+            emit(summary, item["submitted_at"])
+        pending.clear()
+
+    def handle(index, outcome):
+        (pdf_path, institution_name, year), submitted_at = jobs[index], submitted[index]
+        for evento in outcome["eventos"]:
+            events.forward(dict(evento, arquivo=pdf_path))
+        summary = {
+            "arquivo": pdf_path,
+            "instituicao": institution_name,
+            "ano": year,
+            "duracao_extracao_s": round(outcome["duracao_extracao_s"], 3),
+        }
+
+        if "erro" in outcome:
+            summary.update({"status": "erro", "etapa": outcome["etapa"], "codigo": outcome["codigo"],
+                            "erro": outcome["erro"]})
+            if outcome.get("metricas"):
+                record_run(outcome["metricas"])
+            emit(summary, submitted_at)
+            return
+
+        pending.append({"summary": summary, "normalized": outcome["normalized"],
+                        "paginas": outcome["paginas"], "extracao": outcome["extracao"],
+                        "metricas": outcome.get("metricas"), "submitted_at": submitted_at})
+        if len(pending) >= write_batch:
+            flush()
+
+    def run_alone(index):
+        # Sozinho em um pool de um processo: se ele cair de novo, o arquivo é o culpado
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=1) as solo:
+            try:
+                return solo.submit(_extract_batch_item, *jobs[index], targeted, streaming, events.enabled).result()
+            except BrokenProcessPool as e:
+                return {"erro": f"O processo de extração foi interrompido ao processar o arquivo sozinho: {e}",
+                        "etapa": "extracao", "codigo": "processo_interrompido",
+                        "duracao_extracao_s": time.perf_counter() - start, "eventos": []}
+
+    # Só `concurrency` jobs ficam no pool por vez, todos em execução: quando um processo
+    # morre e o pool inteiro falha com BrokenProcessPool, só esses jobs são suspeitos
+    queue = deque(range(len(jobs)))
+    submitted = [None] * len(jobs)
+    in_flight = {}
+    executor = ProcessPoolExecutor(max_workers=concurrency)
+    try:
+        while queue or in_flight:
+            while queue and len(in_flight) < concurrency:
+                index = queue.popleft()
+                submitted[index] = time.perf_counter()
+                in_flight[executor.submit(_extract_batch_item, *jobs[index], targeted, streaming,
+                                          events.enabled)] = index
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            if not any(isinstance(future.exception(), BrokenProcessPool) for future in finished):
+                for future in finished:
+                    handle(in_flight.pop(future), future.result())
+                continue
+
+            # O pool quebrou: os demais jobs em andamento também falham (ou já terminaram)
+            wait(in_flight)
+            suspects = []
+            for future, index in in_flight.items():
+                if isinstance(future.exception(), BrokenProcessPool):
+                    suspects.append(index)
+                else:
+                    handle(index, future.result())
+            in_flight.clear()
+            executor.shutdown(wait=False)
+            logging.warning(f"Um processo de extração foi interrompido; {len(suspects)} arquivo(s) em andamento "
+                            f"serão reprocessados um por vez.")
+            for index in suspects:
+                handle(index, run_alone(index))
+            executor = ProcessPoolExecutor(max_workers=concurrency)
+        flush()
+    finally:
+        executor.shutdown(wait=True)
+        client.close()
+
+    elapsed = time.perf_counter() - batch_start
+    logging.info(
+        f"Lote finalizado: {len(jobs) - failures} sucesso(s), {failures} falha(s) em {elapsed:.1f}s "
+        f"({len(jobs) / elapsed if elapsed else 0:.2f} arquivos/s)."
+    )
+    return failures
+
+
 def main():
     """Função principal que analisa os argumentos e executa o pipeline."""
     parser = argparse.ArgumentParser(
         description="Executa o pipeline de processamento de PDF para o banco de dados PGA.",
         formatter_class=argparse.RawTextHelpFormatter
     )
-    
+
     parser.add_argument(
-        "pdf_path", 
+        "pdf_path",
+        nargs="?",
         help="O caminho completo para o arquivo PDF a ser processado."
     )
     parser.add_argument(
-        "institution_name", 
+        "institution_name",
+        nargs="?",
         help="O nome da instituição (ex: 'fatec-votorantim')."
     )
     parser.add_argument(
-        "year", 
+        "year",
+        nargs="?",
         type=int,
         help="O ano de referência do documento."
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Número de processos para a extração paralela das páginas (padrão: PGA_EXTRACTION_WORKERS ou 1)."
+    )
+    parser.add_argument(
+        "--targeted",
+        action="store_true",
+        default=None,
+        help="Extração direcionada: só detecta tabelas nas páginas com marcadores de seção usados na normalização."
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        default=None,
+        help="Extrai e normaliza página a página sem manter o PDF extraído em memória (ignora --workers e o cache)."
+    )
+    parser.add_argument(
+        "--batch",
+        help="Modo em lote: pasta, padrão glob ou manifesto (.csv/.jsonl com pdf_path, institution_name, year)."
+    )
+    parser.add_argument("--institution", help="Instituição padrão dos arquivos do lote.")
+    parser.add_argument("--year", dest="batch_year", metavar="YEAR", type=int, help="Ano de referência padrão dos arquivos do lote.")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Número máximo de arquivos processados ao mesmo tempo no modo em lote (padrão: número de CPUs)."
+    )
+    parser.add_argument(
+        "--write-batch",
+        type=int,
+        default=UPSERT_BATCH_SIZE,
+        help=f"Documentos enviados ao MongoDB por bulk_write no modo em lote (padrão: {UPSERT_BATCH_SIZE})."
+    )
+    parser.add_argument(
+        "--summary",
+        help="Arquivo JSONL com o resumo por arquivo do modo em lote (padrão: stdout)."
+    )
+    parser.add_argument(
+        "--progress-fd",
+        type=int,
+        default=None,
+        help="Descritor de arquivo que recebe os eventos de progresso em JSON por linha (padrão: PGA_PROGRESS_FD)."
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Exibe os logs por página (nível DEBUG; padrão: PGA_LOG_LEVEL ou INFO)."
+    )
 
     args = parser.parse_args()
+    process_pdf.configure_log_level("DEBUG" if args.verbose else None)
+    events = events_from_env(args.progress_fd)
 
-    # --- CORREÇÃO AQUI ---
-    # O script_dir é a pasta atual (/app/scripts)
-    # process_pdf.py está na MESMA pasta.
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    process_script_path = os.path.join(script_dir, "process_pdf.py") # Removida a sub-pasta "python"
+    if args.batch:
+        try:
+            jobs = load_batch_jobs(args.batch, args.institution, args.batch_year)
+        except (OSError, ValueError) as e:
+            logging.error(f"Não foi possível montar o lote: {e}")
+            sys.exit(1)
+        if not jobs:
+            logging.warning(f"Nenhum PDF encontrado em '{args.batch}'.")
+            sys.exit(0)
 
-    if not os.path.isfile(process_script_path):
-        logging.error(f"Erro: O script de processamento não foi encontrado em '{process_script_path}'")
-        sys.exit(1)
+        logging.info(f"Iniciando o lote com {len(jobs)} arquivo(s) e concorrência {args.concurrency}...")
+        summary_file = open(args.summary, 'w', encoding='utf-8') if args.summary else sys.stdout
+        try:
+            failures = run_batch(jobs, max(1, args.concurrency), summary_file, targeted=args.targeted,
+                                 streaming=args.streaming, write_batch=max(1, args.write_batch), events=events,
+                                 metrics=metrics_from_env())
+        finally:
+            if args.summary:
+                summary_file.close()
+        sys.exit(1 if failures else 0)
 
-    command = [
-        sys.executable,  # Usa o mesmo interpretador Python que está executando este script
-        process_script_path,
-        args.pdf_path,
-        args.institution_name,
-        str(args.year)
-    ]
+    if not (args.pdf_path and args.institution_name and args.year):
+        parser.error("informe <pdf_path> <institution_name> <year> ou use --batch.")
 
+    # O pipeline roda no mesmo interpretador: extração, normalização e envio ao
+    # MongoDB são importados de process_pdf.py em vez de encadear subprocessos.
     try:
-        logging.info(f"Iniciando o pipeline... Executando: {' '.join(command)}")
-        
-        # O subprocesso herdará o stdout/stderr, então os logs aparecerão normalmente
-        subprocess.run(command, check=True)
-        
-        logging.info("Pipeline executado com sucesso!")
-
-    except FileNotFoundError:
-        logging.error(f"Erro: O arquivo PDF '{args.pdf_path}' não foi encontrado.")
-        sys.exit(1)
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Ocorreu um erro durante a execução do pipeline (código de saída: {e.returncode}).")
-        # A saída de erro do subprocesso já foi para o terminal
+        logging.info(f"Iniciando o pipeline para '{args.pdf_path}'...")
+        resumo = process_pdf.run(args.pdf_path, args.institution_name, args.year,
+                                 workers=args.workers, targeted=args.targeted, streaming=args.streaming,
+                                 events=events)
+        logging.info(
+            f"Pipeline executado com sucesso! {resumo['projetos']} projetos e "
+            f"{resumo['aquisicoes']} aquisições (documento {resumo['inserted_id']} {resumo['operacao']})."
+        )
+
+    except process_pdf.PipelineError as e:
+        logging.error(f"Ocorreu um erro durante a execução do pipeline (etapa: {e.etapa}): {e}")
         sys.exit(1)
     except Exception as e:
         logging.error(f"Um erro inesperado ocorreu: {e}")
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índice de busca textual sobre as narrativas dos PGAs (coleção `busca`).
+
+A coleção é mais uma derivada de `projetos` (ver child_collections.py), então
+é mantida pelos mesmos writers. Tem uma linha por ação/projeto, com `titulo`,
+`o_que_sera_feito` e `por_que_sera_feito`, e uma linha por documento com
+`analise_cenario` e `situacoes_problema_gerais`. Cada linha guarda os textos
+originais (para os trechos do resultado) e os termos já analisados em
+português: minúsculas e sem acentos (como `normalize_code`), sem stopwords e
+reduzidos por um stemmer leve (plural, feminino e vogal temática).
+
+A coleção tem um índice de texto do MongoDB (idioma português). A consulta
+usa esse índice para trazer só as linhas candidatas (as de maior `textScore`,
+já com os filtros) e as ordena com um índice invertido em memória
+(`SearchEngine`), com ranking BM25 e trechos com os termos encontrados. As
+estatísticas do BM25 (número de linhas, tamanho médio e em quantas linhas
+aparece cada termo) são contadas no servidor, então a pontuação é a mesma de
+um índice sobre a coleção inteira, sem carregar a coleção a cada busca.
+`mongo_search` devolve direto o resultado do `$text`.
+
+Uso:
+    python3 scripts/search_index.py query "laboratório de informática" [--ano 2025] [--instituicao 123] [--limit 10] [--candidatas 500]
+    python3 scripts/search_index.py query "evasão" --mongo
+    python3 scripts/child_collections.py rebuild   # reconstrói também a coleção busca
+"""
+
+import argparse
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import sys
+import time
+import unicodedata
+from collections import defaultdict
+
+# Adiciona o diretório do script ao path do Python para importar módulos locais
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+SEARCH_COLLECTION = 'busca'
+TEXT_INDEX = 'texto_portugues'
+
+# Campos indexados por tipo de linha, com o peso de cada ocorrência no ranking
+PROJECT_FIELDS = (('titulo', 2), ('o_que_sera_feito', 1), ('por_que_sera_feito', 1))
+DOCUMENT_FIELDS = (('analise_cenario', 1), ('situacoes_problema_gerais', 1))
+
+# Parâmetros do BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+SNIPPET_WORDS = 12
+# Máximo de linhas trazidas pelo `$text` para o ranking BM25
+TEXT_CANDIDATES = 500
+
+STOPWORDS = frozenset("""
+a ao aos aquela aquelas aquele aqueles aquilo as ate com como da das de dela delas dele deles depois do dos
+e ela elas ele eles em entre era eram essa essas esse esses esta estas este estes eu foi for foram ha isso
+isto ja lhe lhes mais mas me mesmo meu meus minha minhas muito na nas nao nem no nos nossa nossas nosso
+nossos num numa o os ou para pela pelas pelo pelos por qual quando que quem sao se sem ser sera seu seus
+so sobre sua suas tambem te tem ter teu tua tu um uma umas uns voce voces vos cada onde outro outra outros
+outras pois porque sendo tal tais ainda bem assim
+""".split())
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fold(text):
+    """Minúsculas e sem acentos: 'Ação' -> 'acao', como `normalize_code` faz com os acentos do português."""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def stem(word):
+    """
+    Stemmer leve para português (palavra já sem acentos): une plural e
+    singular, feminino e masculino e remove a vogal final. Não tenta ser um
+    stemmer completo; basta que variações da mesma palavra caiam no mesmo termo.
+    """
+    if len(word) < 4 or not word.isalpha():
+        return word
+    if word.endswith('mente') and len(word) > 7:
+        word = word[:-5]
+    # Plural
+    if word.endswith(('oes', 'aes')) and len(word) > 4:
+        word = word[:-3] + 'ao'
+    elif word.endswith('eis') and len(word) > 4:
+        word = word[:-3] + 'el'
+    elif word.endswith(('ais', 'ois')) and len(word) > 4:
+        word = word[:-2] + 'l'
+    elif word.endswith('ns') and len(word) > 4:
+        word = word[:-2] + 'm'
+    elif word.endswith('es') and len(word) > 4 and word[-3] in 'rslz':
+        word = word[:-2]
+    elif word.endswith('s') and not word.endswith('ss') and len(word) > 3:
+        word = word[:-1]
+    # Feminino
+    if word.endswith('ora') and len(word) > 5:
+        word = word[:-1]
+    elif word.endswith('inha') and len(word) > 5:
+        word = word[:-1] + 'o'
+    # Vogal final
+    if len(word) > 4 and word[-1] in 'aeo':
+        word = word[:-1]
+    return word
+
+
+def analyze(text):
+    """Termos de um texto: palavras sem acento, sem stopwords e com stemming."""
+    return [stem(word) for word in _WORD_RE.findall(fold(text or '')) if word not in STOPWORDS]
+
+
+def _field_text(value):
+    if isinstance(value, list):
+        return '\n'.join(str(item) for item in value if item)
+    return value if isinstance(value, str) else ''
+
+
+def _row(parent, tipo, campos, weights):
+    termos = defaultdict(int)
+    for name, weight in weights:
+        for term in analyze(campos.get(name)):
+            termos[term] += weight
+    return dict(parent, tipo=tipo, campos=campos, termos=dict(termos), tamanho=sum(termos.values()))
+
+
+def index_rows(parent, document):
+    """
+    Linhas da coleção `busca` de um documento de `projetos`. `parent` traz os
+    campos comuns (projeto_id, instituição e ano), como nas outras coleções
+    derivadas. Linhas sem nenhum termo não são geradas.
+    """
+    rows = []
+    campos = {name: _field_text(document.get(name)) for name, _ in DOCUMENT_FIELDS}
+    row = _row(parent, 'documento', campos, DOCUMENT_FIELDS)
+    if row['tamanho']:
+        rows.append(row)
+    for posicao, acao in enumerate(document.get('acoes_projetos') or []):
+        campos = {name: _field_text(acao.get(name)) for name, _ in PROJECT_FIELDS}
+        row = _row(dict(parent, posicao=posicao, codigo_acao=acao.get('codigo_acao', '')), 'projeto', campos,
+                   PROJECT_FIELDS)
+        if row['tamanho']:
+            rows.append(row)
+    return rows
+
+
+def ensure_text_index(collection):
+    """Índice de texto do MongoDB sobre os textos originais, com as regras do idioma português."""
+    fields = PROJECT_FIELDS + DOCUMENT_FIELDS
+    collection.create_index(
+        [(f'campos.{name}', 'text') for name, _ in fields],
+        name=TEXT_INDEX,
+        default_language='portuguese',
+        weights={f'campos.{name}': weight for name, weight in fields},
+    )
+
+
+def _snippet(row, query_terms):
+    """Trecho do primeiro campo que contém um termo da busca, com os termos entre ** **."""
+    for name, _ in PROJECT_FIELDS + DOCUMENT_FIELDS:
+        text = (row.get('campos') or {}).get(name)
+        if not text:
+            continue
+        words = list(_WORD_RE.finditer(text))
+        hits = [index for index, match in enumerate(words) if stem(fold(match.group())) in query_terms
+                and fold(match.group()) not in STOPWORDS]
+        if not hits:
+            continue
+        start = max(0, hits[0] - SNIPPET_WORDS // 3)
+        end = min(len(words), start + SNIPPET_WORDS)
+        hits = set(hits)
+        parts = []
+        position = words[start].start()
+        for index in range(start, end):
+            match = words[index]
+            parts.append(text[position:match.start()])
+            parts.append(f'**{match.group()}**' if index in hits else match.group())
+            position = match.end()
+        snippet = ''.join(parts).replace('\n', ' ')
+        return ('...' if start else '') + snippet + ('...' if end < len(words) else '')
+    return ''
+
+
+def _scope_filter(ano=None, instituicao=None):
+    filtro = {}
+    if ano is not None:
+        filtro['ano_referencia'] = ano
+    if instituicao:
+        filtro['instituicao_codigo'] = instituicao
+    return filtro
+
+
+def _text_filter(text, **filtro):
+    return dict(filtro, **{'$text': {'$search': text, '$language': 'portuguese'}})
+
+
+class SearchEngine:
+    """
+    Índice invertido em memória de linhas de `busca`, com ranking BM25. Por
+    padrão as estatísticas do BM25 são as das próprias linhas; `total`,
+    `avg_length` e `document_frequency` permitem usar as da coleção quando as
+    linhas são só as candidatas de uma busca (ver `from_db`).
+    """
+
+    def __init__(self, rows, total=None, avg_length=None, document_frequency=None):
+        self.rows = rows
+        self.total = len(rows) if total is None else total
+        if avg_length is None:
+            avg_length = (sum(row.get('tamanho', 0) for row in rows) / len(rows)) if rows else 0
+        self.avg_length = avg_length
+        self.document_frequency = document_frequency or {}
+        # A parte do BM25 que não depende da busca (frequência normalizada pelo tamanho) é calculada aqui
+        self.postings = defaultdict(list)
+        for index, row in enumerate(rows):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * row.get('tamanho', 0) / self.avg_length) if self.avg_length else BM25_K1
+            for term, frequency in (row.get('termos') or {}).items():
+                self.postings[term].append((index, frequency * (BM25_K1 + 1) / (frequency + norm)))
+
+    @classmethod
+    def from_db(cls, db, query, ano=None, instituicao=None, tipo=None, candidates=TEXT_CANDIDATES):
+        """
+        Índice das linhas candidatas de uma busca: as `candidates` de maior
+        `textScore` no índice de texto do MongoDB, já filtradas por ano,
+        instituição e tipo. O número de linhas e o tamanho médio vêm de uma
+        agregação e a frequência de cada termo de uma contagem pelo índice de
+        texto, todos com o filtro de ano e instituição (como se o índice fosse
+        montado só com essas linhas). Linhas além das `candidates` primeiras
+        do `textScore` ficam fora do ranking.
+        """
+        collection = db[SEARCH_COLLECTION]
+        filtro = _scope_filter(ano, instituicao)
+        words = {}
+        for word in _WORD_RE.findall(query or ''):
+            folded = fold(word)
+            if folded not in STOPWORDS:
+                words.setdefault(stem(folded), word)
+        if not words:
+            return cls([])
+
+        candidate_filter = _text_filter(query, **filtro)
+        if tipo is not None:
+            candidate_filter['tipo'] = tipo
+        rows = list(collection.find(
+            candidate_filter,
+            {'_id': 0, 'score': {'$meta': 'textScore'}},
+            sort=[('score', {'$meta': 'textScore'})],
+            limit=candidates,
+        ))
+        if not rows:
+            return cls([])
+
+        stats = next(iter(collection.aggregate([
+            {'$match': filtro},
+            {'$group': {'_id': None, 'total': {'$sum': 1}, 'tamanho': {'$avg': '$tamanho'}}},
+        ])), None) or {}
+        document_frequency = {term: collection.count_documents(_text_filter(word, **filtro))
+                              for term, word in words.items()}
+        return cls(rows, stats.get('total'), stats.get('tamanho'), document_frequency)
+
+    def search(self, query, limit=10, ano=None, instituicao=None, tipo=None):
+        """
+        Linhas mais relevantes para a busca, da maior para a menor pontuação.
+        Cada resultado traz a pontuação, o documento de origem, o projeto (se
+        for uma linha de projeto) e um trecho com os termos encontrados.
+        """
+        query_terms = set(analyze(query))
+        if not query_terms or not self.rows:
+            return []
+        total = max(self.total, len(self.rows))
+        scores = defaultdict(float)
+        for term in query_terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            # A contagem do servidor usa o stemmer do MongoDB: nunca menos que as linhas que têm o termo
+            frequency = max(self.document_frequency.get(term, 0), len(postings))
+            idf = math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+            for index, weight in postings:
+                scores[index] += idf * weight
+
+        def accepted(index):
+            row = self.rows[index]
+            return ((ano is None or row.get('ano_referencia') == ano)
+                    and (not instituicao or row.get('instituicao_codigo') == instituicao)
+                    and (tipo is None or row.get('tipo') == tipo))
+
+        candidates = scores.items()
+        if ano is not None or instituicao or tipo is not None:
+            candidates = [item for item in candidates if accepted(item[0])]
+        best = heapq.nlargest(limit, candidates, key=lambda item: item[1])
+        results = []
+        for index, score in best:
+            row = self.rows[index]
+            results.append({
+                'pontuacao': round(score, 4),
+                'tipo': row.get('tipo'),
+                'projeto_id': row.get('projeto_id'),
+                'instituicao_codigo': row.get('instituicao_codigo'),
+                'instituicao_nome': row.get('instituicao_nome'),
+                'ano_referencia': row.get('ano_referencia'),
+                'codigo_acao': row.get('codigo_acao'),
+                'titulo': (row.get('campos') or {}).get('titulo'),
+                'trecho': _snippet(row, query_terms),
+            })
+        return results
+
+
+def mongo_search(db, query, limit=10, ano=None, instituicao=None):
+    """Mesma busca pelo índice de texto do MongoDB (`$text`), ordenada pelo `textScore`."""
+    cursor = db[SEARCH_COLLECTION].find(
+        _text_filter(query, **_scope_filter(ano, instituicao)),
+        {'_id': 0, 'termos': 0, 'pontuacao': {'$meta': 'textScore'}},
+        sort=[('pontuacao', {'$meta': 'textScore'})],
+        limit=limit,
+    )
+    return list(cursor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Busca textual nas narrativas dos PGAs (coleção busca).')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    query_parser = subparsers.add_parser('query', help='Busca projetos e documentos pelos textos.')
+    query_parser.add_argument('texto', help='Texto da busca.')
+    query_parser.add_argument('--ano', type=int, default=None, help='Só documentos deste ano de referência.')
+    query_parser.add_argument('--instituicao', default=None, help='Só documentos deste código de unidade.')
+    query_parser.add_argument('--limit', type=int, default=10, help='Número máximo de resultados (padrão: 10).')
+    query_parser.add_argument('--candidatas', type=int, default=TEXT_CANDIDATES,
+                              help=f'Linhas trazidas pelo $text para o ranking (padrão: {TEXT_CANDIDATES}).')
+    query_parser.add_argument('--mongo', action='store_true', help='Só o índice de texto do MongoDB ($text), sem o BM25.')
+    args = parser.parse_args()
+
+    # Importado aqui porque send_to_mongo importa child_collections, que importa este módulo
+    from send_to_mongo import get_mongo_client
+
+    client = get_mongo_client()
+    try:
+        db = client.get_database()
+        if args.mongo:
+            start = time.perf_counter()
+            results = mongo_search(db, args.texto, args.limit, args.ano, args.instituicao)
+        else:
+            start = time.perf_counter()
+            engine = SearchEngine.from_db(db, args.texto, args.ano, args.instituicao,
+                                          candidates=max(args.candidatas, args.limit))
+            logging.info(f'Candidatas: {len(engine.rows)} de {engine.total} linhas '
+                         f'em {(time.perf_counter() - start) * 1000:.0f} ms.')
+            results = engine.search(args.texto, args.limit)
+        logging.info(f'{len(results)} resultado(s) em {(time.perf_counter() - start) * 1000:.1f} ms.')
+        for result in results:
+            print(json.dumps(result, ensure_ascii=False, default=str))
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,18 +2,44 @@
 # -*- coding: utf-8 -*-
 """
 Script para receber um JSON normalizado via stdin, ler o arquivo PDF original,
-e enviar ambos para o MongoDB.
+e enviar ambos para o MongoDB. O PDF vai para o GridFS (bucket `pdfs`) e o
+documento da coleção `projetos` guarda apenas a referência `pdf_original_id`.
+
+A gravação é um upsert idempotente pela chave natural (código da unidade +
+`ano_referencia` + `hash_conteudo`, o SHA-256 do PDF original): reenviar o
+mesmo PDF (retentativas, envios duplicados) atualiza o documento existente em
+vez de criar outro, e não grava nada se os dados não mudaram. O índice único
+da chave natural é criado no primeiro uso. Documentos inseridos ou
+atualizados também são replicados nas coleções derivadas `acoes`,
+`equipe_membros` e `aquisicoes` (ver child_collections.py) e atualizam os
+totais de `dashboard_aggregates` (ver dashboard_aggregates.py).
+
+As funções `get_mongo_client`, `upsert_document` e `upsert_documents` também
+são importadas pelo pipeline em processo (`process_pdf.py`), pelo modo em lote
+(`run_pipeline.py`) e pelo worker persistente (`pipeline_worker.py`), que
+reutilizam uma única conexão.
 """
 
 import sys
 import os
 import json
+import hashlib
 import logging
-import base64
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+from gridfs import GridFSBucket
+from gridfs.errors import NoFile
+from pymongo import MongoClient, ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure
 from dotenv import load_dotenv
 
+# Adiciona o diretório do script ao path do Python para importar módulos locais
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from extraction_cache import file_sha256
+from child_collections import (SOURCE_PROJECTION as CHILD_PROJECTION, delete_documents as delete_child_rows,
+                               sync_documents as sync_child_collections)
+from dashboard_aggregates import aggregate_key, refresh as refresh_aggregates
+from pipeline_metrics import ROUND_TRIPS
+
 # Carregar as variáveis de ambiente do arquivo .env
 # Tenta carregar a partir do diretório raiz do projeto (pai do scripts/)
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -22,16 +48,326 @@ load_dotenv(env_path)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Bucket do GridFS onde ficam os PDFs originais (collections pdfs.files / pdfs.chunks)
+PDF_BUCKET = 'pdfs'
+
+# Chave natural de um documento da coleção `projetos`
+NATURAL_KEY_FIELDS = ('identificacao_unidade.codigo', 'ano_referencia', 'hash_conteudo')
+NATURAL_KEY_INDEX = 'chave_natural'
+# Documentos por round-trip do bulk_write
+UPSERT_BATCH_SIZE = 100
+# Campos que só são gravados quando o documento é criado
+INSERT_ONLY_FIELDS = ('pdf_original_id', 'pdf_original_tamanho')
+# Contador incrementado a cada gravação, usado pelo editor manual para detectar edições concorrentes
+REVISION_FIELD = 'revisao'
+
+INSERIDO = 'inserido'
+ATUALIZADO = 'atualizado'
+INALTERADO = 'inalterado'
+
+# Collections cujo índice da chave natural já foi garantido neste processo
+_indexed_collections = set()
+
+
+def get_mongo_client():
+    """
+    Cria um MongoClient a partir de MONGODB_URI, com os comandos contados nas
+    métricas do pipeline (ver pipeline_metrics.py). Lança RuntimeError se a
+    variável não existir.
+    """
+    mongodb_uri = os.getenv('MONGODB_URI')
+    if not mongodb_uri:
+        raise RuntimeError("A variável de ambiente MONGODB_URI não foi encontrada.")
+    return MongoClient(mongodb_uri, event_listeners=[ROUND_TRIPS])
+
+
+def store_pdf(db, pdf_path):
+    """
+    Envia o PDF original para o GridFS (bucket `pdfs`) em blocos, sem carregar o
+    arquivo inteiro em memória, e retorna o ObjectId do arquivo armazenado.
+    """
+    bucket = GridFSBucket(db, bucket_name=PDF_BUCKET)
+    filename = os.path.basename(pdf_path)
+    logging.info(f"Enviando o arquivo PDF '{filename}' para o GridFS...")
+    with open(pdf_path, "rb") as pdf_file:
+        file_id = bucket.upload_from_stream(
+            filename,
+            pdf_file,
+            metadata={"contentType": "application/pdf"}
+        )
+    logging.info(f"Arquivo PDF armazenado no GridFS com ID: {file_id}")
+    return file_id
+
+
+def ensure_natural_key_index(collection):
+    """
+    Cria o índice único da chave natural, uma vez por processo e collection.
+
+    O índice é parcial (só documentos com `hash_conteudo`), para não conflitar
+    com documentos antigos gravados antes do upsert, que podem estar duplicados.
+    """
+    if collection.full_name in _indexed_collections:
+        return
+    collection.create_index(
+        [(field, ASCENDING) for field in NATURAL_KEY_FIELDS],
+        name=NATURAL_KEY_INDEX,
+        unique=True,
+        partialFilterExpression={'hash_conteudo': {'$exists': True}},
+    )
+    _indexed_collections.add(collection.full_name)
+
+
+def natural_key(normalized_data):
+    """Filtro da chave natural de um documento normalizado que já tem `hash_conteudo`."""
+    return {
+        'identificacao_unidade.codigo': (normalized_data.get('identificacao_unidade') or {}).get('codigo', ''),
+        'ano_referencia': normalized_data['ano_referencia'],
+        'hash_conteudo': normalized_data['hash_conteudo'],
+    }
+
+
+def _key_tuple(key):
+    return tuple(key[field] for field in NATURAL_KEY_FIELDS)
+
+
+def _stored_key_tuple(doc):
+    return ((doc.get('identificacao_unidade') or {}).get('codigo', ''), doc.get('ano_referencia'), doc.get('hash_conteudo'))
+
+
+def update_fields(normalized_data):
+    """
+    Separa os dados normalizados em campos de `$set` e de `$setOnInsert`.
+
+    A data de extração e a referência ao PDF ficam com a primeira gravação,
+    para que reenviar o mesmo PDF não altere o documento à toa. `hash_dados`
+    resume os campos de `$set` e permite saber, sem escrever, se algo mudou.
+    """
+    fields = {}
+    on_insert = {}
+    for name, value in normalized_data.items():
+        if name in ('_id', REVISION_FIELD):
+            continue
+        if name == 'metadados_extracao':
+            for meta_name, meta_value in (value or {}).items():
+                target = on_insert if meta_name == 'data_extracao' else fields
+                target[f'metadados_extracao.{meta_name}'] = meta_value
+        elif name in INSERT_ONLY_FIELDS:
+            on_insert[name] = value
+        else:
+            fields[name] = value
+    fields.pop('hash_dados', None)
+    fields['hash_dados'] = fields_hash(fields)
+    return fields, on_insert
+
+
+def fields_hash(fields):
+    """`hash_dados` de um conjunto de campos de `$set` (sem o próprio `hash_dados`)."""
+    canonical = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def upsert_documents(collection, items, batch_size=UPSERT_BATCH_SIZE):
+    """
+    Grava vários documentos com upsert pela chave natural, `batch_size` por bulk_write.
+
+    `items` é uma lista de tuplas (dados_normalizados, caminho_do_pdf). Só os
+    PDFs de documentos novos vão para o GridFS. Retorna as contagens
+    `inseridos`, `atualizados` e `inalterados` e, em `resultados`, uma tupla
+    (id do documento, operação) por item, na ordem de `items`.
+    """
+    ensure_natural_key_index(collection)
+    counts = {INSERIDO: 0, ATUALIZADO: 0, INALTERADO: 0}
+    results = []
+    for start in range(0, len(items), batch_size):
+        results.extend(_upsert_batch(collection, items[start:start + batch_size], counts))
+    return {
+        'inseridos': counts[INSERIDO],
+        'atualizados': counts[ATUALIZADO],
+        'inalterados': counts[INALTERADO],
+        'resultados': results,
+    }
+
+
+def _upsert_batch(collection, items, counts):
+    """Um round-trip de leitura das chaves existentes e um bulk_write para o lote."""
+    db = collection.database
+    # Um mesmo PDF repetido no lote vira uma única operação (vale a última ocorrência)
+    latest = {}
+    item_keys = []
+    for normalized_data, pdf_path in items:
+        normalized_data['hash_conteudo'] = file_sha256(pdf_path)
+        key = natural_key(normalized_data)
+        item_keys.append(_key_tuple(key))
+        latest[_key_tuple(key)] = (key, normalized_data, pdf_path)
+
+    existing = {
+        _stored_key_tuple(doc): doc
+        for doc in collection.find(
+            {'$or': [key for key, _, _ in latest.values()]},
+            {field: 1 for field in NATURAL_KEY_FIELDS + ('hash_dados',)},
+        )
+    }
+
+    outcome = {}
+    operations = []
+    op_keys = []
+    upsert_keys = []
+    uploaded = {}
+    try:
+        for key_tuple, (key, normalized_data, pdf_path) in latest.items():
+            fields, on_insert = update_fields(normalized_data)
+            current = existing.get(key_tuple)
+            if current is not None:
+                if current.get('hash_dados') == fields['hash_dados']:
+                    outcome[key_tuple] = (current['_id'], INALTERADO)
+                    continue
+                operations.append(UpdateOne({'_id': current['_id']}, {'$set': fields, '$inc': {REVISION_FIELD: 1}}))
+                outcome[key_tuple] = (current['_id'], ATUALIZADO)
+            else:
+                file_id = store_pdf(db, pdf_path)
+                uploaded[key_tuple] = file_id
+                on_insert.update({'pdf_original_id': file_id, 'pdf_original_tamanho': os.path.getsize(pdf_path)})
+                # Se outro processo criar o documento antes do bulk_write, o filtro só casa
+                # quando os dados dele são diferentes; iguais, o upsert vira um erro 11000
+                operations.append(UpdateOne(dict(key, hash_dados={'$ne': fields['hash_dados']}),
+                                            {'$set': fields, '$setOnInsert': on_insert,
+                                             '$inc': {REVISION_FIELD: 1}}, upsert=True))
+                upsert_keys.append(key_tuple)
+            op_keys.append(key_tuple)
+
+        if operations:
+            logging.info(f"Gravando {len(operations)} documento(s) em '{collection.name}' com bulk_write...")
+            try:
+                result = collection.bulk_write(operations, ordered=False)
+                _record_upserts(result.upserted_ids, op_keys, outcome)
+            except BulkWriteError as e:
+                _record_upserts({op['index']: op['_id'] for op in e.details.get('upserted', [])}, op_keys, outcome)
+                _resolve_write_errors(collection, e, op_keys, outcome)
+            _resolve_matched_upserts(collection, upsert_keys, outcome)
+    finally:
+        # Remove do GridFS os PDFs enviados para documentos que não chegaram a ser criados
+        bucket = None
+        for key_tuple, file_id in uploaded.items():
+            if outcome.get(key_tuple, (None, None))[1] != INSERIDO:
+                bucket = bucket or GridFSBucket(db, bucket_name=PDF_BUCKET)
+                bucket.delete(file_id)
+
+    for doc_id, operacao in outcome.values():
+        counts[operacao] += 1
+
+    # Mantém as coleções derivadas (acoes, equipe_membros, aquisicoes) e os totais do dashboard em dia
+    changed = [
+        (doc_id, latest[key_tuple][1])
+        for key_tuple, (doc_id, operacao) in outcome.items() if operacao != INALTERADO
+    ]
+    sync_child_collections(db, changed)
+    refresh_aggregates(db, {aggregate_key(document) for _, document in changed})
+    return [outcome[key_tuple] for key_tuple in item_keys]
+
+
+def _record_upserts(upserted_ids, op_keys, outcome):
+    for index, doc_id in upserted_ids.items():
+        outcome[op_keys[index]] = (doc_id, INSERIDO)
+
+
+def _resolve_matched_upserts(collection, upsert_keys, outcome):
+    """
+    Upserts de documentos novos que casaram com um documento criado por outro
+    processo entre a leitura e a escrita: os dados deste lote foram gravados
+    sobre ele, então contam como atualizados.
+    """
+    for key_tuple in upsert_keys:
+        if key_tuple in outcome:
+            continue
+        doc = collection.find_one(dict(zip(NATURAL_KEY_FIELDS, key_tuple)), {'_id': 1})
+        if doc is None:
+            raise RuntimeError(f"Documento {key_tuple} não encontrado depois do upsert.")
+        outcome[key_tuple] = (doc['_id'], ATUALIZADO)
+
+
+def _resolve_write_errors(collection, error, op_keys, outcome):
+    """
+    Trata os erros de um bulk_write não ordenado. Violação da chave natural
+    (outro processo criou o mesmo documento entre a leitura e a escrita) conta
+    como inalterado; qualquer outro erro é relançado.
+    """
+    for write_error in error.details.get('writeErrors', []):
+        if write_error.get('code') != 11000:
+            raise error
+        key_tuple = op_keys[write_error['index']]
+        doc = collection.find_one(dict(zip(NATURAL_KEY_FIELDS, key_tuple)), {'_id': 1})
+        if doc is None:
+            raise error
+        outcome[key_tuple] = (doc['_id'], INALTERADO)
+
+
+def upsert_document(collection, normalized_data, pdf_path):
+    """Grava um documento com upsert pela chave natural. Retorna (id do documento, operação)."""
+    result = upsert_documents(collection, [(normalized_data, pdf_path)])
+    doc_id, operacao = result['resultados'][0]
+    logging.info(f"Documento {doc_id} {operacao} em '{collection.database.name}.{collection.name}'.")
+    return doc_id, operacao
+
+
+def sync_projects(db, projeto_ids, previous_keys=()):
+    """
+    Atualiza as coleções derivadas e os totais do dashboard de documentos de
+    `projetos` gravados por outros caminhos (as rotas de edição da interface
+    web). `previous_keys` são os pares (código, ano) de antes da gravação, para
+    recalcular também o par de onde o documento saiu. Retorna quantos
+    documentos foram sincronizados.
+    """
+    projeto_ids = list(projeto_ids)
+    documents = list(db.projetos.find({'_id': {'$in': projeto_ids}}, CHILD_PROJECTION))
+    found = {doc['_id'] for doc in documents}
+    missing = [projeto_id for projeto_id in projeto_ids if projeto_id not in found]
+    sync_child_collections(db, [(doc['_id'], doc) for doc in documents])
+    if missing:
+        delete_child_rows(db, missing)
+    refresh_aggregates(db, {aggregate_key(doc) for doc in documents} | {tuple(key) for key in previous_keys})
+    return len(documents)
+
+
+def delete_project(db, projeto_id):
+    """
+    Remove um documento de `projetos` com tudo o que deriva dele: linhas das
+    coleções derivadas (e as identidades de `pessoas`), o PDF no GridFS, a
+    extração guardada (se nenhum outro documento usa o mesmo PDF) e o total do
+    dashboard do par. Retorna o documento removido (sem os dados) ou None.
+    """
+    # Importado aqui porque raw_extractions importa este módulo
+    from raw_extractions import EXTRACTIONS
+
+    document = db.projetos.find_one_and_delete(
+        {'_id': projeto_id},
+        projection={'identificacao_unidade.codigo': 1, 'ano_referencia': 1, 'hash_conteudo': 1,
+                    'pdf_original_id': 1, 'metadados_extracao.nome_arquivo_original': 1},
+    )
+    if document is None:
+        return None
+    delete_child_rows(db, [projeto_id])
+    hash_conteudo = document.get('hash_conteudo')
+    if hash_conteudo and db.projetos.find_one({'hash_conteudo': hash_conteudo}, {'_id': 1}) is None:
+        db[EXTRACTIONS].delete_one({'_id': hash_conteudo})
+    if document.get('pdf_original_id'):
+        try:
+            GridFSBucket(db, bucket_name=PDF_BUCKET).delete(document['pdf_original_id'])
+        except NoFile:
+            logging.warning(f"PDF {document['pdf_original_id']} do documento {projeto_id} não estava no GridFS.")
+    refresh_aggregates(db, {aggregate_key(document)})
+    logging.info(f"Documento {projeto_id} removido de 'projetos' e das coleções derivadas.")
+    return document
+
+
 def main():
     # O primeiro argumento da linha de comando será o caminho para o arquivo PDF
     if len(sys.argv) < 2:
         logging.error("Uso: python send_to_mongo.py <caminho_do_pdf>")
         sys.exit(1)
-    
+
     pdf_path = sys.argv[1]
 
-    mongodb_uri = os.getenv('MONGODB_URI')
-    if not mongodb_uri:
+    if not os.getenv('MONGODB_URI'):
         logging.error("A variável de ambiente MONGODB_URI não foi encontrada.")
         sys.exit(1)
 
@@ -41,7 +377,7 @@ def main():
         if not json_input_string:
             logging.warning("Nenhum dado JSON recebido da entrada padrão.")
             sys.exit(0)
-        
+
         data = json.loads(json_input_string)
         data_to_insert = data.get("normalizedData")
 
@@ -56,35 +392,16 @@ def main():
         logging.error(f"Erro ao processar a entrada JSON: {e}")
         sys.exit(1)
 
-    # Ler e codificar o arquivo PDF em base64
-    try:
-        logging.info(f"Lendo o arquivo PDF de: {pdf_path}")
-        with open(pdf_path, "rb") as pdf_file:
-            pdf_binary_content = pdf_file.read()
-            pdf_base64_encoded = base64.b64encode(pdf_binary_content).decode('utf-8')
-        
-        # Adicionar o conteúdo codificado ao dicionário para inserção
-        data_to_insert['pdf_original_arquivo'] = pdf_base64_encoded
-        logging.info("Arquivo PDF codificado e adicionado ao documento.")
-
-    except FileNotFoundError:
+    if not os.path.isfile(pdf_path):
         logging.error(f"Erro: Arquivo PDF não encontrado em '{pdf_path}'")
         sys.exit(1)
-    except Exception as e:
-        logging.error(f"Erro ao ler ou codificar o arquivo PDF: {e}")
-        sys.exit(1)
 
     logging.info("Conectando ao MongoDB...")
     client = None  # Inicializa client como None
     try:
-        client = MongoClient(mongodb_uri)
+        client = get_mongo_client()
         db = client.get_database()
-        collection = db.projetos
-
-        logging.info(f"Inserindo dados no banco '{db.name}', collection '{collection.name}'...")
-        result = collection.insert_one(data_to_insert)
-        
-        logging.info(f"Dados inseridos com sucesso! ID do documento: {result.inserted_id}")
+        upsert_document(db.projetos, data_to_insert, pdf_path)
 
     except ConnectionFailure as e:
         logging.error(f"Não foi possível conectar ao MongoDB: {e}")
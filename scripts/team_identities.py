@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índice de identidades dos membros de equipe (coleção `pessoas`).
+
+Em `projetos` (e em `equipe_membros`) cada membro é só o `nome` digitado no
+PGA, com variações de maiúsculas, acentos, espaços, títulos ("Prof.") e nomes
+do meio abreviados ou omitidos. Este módulo agrupa essas grafias em uma
+identidade por pessoa, entre unidades e anos, com o total de horas semanais:
+
+- `normalize_name` reduz o nome a minúsculas sem acentos, sem pontuação, sem
+  títulos e com um espaço entre as palavras (gravado em `equipe_membros` como
+  `nome_normalizado` pela sincronização das coleções derivadas);
+- os nomes só são comparados dentro de blocos (`blocking_keys`: início e fim
+  do primeiro e do último nome), então o agrupamento não compara todos com
+  todos;
+- dentro de um bloco, dois nomes são a mesma pessoa se têm o mesmo primeiro e
+  último nome e os nomes do meio compatíveis ("Ana M. Silva" e "Ana Maria
+  Silva"), ou se diferem só por um erro de digitação em uma palavra longa
+  ("Oliveira" e "Oliviera"; nunca na vogal final, que muda o gênero: "Paulo" e
+  "Paula", "Daniel" e "Daniela" são pessoas diferentes). Um nome curto compatível
+  com duas pessoas diferentes ("Ana Silva", com "Ana Maria Silva" e "Ana Paula
+  Silva") fica como identidade própria.
+
+Cada documento de `pessoas` tem o nome mais usado, as grafias normalizadas
+(`variantes`, com índice), as alocações (projeto, unidade, ano, função, carga
+horária e tipo de hora) e os totais por ano, tipo de hora e unidade; a
+alocação completa de uma pessoa é uma consulta indexada (`person_allocation`).
+A sincronização das coleções derivadas atualiza só as identidades dos blocos
+dos nomes afetados.
+
+Uso:
+    python3 scripts/team_identities.py show "Ana Maria Silva"
+    python3 scripts/team_identities.py rebuild
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+
+from pymongo import ASCENDING, DeleteMany, ReplaceOne
+
+# Adiciona o diretório do script ao path do Python para importar módulos locais
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from search_index import fold
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+PESSOAS = 'pessoas'
+MEMBER_PROJECTION = {
+    '_id': 0, 'projeto_id': 1, 'instituicao_codigo': 1, 'instituicao_nome': 1, 'ano_referencia': 1,
+    'codigo_acao': 1, 'titulo_acao': 1, 'funcao': 1, 'nome': 1, 'nome_normalizado': 1,
+    'carga_horaria_semanal': 1, 'tipo_hora': 1,
+}
+
+TITLES = frozenset('prof profa professor professora dr dra me ma msc esp sr sra'.split())
+PARTICLES = frozenset('da das de do dos e d'.split())
+# Palavras mais curtas que isso precisam ser iguais; nas outras, aceita-se um erro de digitação
+MIN_TYPO_LENGTH = 5
+VOWELS = frozenset('aeiou')
+BLOCK_PREFIX = 4
+
+_NON_LETTERS_RE = re.compile(r'[^a-z0-9]+')
+
+# Coleções cujos índices já foram garantidos neste processo
+_indexed_collections = set()
+
+
+def normalize_name(nome):
+    """'  Profa. ANA  María da Silva ' -> 'ana maria da silva'."""
+    tokens = _NON_LETTERS_RE.sub(' ', fold(nome or '')).split()
+    while tokens and tokens[0] in TITLES:
+        tokens.pop(0)
+    return ' '.join(tokens)
+
+
+def _core(normalized):
+    return [token for token in normalized.split() if token not in PARTICLES]
+
+
+def blocking_keys(normalized):
+    """
+    Chaves de bloco de um nome normalizado: os primeiros e os últimos
+    caracteres do primeiro e do último nome. Uma grafia com erro no começo
+    ainda cai no bloco das últimas letras, e vice-versa.
+    """
+    core = _core(normalized)
+    if not core:
+        return []
+    first, last = core[0], core[-1]
+    return [f'^{first[:BLOCK_PREFIX]}|{last[:BLOCK_PREFIX]}', f'${first[-BLOCK_PREFIX:]}|{last[-BLOCK_PREFIX:]}']
+
+
+def _middles_compatible(short, long):
+    """Os nomes do meio de `short` aparecem em `long`, na ordem, por extenso ou como inicial."""
+    position = 0
+    for token in short:
+        while position < len(long) and not (long[position] == token or
+                                            (len(token) == 1 and long[position].startswith(token))):
+            position += 1
+        if position == len(long):
+            return False
+        position += 1
+    return True
+
+
+def _is_typo(x, y):
+    """
+    Se duas palavras diferentes de um nome diferem por um erro de digitação:
+    uma letra trocada, sobrando, faltando ou duas vizinhas invertidas, em
+    palavras com pelo menos MIN_TYPO_LENGTH letras. A vogal final trocada ou
+    acrescentada ("paulo"/"paula", "daniel"/"daniela") não conta como erro.
+    """
+    if min(len(x), len(y)) < MIN_TYPO_LENGTH or abs(len(x) - len(y)) > 1:
+        return False
+    if len(x) != len(y):
+        short, long = sorted((x, y), key=len)
+        if long[:-1] == short and long[-1] in VOWELS:
+            return False
+        return any(long[:i] + long[i + 1:] == short for i in range(len(long)))
+    diff = [i for i in range(len(x)) if x[i] != y[i]]
+    if len(diff) == 1:
+        i = diff[0]
+        return not (i == len(x) - 1 and x[i] in VOWELS and y[i] in VOWELS)
+    return len(diff) == 2 and diff[1] == diff[0] + 1 and x[diff[0]] == y[diff[1]] and x[diff[1]] == y[diff[0]]
+
+
+def same_person(a, b):
+    """Se dois nomes normalizados são a mesma pessoa (ver a descrição do módulo)."""
+    ta, tb = _core(a), _core(b)
+    if not ta or not tb:
+        return False
+    if ta == tb:
+        return True
+    if len(ta) == len(tb):
+        diff = [(x, y) for x, y in zip(ta, tb) if x != y]
+        if len(diff) == 1 and _is_typo(*diff[0]):
+            return True
+    if len(ta) < 2 or len(tb) < 2 or ta[0] != tb[0] or ta[-1] != tb[-1]:
+        return False
+    short, long = sorted((ta[1:-1], tb[1:-1]), key=len)
+    return _middles_compatible(short, long)
+
+
+def cluster_names(names):
+    """
+    Agrupa nomes normalizados por pessoa, comparando só dentro dos blocos.
+    Retorna uma lista de conjuntos de nomes.
+    """
+    names = sorted(set(filter(None, names)))
+    parent = {name: name for name in names}
+
+    def find(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    blocks = defaultdict(list)
+    for name in names:
+        for key in blocking_keys(name):
+            blocks[key].append(name)
+
+    matches = defaultdict(set)
+    for members in blocks.values():
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                if b not in matches[a] and same_person(a, b):
+                    matches[a].add(b)
+                    matches[b].add(a)
+
+    # Compatível com duas pessoas que não são a mesma: não dá para saber qual delas é
+    ambiguous = {name for name, candidates in matches.items()
+                 if any(not same_person(x, y) for x in candidates for y in candidates if x < y)}
+    for name, candidates in matches.items():
+        if name in ambiguous:
+            continue
+        for other in candidates:
+            if other not in ambiguous:
+                parent[find(name)] = find(other)
+
+    clusters = defaultdict(set)
+    for name in names:
+        clusters[find(name)].add(name)
+    return list(clusters.values())
+
+
+def _hours(value):
+    # Documentos editados à mão podem ter a carga horária como texto
+    return value if isinstance(value, (int, float)) else 0
+
+
+def build_identity(rows):
+    """Documento de `pessoas` a partir das linhas de `equipe_membros` de uma mesma pessoa."""
+    grafias = Counter((row.get('nome') or '').strip() for row in rows)
+    nome = max(grafias, key=lambda grafia: (grafias[grafia], len(grafia), grafia))
+    variantes = sorted({row['nome_normalizado'] for row in rows})
+    por_ano = defaultdict(float)
+    por_tipo_hora = defaultdict(float)
+    por_unidade = {}
+    alocacoes = []
+    for row in sorted(rows, key=lambda row: (row.get('ano_referencia') or 0, row.get('instituicao_codigo') or '',
+                                             row.get('codigo_acao') or '')):
+        horas = _hours(row.get('carga_horaria_semanal'))
+        ano = row.get('ano_referencia')
+        por_ano[ano] += horas
+        por_tipo_hora[(row.get('tipo_hora') or '').strip() or 'não informado'] += horas
+        unidade = por_unidade.setdefault(row.get('instituicao_codigo') or '', {
+            'instituicao_codigo': row.get('instituicao_codigo') or '',
+            'instituicao_nome': row.get('instituicao_nome') or '', 'horas': 0, 'projetos': 0})
+        unidade['horas'] += horas
+        unidade['projetos'] += 1
+        alocacoes.append({field: row.get(field) for field in (
+            'projeto_id', 'instituicao_codigo', 'instituicao_nome', 'ano_referencia', 'codigo_acao',
+            'titulo_acao', 'funcao', 'nome', 'carga_horaria_semanal', 'tipo_hora')})
+
+    return {
+        '_id': normalize_name(nome).replace(' ', '-') or variantes[0].replace(' ', '-'),
+        'nome': nome,
+        'variantes': variantes,
+        'blocos': sorted({key for variante in variantes for key in blocking_keys(variante)}),
+        'alocacoes': alocacoes,
+        'totais': {
+            'carga_horaria_semanal': sum(por_ano.values()),
+            'projetos': len(alocacoes),
+            'unidades': len(por_unidade),
+            'anos': len(por_ano),
+            # Listas em vez de dicts: tipos de hora podem ter '.' e anos não podem ser chaves
+            'por_ano': [{'ano_referencia': ano, 'horas': horas} for ano, horas in
+                        sorted(por_ano.items(), key=lambda item: item[0] or 0)],
+            'por_tipo_hora': [{'tipo_hora': tipo, 'horas': horas} for tipo, horas in sorted(por_tipo_hora.items())],
+            'por_unidade': sorted(por_unidade.values(), key=lambda unidade: unidade['instituicao_codigo']),
+        },
+    }
+
+
+def build_identities(rows):
+    """Identidades de todas as linhas de `equipe_membros` informadas."""
+    by_name = defaultdict(list)
+    for row in rows:
+        if row.get('nome_normalizado'):
+            by_name[row['nome_normalizado']].append(row)
+    return [build_identity([row for name in cluster for row in by_name[name]])
+            for cluster in cluster_names(by_name)]
+
+
+def ensure_identity_indexes(members, pessoas):
+    """Índices de `pessoas` e do nome normalizado em `equipe_membros`, uma vez por processo."""
+    if pessoas.full_name in _indexed_collections:
+        return
+    members.create_index([('nome_normalizado', ASCENDING)], name='nome_normalizado')
+    pessoas.create_index([('variantes', ASCENDING)], name='variantes')
+    pessoas.create_index([('blocos', ASCENDING)], name='blocos')
+    _indexed_collections.add(pessoas.full_name)
+
+
+def write_identities(pessoas, identities, old_ids=None):
+    """
+    Grava as identidades pela chave (`_id`) com ReplaceOne/upsert em um único
+    bulk_write e remove, no mesmo lote, as de `old_ids` que não existem mais
+    (todas as outras, quando `old_ids` é None). A coleção nunca fica sem as
+    identidades que continuam valendo, como ficaria com remover e inserir.
+    """
+    new_ids = [identity['_id'] for identity in identities]
+    operations = [ReplaceOne({'_id': identity['_id']}, identity, upsert=True) for identity in identities]
+    if old_ids is None:
+        operations.append(DeleteMany({'_id': {'$nin': new_ids}}))
+    else:
+        gone = set(old_ids) - set(new_ids)
+        if gone:
+            operations.append(DeleteMany({'_id': {'$in': list(gone)}}))
+    if operations:
+        pessoas.bulk_write(operations, ordered=True)
+
+
+def refresh_identities(members, pessoas, names):
+    """
+    Recalcula as identidades dos blocos dos nomes normalizados informados (os
+    que entraram ou saíram de `equipe_membros`). As identidades existentes dos
+    mesmos blocos, e as dos blocos das suas variantes, são refeitas juntas:
+    as que continuam são substituídas pela chave e as que sumiram, removidas.
+    Retorna o número de identidades gravadas.
+    """
+    names = set(filter(None, names))
+    if not names:
+        return 0
+    ensure_identity_indexes(members, pessoas)
+    blocks = {key for name in names for key in blocking_keys(name)}
+    pending = set(blocks)
+    old_ids = set()
+    while pending:
+        for identity in pessoas.find({'blocos': {'$in': list(pending)}}, {'variantes': 1, 'blocos': 1}):
+            old_ids.add(identity['_id'])
+            names.update(identity['variantes'])
+            blocks.update(identity['blocos'])
+        pending = {key for name in names for key in blocking_keys(name)} - blocks
+        blocks.update(pending)
+
+    rows = list(members.find({'nome_normalizado': {'$in': list(names)}}, MEMBER_PROJECTION))
+    identities = build_identities(rows)
+    write_identities(pessoas, identities, old_ids)
+    return len(identities)
+
+
+def rebuild(db):
+    """Refaz toda a coleção `pessoas` a partir de `equipe_membros`."""
+    # Importado aqui porque child_collections importa este módulo
+    from child_collections import EQUIPE_MEMBROS
+
+    members, pessoas = db[EQUIPE_MEMBROS], db[PESSOAS]
+    ensure_identity_indexes(members, pessoas)
+    rows = []
+    for row in members.find({}, MEMBER_PROJECTION):
+        # Linhas gravadas antes do nome normalizado existir
+        row.setdefault('nome_normalizado', normalize_name(row.get('nome')))
+        rows.append(row)
+    identities = build_identities(rows)
+    write_identities(pessoas, identities)
+    logging.info(f'{len(identities)} identidades a partir de {len(rows)} participações em projetos.')
+    return len(identities)
+
+
+def person_allocation(db, nome):
+    """Identidade, alocações e totais de uma pessoa por qualquer grafia já vista do nome, ou None."""
+    return db[PESSOAS].find_one({'variantes': normalize_name(nome)})
+
+
+def similar_people(db, nome, limit=5):
+    """Identidades dos mesmos blocos do nome, para sugerir quando a grafia nunca foi vista."""
+    return list(db[PESSOAS].find({'blocos': {'$in': blocking_keys(normalize_name(nome))}},
+                                 {'nome': 1, 'totais.carga_horaria_semanal': 1}, limit=limit))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Identidades dos membros de equipe (coleção pessoas).')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    show_parser = subparsers.add_parser('show', help='Alocação completa de uma pessoa.')
+    show_parser.add_argument('nome', help='Nome da pessoa, em qualquer grafia.')
+    subparsers.add_parser('rebuild', help='Reconstrói a coleção pessoas a partir de equipe_membros.')
+    args = parser.parse_args()
+
+    # Importado aqui porque send_to_mongo importa child_collections, que importa este módulo
+    from send_to_mongo import get_mongo_client
+
+    client = get_mongo_client()
+    try:
+        db = client.get_database()
+        if args.command == 'rebuild':
+            rebuild(db)
+            return
+        pessoa = person_allocation(db, args.nome)
+        if pessoa is None:
+            sugestoes = similar_people(db, args.nome)
+            logging.error(f"Nenhuma pessoa com o nome '{args.nome}'."
+                          + (f" Nomes parecidos: {', '.join(s['nome'] for s in sugestoes)}." if sugestoes else ''))
+            sys.exit(1)
+        print(json.dumps(pessoa, ensure_ascii=False, indent=2, default=str))
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
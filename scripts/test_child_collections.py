@@ -0,0 +1,51 @@
+from child_collections import flatten_document, ACOES, EQUIPE_MEMBROS, AQUISICOES
+
+# --- Testes das coleções derivadas de projetos ---
+
+DOCUMENTO = {
+    "ano_referencia": 2025,
+    "instituicao_nome": "Fatec Teste",
+    "identificacao_unidade": {"codigo": "123", "nome": "Fatec Teste", "diretor": ""},
+    "acoes_projetos": [
+        {
+            "codigo_acao": "01",
+            "titulo": "Laboratório",
+            "custo_estimado": 1000.0,
+            "equipe": [
+                {"funcao": "Responsável", "nome": "Ana", "carga_horaria_semanal": 4, "tipo_hora": "HAE"},
+                {"funcao": "Colaborador", "nome": "Bruno", "carga_horaria_semanal": "2h", "tipo_hora": "HAE"},
+            ],
+        },
+        {"codigo_acao": "02", "titulo": "Biblioteca", "equipe": []},
+    ],
+    "anexo1_aquisicoes": [
+        {"item": 1, "projeto_referencia": "01", "denominacao": "Computador", "quantidade": 2, "preco_total_estimado": 9000.0},
+    ],
+}
+
+def test_flatten_document_rows_keyed_to_parent():
+    linhas = flatten_document("pai", DOCUMENTO)
+
+    assert [acao["codigo_acao"] for acao in linhas[ACOES]] == ["01", "02"]
+    primeira = linhas[ACOES][0]
+    assert "equipe" not in primeira
+    assert primeira["membros_equipe"] == 2
+    assert primeira["carga_horaria_semanal_total"] == 4
+    assert primeira["projeto_id"] == "pai"
+    assert primeira["instituicao_codigo"] == "123"
+    assert primeira["ano_referencia"] == 2025
+
+    membros = linhas[EQUIPE_MEMBROS]
+    assert [(m["codigo_acao"], m["nome"], m["posicao"]) for m in membros] == [("01", "Ana", 0), ("01", "Bruno", 1)]
+    assert membros[0]["titulo_acao"] == "Laboratório"
+
+    assert linhas[AQUISICOES] == [{
+        "projeto_id": "pai", "instituicao_codigo": "123", "instituicao_nome": "Fatec Teste", "ano_referencia": 2025,
+        "item": 1, "projeto_referencia": "01", "denominacao": "Computador", "quantidade": 2,
+        "preco_total_estimado": 9000.0, "posicao": 0,
+    }]
+
+def test_flatten_document_does_not_mutate_source():
+    flatten_document("pai", DOCUMENTO)
+    assert len(DOCUMENTO["acoes_projetos"][0]["equipe"]) == 2
+    assert "projeto_id" not in DOCUMENTO["anexo1_aquisicoes"][0]
@@ -0,0 +1,71 @@
+from dashboard_aggregates import compute_aggregate, parse_workload_value
+
+# --- Testes dos totais pré-calculados do dashboard ---
+
+DOCUMENTO = {
+    "_id": "doc1",
+    "ano_referencia": 2025,
+    "instituicao_nome": "Fatec Teste",
+    "identificacao_unidade": {"codigo": "123", "nome": "Fatec Teste"},
+    "acoes_projetos": [
+        {
+            "codigo_acao": "01",
+            "custo_estimado": 1000.0,
+            "fonte_recursos": "CPS",
+            "origem_prioridade": "CPS",
+            "equipe": [
+                {"nome": "Ana", "carga_horaria_semanal": 4, "tipo_hora": "HAE"},
+                {"nome": "Bruno", "carga_horaria_semanal": "2,5h", "tipo_hora": "HAE"},
+            ],
+        },
+        {
+            "codigo_acao": "02",
+            "custo_estimado": None,
+            "fonte_recursos": "Não haverá custos",
+            "origem_prioridade": "Unidade",
+            "equipe": [{"nome": "Carla", "carga_horaria_semanal": 3, "tipo_hora": "HAC"}],
+        },
+    ],
+    "anexo1_aquisicoes": [
+        {"item": 1, "preco_total_estimado": 9000.0},
+        {"item": 2, "preco_total_estimado": "a definir"},
+    ],
+}
+
+def test_parse_workload_value_matches_dashboard_rule():
+    assert parse_workload_value(4) == 4
+    assert parse_workload_value("2,5h") == 2.5
+    assert parse_workload_value(" 10 horas ") == 10.0
+    assert parse_workload_value("N/A") == 0
+    assert parse_workload_value(None) == 0
+    assert parse_workload_value(True) == 0
+
+def test_compute_aggregate_totals():
+    total = compute_aggregate(DOCUMENTO)
+
+    assert total["_id"] == "123|2025"
+    assert total["projeto_id"] == "doc1"
+    assert total["total_projetos"] == 2
+    assert total["custo_estimado_total"] == 1000.0
+    assert total["projetos_com_orcamento"] == 1
+    assert total["projetos_sem_custo"] == 1
+    assert total["carga_horaria_semanal_total"] == 9.5
+    assert total["media_carga_por_projeto"] == 4.8
+    assert total["membros_equipe"] == 3
+    assert total["carga_horaria_por_tipo"] == [
+        {"tipo_hora": "HAE", "horas": 6.5},
+        {"tipo_hora": "HAC", "horas": 3},
+    ]
+    assert total["projetos_por_origem"] == [
+        {"origem_prioridade": "CPS", "projetos": 1},
+        {"origem_prioridade": "Unidade", "projetos": 1},
+    ]
+    assert total["total_aquisicoes"] == 2
+    assert total["valor_aquisicoes_total"] == 9000.0
+
+def test_compute_aggregate_empty_document():
+    total = compute_aggregate({"ano_referencia": 2024, "identificacao_unidade": {"codigo": "9"}})
+
+    assert total["total_projetos"] == 0
+    assert total["media_carga_por_projeto"] == 0
+    assert total["projetos_por_origem"] == []
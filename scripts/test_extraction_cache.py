@@ -0,0 +1,55 @@
+import os
+import time
+
+from extraction_cache import ExtractionCache, PageCache
+
+PAGES = [{"numero_pagina": 1, "texto": "Anexo 1 – Lista de aquisições", "tabelas": [[["Item", None], ["1", "Ação"]]]}]
+
+# --- Testes do cache de extração ---
+
+def test_put_get_roundtrip_and_counters(tmp_path):
+    cache = ExtractionCache(cache_dir=str(tmp_path), max_bytes=10 * 1024 * 1024)
+    assert cache.get("abc") is None
+    cache.put("abc", PAGES)
+    assert cache.get("abc") == PAGES
+    assert cache.stats()["sessao"] == {"hits": 1, "misses": 1}
+    assert cache.stats()["total"]["hits"] == 1
+
+def test_key_depends_on_content_and_settings(tmp_path):
+    pdf_a = tmp_path / "a.pdf"
+    pdf_b = tmp_path / "b.pdf"
+    pdf_a.write_bytes(b"%PDF-1.4 a")
+    pdf_b.write_bytes(b"%PDF-1.4 a")
+    assert ExtractionCache.make_key(str(pdf_a)) == ExtractionCache.make_key(str(pdf_b))
+    assert ExtractionCache.make_key(str(pdf_a)) != ExtractionCache.make_key(str(pdf_a), {"modo": "x"})
+    pdf_b.write_bytes(b"%PDF-1.4 b")
+    assert ExtractionCache.make_key(str(pdf_a)) != ExtractionCache.make_key(str(pdf_b))
+
+def test_lru_eviction_keeps_recently_used(tmp_path):
+    cache = ExtractionCache(cache_dir=str(tmp_path), max_bytes=10 * 1024 * 1024)
+    for key in ("k1", "k2", "k3"):
+        cache.put(key, PAGES)
+    entry_size = os.path.getsize(cache._entry_path("k1"))
+    # Envelhece k1 e k2; um acesso a k1 o torna o mais recente
+    old = time.time() - 100
+    os.utime(cache._entry_path("k1"), (old, old))
+    os.utime(cache._entry_path("k2"), (old - 10, old - 10))
+    cache.get("k1")
+
+    cache.max_bytes = entry_size * 2
+    assert cache.evict() == 1
+    assert cache.get("k2") is None
+    assert cache.get("k1") == PAGES
+    assert cache.get("k3") == PAGES
+
+def test_page_cache_writes_pending_pages_on_flush(tmp_path):
+    pages = ExtractionCache(cache_dir=str(tmp_path), max_bytes=10 * 1024 * 1024).page_cache()
+    assert isinstance(pages, PageCache) and pages.cache_dir == str(tmp_path / "paginas")
+    assert pages.get("p1") is None
+    pages.put("p1", {"texto": "x", "tabelas": []})
+    assert pages.get("p1") is None
+    assert pages.flush() == 1
+    assert pages.get("p1") == {"texto": "x", "tabelas": []}
+    assert pages.flush() == 0
+    assert pages.stats()["total"] == {"hits": 1, "misses": 2, "evictions": 0}
+
@@ -0,0 +1,166 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import job_queue
+from pipeline_metrics import ROUND_TRIPS
+from job_queue import (ERROR, PROCESSED, PROCESSING, QUEUED, SAVED, QueueWorker, claim_job, fail_exhausted,
+                       heartbeat, save_approved)
+
+# --- Testes da fila de processamento ---
+
+class _JobsCollection:
+    database = None
+
+    def __init__(self, owned):
+        self.owned = set(owned)
+        self.updates = []
+
+    def update_many(self, query, update):
+        matched = len(self.owned & set(query["_id"]["$in"]))
+        return SimpleNamespace(matched_count=matched, modified_count=matched)
+
+    def update_one(self, query, update):
+        # O listener dos clientes reais vê cada comando enviado
+        ROUND_TRIPS.started(None)
+        self.updates.append((query, update))
+        return SimpleNamespace(matched_count=int(query["_id"] in self.owned))
+
+    def find(self, query, projection):
+        return [{"_id": job_id} for job_id in self.owned & set(query["_id"]["$in"])]
+
+
+def _done(result=None, error=None):
+    future = Future()
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+    return future
+
+
+def test_heartbeat_returns_jobs_whose_lease_was_lost():
+    coll = _JobsCollection(owned={"a", "b"})
+    assert heartbeat(coll, ["a", "b"], "w1", 60) == set()
+    assert heartbeat(coll, ["a", "b", "c"], "w1", 60) == {"c"}
+    assert heartbeat(coll, [], "w1", 60) == set()
+
+
+def test_finish_stores_normalized_data_and_pipeline_errors():
+    coll = _JobsCollection(owned={"a", "b"})
+    worker = QueueWorker(coll, concurrency=1, lease_s=60, poll_s=1, max_attempts=3, worker_id="w1")
+    normalized = {"acoes_projetos": [{}, {}], "anexo1_aquisicoes": [{}]}
+    worker._finish({"_id": "a"}, _done({"normalized": normalized, "paginas": 4, "duracao_s": 1.5}))
+    worker._finish({"_id": "b"}, _done({"erro": "PDF vazio", "etapa": "extracao", "codigo": "pdf_vazio"}))
+
+    (query, ok), (_, failed) = coll.updates
+    assert query["lease.worker"] == "w1"
+    assert ok["$set"]["status"] == PROCESSED and ok["$set"]["normalizedData"] == normalized
+    assert ok["$set"]["result"] == {"paginas": 4, "projetos": 2, "aquisicoes": 1, "duracao_s": 1.5}
+    assert failed["$set"]["status"] == ERROR and failed["$set"]["errorCode"] == "pdf_vazio"
+    assert failed["$set"]["errorStage"] == "extracao"
+
+
+def test_crashed_job_is_requeued_until_attempts_are_exhausted():
+    coll = _JobsCollection(owned={"a", "b"})
+    worker = QueueWorker(coll, concurrency=1, lease_s=60, poll_s=1, max_attempts=2, worker_id="w1")
+    worker._finish({"_id": "a", "attempts": 1}, _done(error=BrokenProcessPool("processo morreu")))
+    worker._finish({"_id": "b", "attempts": 2}, _done(error=BrokenProcessPool("processo morreu")))
+    assert [update["$set"]["status"] for _, update in coll.updates] == [QUEUED, ERROR]
+
+
+def _matches_job(doc, query):
+    for key, cond in query.items():
+        if key == "$or":
+            if not any(_matches_job(doc, sub) for sub in cond):
+                return False
+            continue
+        value = doc
+        for part in key.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        if isinstance(cond, dict):
+            if "$exists" in cond and (value is not None) != cond["$exists"]:
+                return False
+            if "$lt" in cond and not (value is not None and value < cond["$lt"]):
+                return False
+            if "$gte" in cond and not (value is not None and value >= cond["$gte"]):
+                return False
+            if "$not" in cond and _matches_job({"v": value}, {"v": cond["$not"]}):
+                return False
+        elif value != cond:
+            return False
+    return True
+
+
+class _QueueCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find_one_and_update(self, query, update, **kwargs):
+        return next((doc["_id"] for doc in self.docs if _matches_job(doc, query)), None)
+
+    def update_many(self, query, update):
+        return SimpleNamespace(modified_count=sum(_matches_job(doc, query) for doc in self.docs))
+
+
+def test_processing_jobs_without_lease_are_reclaimed():
+    now = datetime(2025, 3, 1, 12, 0)
+    ativo = {"_id": "ativo", "status": PROCESSING, "attempts": 1,
+             "lease": {"worker": "w2", "expiresAt": now + timedelta(seconds=30)}}
+    antigo = {"_id": "antigo", "status": PROCESSING}
+    assert claim_job(_QueueCollection([ativo, antigo]), "w1", 60, 3, now=now) == "antigo"
+    assert claim_job(_QueueCollection([ativo]), "w1", 60, 3, now=now) is None
+    assert fail_exhausted(_QueueCollection([ativo, dict(antigo, attempts=3)]), 3, now=now) == 1
+
+
+def test_finish_records_run_metrics():
+    recorded = []
+    metrics = SimpleNamespace(record_run=lambda record, db: recorded.append(record))
+    worker = QueueWorker(_JobsCollection(owned={"a"}), concurrency=1, lease_s=60, poll_s=1, max_attempts=3,
+                         worker_id="w1", metrics=metrics)
+    worker._finish({"_id": "a"}, _done({"erro": "PDF vazio", "etapa": "extracao", "codigo": "pdf_vazio",
+                                         "metricas": {"status": "erro", "origem": "fila", "mongo_round_trips": 0}}))
+    # A gravação do resultado, feita no processo principal, conta para o job
+    assert recorded == [{"status": "erro", "origem": "fila", "mongo_round_trips": 1}]
+
+
+# --- Testes da aprovação dos documentos processados ---
+
+class _DocumentsCollection:
+    def __init__(self, document):
+        self.document = document
+
+    def find_one(self, query, projection=None):
+        return self.document if query["_id"] == self.document["_id"] else None
+
+    def update_one(self, query, update):
+        self.document.update(update["$set"])
+
+
+class _Db(dict):
+    projetos = None
+
+
+def test_save_approved_writes_through_pipeline_upsert(monkeypatch):
+    gravados, removidos = [], []
+    monkeypatch.setattr(job_queue, "upsert_document",
+                        lambda collection, data, path: gravados.append((data, path)) or ("novo", "inserido"))
+    monkeypatch.setattr(job_queue, "delete_project", lambda db, projeto_id: removidos.append(projeto_id))
+    documento = {"_id": "d1", "status": PROCESSED, "filePath": "/app/uploads/pga.pdf", "projectId": "antigo",
+                 "normalizedData": {"ano_referencia": 2025, "metadados_extracao": {"nome_arquivo_original": "pga.pdf"}}}
+    db = _Db({job_queue.DOCUMENTS: _DocumentsCollection(documento)})
+
+    assert save_approved(db, "d1", "u1") == ("novo", "inserido")
+    (dados, caminho), = gravados
+    assert caminho == "/app/uploads/pga.pdf"
+    assert dados["metadados_extracao"]["documento_origem"] == "d1"
+    assert dados["metadados_extracao"]["processado_por"] == "u1"
+    assert removidos == ["antigo"]
+    assert documento["status"] == SAVED and documento["projectId"] == "novo"
+
+    documento["status"] = QUEUED
+    with pytest.raises(ValueError):
+        save_approved(db, "d1", "u1")
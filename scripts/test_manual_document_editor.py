@@ -0,0 +1,70 @@
+from datetime import datetime
+
+from bson import ObjectId
+
+from manual_document_editor import diff_documents, export_document, load_json_file, save_json_file
+
+# --- Testes da edição manual por diferença ---
+
+ARMAZENADO = {
+    "ano_referencia": 2025,
+    "analise_cenario": "Cenário",
+    "identificacao_unidade": {"codigo": "123", "nome": "Fatec Teste", "diretor": ""},
+    "acoes_projetos": [
+        {"codigo_acao": "01", "titulo": "Projeto A", "equipe": [{"nome": "Ana"}]},
+        {"codigo_acao": "02", "titulo": "Projeto B", "equipe": []},
+    ],
+}
+
+
+def _editado(**changes):
+    editado = {key: value for key, value in ARMAZENADO.items()}
+    editado["identificacao_unidade"] = dict(ARMAZENADO["identificacao_unidade"])
+    editado["acoes_projetos"] = [dict(acao) for acao in ARMAZENADO["acoes_projetos"]]
+    editado.update(changes)
+    return editado
+
+
+def test_export_drops_binary_and_control_fields():
+    doc_id = ObjectId()
+    exported = export_document(dict(ARMAZENADO, _id=doc_id, pdf_original_arquivo="JVBERi0...",
+                                    pdf_original_id=ObjectId(), hash_dados="x", revisao=3))
+    assert exported["_id"] == doc_id
+    assert exported["revisao"] == 3
+    assert "pdf_original_arquivo" not in exported and "pdf_original_id" not in exported
+    assert "hash_dados" not in exported
+
+
+
+def test_exported_file_round_trips_object_ids_and_dates(tmp_path):
+    armazenado = dict(ARMAZENADO, _id=ObjectId(), pdf_original_id=ObjectId(), revisao=2,
+                      metadados_documento={"processado_por": ObjectId(), "aprovado_em": datetime(2025, 3, 1, 9, 30)})
+    caminho = str(tmp_path / "doc.json")
+    save_json_file(export_document(armazenado), caminho)
+    assert '"$oid"' in open(caminho, encoding="utf-8").read()
+
+    carregado = load_json_file(caminho)
+    assert carregado["_id"] == armazenado["_id"]
+    assert carregado["metadados_documento"] == armazenado["metadados_documento"]
+    # Sem edição, o save não tem nada a gravar: os ObjectIds não viram strings
+    assert diff_documents(export_document(armazenado), carregado) == ({}, {}, {})
+
+
+def test_diff_sets_only_changed_paths():
+    editado = _editado()
+    editado["identificacao_unidade"]["diretor"] = "Maria"
+    editado["acoes_projetos"][1]["titulo"] = "Projeto B revisado"
+    sets, unsets, anterior = diff_documents(ARMAZENADO, editado)
+    assert sets == {"identificacao_unidade.diretor": "Maria", "acoes_projetos.1.titulo": "Projeto B revisado"}
+    assert unsets == {}
+    assert anterior["acoes_projetos.1.titulo"] == "Projeto B"
+
+
+def test_diff_replaces_resized_lists_and_unsets_removed_fields():
+    editado = _editado(acoes_projetos=ARMAZENADO["acoes_projetos"][:1])
+    del editado["analise_cenario"]
+    sets, unsets, anterior = diff_documents(ARMAZENADO, editado)
+    assert sets == {"acoes_projetos": ARMAZENADO["acoes_projetos"][:1]}
+    assert unsets == {"analise_cenario": ""}
+    assert anterior["analise_cenario"] == "Cenário"
+    assert diff_documents(ARMAZENADO, _editado()) == ({}, {}, {})
@@ -0,0 +1,128 @@
+from types import SimpleNamespace
+
+from fix_missing_names import FixMissingNames
+from migrations import Migration, MigrationRunner, _range_filter, load_migrations, partition_bounds
+
+# --- Testes do executor de migrações ---
+
+class _BucketCollection:
+    def __init__(self, buckets):
+        self.buckets = buckets
+
+    def aggregate(self, pipeline):
+        return [{"_id": {"min": start, "max": end}, "count": 1} for start, end in self.buckets]
+
+
+def test_partition_bounds_cover_whole_range_with_open_ends():
+    coll = _BucketCollection([(1, 10), (10, 20), (20, 30)])
+    assert partition_bounds(coll, {}, 3) == [(None, 10), (10, 20), (20, None)]
+    assert partition_bounds(coll, {}, 1) == [(None, None)]
+    assert partition_bounds(_BucketCollection([]), {}, 4) == [(None, None)]
+
+
+def test_range_filter_resumes_after_last_id():
+    query = {"ano_referencia": 2025}
+    assert _range_filter(query, None, None, None) == query
+    assert _range_filter({}, 10, 20, None) == {"_id": {"$gte": 10, "$lt": 20}}
+    assert _range_filter(query, 10, 20, 15) == {"$and": [query, {"_id": {"$gt": 15, "$lt": 20}}]}
+
+
+# --- Testes da migração fix_missing_names ---
+
+def test_fix_missing_names_plan_sets_unit_from_institution_name():
+    update = FixMissingNames().plan({"_id": "doc1", "instituicao_nome": "Fatec São José"})
+    assert update == {"$set": {"identificacao_unidade": {
+        "codigo": "fatec-sao-jose", "nome": "Fatec São José", "diretor": ""}}}
+
+
+def test_fix_missing_names_skips_documents_without_institution_name():
+    assert FixMissingNames().plan({"_id": "doc1", "instituicao_nome": ""}) is None
+    assert "fix_missing_names" in load_migrations()
+
+
+# --- Testes da retomada ---
+
+def _matches(doc, query):
+    for key, expected in query.items():
+        if key == "$and":
+            if not all(_matches(doc, part) for part in expected):
+                return False
+            continue
+        value = doc.get(key)
+        if isinstance(expected, dict):
+            ops = {"$gt": lambda a, b: a is not None and a > b, "$gte": lambda a, b: a is not None and a >= b,
+                   "$lt": lambda a, b: a is not None and a < b}
+            if not all(ops[op](value, bound) for op, bound in expected.items()):
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+class _Cursor(list):
+    def sort(self, key, direction=1):
+        return _Cursor(sorted(self, key=lambda doc: doc[key], reverse=direction < 0))
+
+
+class _Collection:
+    def __init__(self, docs=()):
+        self.docs = {doc["_id"]: dict(doc) for doc in docs}
+
+    def find(self, query=None, projection=None, sort=None, batch_size=None, limit=0):
+        docs = sorted((dict(doc) for doc in self.docs.values() if _matches(doc, query or {})),
+                      key=lambda doc: doc["_id"])
+        return _Cursor(docs[:limit] if limit else docs)
+
+    def _update(self, doc_id, update):
+        doc = self.docs[doc_id]
+        doc.update(update.get("$set", {}))
+        for key, amount in update.get("$inc", {}).items():
+            doc[key] = doc.get(key, 0) + amount
+
+    def update_one(self, query, update):
+        for doc in self.find(query)[:1]:
+            self._update(doc["_id"], update)
+
+    def replace_one(self, query, document, upsert=False):
+        self.docs[query["_id"]] = dict(document, _id=query["_id"])
+
+    def delete_many(self, query):
+        for doc in self.find(query):
+            del self.docs[doc["_id"]]
+
+    def bulk_write(self, operations, ordered=True):
+        modified = 0
+        for op in operations:
+            for doc in self.find(op._filter)[:1]:
+                self._update(doc["_id"], op._doc)
+                modified += 1
+        return SimpleNamespace(modified_count=modified)
+
+
+class _Db(dict):
+    def __getattr__(self, name):
+        return self[name]
+
+
+class _MarkChecked(Migration):
+    name = "marca_conferidos"
+    query = {"conferido": False}
+    projection = {"conferido": 1}
+
+    def plan(self, doc):
+        return {"$set": {"conferido": True}}
+
+
+def test_completed_run_is_not_resumed_and_new_documents_are_migrated():
+    db = _Db(projetos=_Collection({"_id": n, "conferido": False} for n in range(1, 6)),
+             migracoes=_Collection())
+    assert MigrationRunner(db, _MarkChecked(), batch_size=2).run()["alterados"] == 5
+
+    # Documentos ruins criados depois da execução concluída (inclusive com `_id` menor que o último)
+    db.projetos.docs[0] = {"_id": 0, "conferido": False}
+    db.projetos.docs[9] = {"_id": 9, "conferido": False}
+    totals = MigrationRunner(db, _MarkChecked(), batch_size=2).run()
+
+    assert totals["alterados"] == 2
+    assert all(doc["conferido"] for doc in db.projetos.docs.values())
+    assert [cp["concluida"] for cp in db.migracoes.docs.values()] == [True]
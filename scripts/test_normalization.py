@@ -93,3 +93,111 @@ def test_normalize_data_structure():
     assert result["identificacao_unidade"]["nome"] == "Fatec Teste"
     assert result["analise_cenario"] == "Cenário de teste"
     assert result["metadados_extracao"]["nome_arquivo_original"] == "test.pdf"
+
+# --- Testes do filtro de páginas da extração direcionada ---
+
+def test_page_needs_tables():
+    from normalization import page_needs_tables
+    assert page_needs_tables("", 1) is True
+    assert page_needs_tables("AÇÃO/PROJETO\n(Tema) 03 Laboratório", 7) is True
+    assert page_needs_tables("Anexo 1 – Lista de aquisições\nItem Projeto", 12) is True
+    assert page_needs_tables("Texto corrido sem tabelas relevantes", 5) is False
+    assert page_needs_tables(None, 5) is False
+
+# --- Testes do índice de tabelas (equivalência com a varredura anterior) ---
+
+def test_indexed_project_extraction_matches_legacy_scan():
+    from normalization import extract_project_data
+    from benchmarks.bench_normalization import legacy_extract_project_data
+    from benchmarks.synthetic_data import make_extracted_document
+
+    pages = make_extracted_document(n_projects=7, team_size=4, acquisitions=0)
+    # Casos de borda: rótulo repetido sem valor, texto multilinha vazio, células None e equipe "nn"
+    pages[1]["tabelas"].append([
+        ["AÇÃO/PROJETO (Tema) 42 Projeto com bordas", None, None],
+        ["Origem (prioridade):", None, ""],
+        ["Origem (prioridade): revisada", "Prioridade 2", None],
+        ["O que será feito:", None],
+        ["", None],
+        ["Por que será feito:", "Motivo"],
+        ["Responsável:", "<nome> nn", None, None, None, None, "10", None, "HAE"],
+        ["Colaborador(a):", "<nome> Ana", None, None, None, None, "x", None, "HAE"],
+        ["Período de execução:", "01/01/2025"],
+        ["Custo R$ (se houver):", "Não haverá custos"],
+    ])
+    assert extract_project_data(pages) == legacy_extract_project_data(pages)
+    assert len(extract_project_data(pages)) == 8
+
+# --- Testes da normalização incremental (pipeline em streaming) ---
+
+def test_incremental_normalizer_matches_normalize_data():
+    from normalization import IncrementalNormalizer
+    from benchmarks.synthetic_data import make_extracted_document
+
+    pages = make_extracted_document(n_projects=9, team_size=3, acquisitions=40)
+    expected = normalize_data(pages, "doc.pdf", None, 2025)
+
+    normalizer = IncrementalNormalizer()
+    for page in pages:
+        normalizer.feed(page)
+    result = normalizer.finish("doc.pdf", None, 2025)
+
+    for data in (expected, result):
+        data["metadados_extracao"].pop("data_extracao")
+    assert result == expected
+    assert len(result["acoes_projetos"]) == 9
+    assert len(result["anexo1_aquisicoes"]) == 40
+    # Só o texto das 3 primeiras páginas fica retido para detectar a instituição
+    assert len(normalizer.first_pages) == 3
+
+def test_incremental_normalizer_without_pages():
+    from normalization import IncrementalNormalizer
+    with pytest.raises(ValueError):
+        IncrementalNormalizer().finish("doc.pdf", "Fatec Teste", 2025)
+    assert normalize_data([], "doc.pdf", "Fatec Teste", 2025) is None
+
+
+def test_pages_without_tables_by_time_are_listed_in_metadata():
+    pages = [{"numero_pagina": 1, "texto": "Fatec Teste", "tabelas": []},
+             {"numero_pagina": 2, "texto": "AÇÃO/PROJETO", "tabelas": [], "tabelas_tempo_esgotado": True}]
+    result = normalize_data(pages, "test.pdf", "Fatec Teste", 2025)
+    assert result["metadados_extracao"]["paginas_sem_tabelas_por_tempo"] == [2]
+    assert result["metadados_extracao"]["extracao_parcial"] is True
+    completo = normalize_data(pages[:1], "test.pdf", "Fatec Teste", 2025)["metadados_extracao"]
+    assert "paginas_sem_tabelas_por_tempo" not in completo
+    assert completo["extracao_parcial"] is False
+
+
+# --- Testes da estabilidade do hash dos dados ---
+
+_SITUACOES_SCRIPT = """
+import json, sys
+from normalization import normalize_data
+from send_to_mongo import update_fields
+paginas = json.loads(sys.argv[1])
+dados = normalize_data(paginas, "/tmp/pga.pdf", "Fatec Teste", "2024")
+dados["hash_conteudo"] = "abc"
+print(json.dumps([dados["situacoes_problema_gerais"], update_fields(dados)[0]["hash_dados"]]))
+"""
+
+
+def test_situacoes_problema_keep_order_and_hash_across_hash_seeds():
+    import json
+    import os
+    import subprocess
+    import sys
+
+    paginas = [{"texto": "", "tabelas": [
+        [["IDENTIFICAÇÃO DA UNIDADE", ""], ["Unidade", "001 - Fatec Teste"]],
+        [["APONTAMENTO DE SITUAÇÕES-PROBLEMA", ""], ["Evasão (cat. 1)", "Infraestrutura (cat. 2)"],
+         ["Evasão (cat. 1)", ""]],
+    ]}]
+    resultados = set()
+    for seed in range(4, 12):
+        saida = subprocess.run([sys.executable, "-c", _SITUACOES_SCRIPT, json.dumps(paginas)], check=True,
+                               capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                               env=dict(os.environ, PYTHONHASHSEED=str(seed))).stdout
+        resultados.add(saida.strip().splitlines()[-1])
+    assert len(resultados) == 1
+    situacoes, _ = json.loads(resultados.pop())
+    assert situacoes == ["Evasão (cat. 1)", "Infraestrutura (cat. 2)"]
@@ -0,0 +1,96 @@
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+
+from pipeline_metrics import (ROUND_TRIPS, PipelineMetrics, RunRecorder, count_round_trips, parse_window, percentile,
+                              summarize_runs)
+from progress_events import ProgressEvents
+
+# --- Testes das métricas do pipeline ---
+
+def _record(cache="miss"):
+    recorder = RunRecorder(arquivo="pga.pdf", origem="cli")
+    events = recorder.attach(ProgressEvents())
+    with events.stage("extracao") as counts:
+        for numero, tabelas in enumerate([2, 0, 2], start=1):
+            events.page("extracao", numero, 3, tabelas)
+        time.sleep(0.01)
+        counts.update(paginas=3, cache=cache, paginas_reaproveitadas=[2], bytes_lidos=1000)
+    with pytest.raises(RuntimeError):
+        with events.stage("normalizacao"):
+            raise RuntimeError("falhou")
+    return recorder.finish()
+
+
+def test_run_recorder_builds_record_from_progress_events():
+    record = _record()
+    assert record["arquivo"] == "pga.pdf" and record["origem"] == "cli"
+    assert record["status"] == "erro" and record["codigo"] == "erro_inesperado"
+    assert set(record["etapas"]) == {"extracao", "normalizacao"}
+    assert record["etapas"]["extracao"]["status"] == "ok"
+    assert record["tabelas"] == 4 and record["tabelas_por_pagina"] == {"0": 1, "2": 2}
+    assert record["paginas_reaproveitadas"] == 1 and record["bytes_lidos"] == 1000
+    assert record["paginas_por_s"] > 0
+    assert _record(cache="hit")["paginas_por_s"] is None
+
+
+def test_round_trips_count_only_for_the_run_that_sent_them():
+    recorders = [RunRecorder(arquivo=f"{n}.pdf") for n in range(2)]
+    barrier = threading.Barrier(2)
+
+    def run(recorder, commands):
+        with recorder.counting():
+            barrier.wait()
+            for _ in range(commands):
+                ROUND_TRIPS.started(None)
+
+    threads = [threading.Thread(target=run, args=(recorder, commands)) for recorder, commands in zip(recorders, (3, 5))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Fora de qualquer execução: não conta para ninguém
+    ROUND_TRIPS.started(None)
+    assert [recorder.finish()["mongo_round_trips"] for recorder in recorders] == [3, 5]
+
+    with count_round_trips() as outer, recorders[0].counting():
+        ROUND_TRIPS.started(None)
+    assert outer.total == 1 and recorders[0].finish()["mongo_round_trips"] == 4
+
+
+def test_also_keeps_existing_destination_and_context():
+    seen, extra = [], []
+    events = ProgressEvents(seen.append, id="job1").also(extra.append)
+    events.emit("ready")
+    assert seen == extra and seen[0]["id"] == "job1"
+
+
+def test_metrics_render_prometheus_histograms_and_counters():
+    metrics = PipelineMetrics()
+    metrics.observe_run(_record())
+    text = metrics.render()
+    assert 'pga_runs_total{status="erro"} 1' in text
+    assert 'pga_stage_duration_seconds_count{stage="extracao"} 1' in text
+    assert 'pga_tables_per_page_bucket{le="0"} 1' in text
+    assert 'pga_tables_per_page_bucket{le="+Inf"} 3' in text
+    assert 'pga_extraction_cache_total{result="miss"} 1' in text
+    assert "pga_pages_total 3" in text and "pga_bytes_read_total 1000" in text
+
+
+def test_summarize_runs_reports_percentiles_by_stage():
+    records = [{"status": "ok", "duracao_ms": ms, "etapas": {"extracao": {"duracao_ms": ms - 1}}}
+               for ms in range(1, 101)]
+    summary = summarize_runs(records)
+    assert summary["execucoes"] == 100 and summary["por_status"] == {"ok": 100}
+    assert summary["series"]["total"] == {"n": 100, "p50": 50, "p95": 95, "p99": 99}
+    assert summary["series"]["extracao"]["p99"] == 98
+    assert percentile([], 50) is None
+
+
+def test_parse_window():
+    assert parse_window("30m") == timedelta(minutes=30)
+    assert parse_window("7d") == timedelta(days=7)
+    with pytest.raises(Exception):
+        parse_window("ontem")
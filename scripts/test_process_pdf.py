@@ -0,0 +1,96 @@
+import threading
+import time
+
+import process_pdf
+from process_pdf import split_page_ranges, PageMemoryGuard, PageTimeBudget, extract_page, rss_limit_from_env
+
+# --- Testes Unitários para a divisão de páginas da extração paralela ---
+
+def test_split_page_ranges_contiguous_and_complete():
+    ranges = split_page_ranges(10, 3)
+    assert ranges == [(0, 4), (4, 7), (7, 10)]
+    # As fatias devem cobrir todas as páginas, em ordem, sem sobreposição
+    pages = [p for start, end in ranges for p in range(start, end)]
+    assert pages == list(range(10))
+
+def test_split_page_ranges_more_workers_than_pages():
+    assert split_page_ranges(2, 8) == [(0, 1), (1, 2)]
+    assert split_page_ranges(5, 1) == [(0, 5)]
+
+# --- Testes do limite de memória por página ---
+
+def test_page_memory_guard_switches_to_lean_mode(monkeypatch):
+    rss = iter([100.0, 250.0, 120.0])
+    monkeypatch.setattr(process_pdf, "current_rss_mb", lambda: next(rss))
+
+    guard = PageMemoryGuard(rss_limit_mb=200)
+    guard.record(1)
+    assert not guard.lean
+    guard.record(2)
+    guard.record(3)
+    assert guard.lean
+    assert guard.stats() == {
+        "memoria_paginas_mb": [100.0, 250.0, 120.0],
+        "rss_pico_mb": 250.0,
+        "modo_enxuto_desde_pagina": 3,
+    }
+
+def test_rss_limit_from_env(monkeypatch):
+    monkeypatch.delenv("PGA_EXTRACTION_RSS_LIMIT_MB", raising=False)
+    assert rss_limit_from_env() is None
+    monkeypatch.setenv("PGA_EXTRACTION_RSS_LIMIT_MB", "512")
+    assert rss_limit_from_env() == 512.0
+    assert rss_limit_from_env(256) == 256
+
+# --- Testes do tempo máximo por página ---
+
+class _SlowTablesPage:
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def extract_text(self):
+        return "AÇÃO/PROJETO (Tema)"
+
+    def extract_tables(self):
+        end = time.monotonic() + self.seconds
+        while time.monotonic() < end:
+            pass
+        return [[["tabela"]]]
+
+def test_page_over_budget_falls_back_to_text_only():
+    budget = PageTimeBudget(page_budget_s=0.05)
+    dados = extract_page(_SlowTablesPage(5), 4, 10, budget=budget)
+    assert dados["texto"] == "AÇÃO/PROJETO (Tema)"
+    assert dados["tabelas"] == [] and dados["tabelas_tempo_esgotado"]
+
+    dados = extract_page(_SlowTablesPage(0), 5, 10, budget=budget)
+    assert dados["tabelas"] == [[["tabela"]]] and "tabelas_tempo_esgotado" not in dados
+
+def test_page_budget_outside_main_thread_is_reported_as_not_enforced(caplog):
+    budget = PageTimeBudget(page_budget_s=0.01)
+    resultado = {}
+    worker = threading.Thread(target=lambda: resultado.update(extract_page(_SlowTablesPage(0.05), 2, 3, budget=budget)))
+    worker.start()
+    worker.join()
+    # Sem SIGALRM fora do thread principal: a página termina, e o limite não aplicado fica registrado
+    assert resultado["tabelas"] == [[["tabela"]]]
+    assert budget.stats()["tempo_limite_aplicado"] is False
+    assert "fora do thread principal" in caplog.text
+    assert PageTimeBudget(page_budget_s=0.01).stats()["tempo_limite_aplicado"] is True
+
+def test_document_budget_skips_tables_for_remaining_pages():
+    budget = PageTimeBudget(deadline=time.time() - 1)
+    dados = extract_page(_SlowTablesPage(0), 7, 10, budget=budget)
+    assert dados["tabelas_tempo_esgotado"]
+    budget.record(dados, 0.1)
+    assert budget.stats()["paginas_tempo_esgotado"] == [7]
+    assert budget.stats()["tempo_documento_esgotado_na_pagina"] == 7
+
+def test_slow_pages_report_keeps_the_slowest():
+    budget = PageTimeBudget()
+    for numero, duracao in enumerate([0.5, 3.0] + [2.5] * 12 + [9.0], start=1):
+        budget.record({"numero_pagina": numero}, duracao)
+    lentas = budget.stats()["paginas_lentas"]
+    assert len(lentas) == process_pdf.SLOW_PAGES_REPORTED
+    assert lentas[:2] == [{"pagina": 15, "duracao_s": 9.0}, {"pagina": 2, "duracao_s": 3.0}]
+
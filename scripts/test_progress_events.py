@@ -0,0 +1,40 @@
+import pytest
+
+from progress_events import ProgressEvents
+from process_pdf import PipelineError
+
+# --- Testes dos eventos de progresso estruturados ---
+
+def test_stage_emits_start_and_end_with_counts():
+    eventos = []
+    events = ProgressEvents(eventos.append, id="job1")
+    with events.stage("extracao") as counts:
+        events.page("extracao", 1, 2, tabelas=3)
+        counts["paginas"] = 2
+
+    assert [e["event"] for e in eventos] == ["stage_start", "page", "stage_end"]
+    assert all(e["id"] == "job1" for e in eventos)
+    assert eventos[1]["page"] == 1 and eventos[1]["total"] == 2 and eventos[1]["tables"] == 3
+    fim = eventos[-1]
+    assert fim["status"] == "ok"
+    assert fim["counts"] == {"paginas": 2}
+    assert fim["duration_ms"] >= 0
+
+def test_stage_error_carries_pipeline_error_code():
+    eventos = []
+    events = ProgressEvents(eventos.append)
+    with pytest.raises(PipelineError):
+        with events.stage("normalizacao"):
+            raise PipelineError("normalizacao", "Falha na normalização dos dados.")
+
+    fim = eventos[-1]
+    assert fim["status"] == "erro"
+    assert fim["code"] == "normalizacao_falhou"
+    assert fim["message"] == "Falha na normalização dos dados."
+
+def test_disabled_events_do_nothing():
+    events = ProgressEvents()
+    assert not events.enabled
+    with events.stage("envio") as counts:
+        events.page("envio", 1, 1)
+        counts["operacao"] = "inserido"
@@ -0,0 +1,169 @@
+import gzip
+import json
+from types import SimpleNamespace
+
+import raw_extractions
+from benchmarks.synthetic_data import make_extracted_document
+from raw_extractions import LazyExtraction, PageEncoder, decode_pages, encode_pages, plan_update
+from send_to_mongo import update_fields
+
+# --- Testes das extrações guardadas ---
+
+PAGINAS = [
+    {"numero_pagina": 1, "texto": "Identificação da Unidade", "tabelas": [[["Unidade", "123 Fatec São José"]]]},
+    {"numero_pagina": 2, "texto": None, "tabelas": []},
+]
+
+
+def test_encoded_pages_round_trip():
+    assert decode_pages(encode_pages(PAGINAS)) == PAGINAS
+    assert decode_pages(encode_pages([])) == []
+
+
+def test_compact_format_keeps_ragged_tables_flags_and_extra_keys():
+    paginas = PAGINAS + [
+        {"numero_pagina": 3, "texto": "", "tabelas": [[["Item", None, "Valor"], ["1"], []], [["Item", "2"]]],
+         "tabelas_tempo_esgotado": True},
+        {"numero_pagina": 4, "texto": "x", "tabelas": [[[1, 2.5]]], "tabelas_ignoradas": True, "origem": "ocr"},
+    ]
+    assert decode_pages(encode_pages(paginas)) == paginas
+
+
+def test_lazy_extraction_reads_single_page_and_table():
+    tabela = [["Responsável:", "Ana"], ["Colaborador(a):", None]]
+    paginas = [{"numero_pagina": n, "texto": f"Página {n}", "tabelas": [tabela, [["Anexo", str(n)]]]}
+               for n in range(1, 6)]
+    lazy = LazyExtraction(encode_pages(paginas))
+    assert len(lazy) == 5
+    assert lazy.page(3) == paginas[3]
+    assert lazy.table(4, 1) == [["Anexo", "5"]]
+
+
+def test_compact_format_is_not_larger_than_gzip_json():
+    # Referência do formato antigo: o documento inteiro em um único gzip
+    for paginas in (make_extracted_document(n_projects=10), make_extracted_document(n_projects=60)):
+        legacy = len(gzip.compress(json.dumps(paginas, ensure_ascii=False).encode("utf-8")))
+        encoded = encode_pages(paginas)
+        assert len(encoded) <= legacy
+        lazy = LazyExtraction(encoded)
+        assert lazy.page(len(lazy) - 1) == paginas[-1]
+
+
+def test_compact_format_keeps_long_and_multibyte_cells():
+    longa = "Descrição " * 40
+    paginas = [{"numero_pagina": 1, "texto": "t", "tabelas": [
+        [["Ação", longa], ["Meta", "ç" * 300]],
+        [[], []],
+        [["Só", None], [None, "á"]],
+    ]}]
+    assert decode_pages(encode_pages(paginas)) == paginas
+    assert LazyExtraction(encode_pages(paginas)).table(0, 0)[1][1] == "ç" * 300
+
+
+def test_legacy_gzip_extractions_still_decode():
+    assert decode_pages(gzip.compress(json.dumps(PAGINAS).encode("utf-8"))) == PAGINAS
+
+
+def test_incremental_encoder_matches_page_callbacks():
+    encoder = PageEncoder()
+    for pagina in PAGINAS:
+        encoder.add_page(pagina, len(PAGINAS))
+    assert encoder.paginas == 2
+    assert decode_pages(encoder.finish()) == PAGINAS
+
+
+# --- Testes da renormalização ---
+
+def _stored(normalized):
+    """Documento como gravado pelo upsert: campos de $set e $setOnInsert juntos."""
+    fields, on_insert = update_fields(dict(normalized, hash_conteudo="abc"))
+    stored = {"_id": "doc1", "identificacao_unidade": normalized["identificacao_unidade"],
+              "metadados_extracao": dict(normalized["metadados_extracao"])}
+    for name, value in {**fields, **on_insert}.items():
+        if not name.startswith("metadados_extracao."):
+            stored[name] = value
+    return stored
+
+
+NORMALIZADO = {
+    "ano_referencia": 2025,
+    "instituicao_nome": "Fatec Teste",
+    "identificacao_unidade": {"codigo": "123", "nome": "Fatec Teste", "diretor": ""},
+    "metadados_extracao": {"nome_arquivo_original": "pga.pdf", "data_extracao": "2025-01-01T00:00:00"},
+    "acoes_projetos": [{"codigo_acao": "01", "custo_estimado": 100.0}],
+    "anexo1_aquisicoes": [],
+}
+
+
+def test_plan_update_writes_only_changed_fields():
+    stored = _stored(NORMALIZADO)
+    renormalized = dict(NORMALIZADO, acoes_projetos=[{"codigo_acao": "01", "custo_estimado": 150.0}],
+                        metadados_extracao={"nome_arquivo_original": "pga.pdf", "data_extracao": "2026-01-01"})
+    assert plan_update(stored, NORMALIZADO) == ("inalterado", None)
+    status, update = plan_update(stored, renormalized)
+    assert status == "alterado"
+    assert set(update["$set"]) == {"acoes_projetos", "hash_dados"}
+
+
+def test_plan_update_keeps_hand_edited_documents_unless_forced():
+    stored = _stored(NORMALIZADO)
+    stored["analise_cenario"] = "Editado à mão"
+    renormalized = dict(NORMALIZADO, anexo1_aquisicoes=[{"item": 1}])
+    assert plan_update(stored, renormalized) == ("editado", None)
+    status, update = plan_update(stored, renormalized, force=True)
+    assert status == "alterado"
+    assert update["$unset"] == {"analise_cenario": ""}
+
+
+
+def test_plan_update_keeps_queue_approval_metadata():
+    # Documento aprovado pela fila: save_approved acrescenta a proveniência aos metadados
+    aprovado = dict(NORMALIZADO, metadados_extracao=dict(NORMALIZADO["metadados_extracao"], documento_origem="d1",
+                                                         processado_por="u1",
+                                                         data_processamento="2025-02-01T10:00:00"))
+    stored = _stored(aprovado)
+    assert plan_update(stored, NORMALIZADO) == ("inalterado", None)
+
+    status, update = plan_update(stored, dict(NORMALIZADO, acoes_projetos=[{"codigo_acao": "01"}]))
+    assert status == "alterado"
+    assert set(update["$set"]) == {"acoes_projetos", "hash_dados"} and "$unset" not in update
+    assert update["$set"]["hash_dados"] == update_fields(dict(aprovado, hash_conteudo="abc",
+                                                              acoes_projetos=[{"codigo_acao": "01"}]))[0]["hash_dados"]
+
+class _Collection:
+    def __init__(self, docs=(), modified_count=0):
+        self.docs = {doc["_id"]: doc for doc in docs}
+        self.modified_count = modified_count
+
+    def find(self, query, projection=None):
+        return [doc for doc_id, doc in self.docs.items() if doc_id in query["_id"]["$in"]]
+
+    def bulk_write(self, operations, ordered=True):
+        return SimpleNamespace(modified_count=self.modified_count)
+
+
+class _Db(dict):
+    def __getattr__(self, name):
+        return self[name]
+
+
+def test_renormalize_syncs_only_documents_that_were_written(monkeypatch):
+    synced, refreshed = [], []
+    monkeypatch.setattr(raw_extractions, "sync_child_collections", lambda db, items: synced.extend(items))
+    monkeypatch.setattr(raw_extractions, "refresh_aggregates", lambda db, keys: refreshed.extend(keys))
+    batch = [dict(_stored(NORMALIZADO), _id=doc_id) for doc_id in ("doc1", "doc2")]
+    renormalized = dict(NORMALIZADO, acoes_projetos=[{"codigo_acao": "01", "custo_estimado": 150.0}])
+    results = [(stored["_id"], *plan_update(stored, renormalized), renormalized) for stored in batch]
+    novo_hash = results[0][2]["$set"]["hash_dados"]
+    # doc2 foi regravado por outro processo entre a leitura e o bulk_write: o filtro do hash não conferiu
+    db = _Db(extracoes=_Collection([{"_id": "abc", "dados": b""}]),
+             projetos=_Collection([{"_id": "doc1", "hash_dados": novo_hash}, {"_id": "doc2", "hash_dados": "outro"}],
+                                  modified_count=1))
+    executor = SimpleNamespace(map=lambda fn, tasks, chunksize: results)
+    counts = {"inalterado": 0, "alterado": 0, "editado": 0, "sem_extracao": 0, "erro": 0}
+
+    raw_extractions._renormalize_batch(db, executor, 1, batch, counts, dry_run=False, force=False)
+
+    assert [doc_id for doc_id, _ in synced] == ["doc1"]
+    assert counts["alterado"] == 1 and counts["editado"] == 1
+    assert refreshed == [("123", 2025)]
@@ -0,0 +1,97 @@
+import random
+
+from recurring_projects import link_rows, minhash, shingles, signature_rows, similarity
+
+# --- Testes dos projetos recorrentes ---
+
+LABORATORIO = {"codigo_acao": "01", "titulo": "Modernização do laboratório de informática",
+               "o_que_sera_feito": "Substituir os computadores do laboratório de informática e instalar "
+                                   "softwares de programação para as aulas práticas dos cursos de tecnologia"}
+LABORATORIO_REVISTO = {"codigo_acao": "03", "titulo": "Modernização dos laboratórios de informática",
+                       "o_que_sera_feito": "Substituir computadores do laboratório de informática e instalar "
+                                           "softwares de programação para aulas práticas dos cursos de tecnologia "
+                                           "em 2025"}
+EVASAO = {"codigo_acao": "02", "titulo": "Combate à evasão no primeiro semestre",
+          "o_que_sera_feito": "Monitoria e acompanhamento dos alunos ingressantes com baixo rendimento"}
+
+
+def _signature(acao):
+    return minhash(shingles(acao))
+
+
+def test_minhash_estimates_similarity_of_reworded_projects():
+    assert similarity(_signature(LABORATORIO), _signature(LABORATORIO_REVISTO)) >= 0.6
+    assert similarity(_signature(LABORATORIO), _signature(EVASAO)) < 0.2
+    assert _signature(LABORATORIO) == _signature(dict(LABORATORIO))
+
+
+def test_signature_rows_skip_projects_without_text():
+    document = {"acoes_projetos": [LABORATORIO, {"codigo_acao": "09", "titulo": ""}]}
+    (row,) = signature_rows({"projeto_id": "p1", "ano_referencia": 2024}, document)
+    assert (row["projeto_id"], row["posicao"], row["codigo_acao"]) == ("p1", 0, "01")
+    assert len(row["bandas"]) == 16 and len(set(row["bandas"])) == 16
+
+
+def _rows():
+    rows = []
+    for projeto_id, acoes in (("p2024", [LABORATORIO, EVASAO]), ("p2025", [LABORATORIO_REVISTO, EVASAO]),
+                              ("outra", [EVASAO])):
+        rows.extend(signature_rows({"projeto_id": projeto_id}, {"acoes_projetos": acoes}))
+    return rows
+
+
+def test_link_rows_groups_recurring_projects_across_documents():
+    rows = _rows()
+    stats = {}
+    groups = link_rows(rows, stats=stats)
+    linked = sorted(sorted((rows[i]["projeto_id"], rows[i]["codigo_acao"]) for i in group) for group in groups)
+    assert linked == [[("outra", "02"), ("p2024", "02"), ("p2025", "02")], [("p2024", "01"), ("p2025", "03")]]
+    # Os três projetos de evasão são idênticos: unidos direto, sem comparação
+    assert stats["assinaturas_distintas"] == 3 and stats["pares_comparados"] == 1
+
+
+def test_link_rows_samples_oversized_buckets():
+    acoes = [dict(LABORATORIO, o_que_sera_feito=LABORATORIO["o_que_sera_feito"] + f" da unidade {n}")
+             for n in range(6)]
+    rows = []
+    for n, acao in enumerate(acoes):
+        rows.extend(signature_rows({"projeto_id": f"p{n}"}, {"acoes_projetos": [acao, EVASAO]}))
+    stats = {}
+    groups = link_rows(rows, max_bucket=2, stats=stats)
+    linked = sorted(sorted(rows[i]["codigo_acao"] for i in group) for group in groups)
+    assert linked == [["01"] * 6, ["02"] * 6]
+    assert stats["baldes_amostrados"] > 0 and stats["pares_comparados"] < 15
+
+
+def _chain_rows():
+    # Cada projeto reescreve um termo do anterior: vizinhos parecidos, pontas distantes
+    termos = ("alfa beta gama delta epsilon zeta eta teta iota capa lambda mi ni csi omicron pi ro sigma tau "
+              "upsilon fi chi psi omega").split()
+    rows = []
+    for n in range(12):
+        acao = {"codigo_acao": f"{n:02d}", "titulo": "Projeto de extensão",
+                "o_que_sera_feito": " ".join(termos[n:n + 16])}
+        rows.extend(signature_rows({"projeto_id": f"p{n:02d}"}, {"acoes_projetos": [acao]}))
+    return rows
+
+
+def test_link_rows_sampling_does_not_depend_on_row_order():
+    rows = _chain_rows()
+    results = set()
+    for seed in range(20):
+        shuffled = list(rows)
+        random.Random(seed).shuffle(shuffled)
+        stats = {}
+        groups = link_rows(shuffled, threshold=0.8, max_bucket=1, stats=stats)
+        assert stats["baldes_amostrados"] > 0
+        results.add((tuple(sorted(tuple(sorted(shuffled[i]["projeto_id"] for i in group)) for group in groups)),
+                     stats["pares_comparados"]))
+    assert len(results) == 1
+
+
+def test_link_rows_does_not_link_projects_of_the_same_document():
+    rows = signature_rows({"projeto_id": "p1"}, {"acoes_projetos": [LABORATORIO, LABORATORIO_REVISTO]})
+    assert link_rows(rows) == []
+    rows += signature_rows({"projeto_id": "p2"}, {"acoes_projetos": [LABORATORIO]})
+    (group,) = link_rows(rows)
+    assert len(group) == 3
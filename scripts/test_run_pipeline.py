@@ -0,0 +1,130 @@
+import io
+import json
+import os
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+import run_pipeline
+from pipeline_metrics import ROUND_TRIPS, RunRecorder
+from progress_events import ProgressEvents
+from run_pipeline import load_batch_jobs, run_batch
+
+# --- Testes da montagem de jobs do modo em lote ---
+
+def test_load_batch_jobs_from_csv_manifest(tmp_path):
+    manifest = tmp_path / "manifesto.csv"
+    manifest.write_text(
+        "pdf_path,institution_name,year\n"
+        "pga_2023.pdf,Fatec Sorocaba,2023\n"
+        "/abs/pga_2024.pdf,Fatec Votorantim,2024\n",
+        encoding="utf-8",
+    )
+    assert load_batch_jobs(str(manifest)) == [
+        (str(tmp_path / "pga_2023.pdf"), "Fatec Sorocaba", 2023),
+        ("/abs/pga_2024.pdf", "Fatec Votorantim", 2024),
+    ]
+
+def test_load_batch_jobs_from_jsonl_uses_defaults(tmp_path):
+    manifest = tmp_path / "manifesto.jsonl"
+    manifest.write_text(json.dumps({"pdf_path": "a.pdf"}) + "\n", encoding="utf-8")
+    assert load_batch_jobs(str(manifest), "Fatec Sorocaba", 2025) == [
+        (str(tmp_path / "a.pdf"), "Fatec Sorocaba", 2025)
+    ]
+
+def test_load_batch_jobs_from_directory(tmp_path):
+    (tmp_path / "b.pdf").write_bytes(b"%PDF")
+    (tmp_path / "a.PDF").write_bytes(b"%PDF")
+    (tmp_path / "notas.txt").write_text("x")
+    jobs = load_batch_jobs(str(tmp_path), "Fatec Sorocaba", 2024)
+    assert [path for path, _, _ in jobs] == [str(tmp_path / "a.PDF"), str(tmp_path / "b.pdf")]
+    with pytest.raises(ValueError):
+        load_batch_jobs(str(tmp_path))
+
+
+# --- Testes da recuperação do pool de extração ---
+
+def _fake_extract(pdf_path, institution_name, year, targeted=None, streaming=None, collect_events=False):
+    """Executado no pool no lugar de _extract_batch_item: 'quebra.pdf' derruba o processo."""
+    with open(os.path.join(os.path.dirname(pdf_path), "execucoes.log"), "a") as log:
+        log.write(os.path.basename(pdf_path) + "\n")
+    if pdf_path.endswith("quebra.pdf"):
+        os._exit(1)
+    time.sleep(0.05)
+    return {"normalized": {"arquivo": pdf_path}, "paginas": 1, "extracao": None, "duracao_extracao_s": 0.05,
+            "eventos": []}
+
+
+def test_run_batch_isolates_the_pdf_that_kills_its_process(monkeypatch, tmp_path):
+    ingested = []
+
+    def fake_upsert(collection, items):
+        ingested.extend(os.path.basename(normalized["arquivo"]) for normalized, _ in items)
+        return {"inseridos": len(items), "atualizados": 0, "inalterados": 0,
+                "resultados": [(n, "inserido") for n in range(len(items))]}
+
+    client = SimpleNamespace(get_database=lambda: SimpleNamespace(projetos=SimpleNamespace(database=None)),
+                             close=lambda: None)
+    monkeypatch.setattr(run_pipeline, "_extract_batch_item", _fake_extract)
+    monkeypatch.setattr(run_pipeline, "get_mongo_client", lambda: client)
+    monkeypatch.setattr(run_pipeline, "upsert_documents", fake_upsert)
+    monkeypatch.setattr(run_pipeline.process_pdf, "save_raw_extractions", lambda db, items: None)
+    monkeypatch.setattr(run_pipeline.process_pdf, "summarize",
+                        lambda normalized, document_id, paginas, operacao: {"projetos": 0, "aquisicoes": 0,
+                                                                            "operacao": operacao})
+    bons = [f"bom{n:02d}.pdf" for n in range(12)]
+    nomes = bons[:5] + ["quebra.pdf"] + bons[5:]
+    jobs = [(str(tmp_path / nome), "Fatec A", 2025) for nome in nomes]
+    summary_file = io.StringIO()
+
+    assert run_batch(jobs, 3, summary_file) == 1
+
+    summaries = {os.path.basename(line["arquivo"]): line for line in map(json.loads, summary_file.getvalue().splitlines())}
+    assert summaries["quebra.pdf"]["codigo"] == "processo_interrompido"
+    assert sorted(ingested) == bons
+    execucoes = Counter((tmp_path / "execucoes.log").read_text().split())
+    # Uma vez no pool e outra sozinho; os que não estavam em andamento rodam uma vez só
+    assert execucoes["quebra.pdf"] == 2
+    assert sum(execucoes[nome] > 1 for nome in bons) <= 2
+
+
+# --- Testes das métricas do modo em lote ---
+
+def _fake_extract_with_metrics(pdf_path, institution_name, year, targeted=None, streaming=None,
+                               collect_events=False):
+    recorder = RunRecorder(arquivo=os.path.basename(pdf_path), origem="lote")
+    with recorder.counting(), recorder.attach(ProgressEvents()).stage("extracao") as counts:
+        ROUND_TRIPS.started(None)
+        counts.update(paginas=1)
+    return {"normalized": {"arquivo": pdf_path}, "paginas": 1, "extracao": None, "duracao_extracao_s": 0.01,
+            "eventos": [], "metricas": recorder.finish()}
+
+
+def test_run_batch_records_each_file_with_its_share_of_the_writes(monkeypatch, tmp_path):
+    def fake_upsert(collection, items):
+        for _ in range(3):
+            ROUND_TRIPS.started(None)
+        return {"inseridos": len(items), "atualizados": 0, "inalterados": 0,
+                "resultados": [(n, "inserido") for n in range(len(items))]}
+
+    recorded = []
+    metrics = SimpleNamespace(record_run=lambda record, db: recorded.append(record))
+    client = SimpleNamespace(get_database=lambda: SimpleNamespace(projetos=SimpleNamespace(database=None)),
+                             close=lambda: None)
+    monkeypatch.setattr(run_pipeline, "_extract_batch_item", _fake_extract_with_metrics)
+    monkeypatch.setattr(run_pipeline, "get_mongo_client", lambda: client)
+    monkeypatch.setattr(run_pipeline, "upsert_documents", fake_upsert)
+    monkeypatch.setattr(run_pipeline.process_pdf, "save_raw_extractions", lambda db, items: None)
+    monkeypatch.setattr(run_pipeline.process_pdf, "summarize",
+                        lambda normalized, document_id, paginas, operacao: {"projetos": 0, "aquisicoes": 0,
+                                                                            "operacao": operacao})
+    jobs = [(str(tmp_path / nome), "Fatec A", 2025) for nome in ("a.pdf", "b.pdf")]
+
+    assert run_batch(jobs, 1, io.StringIO(), write_batch=2, metrics=metrics) == 0
+
+    assert sorted(record["arquivo"] for record in recorded) == ["a.pdf", "b.pdf"]
+    assert all(record["origem"] == "lote" and record["etapas"]["envio"]["status"] == "ok" for record in recorded)
+    # Um comando de cada extração e os três do envio em grupo, divididos entre os dois arquivos
+    assert sorted(record["mongo_round_trips"] for record in recorded) == [2, 3]
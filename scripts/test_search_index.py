@@ -0,0 +1,97 @@
+from search_index import SearchEngine, analyze, fold, index_rows
+
+# --- Testes do índice de busca textual ---
+
+DOCUMENTO = {
+    "analise_cenario": "A unidade enfrenta evasão escolar nos primeiros semestres.",
+    "situacoes_problema_gerais": ["cat 1 - Falta de laboratórios"],
+    "acoes_projetos": [
+        {"codigo_acao": "01", "titulo": "Laboratório de Informática",
+         "o_que_sera_feito": "Compra de computadores para os laboratórios", "por_que_sera_feito": "Aulas práticas"},
+        {"codigo_acao": "02", "titulo": "Monitoria", "o_que_sera_feito": "Monitores de matemática",
+         "por_que_sera_feito": "Reduzir a evasão dos alunos"},
+    ],
+}
+
+
+def _engine():
+    parent = {"projeto_id": "doc1", "instituicao_codigo": "123", "ano_referencia": 2025}
+    outro = {"projeto_id": "doc2", "instituicao_codigo": "456", "ano_referencia": 2024}
+    return SearchEngine(index_rows(parent, DOCUMENTO) + index_rows(outro, {"acoes_projetos": [
+        {"codigo_acao": "01", "titulo": "Semana de tecnologia", "o_que_sera_feito": "Palestras"}]}))
+
+
+def test_analyze_folds_accents_drops_stopwords_and_stems():
+    assert fold("Ação Educação") == "acao educacao"
+    assert analyze("Os laboratórios de informática") == analyze("laboratorio informatica")
+    assert analyze("professores") == analyze("professora") == analyze("professor")
+    assert analyze("ações") == analyze("ação")
+
+
+def test_index_rows_one_per_project_plus_document():
+    rows = index_rows({"projeto_id": "doc1"}, DOCUMENTO)
+    assert [(row["tipo"], row.get("codigo_acao")) for row in rows] == [
+        ("documento", None), ("projeto", "01"), ("projeto", "02")]
+    # Ocorrências no título contam em dobro
+    assert rows[1]["termos"][analyze("laboratório")[0]] == 3
+
+
+def test_search_ranks_title_match_first_with_snippet():
+    results = _engine().search("laboratório")
+    assert results[0]["codigo_acao"] == "01"
+    assert "**Laboratório**" in results[0]["trecho"]
+    assert {result["tipo"] for result in results} == {"projeto", "documento"}
+
+
+def test_search_filters_and_empty_queries():
+    engine = _engine()
+    assert [r["codigo_acao"] for r in engine.search("evasao", tipo="projeto")] == ["02"]
+    assert engine.search("palestras", ano=2025) == []
+    assert engine.search("de para com") == []
+
+
+class _Busca:
+    """Coleção `busca` falsa: o `$text` aqui é só "alguma palavra da busca aparece nos termos"."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def _matches(self, row, filtro):
+        for name, value in filtro.items():
+            if name == "$text":
+                if not set(analyze(value["$search"])) & set(row["termos"]):
+                    return False
+            elif row.get(name) != value:
+                return False
+        return True
+
+    def find(self, filtro, projection=None, sort=None, limit=0):
+        self.calls.append(("find", filtro, limit))
+        return [dict(row) for row in self.rows if self._matches(row, filtro)][:limit]
+
+    def aggregate(self, pipeline):
+        self.calls.append(("aggregate", pipeline[0]["$match"]))
+        rows = [row for row in self.rows if self._matches(row, pipeline[0]["$match"])]
+        return [{"_id": None, "total": len(rows), "tamanho": sum(row["tamanho"] for row in rows) / len(rows)}]
+
+    def count_documents(self, filtro):
+        self.calls.append(("count", filtro))
+        return sum(1 for row in self.rows if self._matches(row, filtro))
+
+
+def test_from_db_ranks_text_candidates_with_collection_statistics():
+    rows = _engine().rows
+    busca = _Busca(rows)
+    engine = SearchEngine.from_db({"busca": busca}, "laboratório", candidates=2)
+
+    # Só as candidatas do $text são carregadas, mas o BM25 usa os números da coleção inteira
+    find = next(call for call in busca.calls if call[0] == "find")
+    assert find[1]["$text"]["$search"] == "laboratório" and find[2] == 2
+    assert len(engine.rows) == 2 and engine.total == len(rows)
+    assert engine.search("laboratório") == _engine().search("laboratório")
+
+    filtrado = SearchEngine.from_db({"busca": busca}, "evasão", ano=2025, tipo="projeto")
+    assert [row["codigo_acao"] for row in filtrado.rows] == ["02"]
+    assert ("aggregate", {"ano_referencia": 2025}) in busca.calls
+    assert SearchEngine.from_db({"busca": busca}, "de para").rows == []
@@ -0,0 +1,176 @@
+import itertools
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+import send_to_mongo
+from send_to_mongo import ATUALIZADO, INALTERADO, INSERIDO, natural_key, update_fields, upsert_documents
+
+# --- Testes do upsert pela chave natural ---
+
+def _documento(data_extracao="2025-01-01T10:00:00"):
+    return {
+        "ano_referencia": 2025,
+        "instituicao_nome": "Fatec Teste",
+        "identificacao_unidade": {"codigo": "123", "nome": "Fatec Teste", "diretor": ""},
+        "metadados_extracao": {"nome_arquivo_original": "pga.pdf", "data_extracao": data_extracao},
+        "acoes_projetos": [{"codigo_acao": "1", "titulo": "Projeto"}],
+        "hash_conteudo": "abc",
+    }
+
+
+def test_natural_key():
+    assert natural_key(_documento()) == {
+        "identificacao_unidade.codigo": "123",
+        "ano_referencia": 2025,
+        "hash_conteudo": "abc",
+    }
+
+
+def test_update_fields_keeps_first_write_fields_out_of_set():
+    fields, on_insert = update_fields(dict(_documento(), pdf_original_id="id-gridfs"))
+    assert on_insert == {"metadados_extracao.data_extracao": "2025-01-01T10:00:00", "pdf_original_id": "id-gridfs"}
+    assert fields["metadados_extracao.nome_arquivo_original"] == "pga.pdf"
+    assert "metadados_extracao" not in fields
+    assert fields["acoes_projetos"] == [{"codigo_acao": "1", "titulo": "Projeto"}]
+
+
+def test_update_fields_hash_ignores_extraction_date():
+    first, _ = update_fields(_documento("2025-01-01T10:00:00"))
+    retry, _ = update_fields(_documento("2025-01-02T08:30:00"))
+    assert first["hash_dados"] == retry["hash_dados"]
+
+    changed = _documento()
+    changed["acoes_projetos"][0]["titulo"] = "Projeto revisado"
+    assert update_fields(changed)[0]["hash_dados"] != first["hash_dados"]
+
+
+# --- Testes do upsert em lote com uma collection falsa ---
+
+def _get(doc, path):
+    for part in path.split("."):
+        doc = (doc or {}).get(part)
+    return doc
+
+
+def _set(doc, path, value):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def _matches(doc, query):
+    if "$or" in query:
+        return any(_matches(doc, sub) for sub in query["$or"])
+    for path, expected in query.items():
+        value = doc.get("_id") if path == "_id" else _get(doc, path)
+        if isinstance(expected, dict) and "$ne" in expected:
+            if value == expected["$ne"]:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+class _ProjetosCollection:
+    """Collection com o índice único da chave natural e um gancho para simular outro writer."""
+    name = "projetos"
+
+    def __init__(self, before_write=None):
+        self.docs = []
+        self.ids = itertools.count(1)
+        self.before_write = before_write
+        self.database = SimpleNamespace(name="teste")
+
+    def insert(self, doc):
+        doc = dict(doc, _id=next(self.ids))
+        self.docs.append(doc)
+        return doc
+
+    def find(self, query, projection=None):
+        return [doc for doc in self.docs if _matches(doc, query)]
+
+    def find_one(self, query, projection=None):
+        return next(iter(self.find(query)), None)
+
+    def bulk_write(self, operations, ordered=False):
+        if self.before_write:
+            self.before_write(self)
+        upserted, errors = {}, []
+        for index, op in enumerate(operations):
+            query, update, upsert = op._filter, op._doc, op._upsert
+            doc = self.find_one(query)
+            if doc is None and not upsert:
+                continue
+            if doc is None:
+                key = {path: value for path, value in query.items() if not isinstance(value, dict)}
+                if any(all(_get(other, path) == value for path, value in key.items()) for other in self.docs):
+                    errors.append({"index": index, "code": 11000})
+                    continue
+                doc = self.insert({})
+                for path, value in {**key, **update.get("$setOnInsert", {})}.items():
+                    _set(doc, path, value)
+                upserted[index] = doc["_id"]
+            for path, value in update.get("$set", {}).items():
+                _set(doc, path, value)
+            for path, value in update.get("$inc", {}).items():
+                _set(doc, path, (_get(doc, path) or 0) + value)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "upserted": [
+                {"index": index, "_id": doc_id} for index, doc_id in upserted.items()]})
+        return SimpleNamespace(upserted_ids=upserted)
+
+
+@pytest.fixture
+def sem_gridfs(monkeypatch, tmp_path):
+    pdf = tmp_path / "pga.pdf"
+    pdf.write_bytes(b"%PDF-1.4 teste")
+    removidos = []
+    monkeypatch.setattr(send_to_mongo, "ensure_natural_key_index", lambda collection: None)
+    monkeypatch.setattr(send_to_mongo, "file_sha256", lambda path: "abc")
+    monkeypatch.setattr(send_to_mongo, "store_pdf", lambda db, path: "arquivo-gridfs")
+    monkeypatch.setattr(send_to_mongo, "GridFSBucket",
+                        lambda db, bucket_name: SimpleNamespace(delete=removidos.append))
+    monkeypatch.setattr(send_to_mongo, "sync_child_collections", lambda db, documents: None)
+    monkeypatch.setattr(send_to_mongo, "refresh_aggregates", lambda db, keys: None)
+    return str(pdf), removidos
+
+
+def _outro_writer(data):
+    def before_write(collection):
+        fields, on_insert = send_to_mongo.update_fields(_documento())
+        doc = collection.insert({})
+        for path, value in {**dict(zip(send_to_mongo.NATURAL_KEY_FIELDS, ("123", 2025, "abc"))), **fields,
+                            **on_insert}.items():
+            _set(doc, path, value)
+        if data != "iguais":
+            doc["hash_dados"] = "outro"
+        collection.before_write = None
+    return before_write
+
+
+def test_upsert_inserts_then_reports_unchanged(sem_gridfs):
+    pdf, removidos = sem_gridfs
+    collection = _ProjetosCollection()
+    assert upsert_documents(collection, [(_documento(), pdf)])["resultados"] == [(1, INSERIDO)]
+    assert upsert_documents(collection, [(_documento(), pdf)])["resultados"] == [(1, INALTERADO)]
+    assert collection.docs[0]["revisao"] == 1 and removidos == []
+
+
+def test_upsert_racing_identical_insert_is_unchanged(sem_gridfs):
+    pdf, removidos = sem_gridfs
+    collection = _ProjetosCollection(before_write=_outro_writer("iguais"))
+    assert upsert_documents(collection, [(_documento(), pdf)])["resultados"] == [(1, INALTERADO)]
+    assert len(collection.docs) == 1 and removidos == ["arquivo-gridfs"]
+
+
+def test_upsert_racing_different_insert_is_updated(sem_gridfs):
+    pdf, removidos = sem_gridfs
+    collection = _ProjetosCollection(before_write=_outro_writer("diferentes"))
+    assert upsert_documents(collection, [(_documento(), pdf)])["resultados"] == [(1, ATUALIZADO)]
+    assert len(collection.docs) == 1
+    assert collection.docs[0]["hash_dados"] == send_to_mongo.update_fields(_documento())[0]["hash_dados"]
+    # O PDF enviado por este writer não é referenciado pelo documento do outro
+    assert removidos == ["arquivo-gridfs"]
@@ -0,0 +1,64 @@
+from benchmarks.synthetic_pdf import write_pga_pdf
+from extraction_cache import ExtractionCache
+import process_pdf
+from normalization import normalize_data
+from process_pdf import _extract_page_range, extract_pdf_data, iter_pdf_pages
+
+# --- Testes do gerador de PGAs sintéticos dos benchmarks ---
+
+def test_synthetic_pdf_normalizes_like_generated_pages(tmp_path):
+    pdf_path = str(tmp_path / "pga.pdf")
+    pages = write_pga_pdf(pdf_path, n_projects=3, team_size=2, acquisitions=4)
+
+    extracted = extract_pdf_data(pdf_path, workers=1, cache=None)
+    assert len(extracted) == len(pages)
+
+    from_pdf = normalize_data(extracted, pdf_path, "Fatec Sorocaba", 2025)
+    expected = normalize_data(pages, pdf_path, "Fatec Sorocaba", 2025)
+    assert [p["codigo_acao"] for p in from_pdf["acoes_projetos"]] == ["01", "02", "03"]
+    assert from_pdf["acoes_projetos"] == expected["acoes_projetos"]
+    assert from_pdf["anexo1_aquisicoes"] == expected["anexo1_aquisicoes"]
+    assert from_pdf["identificacao_unidade"] == expected["identificacao_unidade"]
+
+
+def test_revised_pdf_reuses_unchanged_pages(tmp_path):
+    original = str(tmp_path / "v1.pdf")
+    revised = str(tmp_path / "v2.pdf")
+    write_pga_pdf(original, n_projects=3, team_size=2, acquisitions=4)
+    write_pga_pdf(revised, n_projects=3, team_size=2, acquisitions=5)
+    cache = ExtractionCache(cache_dir=str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+
+    stats = {}
+    extract_pdf_data(original, workers=1, cache=cache, stats=stats)
+    assert stats["paginas_reaproveitadas"] == []
+
+    stats = {}
+    extracted = extract_pdf_data(revised, workers=1, cache=cache, stats=stats)
+    assert stats["cache"] == "miss"
+    assert 0 < len(stats["paginas_reaproveitadas"]) < len(extracted)
+    assert extracted == extract_pdf_data(revised, workers=1, cache=None)
+
+
+
+def test_page_range_opens_only_its_pages_and_closes_them(tmp_path, monkeypatch):
+    pdf_path = str(tmp_path / "pga.pdf")
+    write_pga_pdf(pdf_path, n_projects=3, team_size=2, acquisitions=4)
+    full = list(iter_pdf_pages(pdf_path))
+
+    opened, closed = [], []
+
+    class _Page(process_pdf.Page):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            opened.append(self.page_number)
+
+        def close(self):
+            closed.append(self.page_number)
+            super().close()
+
+    monkeypatch.setattr(process_pdf, "Page", _Page)
+    extracted, _ = _extract_page_range(pdf_path, 1, 3)
+    assert extracted == full[1:3]
+    # A página 1 só é criada para somar a altura ao doctop; as seguintes ao intervalo nem isso
+    assert opened == [1, 2, 3] and len(full) > 3
+    assert closed == [2, 3]
@@ -0,0 +1,114 @@
+from pymongo import ReplaceOne
+
+import team_identities
+from team_identities import (blocking_keys, build_identities, cluster_names, normalize_name, refresh_identities,
+                             same_person)
+
+# --- Testes das identidades dos membros de equipe ---
+
+def test_normalize_name_folds_case_accents_titles_and_spacing():
+    assert normalize_name("  Profa. ANA  María da Silva ") == "ana maria da silva"
+    assert normalize_name("Dr. José-Carlos d'Ávila") == "jose carlos d avila"
+    assert normalize_name(None) == ""
+
+
+def _clusters(names):
+    return sorted(sorted(cluster) for cluster in cluster_names(names))
+
+
+def test_cluster_names_joins_abbreviations_and_typos():
+    assert _clusters(["ana maria da silva", "ana m silva", "ana maria silva", "ana maira silva",
+                      "bruno costa"]) == [["ana m silva", "ana maira silva", "ana maria da silva", "ana maria silva"],
+                                          ["bruno costa"]]
+
+
+def test_same_person_accepts_typos_only_in_long_words():
+    assert same_person("ana maria oliveira", "ana maria oliviera")
+    assert same_person("carlos souza", "carlos sousa")
+    assert same_person("fernanda lima", "fernada lima")
+    assert not same_person("ana lima", "ana lia")
+
+
+def test_same_person_rejects_swapped_final_vowel():
+    assert not same_person("paulo santos", "paula santos")
+    assert not same_person("maria silva", "mario silva")
+    assert not same_person("daniel oliveira", "daniela oliveira")
+    assert _clusters(["paulo santos", "paula santos", "maria silva", "mario silva"]) == [
+        ["maria silva"], ["mario silva"], ["paula santos"], ["paulo santos"]]
+
+
+def test_cluster_names_keeps_ambiguous_short_name_apart():
+    assert _clusters(["ana silva", "ana maria silva", "ana paula silva"]) == [
+        ["ana maria silva"], ["ana paula silva"], ["ana silva"]]
+
+
+def test_build_identities_rolls_up_allocations():
+    rows = [
+        {"projeto_id": "p1", "instituicao_codigo": "123", "instituicao_nome": "Fatec A", "ano_referencia": 2024,
+         "codigo_acao": "01", "nome": "Ana Maria Silva", "nome_normalizado": "ana maria silva",
+         "carga_horaria_semanal": 4, "tipo_hora": "HAE"},
+        {"projeto_id": "p2", "instituicao_codigo": "456", "instituicao_nome": "Fatec B", "ano_referencia": 2025,
+         "codigo_acao": "02", "nome": "Profa. Ana M. Silva", "nome_normalizado": "ana m silva",
+         "carga_horaria_semanal": 2, "tipo_hora": "HAE"},
+        {"projeto_id": "p3", "instituicao_codigo": "123", "instituicao_nome": "Fatec A", "ano_referencia": 2025,
+         "codigo_acao": "01", "nome": "Ana Maria Silva", "nome_normalizado": "ana maria silva",
+         "carga_horaria_semanal": "3h", "tipo_hora": ""},
+    ]
+    (pessoa,) = build_identities(rows)
+    assert pessoa["_id"] == "ana-maria-silva" and pessoa["nome"] == "Ana Maria Silva"
+    assert pessoa["variantes"] == ["ana m silva", "ana maria silva"]
+    totais = pessoa["totais"]
+    assert (totais["carga_horaria_semanal"], totais["projetos"], totais["unidades"], totais["anos"]) == (6, 3, 2, 2)
+    assert totais["por_ano"] == [{"ano_referencia": 2024, "horas": 4}, {"ano_referencia": 2025, "horas": 2}]
+    assert totais["por_tipo_hora"] == [{"tipo_hora": "HAE", "horas": 6}, {"tipo_hora": "não informado", "horas": 0}]
+
+
+# --- Testes da gravação das identidades ---
+
+class _Members:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def find(self, query, projection=None):
+        names = set(query["nome_normalizado"]["$in"])
+        return [dict(row) for row in self.rows if row["nome_normalizado"] in names]
+
+
+class _Pessoas:
+    full_name = "db.pessoas"
+
+    def __init__(self, docs):
+        self.docs = {doc["_id"]: doc for doc in docs}
+        self.operations = []
+
+    def find(self, query, projection=None):
+        blocks = set(query["blocos"]["$in"])
+        return [dict(doc) for doc in self.docs.values() if blocks & set(doc["blocos"])]
+
+    def bulk_write(self, operations, ordered=True):
+        for op in operations:
+            self.operations.append(type(op).__name__)
+            if isinstance(op, ReplaceOne):
+                self.docs[op._filter["_id"]] = op._doc
+            else:
+                for doc_id in op._filter["_id"]["$in"]:
+                    self.docs.pop(doc_id, None)
+
+
+def test_refresh_identities_replaces_by_key_and_deletes_only_gone_identities():
+    linha = {"projeto_id": "p1", "instituicao_codigo": "123", "instituicao_nome": "Fatec A", "ano_referencia": 2025,
+             "codigo_acao": "01", "nome": "Ana Maria Silva", "nome_normalizado": "ana maria silva",
+             "carga_horaria_semanal": 4, "tipo_hora": "HAE"}
+    antiga = dict(build_identities([dict(linha, carga_horaria_semanal=1)])[0])
+    # Identidade do mesmo bloco cujo nome saiu de equipe_membros
+    sumida = {"_id": "ana-maria-silveira", "variantes": ["ana maria silveira"],
+              "blocos": blocking_keys("ana maria silveira")}
+    outra = {"_id": "joao-souza", "variantes": ["joao souza"], "blocos": blocking_keys("joao souza")}
+    pessoas = _Pessoas([antiga, sumida, outra])
+    team_identities._indexed_collections.add(pessoas.full_name)
+
+    assert refresh_identities(_Members([linha]), pessoas, ["ana maria silva"]) == 1
+
+    assert set(pessoas.docs) == {"ana-maria-silva", "joao-souza"}
+    assert pessoas.docs["ana-maria-silva"]["totais"]["carga_horaria_semanal"] == 4
+    assert pessoas.operations == ["ReplaceOne", "DeleteMany"]